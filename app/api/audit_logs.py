@@ -18,6 +18,7 @@ from app.crud.audit_logs import (
     get_audit_statistics, cleanup_old_audit_logs,
     get_user_authorized_equipment_ids, has_equipment_permission
 )
+from app.crud.audit_archive import ArchivedAuditLogError
 
 router = APIRouter()
 
@@ -250,13 +251,16 @@ def rollback_operation_api(
     # 获取客户端IP地址
     client_ip = request.client.host if request.client else None
 
-    rollback_log = rollback_operation(
-        db=db,
-        rollback_data=rollback_data,
-        current_user_id=current_user.id,
-        is_admin=current_user.is_admin,
-        ip_address=client_ip
-    )
+    try:
+        rollback_log = rollback_operation(
+            db=db,
+            rollback_data=rollback_data,
+            current_user_id=current_user.id,
+            is_admin=current_user.is_admin,
+            ip_address=client_ip
+        )
+    except ArchivedAuditLogError as e:
+        raise HTTPException(status_code=400, detail=f"回滚失败：{e}")
 
     if not rollback_log:
         raise HTTPException(
@@ -302,11 +306,12 @@ def rollback_operation_api(
 
 @router.get("/statistics")
 def get_audit_statistics_api(
+    days: int = Query(30, ge=1, le=366, description="每日趋势的天数"),
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
-    """获取操作日志统计信息"""
-    return get_audit_statistics(db, current_user.id, current_user.is_admin)
+    """获取操作日志统计信息（含每日趋势 daily_stats）"""
+    return get_audit_statistics(db, current_user.id, current_user.is_admin, days=days)
 
 
 @router.get("/users")
@@ -423,10 +428,13 @@ def log_equipment_operation(
     old_data: Optional[dict] = None,
     new_data: Optional[dict] = None,
     operation_type: str = "equipment",
-    request: Optional[Request] = None
+    request: Optional[Request] = None,
+    transactional: bool = False
 ) -> AuditLogModel:
     """
     记录设备操作日志的辅助函数
+
+    日志默认批量异步写入；transactional=True 时随调用方的事务写入（如删除前保存的完整设备数据）
     """
     # 获取客户端信息
     client_ip = request.client.host if request and request.client else None
@@ -436,9 +444,6 @@ def log_equipment_operation(
     old_value = json.dumps(old_data, ensure_ascii=False, default=str) if old_data else None
     new_value = json.dumps(new_data, ensure_ascii=False, default=str) if new_data else None
 
-    # 获取设备信息用于确定target_table和target_id
-    equipment = db.query(Equipment).filter(Equipment.id == equipment_id).first()
-
     audit_log_data = AuditLogCreate(
         user_id=user_id,
         equipment_id=equipment_id,
@@ -452,7 +457,7 @@ def log_equipment_operation(
         user_agent=user_agent
     )
 
-    return create_audit_log(db, audit_log_data, client_ip)
+    return create_audit_log(db, audit_log_data, client_ip, transactional=transactional)
 
 
 def log_system_operation(
@@ -30,7 +30,7 @@ router = APIRouter(prefix="/calibration", tags=["calibration"])
 
 
 @router.get("/equipment/{equipment_id}/last-external-info")
-async def get_equipment_last_external_calibration_info(
+def get_equipment_last_external_calibration_info(
     equipment_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -80,7 +80,7 @@ async def get_equipment_last_external_calibration_info(
 
 
 @router.post("/equipment/{equipment_id}/update", response_model=CalibrationHistoryResponse)
-async def update_equipment_calibration(
+def update_equipment_calibration(
     equipment_id: int,
     calibration_data: CalibrationUpdateRequest,
     db: Session = Depends(get_db),
@@ -500,7 +500,7 @@ async def update_equipment_calibration_with_files(
 
 
 @router.post("/equipment/batch-update")
-async def batch_update_equipment_calibration(
+def batch_update_equipment_calibration(
     batch_data: BatchCalibrationUpdateRequest,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -527,7 +527,7 @@ async def batch_update_equipment_calibration(
     ):
         try:
             # 调用单个设备更新接口
-            result = await update_equipment_calibration(
+            result = update_equipment_calibration(
                 equipment_id, calibration_data, db, current_user
             )
             results.append({
@@ -560,7 +560,7 @@ async def batch_update_equipment_calibration(
 
 
 @router.get("/equipment/{equipment_id}/history", response_model=List[CalibrationHistoryWithDetails])
-async def get_equipment_calibration_history(
+def get_equipment_calibration_history(
     equipment_id: int,
     skip: int = 0,
     limit: int = 100,
@@ -627,7 +627,7 @@ async def get_equipment_calibration_history(
 
 
 @router.get("/history", response_model=List[CalibrationHistoryWithDetails])
-async def get_calibration_histories(
+def get_calibration_histories(
     filter_params: CalibrationHistoryFilter = Depends(),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -696,7 +696,7 @@ async def get_calibration_histories(
 
 
 @router.get("/statistics", response_model=CalibrationStatistics)
-async def get_calibration_statistics(
+def get_calibration_statistics(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -718,7 +718,7 @@ async def get_calibration_statistics(
 
 
 @router.get("/due-reminders", response_model=List[CalibrationDueReminder])
-async def get_calibration_due_reminders(
+def get_calibration_due_reminders(
     days: int = 30,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -6,8 +6,9 @@ from app.db.database import get_db
 from app.crud import categories
 from app.schemas.schemas import EquipmentCategory, EquipmentCategoryCreate
 from app.api.auth import get_current_admin_user, get_current_user
-from app.core.cache import cached, invalidate_cache_pattern
-from app.core.cache_config import CacheConfig, CacheInvalidationRules
+from app.core.cache import cached, invalidate_cache_tags
+from app.crud.permission_scope import equipment_scope_tags
+from app.core.cache_config import CacheConfig, CacheInvalidationRules, CacheTag
 
 router = APIRouter()
 
@@ -30,7 +31,8 @@ class PredefinedNamesRequest(BaseModel):
 @router.get("/", response_model=List[EquipmentCategory])
 @cached(
     ttl=CacheConfig.get_cache_ttl_for_api("categories_list"),
-    key_prefix=CacheConfig.get_cache_prefix_for_api("categories_list")
+    key_prefix=CacheConfig.get_cache_prefix_for_api("categories_list"),
+    tags=[CacheTag.CATEGORIES]
 )
 def read_categories(skip: int = 0, limit: int = 100,
                    db: Session = Depends(get_db),
@@ -77,9 +79,7 @@ def create_category(category: EquipmentCategoryCreate,
 
     # 创建类别后失效相关缓存
     try:
-        patterns = CacheInvalidationRules.CATEGORY_CHANGE_PATTERNS
-        for pattern in patterns:
-            invalidate_cache_pattern(pattern)
+        invalidate_cache_tags(*CacheInvalidationRules.CATEGORY_CHANGE_TAGS)
     except Exception as e:
         print(f"警告：清除缓存失败: {e}")
 
@@ -88,7 +88,8 @@ def create_category(category: EquipmentCategoryCreate,
 @router.get("/with-counts")
 @cached(
     ttl=CacheConfig.get_cache_ttl_for_api("categories_with_predefined"),
-    key_prefix=CacheConfig.get_cache_prefix_for_api("categories_with_predefined")
+    key_prefix=CacheConfig.get_cache_prefix_for_api("categories_with_predefined"),
+    tags=[CacheTag.CATEGORIES, equipment_scope_tags]
 )
 def get_categories_with_counts(skip: int = 0, limit: int = 100,
                               db: Session = Depends(get_db),
@@ -179,9 +180,7 @@ def update_category(category_id: int, category: EquipmentCategoryCreate,
 
     # 更新类别后失效相关缓存
     try:
-        patterns = CacheInvalidationRules.CATEGORY_CHANGE_PATTERNS
-        for pattern in patterns:
-            invalidate_cache_pattern(pattern)
+        invalidate_cache_tags(*CacheInvalidationRules.CATEGORY_CHANGE_TAGS)
     except Exception as e:
         print(f"警告：清除缓存失败: {e}")
 
@@ -196,9 +195,7 @@ def delete_category(category_id: int,
     if success:
         # 删除类别后失效相关缓存
         try:
-            patterns = CacheInvalidationRules.CATEGORY_CHANGE_PATTERNS
-            for pattern in patterns:
-                invalidate_cache_pattern(pattern)
+            invalidate_cache_tags(*CacheInvalidationRules.CATEGORY_CHANGE_TAGS)
         except Exception as e:
             print(f"警告：清除缓存失败: {e}")
 
@@ -247,9 +244,7 @@ def add_predefined_name(category_id: int,
 
     # 添加预定义名称后失效相关缓存
     try:
-        patterns = CacheInvalidationRules.CATEGORY_CHANGE_PATTERNS
-        for pattern in patterns:
-            invalidate_cache_pattern(pattern)
+        invalidate_cache_tags(*CacheInvalidationRules.CATEGORY_CHANGE_TAGS)
     except Exception as e:
         print(f"警告：清除缓存失败: {e}")
 
@@ -304,9 +299,7 @@ def remove_predefined_name(category_id: int,
 
         # 删除预定义名称后失效相关缓存
         try:
-            patterns = CacheInvalidationRules.CATEGORY_CHANGE_PATTERNS
-            for pattern in patterns:
-                invalidate_cache_pattern(pattern)
+            invalidate_cache_tags(*CacheInvalidationRules.CATEGORY_CHANGE_TAGS)
         except Exception as e:
             print(f"警告：清除缓存失败: {e}")
 
@@ -376,9 +369,7 @@ def edit_predefined_name(category_id: int,
 
     # 编辑预定义名称后失效相关缓存
     try:
-        patterns = CacheInvalidationRules.CATEGORY_CHANGE_PATTERNS
-        for pattern in patterns:
-            invalidate_cache_pattern(pattern)
+        invalidate_cache_tags(*CacheInvalidationRules.CATEGORY_CHANGE_TAGS)
     except Exception as e:
         print(f"警告：清除缓存失败: {e}")
 
@@ -402,9 +393,7 @@ def update_predefined_names(category_id: int,
 
         # 更新预定义名称列表后失效相关缓存
         try:
-            patterns = CacheInvalidationRules.CATEGORY_CHANGE_PATTERNS
-            for pattern in patterns:
-                invalidate_cache_pattern(pattern)
+            invalidate_cache_tags(*CacheInvalidationRules.CATEGORY_CHANGE_TAGS)
         except Exception as e:
             print(f"警告：清除缓存失败: {e}")
 
@@ -469,6 +458,7 @@ def get_category_equipment_usage(category_id: int,
     from app.models.models import Equipment, EquipmentCategory, UserCategory, UserEquipmentPermission
     from sqlalchemy import func
     from app.utils.predefined_name_manager import get_smart_name_mapping
+    from app.crud.type_code_index import type_code_index
     
     # 获取类别信息
     category = db.query(EquipmentCategory).filter(EquipmentCategory.id == category_id).first()
@@ -530,17 +520,20 @@ def get_category_equipment_usage(category_id: int,
     
     equipment_stats = equipment_query.group_by(Equipment.name).all()
     
-    # 获取预定义名称的编号映射 - 使用智能编号管理
+    # 获取预定义名称的编号映射 - 从类型编号索引中查找（与生成内部编号时使用的编号一致）
     category_code = str(category.code or "")
+    type_codes = type_code_index.get(category_code, db)
     
-    # 获取该类别下所有设备的名称和internal_id，用于智能编号
-    all_equipment_data = db.query(Equipment.name, Equipment.internal_id).filter(
-        Equipment.category_id == category_id
-    ).all()
-    existing_equipment_names = [item[0] for item in all_equipment_data]
-    equipment_internal_ids = {item[0]: item[1] for item in all_equipment_data}
-    
-    name_mapping = get_smart_name_mapping(category_code, predefined_names, existing_equipment_names, equipment_internal_ids)
+    if type_codes.category_id == category_id:
+        name_mapping = {name: type_codes.type_codes[name] for name in predefined_names if name in type_codes.type_codes}
+    else:
+        # 类别未设置代码或代码与其他类别重复时不在索引中，按该类别的设备计算
+        all_equipment_data = db.query(Equipment.name, Equipment.internal_id).filter(
+            Equipment.category_id == category_id
+        ).all()
+        existing_equipment_names = [item[0] for item in all_equipment_data]
+        equipment_internal_ids = {item[0]: item[1] for item in all_equipment_data}
+        name_mapping = get_smart_name_mapping(category_code, predefined_names, existing_equipment_names, equipment_internal_ids)
     
     # 转换为字典格式，并清理名称（去除可能的引号）
     usage_stats = {}
@@ -567,6 +560,11 @@ def get_category_equipment_usage(category_id: int,
     # 模糊匹配：检查预定义名称是否与设备名称相似
     enhanced_usage_stats = usage_stats.copy()
     
+    # 去除特殊字符后的设备名称 -> 模糊映射键（重复时取第一个）
+    simplified_devices = {}
+    for device_key in fuzzy_mapping:
+        simplified_devices.setdefault(''.join(c for c in device_key if c.isalnum()), device_key)
+    
     for predefined_name in predefined_names:
         predefined_lower = predefined_name.lower().strip()
         
@@ -581,12 +579,9 @@ def get_category_equipment_usage(category_id: int,
             else:
                 # 去除预定义名称中的特殊字符再匹配
                 simplified_predefined = ''.join(c for c in predefined_lower if c.isalnum())
-                for device_key in fuzzy_mapping:
-                    simplified_device = ''.join(c for c in device_key if c.isalnum())
-                    if simplified_predefined == simplified_device and len(simplified_predefined) > 2:
-                        matched_device_name = fuzzy_mapping[device_key]
-                        enhanced_usage_stats[predefined_name] = usage_stats.get(matched_device_name, 0)
-                        break
+                if len(simplified_predefined) > 2 and simplified_predefined in simplified_devices:
+                    matched_device_name = fuzzy_mapping[simplified_devices[simplified_predefined]]
+                    enhanced_usage_stats[predefined_name] = usage_stats.get(matched_device_name, 0)
     
     return {
         "category_id": category_id,
@@ -1,14 +1,15 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
-from sqlalchemy import func, select
+from sqlalchemy import func
 from datetime import date, timedelta
 from calendar import monthrange
 from app.db.database import get_db
-from app.crud import equipment
+from app.crud import equipment, equipment_stats
+from app.crud.permission_scope import equipment_scope_tags
 from app.schemas.schemas import DashboardStats
 from app.api.auth import get_current_user
-from app.models.models import Equipment, EquipmentCategory, Department
-from app.core.cache import cached, invalidate_cache_pattern
+from app.models.models import EquipmentCategory, Department, EquipmentStats
+from app.core.cache import cached, invalidate_cache_tags
 from app.core.cache_config import CacheConfig, CacheInvalidationRules
 
 router = APIRouter()
@@ -16,134 +17,64 @@ router = APIRouter()
 @router.get("/stats", response_model=DashboardStats)
 @cached(
     ttl=CacheConfig.get_cache_ttl_for_api("dashboard_stats"),
-    key_prefix=CacheConfig.get_cache_prefix_for_api("dashboard_stats")
+    key_prefix=CacheConfig.get_cache_prefix_for_api("dashboard_stats"),
+    tags=[equipment_scope_tags]
 )
 def get_dashboard_stats(db: Session = Depends(get_db),
                        current_user = Depends(get_current_user)):
-    """获取仪表盘统计数据 - 支持缓存"""
+    """获取仪表盘统计数据 - 基于设备统计汇总表，支持缓存"""
+    scope = {"user_id": current_user.id, "is_admin": current_user.is_admin}
     
-    # 设备总数
-    total_equipment_count = equipment.get_equipments_count(
-        db, user_id=current_user.id, is_admin=current_user.is_admin
+    # 按部门、器具名称、状态汇总设备数量（一次汇总表查询）
+    summary_query = equipment_stats.stats_query(
+        db, Department.name, EquipmentStats.name, EquipmentStats.status,
+        func.sum(EquipmentStats.equipment_count), **scope
     )
+    rows = []
+    if summary_query is not None:
+        rows = summary_query.join(
+            Department, Department.id == EquipmentStats.department_id
+        ).group_by(
+            Department.id, Department.name, EquipmentStats.name, EquipmentStats.status
+        ).all()
     
-    # 在用设备数量
-    active_query = db.query(Equipment).filter(Equipment.status == "在用")
-    if not current_user.is_admin:
-        from app.crud import users
-        from app.models.models import UserEquipmentPermission
-        from sqlalchemy import and_
-
-        # 修复权限冲突：需要同时匹配category_id和equipment_name
-        equipment_subquery = db.query(
-            Equipment.id
-        ).join(
-            UserEquipmentPermission,
-            and_(
-                Equipment.category_id == UserEquipmentPermission.category_id,
-                Equipment.name == UserEquipmentPermission.equipment_name,
-                UserEquipmentPermission.user_id == current_user.id
-            )
-        ).subquery()
-
-        authorized_equipment_ids = select(equipment_subquery.c.id)
-        active_query = active_query.filter(Equipment.id.in_(authorized_equipment_ids))
-
-    active_equipment_count = active_query.count()
+    total_equipment_count = 0
+    active_equipment_count = 0
+    inactive_count = 0
+    name_counts = {}
+    department_counts = {}
+    for department_name, equipment_name, status, count in rows:
+        count = count or 0
+        total_equipment_count += count
+        if status in ("停用", "报废"):
+            # 停用状态设备总数
+            inactive_count += count
+        elif status == "在用":
+            # 设备具体器具分布、部门分布（只统计在用设备）
+            active_equipment_count += count
+            name_counts[equipment_name] = name_counts.get(equipment_name, 0) + count
+            department_counts[department_name] = department_counts.get(department_name, 0) + count
     
     # 计算待检设备的日期范围：从当前日期到月底
     today = date.today()
     _, last_day = monthrange(today.year, today.month)
     current_month_end = date(today.year, today.month, last_day)
     
-    # 本月待检设备数量和列表：从今天到月底
-    monthly_due_equipments = equipment.get_equipments_due_for_calibration(
-        db, start_date=today, end_date=current_month_end,
-        user_id=current_user.id, is_admin=current_user.is_admin
+    # 本月待检设备数量：从今天到月底
+    monthly_due_count = equipment_stats.count_valid_between(
+        db, today, current_month_end, **scope
     )
-    monthly_due_count = len(monthly_due_equipments)
     
     # 已超期未检设备数量
-    overdue_equipments = equipment.get_overdue_equipments(
-        db, user_id=current_user.id, is_admin=current_user.is_admin
-    )
-    overdue_count = len(overdue_equipments)
-    
-    # 停用状态设备总数
-    inactive_query = db.query(Equipment).filter(Equipment.status.in_(["停用", "报废"]))
-    if not current_user.is_admin:
-        from app.models.models import UserEquipmentPermission
-        # 修复权限冲突：需要同时匹配category_id和equipment_name
-        equipment_subquery = db.query(
-            Equipment.id
-        ).join(
-            UserEquipmentPermission,
-            and_(
-                Equipment.category_id == UserEquipmentPermission.category_id,
-                Equipment.name == UserEquipmentPermission.equipment_name,
-                UserEquipmentPermission.user_id == current_user.id
-            )
-        ).subquery()
-
-        authorized_equipment_ids = select(equipment_subquery.c.id)
-        inactive_query = inactive_query.filter(Equipment.id.in_(authorized_equipment_ids))
-    
-    inactive_count = inactive_query.count()
-    
-    # 设备具体器具分布（只统计在用设备）
-    equipment_query = db.query(
-        Equipment.name,
-        func.count(Equipment.id).label('count')
-    ).filter(Equipment.status == "在用").group_by(Equipment.name)
-    
-    if not current_user.is_admin:
-        from app.models.models import UserEquipmentPermission
-        # 修复权限冲突：需要同时匹配category_id和equipment_name
-        equipment_subquery = db.query(
-            Equipment.id
-        ).join(
-            UserEquipmentPermission,
-            and_(
-                Equipment.category_id == UserEquipmentPermission.category_id,
-                Equipment.name == UserEquipmentPermission.equipment_name,
-                UserEquipmentPermission.user_id == current_user.id
-            )
-        ).subquery()
-
-        authorized_equipment_ids = select(equipment_subquery.c.id)
-        equipment_query = equipment_query.filter(Equipment.id.in_(authorized_equipment_ids))
+    overdue_count = equipment_stats.count_overdue(db, today, **scope)
     
     category_distribution = [
-        {"name": name, "count": count} 
-        for name, count in equipment_query.all()
+        {"name": name, "count": count}
+        for name, count in name_counts.items() if count
     ]
-    
-    # 部门分布（只统计在用设备）
-    department_query = db.query(
-        Department.name,
-        func.count(Equipment.id).label('count')
-    ).join(Equipment).filter(Equipment.status == "在用").group_by(Department.id, Department.name)
-    
-    if not current_user.is_admin:
-        from app.models.models import UserEquipmentPermission
-        # 修复权限冲突：需要同时匹配category_id和equipment_name
-        equipment_subquery = db.query(
-            Equipment.id
-        ).join(
-            UserEquipmentPermission,
-            and_(
-                Equipment.category_id == UserEquipmentPermission.category_id,
-                Equipment.name == UserEquipmentPermission.equipment_name,
-                UserEquipmentPermission.user_id == current_user.id
-            )
-        ).subquery()
-
-        authorized_equipment_ids = select(equipment_subquery.c.id)
-        department_query = department_query.filter(Equipment.id.in_(authorized_equipment_ids))
-    
     department_distribution = [
-        {"name": name, "count": count} 
-        for name, count in department_query.all()
+        {"name": name, "count": count}
+        for name, count in department_counts.items() if count
     ]
     
     return DashboardStats(
@@ -175,16 +106,13 @@ def get_monthly_due_equipments(db: Session = Depends(get_db),
 def clear_dashboard_cache(current_user = Depends(get_current_user)):
     """清空仪表盘相关缓存"""
     try:
-        patterns = CacheInvalidationRules.EQUIPMENT_CHANGE_PATTERNS
-        cleared_count = 0
-
-        for pattern in patterns:
-            cleared_count += invalidate_cache_pattern(pattern)
+        tags = CacheInvalidationRules.EQUIPMENT_CHANGE_TAGS
+        cleared_count = invalidate_cache_tags(*tags)
 
         return {
             "success": True,
-            "message": f"已清空 {cleared_count} 个缓存项",
-            "cleared_patterns": patterns
+            "message": f"已失效 {cleared_count} 个缓存标签",
+            "cleared_tags": tags
         }
     except Exception as e:
         return {
@@ -25,6 +25,7 @@ from app.schemas.schemas import (
 from app.core.security import create_access_token
 from app.api.auth import get_current_user
 from app.models.models import User
+from app.utils.export_stream import XlsxSheet, iter_query, xlsx_response
 from typing import List, Optional
 
 router = APIRouter()
@@ -32,7 +33,7 @@ router = APIRouter()
 # ========== 部门用户认证相关 ==========
 
 @router.post("/login", response_model=Token, summary="部门用户登录")
-async def department_user_login(
+def department_user_login(
     user_data: DepartmentUserLogin,
     request: Request,
     db: Session = Depends(get_db)
@@ -86,7 +87,7 @@ async def department_user_login(
     }
 
 @router.post("/change-password", response_model=dict, summary="部门用户修改密码")
-async def change_department_user_password(
+def change_department_user_password(
     password_data: DepartmentUserPasswordChange,
     request: Request,
     current_user: User = Depends(get_current_user),
@@ -134,7 +135,7 @@ async def change_department_user_password(
         )
 
 @router.get("/profile", response_model=DepartmentUser, summary="获取当前部门用户信息")
-async def get_department_user_profile(
+def get_department_user_profile(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -157,7 +158,7 @@ async def get_department_user_profile(
 # ========== 部门设备查看相关 ==========
 
 @router.get("/equipment/stats", response_model=DepartmentEquipmentStats, summary="获取部门设备统计信息")
-async def get_department_equipment_statistics(
+def get_department_equipment_statistics(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -172,7 +173,7 @@ async def get_department_equipment_statistics(
     return stats
 
 @router.get("/equipment/list", response_model=PaginatedDepartmentEquipment, summary="获取部门设备列表")
-async def get_department_equipment_list(
+def get_department_equipment_list(
     request: Request,
     skip: int = 0,
     limit: int = 20,
@@ -236,7 +237,7 @@ async def get_department_equipment_list(
     return result
 
 @router.get("/equipment-names", summary="获取部门设备名称列表")
-async def get_department_equipment_names(
+def get_department_equipment_names(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -251,7 +252,7 @@ async def get_department_equipment_names(
     return equipment_names
 
 @router.get("/categories", summary="获取部门设备类别列表")
-async def get_department_categories(
+def get_department_categories(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -265,8 +266,14 @@ async def get_department_categories(
     categories = department_users.get_department_categories(db, int(current_user.department_id))
     return categories
 
+# 部门设备清单导出列
+EXPORT_COLUMNS = [
+    '设备名称', '型号规格', '内部编号', '设备类别', '部门', '准确度等级', '测量范围', '检定周期', '检定日期',
+    '有效期至', '检定方式', '制造厂家', '出厂日期', '出厂编号', '安装地点', '原值(元)', '分度值', '设备状态'
+]
+
 @router.get("/equipment/export", summary="导出部门设备清单")
-async def export_department_equipment(
+def export_department_equipment(
     request: Request,
     status: Optional[str] = None,
     equipment_name: Optional[str] = None,
@@ -275,110 +282,30 @@ async def export_department_equipment(
     db: Session = Depends(get_db)
 ):
     """
-    导出部门设备清单为Excel文件
+    导出部门设备清单为Excel文件（在导出自己的会话中分批读取设备并流式写出）
     """
-    from fastapi.responses import StreamingResponse
-    from io import BytesIO
-    import pandas as pd
-    from datetime import datetime
-    
-    print(f"Export API called with: status={status}, equipment_name={equipment_name}, search={search}")
-    print(f"Current user: {current_user.username}, type: {current_user.user_type}")
-    
     if str(current_user.user_type) != "department_user":
         raise HTTPException(
             status_code=http_status.HTTP_403_FORBIDDEN,
             detail="权限不足"
         )
     
-    try:
-        # 构建筛选条件 - 导出时不筛选状态，获取所有设备
-        filters = DepartmentEquipmentFilter(
-            equipment_name=equipment_name,
-            status=None,  # 强制为None，确保导出所有状态的设备
-            search=search
-        )
-        print(f"Filters created successfully: {filters}")
-        
-        # 获取所有符合条件的设备（不分页，不筛选状态）
-        result = department_users.get_department_equipment_list(
-            db,
-            int(current_user.department_id),
-            skip=0,
-            limit=10000,  # 大数值获取全部
-            filters=filters
-        )
-        
-        print(f"Found {result['total']} equipment items (including all statuses)")
-        
-        
-        # 准备Excel数据
-        data = []
-        for equipment in result['items']:
-            data.append({
-                '设备名称': equipment.name,
-                '型号规格': equipment.model,
-                '内部编号': equipment.internal_id,
-                '设备类别': equipment.category.name,
-                '部门': equipment.department.name,
-                '准确度等级': equipment.accuracy_level or '',
-                '测量范围': equipment.measurement_range or '',
-                '检定周期': equipment.calibration_cycle or '',
-                '检定日期': equipment.calibration_date or '',
-                '有效期至': equipment.valid_until or '',
-                '检定方式': equipment.calibration_method or '',
-                '制造厂家': equipment.manufacturer or '',
-                '出厂日期': equipment.manufacture_date or '',
-                '出厂编号': equipment.manufacturer_id or '',
-                '安装地点': equipment.installation_location or '',
-                '原值(元)': equipment.original_value or '',
-                '分度值': equipment.scale_value or '',
-                '设备状态': equipment.status or '',
-            })
-        
-        # 创建Excel文件
-        df = pd.DataFrame(data)
-        
-        # 创建BytesIO对象
-        output = BytesIO()
-        
-        # 使用pandas的ExcelWriter
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='设备清单', index=False)
-            
-            # 获取工作表进行样式设置
-            worksheet = writer.sheets['设备清单']
-            
-            # 设置列宽
-            for column in worksheet.columns:
-                max_length = 0
-                column_letter = column[0].column_letter
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = min(max_length + 2, 50)
-                worksheet.column_dimensions[column_letter].width = adjusted_width
-        
-        output.seek(0)
-        
-        # 生成文件名
-        current_time = datetime.now().strftime('%Y%m%d_%H%M%S')
-        department_name = current_user.department.name if hasattr(current_user, 'department') else current_user.username
-        filename = f"{department_name}_设备清单_{current_time}.xlsx"
-        
-        # 对文件名进行URL编码以支持中文
-        from urllib.parse import quote
-        encoded_filename = quote(filename.encode('utf-8'))
-        
-        print(f"Generated Excel file: {filename} with {len(data)} rows")
-        
+    # 构建筛选条件 - 导出时不筛选状态，获取所有设备
+    filters = DepartmentEquipmentFilter(
+        equipment_name=equipment_name,
+        status=None,  # 强制为None，确保导出所有状态的设备
+        search=search
+    )
+    department_id = int(current_user.department_id)
+    user_id = int(current_user.id)
+    username = current_user.username
+    department_name = current_user.department.name if current_user.department else username
+    ip_address = request.client.host if request.client else None
+    user_agent = request.headers.get("user-agent", "")
+    
+    def log_export(session: Session, count: int) -> None:
         # 记录导出日志
         try:
-            ip_address = request.client.host if request.client else None
-            user_agent = request.headers.get("user-agent", "")
             filter_info = ""
             if equipment_name:
                 filter_info += f" 设备名称:{equipment_name}"
@@ -386,36 +313,54 @@ async def export_department_equipment(
                 filter_info += f" 搜索:{search}"
             
             department_users.create_department_user_log(
-                db=db,
-                user_id=int(current_user.id),
+                db=session,
+                user_id=user_id,
                 action="export_equipment",
-                description=f"部门用户 {current_user.username} 导出了设备清单({len(data)}条记录){filter_info}",
+                description=f"部门用户 {username} 导出了设备清单({count}条记录){filter_info}",
                 ip_address=str(ip_address) if ip_address else "",
                 user_agent=user_agent
             )
         except Exception as e:
             print(f"记录导出日志失败: {e}")
-        
-        # 返回文件流
-        return StreamingResponse(
-            BytesIO(output.getvalue()),
-            media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            headers={
-                "Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}"
-            }
-        )
-        
-    except Exception as e:
-        print(f"Error in export: {e}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(
-            status_code=http_status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"导出失败: {str(e)}"
-        )
+    
+    equipments = iter_query(
+        lambda session: department_users.department_equipment_query(session, department_id, filters),
+        log_export
+    )
+    rows = (
+        [
+            equipment.name,
+            equipment.model,
+            equipment.internal_id,
+            equipment.category.name,
+            department_name,
+            equipment.accuracy_level or '',
+            equipment.measurement_range or '',
+            equipment.calibration_cycle or '',
+            equipment.calibration_date or '',
+            equipment.valid_until or '',
+            equipment.calibration_method or '',
+            equipment.manufacturer or '',
+            equipment.manufacture_date or '',
+            equipment.manufacturer_id or '',
+            equipment.installation_location or '',
+            equipment.original_value or '',
+            equipment.scale_value or '',
+            equipment.status or '',
+        ]
+        for equipment in equipments
+    )
+    
+    # 流式写出时无法按内容计算列宽，按各列常见内容长度设置
+    sheet = XlsxSheet(
+        '设备清单', EXPORT_COLUMNS, rows,
+        widths=[20, 16, 16, 14, 14, 12, 16, 10, 12, 12, 10, 20, 12, 16, 20, 10, 10, 10]
+    )
+    filename = f"{department_name}_设备清单_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    return xlsx_response([sheet], filename)
 
 @router.get("/equipment/{equipment_id}", response_model=DepartmentEquipmentSimple, summary="获取部门设备详情")
-async def get_department_equipment_detail(
+def get_department_equipment_detail(
     equipment_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -442,7 +387,7 @@ async def get_department_equipment_detail(
 # ========== 管理员管理部门用户相关 ==========
 
 @router.post("/admin/create", response_model=DepartmentUser, summary="管理员创建部门用户")
-async def admin_create_department_user(
+def admin_create_department_user(
     department_id: int,
     request: Request,
     current_user: User = Depends(get_current_user),
@@ -481,7 +426,7 @@ async def admin_create_department_user(
         )
 
 @router.post("/admin/reset-password", response_model=dict, summary="管理员重置部门用户密码")
-async def admin_reset_department_user_password(
+def admin_reset_department_user_password(
     reset_data: DepartmentUserPasswordReset,
     request: Request,
     current_user: User = Depends(get_current_user),
@@ -530,7 +475,7 @@ async def admin_reset_department_user_password(
         )
 
 @router.put("/admin/status/{user_id}", response_model=dict, summary="管理员更新部门用户状态")
-async def admin_update_department_user_status(
+def admin_update_department_user_status(
     user_id: int,
     is_active: bool,
     request: Request,
@@ -583,7 +528,7 @@ async def admin_update_department_user_status(
         )
 
 @router.get("/admin/list", response_model=List[DepartmentUser], summary="管理员获取所有部门用户")
-async def admin_get_all_department_users(
+def admin_get_all_department_users(
     skip: int = 0,
     limit: int = 100,
     current_user: User = Depends(get_current_user),
@@ -600,7 +545,7 @@ async def admin_get_all_department_users(
     return users
 
 @router.delete("/admin/{user_id}", response_model=dict, summary="管理员删除部门用户")
-async def admin_delete_department_user(
+def admin_delete_department_user(
     user_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -622,7 +567,7 @@ async def admin_delete_department_user(
         )
 
 @router.get("/admin/logs/{user_id}", response_model=List[DepartmentUserLog], summary="管理员获取部门用户操作日志")
-async def admin_get_department_user_logs(
+def admin_get_department_user_logs(
     user_id: int,
     limit: int = 10,
     current_user: User = Depends(get_current_user),
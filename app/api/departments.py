@@ -5,15 +5,16 @@ from app.db.database import get_db
 from app.crud import departments
 from app.schemas.schemas import Department, DepartmentCreate, DepartmentUpdate
 from app.api.auth import get_current_admin_user, get_current_user
-from app.core.cache import cached, invalidate_cache_pattern
-from app.core.cache_config import CacheConfig, CacheInvalidationRules
+from app.core.cache import cached, invalidate_cache_tags
+from app.core.cache_config import CacheConfig, CacheInvalidationRules, CacheTag
 
 router = APIRouter()
 
 @router.get("/", response_model=List[Department])
 @cached(
     ttl=CacheConfig.get_cache_ttl_for_api("departments_list"),
-    key_prefix=CacheConfig.get_cache_prefix_for_api("departments_list")
+    key_prefix=CacheConfig.get_cache_prefix_for_api("departments_list"),
+    tags=[CacheTag.DEPARTMENTS]
 )
 def read_departments(skip: int = 0, limit: int = 100,
                     db: Session = Depends(get_db),
@@ -42,9 +43,7 @@ def create_department(department: DepartmentCreate,
 
     # 创建部门后失效相关缓存
     try:
-        patterns = CacheInvalidationRules.DEPARTMENT_CHANGE_PATTERNS
-        for pattern in patterns:
-            invalidate_cache_pattern(pattern)
+        invalidate_cache_tags(*CacheInvalidationRules.DEPARTMENT_CHANGE_TAGS)
     except Exception as e:
         print(f"警告：清除缓存失败: {e}")
 
@@ -63,6 +62,9 @@ def read_department(department_id: int,
     db_department = departments.get_department(db, department_id=department_id)
     if db_department is None:
         raise HTTPException(status_code=404, detail="部门未找到")
+
+    # 更新部门后失效相关缓存
+    invalidate_cache_tags(*CacheInvalidationRules.DEPARTMENT_CHANGE_TAGS, CacheTag.department(department_id))
     return db_department
 
 @router.put("/{department_id}", response_model=Department)
@@ -72,6 +74,9 @@ def update_department(department_id: int, department: DepartmentUpdate,
     db_department = departments.update_department(db, department_id=department_id, department=department)
     if db_department is None:
         raise HTTPException(status_code=404, detail="部门未找到")
+
+    # 更新部门后失效相关缓存
+    invalidate_cache_tags(*CacheInvalidationRules.DEPARTMENT_CHANGE_TAGS, CacheTag.department(department_id))
     return db_department
 
 @router.delete("/{department_id}")
@@ -80,6 +85,8 @@ def delete_department(department_id: int,
                      current_user = Depends(get_current_admin_user)):
     success, message = departments.delete_department(db, department_id=department_id)
     if success:
+        # 删除部门后失效相关缓存
+        invalidate_cache_tags(*CacheInvalidationRules.DEPARTMENT_CHANGE_TAGS, CacheTag.department(department_id))
         return {"message": message}
     else:
         raise HTTPException(status_code=400, detail=message)
\ No newline at end of file
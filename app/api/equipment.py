@@ -1,19 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Response, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
 from sqlalchemy.orm import Session
 from datetime import date, datetime
 from calendar import monthrange
-import io
-import pandas as pd
-from urllib.parse import quote
 from app.db.database import get_db
 from app.crud import equipment
-from app.schemas.schemas import Equipment, EquipmentCreate, EquipmentUpdate, EquipmentFilter, EquipmentSearch, PaginatedEquipment
+from app.crud.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, TOTAL_MODES, InvalidCursorError
+from app.crud.permission_scope import equipment_scope_tags
+from typing import Optional
+from app.schemas.schemas import Equipment, EquipmentCreate, EquipmentUpdate, EquipmentFilter, EquipmentSearch, PaginatedEquipment, PaginatedEquipmentWithAttachmentCount
+from app.utils.fast_json import FastJSONResponse
+from app.utils.export_stream import XlsxSheet, iter_query, xlsx_response
 from app.api.audit_logs import log_equipment_operation, log_system_operation
 from app.api.auth import get_current_user
 from app.utils.auto_id import generate_internal_id
 from app.core.logging import get_context_logger, log_database_operation
-from app.core.cache import cached, invalidate_cache_pattern
-from app.core.cache_config import CacheConfig, CacheInvalidationRules
+from app.core.cache import cached
+from app.core.cache_config import CacheConfig
 import logging
 
 router = APIRouter()
@@ -21,21 +23,44 @@ router = APIRouter()
 # 获取日志记录器
 equipment_logger = logging.getLogger("equipment")
 
+def _paginate_or_400(fetch, total_mode: str):
+    """执行分页查询，游标或总数统计方式无效时返回400"""
+    if total_mode not in TOTAL_MODES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"total_mode 必须是 {', '.join(TOTAL_MODES)} 之一"
+        )
+    try:
+        return fetch()
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
 @router.get("/", response_model=PaginatedEquipment)
 @cached(
     ttl=CacheConfig.get_cache_ttl_for_api("equipment_list"),
-    key_prefix=CacheConfig.get_cache_prefix_for_api("equipment_list")
+    key_prefix=CacheConfig.get_cache_prefix_for_api("equipment_list"),
+    tags=[equipment_scope_tags]
 )
-def read_equipments(skip: int = 0, limit: int = 999999,
+def read_equipments(skip: int = Query(0, ge=0),
+                   limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
                    sort_field: str = "valid_until",
                    sort_order: str = "asc",
+                   cursor: Optional[str] = None,
+                   total_mode: str = "exact",
                    db: Session = Depends(get_db),
                    current_user = Depends(get_current_user)):
-    return equipment.get_equipments_paginated(
+    """
+    获取设备列表
+
+    支持两种分页方式：skip/limit 偏移分页；或将上一页返回的 next_cursor 作为 cursor 传入，
+    按排序键定位下一页（大台账翻页耗时恒定）。total_mode 可选 exact/approximate/none。
+    """
+    return _paginate_or_400(lambda: equipment.get_equipments_paginated(
         db, skip=skip, limit=limit,
         sort_field=sort_field, sort_order=sort_order,
-        user_id=current_user.id, is_admin=current_user.is_admin
-    )
+        user_id=current_user.id, is_admin=current_user.is_admin,
+        cursor=cursor, total_mode=total_mode
+    ), total_mode)
 
 @router.post("/", response_model=Equipment)
 def create_equipment(equipment_data: EquipmentCreate,
@@ -44,15 +69,9 @@ def create_equipment(equipment_data: EquipmentCreate,
                     current_user = Depends(get_current_user)):
     # 检查用户是否有该设备的权限（修复权限冲突）
     if not current_user.is_admin:
-        from app.models.models import UserEquipmentPermission
-
-        user_equipment_permission = db.query(UserEquipmentPermission).filter(
-            UserEquipmentPermission.user_id == current_user.id,
-            UserEquipmentPermission.category_id == equipment_data.category_id,
-            UserEquipmentPermission.equipment_name == equipment_data.name
-        ).first()
-
-        if not user_equipment_permission:
+        if not equipment.has_equipment_permission(
+            db, current_user.id, equipment_data.category_id, equipment_data.name
+        ):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Not authorized to manage this equipment type"
@@ -85,16 +104,24 @@ def create_equipment(equipment_data: EquipmentCreate,
         request=request
     )
 
-    # 创建设备后失效相关缓存
-    try:
-        patterns = CacheInvalidationRules.EQUIPMENT_CHANGE_PATTERNS
-        for pattern in patterns:
-            invalidate_cache_pattern(pattern)
-    except Exception as e:
-        print(f"警告：清除缓存失败: {e}")
+    # 创建设备后的缓存失效由会话提交钩子按设备所在部门、类别完成（见 app/crud/cache_invalidation.py）
 
     return new_equipment
 
+# 需在 /{equipment_id} 之前注册，否则路径会被当作设备ID匹配
+@router.get("/with-attachment-count", response_model=PaginatedEquipmentWithAttachmentCount)
+def get_equipments_with_attachment_count(skip: int = 0, limit: int = 100,
+                                        sort_field: str = "valid_until",
+                                        sort_order: str = "asc",
+                                        db: Session = Depends(get_db),
+                                        current_user = Depends(get_current_user)):
+    """获取设备列表，包含附件数量统计 - 列投影查询，结果直接序列化"""
+    return FastJSONResponse(equipment.get_equipments_with_attachment_count(
+        db, skip=skip, limit=limit,
+        user_id=current_user.id, is_admin=current_user.is_admin,
+        sort_field=sort_field, sort_order=sort_order
+    ))
+
 @router.get("/{equipment_id}", response_model=Equipment)
 def read_equipment(equipment_id: int,
                   db: Session = Depends(get_db),
@@ -162,13 +189,7 @@ def update_equipment(equipment_id: int, equipment_update: EquipmentUpdate,
         request=request
     )
 
-    # 更新设备后失效相关缓存
-    try:
-        patterns = CacheInvalidationRules.EQUIPMENT_CHANGE_PATTERNS
-        for pattern in patterns:
-            invalidate_cache_pattern(pattern)
-    except Exception as e:
-        print(f"警告：清除缓存失败: {e}")
+    # 更新设备后的缓存失效由会话提交钩子按设备所在部门、类别完成（见 app/crud/cache_invalidation.py）
 
     return updated_equipment
 
@@ -220,120 +241,109 @@ def delete_equipment(equipment_id: int,
         equipment_id=equipment_id,
         action="删除",
         description=f"删除设备: {db_equipment.name} ({db_equipment.internal_id})",
-        old_data=equipment_data  # 保存完整数据用于回滚
+        old_data=equipment_data,  # 保存完整数据用于回滚
+        transactional=True  # 与删除一起提交
     )
 
     success = equipment.delete_equipment(db, equipment_id=equipment_id)
     if not success:
         raise HTTPException(status_code=404, detail="设备未找到")
 
-    # 删除设备后失效相关缓存
-    try:
-        patterns = CacheInvalidationRules.EQUIPMENT_CHANGE_PATTERNS
-        for pattern in patterns:
-            invalidate_cache_pattern(pattern)
-    except Exception as e:
-        print(f"警告：清除缓存失败: {e}")
+    # 删除设备后的缓存失效由会话提交钩子按设备所在部门、类别完成（见 app/crud/cache_invalidation.py）
 
     return {"message": "设备删除成功"}
 
 @router.post("/filter", response_model=PaginatedEquipment)
 @cached(
     ttl=CacheConfig.get_cache_ttl_for_api("equipment_search"),
-    key_prefix=CacheConfig.get_cache_prefix_for_api("equipment_search")
+    key_prefix=CacheConfig.get_cache_prefix_for_api("equipment_search"),
+    tags=[equipment_scope_tags]
 )
-def filter_equipments(filters: EquipmentFilter, skip: int = 0, limit: int = 999999,
+def filter_equipments(filters: EquipmentFilter,
+                     skip: int = Query(0, ge=0),
+                     limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
                      sort_field: str = "valid_until",
                      sort_order: str = "asc",
+                     cursor: Optional[str] = None,
+                     total_mode: str = "exact",
                      db: Session = Depends(get_db),
                      current_user = Depends(get_current_user)):
-    return equipment.filter_equipments_paginated(
+    """筛选设备（分页参数同设备列表接口）"""
+    return _paginate_or_400(lambda: equipment.filter_equipments_paginated(
         db, filters=filters, skip=skip, limit=limit,
         sort_field=sort_field, sort_order=sort_order,
-        user_id=current_user.id, is_admin=current_user.is_admin
+        user_id=current_user.id, is_admin=current_user.is_admin,
+        cursor=cursor, total_mode=total_mode
+    ), total_mode)
+
+# 设备台账导出列（月度计划、筛选、选中设备和搜索结果导出共用）
+EXPORT_COLUMNS = [
+    '序号', '使用部门', '计量器具类别', '计量器具名称', '型号/规格', '准确度等级', '测量范围', '内部编号',
+    '出厂编号', '检定周期', '检定（校准）日期', '有效期至', '安装地点', '分度值', '制造厂家', '出厂日期',
+    '检定方式', '证书编号', '检定机构', '证书形式', '管理级别', '原值/元', '设备状态', '状态变更时间', '备注'
+]
+
+def _format_date(value) -> str:
+    return value.strftime('%Y-%m-%d') if value is not None else ''
+
+def _export_row(index: int, eq) -> list:
+    return [
+        index, eq.department.name, eq.category.name, eq.name, eq.model, eq.accuracy_level,
+        eq.measurement_range, eq.internal_id, eq.manufacturer_id or '', eq.calibration_cycle,
+        _format_date(eq.calibration_date), _format_date(eq.valid_until), eq.installation_location,
+        eq.scale_value or '', eq.manufacturer, _format_date(eq.manufacture_date), eq.calibration_method,
+        eq.certificate_number or '', eq.verification_agency or '', eq.certificate_form or '',
+        eq.management_level or '', eq.original_value or '', eq.status,
+        _format_date(eq.status_change_date), eq.notes
+    ]
+
+def _export_sheets(build_query, sheet_title: str, on_complete=None) -> list:
+    """设备台账导出的工作表：在导出自己的会话中分批读取设备并逐行写出"""
+    rows = (
+        _export_row(index, eq)
+        for index, eq in enumerate(iter_query(build_query, on_complete), 1)
+    )
+    return [XlsxSheet(sheet_title, EXPORT_COLUMNS, rows)]
+
+def _export_equipments(build_query, sheet_title: str, filename: str, on_complete=None):
+    """流式导出设备台账"""
+    return xlsx_response(_export_sheets(build_query, sheet_title, on_complete), filename)
+
+def monthly_plan_range(today: date) -> tuple:
+    """月度检定计划的日期范围：从当前日期到月底"""
+    _, last_day = monthrange(today.year, today.month)
+    return today, date(today.year, today.month, last_day)
+
+def monthly_plan_logger(user_id: int):
+    """月度检定计划导出完成后记录操作日志的回调"""
+    def log_export(session: Session, count: int) -> None:
+        # 记录操作日志
+        log_system_operation(
+            db=session,
+            user_id=user_id,
+            action="月度检定计划导出",
+            description=f"月度检定计划导出，共{count}台"
+        )
+    return log_export
+
+def monthly_plan_sheets(start_date: date, end_date: date, user_id: int, is_admin: bool, on_complete=None) -> list:
+    """月度检定计划导出的工作表"""
+    return _export_sheets(
+        lambda session: equipment.due_for_calibration_query(
+            session, start_date=start_date, end_date=end_date, user_id=user_id, is_admin=is_admin
+        ),
+        '选中设备', on_complete
     )
 
 @router.get("/export/monthly-plan")
 def export_monthly_plan(db: Session = Depends(get_db),
                        current_user = Depends(get_current_user)):
     """导出本月待检设备计划"""
-    from datetime import datetime
-    
-    # 获取当前日期
-    today = datetime.now().date()
-    
-    # 计算待检设备的日期范围：从当前日期到月底
-    _, last_day = monthrange(today.year, today.month)
-    start_date = today
-    end_date = date(today.year, today.month, last_day)
-    
-    equipments = equipment.get_equipments_due_for_calibration(
-        db, start_date=start_date, end_date=end_date,
-        user_id=current_user.id, is_admin=current_user.is_admin
-    )
-    
-    # 转换为DataFrame
-    data = []
-    for i, eq in enumerate(equipments, 1):
-        data.append({
-            '序号': i,
-            '使用部门': eq.department.name,
-            '计量器具类别': eq.category.name,
-            '计量器具名称': eq.name,
-            '型号/规格': eq.model,
-            '准确度等级': eq.accuracy_level,
-            '测量范围': eq.measurement_range,
-            '内部编号': eq.internal_id,
-            '出厂编号': eq.manufacturer_id or '',
-            '检定周期': eq.calibration_cycle,
-            '检定（校准）日期': eq.calibration_date.strftime('%Y-%m-%d') if eq.calibration_date is not None else '',
-            '有效期至': eq.valid_until.strftime('%Y-%m-%d') if eq.valid_until is not None else '',
-            '安装地点': eq.installation_location,
-            '分度值': eq.scale_value or '',
-            '制造厂家': eq.manufacturer,
-            '出厂日期': eq.manufacture_date.strftime('%Y-%m-%d') if eq.manufacture_date is not None else '',
-            '检定方式': eq.calibration_method,
-            '证书编号': eq.certificate_number or '',
-            '检定机构': eq.verification_agency or '',
-            '证书形式': eq.certificate_form or '',
-            '管理级别': eq.management_level or '',
-            '原值/元': eq.original_value or '',
-            '设备状态': eq.status,
-            '状态变更时间': eq.status_change_date.strftime('%Y-%m-%d') if eq.status_change_date is not None else '',
-            '备注': eq.notes
-        })
-    
-    df = pd.DataFrame(data)
-    
-    # 重新排列列顺序，确保序号在第一列
-    if not df.empty:
-        columns = ['序号'] + [col for col in df.columns if col != '序号']
-        df = df[columns]
-    
-    # 替换NaN值为空字符串
-    df = df.fillna('')
-    
-    # 创建Excel文件
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name='选中设备', index=False)
-    output.seek(0)
-    
-    filename = f"选中设备_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    encoded_filename = quote(filename)
-    
-    # 记录操作日志
-    log_system_operation(
-        db=db,
-        user_id=current_user.id,
-        action="月度检定计划导出",
-        description=f"月度检定计划导出，共{len(equipments)}台"
-    )
-    
-    return Response(
-        content=output.getvalue(),
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}"}
+    start_date, end_date = monthly_plan_range(datetime.now().date())
+    user_id = current_user.id
+    return xlsx_response(
+        monthly_plan_sheets(start_date, end_date, user_id, current_user.is_admin, monthly_plan_logger(user_id)),
+        f"选中设备_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
     )
 
 
@@ -342,63 +352,12 @@ def export_filtered_equipments(filters: EquipmentFilter,
                               db: Session = Depends(get_db),
                               current_user = Depends(get_current_user)):
     """根据筛选条件导出设备数据"""
-    equipments = equipment.filter_equipments(
-        db, filters=filters, skip=0, limit=10000,  # 导出时不限制数量
-        user_id=current_user.id, is_admin=current_user.is_admin
-    )
-    
-    # 转换为DataFrame
-    data = []
-    for i, eq in enumerate(equipments, 1):
-        data.append({
-            '序号': i,
-            '使用部门': eq.department.name,
-            '计量器具类别': eq.category.name,
-            '计量器具名称': eq.name,
-            '型号/规格': eq.model,
-            '准确度等级': eq.accuracy_level,
-            '测量范围': eq.measurement_range,
-            '内部编号': eq.internal_id,
-            '出厂编号': eq.manufacturer_id or '',
-            '检定周期': eq.calibration_cycle,
-            '检定（校准）日期': eq.calibration_date.strftime('%Y-%m-%d') if eq.calibration_date is not None else '',
-            '有效期至': eq.valid_until.strftime('%Y-%m-%d') if eq.valid_until is not None else '',
-            '安装地点': eq.installation_location,
-            '分度值': eq.scale_value or '',
-            '制造厂家': eq.manufacturer,
-            '出厂日期': eq.manufacture_date.strftime('%Y-%m-%d') if eq.manufacture_date is not None else '',
-            '检定方式': eq.calibration_method,
-            '证书编号': eq.certificate_number or '',
-            '检定机构': eq.verification_agency or '',
-            '证书形式': eq.certificate_form or '',
-            '管理级别': eq.management_level or '',
-            '原值/元': eq.original_value or '',
-            '设备状态': eq.status,
-            '状态变更时间': eq.status_change_date.strftime('%Y-%m-%d') if eq.status_change_date is not None else '',
-            '备注': eq.notes
-        })
-    
-    df = pd.DataFrame(data)
-    
-    # 重新排列列顺序，确保序号在第一列
-    columns = ['序号'] + [col for col in df.columns if col != '序号']
-    df = df[columns]
-    
-    # 替换NaN值为空字符串
-    df = df.fillna('')
-    
-    # 创建Excel文件
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name='设备台账', index=False)
-    output.seek(0)
-    
-    filename = f"设备台账_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    encoded_filename = quote(filename)
-    return Response(
-        content=output.getvalue(),
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}"}
+    user_id, is_admin = current_user.id, current_user.is_admin
+    return _export_equipments(
+        lambda session: equipment.filter_equipments_query(
+            session, filters=filters, user_id=user_id, is_admin=is_admin
+        ),
+        '设备台账', f"设备台账_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
     )
 
 @router.post("/batch/update-calibration")
@@ -463,14 +422,7 @@ def batch_update_calibration(
         description=f"批量更新检定日期，成功{success_count}台，失败{error_count}台"
     )
 
-    # 批量更新后失效相关缓存
-    if success_count > 0:
-        try:
-            patterns = CacheInvalidationRules.EQUIPMENT_CHANGE_PATTERNS
-            for pattern in patterns:
-                invalidate_cache_pattern(pattern)
-        except Exception as e:
-            print(f"警告：清除缓存失败: {e}")
+    # 批量更新后的缓存失效由会话提交钩子完成（见 app/crud/cache_invalidation.py）
 
     return {
         "message": "批量更新完成",
@@ -637,88 +589,37 @@ def batch_export_selected_equipments(
     current_user = Depends(get_current_user)
 ):
     """批量导出选中的设备"""
-    equipment_ids = request_data.get('equipment_ids', [])
-    
-    if not equipment_ids:
+    if not request_data.get('equipment_ids'):
         raise HTTPException(status_code=400, detail="未选择设备")
     
-    # 获取选中的设备
-    selected_equipments = []
-    for equipment_id in equipment_ids:
+    equipment_ids = []
+    for equipment_id in request_data['equipment_ids']:
         try:
-            db_equipment = equipment.get_equipment(
-                db, equipment_id=equipment_id,
-                user_id=current_user.id, is_admin=current_user.is_admin
-            )
-            if db_equipment:
-                selected_equipments.append(db_equipment)
-        except Exception:
+            equipment_ids.append(int(equipment_id))
+        except (TypeError, ValueError):
             continue
     
-    if not selected_equipments:
-        raise HTTPException(status_code=404, detail="未找到可导出的设备")
+    user_id, is_admin = current_user.id, current_user.is_admin
     
-    # 转换为DataFrame
-    data = []
-    for i, eq in enumerate(selected_equipments, 1):
-        data.append({
-            '序号': i,
-            '使用部门': eq.department.name,
-            '计量器具类别': eq.category.name,
-            '计量器具名称': eq.name,
-            '型号/规格': eq.model,
-            '准确度等级': eq.accuracy_level,
-            '测量范围': eq.measurement_range,
-            '内部编号': eq.internal_id,
-            '出厂编号': eq.manufacturer_id or '',
-            '检定周期': eq.calibration_cycle,
-            '检定（校准）日期': eq.calibration_date.strftime('%Y-%m-%d') if eq.calibration_date is not None else '',
-            '有效期至': eq.valid_until.strftime('%Y-%m-%d') if eq.valid_until is not None else '',
-            '安装地点': eq.installation_location,
-            '分度值': eq.scale_value or '',
-            '制造厂家': eq.manufacturer,
-            '出厂日期': eq.manufacture_date.strftime('%Y-%m-%d') if eq.manufacture_date is not None else '',
-            '检定方式': eq.calibration_method,
-            '证书编号': eq.certificate_number or '',
-            '检定机构': eq.verification_agency or '',
-            '证书形式': eq.certificate_form or '',
-            '管理级别': eq.management_level or '',
-            '原值/元': eq.original_value or '',
-            '设备状态': eq.status,
-            '状态变更时间': eq.status_change_date.strftime('%Y-%m-%d') if eq.status_change_date is not None else '',
-            '备注': eq.notes
-        })
-    
-    df = pd.DataFrame(data)
-    
-    # 重新排列列顺序，确保序号在第一列
-    columns = ['序号'] + [col for col in df.columns if col != '序号']
-    df = df[columns]
-    
-    # 替换NaN值为空字符串
-    df = df.fillna('')
-    
-    # 创建Excel文件
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name='选中设备', index=False)
-    output.seek(0)
-    
-    filename = f"选中设备_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    encoded_filename = quote(filename)
-    
-    # 记录操作日志
-    log_system_operation(
-        db=db,
-        user_id=current_user.id,
-        action="批量导出选中设备",
-        description=f"批量导出选中设备，共{len(selected_equipments)}台"
-    )
+    def build_query(session: Session):
+        return equipment.selected_equipments_query(session, equipment_ids, user_id=user_id, is_admin=is_admin)
     
-    return Response(
-        content=output.getvalue(),
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}"}
+    # 开始流式写出前确认有可导出的设备
+    query = build_query(db)
+    if query is None or query.first() is None:
+        raise HTTPException(status_code=404, detail="未找到可导出的设备")
+    
+    def log_export(session: Session, count: int) -> None:
+        # 记录操作日志
+        log_system_operation(
+            db=session,
+            user_id=user_id,
+            action="批量导出选中设备",
+            description=f"批量导出选中设备，共{count}台"
+        )
+    
+    return _export_equipments(
+        build_query, '选中设备', f"选中设备_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx", log_export
     )
 
 @router.post("/batch/transfer")
@@ -800,108 +701,54 @@ def batch_transfer_equipments(
 @router.post("/search", response_model=PaginatedEquipment)
 @cached(
     ttl=CacheConfig.get_cache_ttl_for_api("equipment_search"),
-    key_prefix=CacheConfig.get_cache_prefix_for_api("equipment_search")
+    key_prefix=CacheConfig.get_cache_prefix_for_api("equipment_search"),
+    tags=[equipment_scope_tags]
 )
-def search_equipments(search_params: EquipmentSearch, skip: int = 0, limit: int = 999999,
+def search_equipments(search_params: EquipmentSearch,
+                     skip: int = Query(0, ge=0),
+                     limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
                      sort_field: str = "valid_until",
                      sort_order: str = "asc",
+                     cursor: Optional[str] = None,
+                     total_mode: str = "exact",
                      db: Session = Depends(get_db),
                      current_user = Depends(get_current_user)):
-    """全文本搜索设备"""
-    return equipment.search_equipments_paginated(
+    """
+    全文本搜索设备（走全文检索索引，sort_field=relevance 时按相关度排序）
+
+    分页参数同设备列表接口；相关度排序只支持 skip/limit 偏移分页。
+    """
+    return _paginate_or_400(lambda: equipment.search_equipments_paginated(
         db, search=search_params, skip=skip, limit=limit,
         user_id=current_user.id, is_admin=current_user.is_admin,
-        sort_field=sort_field, sort_order=sort_order
-    )
+        sort_field=sort_field, sort_order=sort_order,
+        cursor=cursor, total_mode=total_mode
+    ), total_mode)
 
-@router.post("/search-with-attachment-count", response_model=PaginatedEquipment)
+@router.post("/search-with-attachment-count", response_model=PaginatedEquipmentWithAttachmentCount)
 def search_equipments_with_attachment_count(search_params: EquipmentSearch, skip: int = 0, limit: int = 100,
                                            sort_field: str = "valid_until",
                                            sort_order: str = "asc",
                                            db: Session = Depends(get_db),
                                            current_user = Depends(get_current_user)):
-    """搜索设备，包含附件数量统计 - 解决N+1查询问题"""
-    return equipment.search_equipments_with_attachment_count(
+    """搜索设备，包含附件数量统计 - 列投影查询，结果直接序列化"""
+    return FastJSONResponse(equipment.search_equipments_with_attachment_count(
         db, search=search_params, skip=skip, limit=limit,
         user_id=current_user.id, is_admin=current_user.is_admin,
         sort_field=sort_field, sort_order=sort_order
-    )
-
-@router.get("/with-attachment-count", response_model=PaginatedEquipment)
-def get_equipments_with_attachment_count(skip: int = 0, limit: int = 100,
-                                        sort_field: str = "valid_until",
-                                        sort_order: str = "asc",
-                                        db: Session = Depends(get_db),
-                                        current_user = Depends(get_current_user)):
-    """获取设备列表，包含附件数量统计 - 解决N+1查询问题"""
-    return equipment.get_equipments_with_attachment_count(
-        db, skip=skip, limit=limit,
-        user_id=current_user.id, is_admin=current_user.is_admin,
-        sort_field=sort_field, sort_order=sort_order
-    )
+    ))
 
 @router.post("/export/search")
 def export_search_equipments(search_params: EquipmentSearch,
                             db: Session = Depends(get_db),
                             current_user = Depends(get_current_user)):
     """导出全文本搜索结果"""
-    equipments = equipment.search_equipments(
-        db, search=search_params, skip=0, limit=10000,  # 导出时不限制数量
-        user_id=current_user.id, is_admin=current_user.is_admin
-    )
-    
-    # 转换为DataFrame
-    data = []
-    for i, eq in enumerate(equipments, 1):
-        data.append({
-            '序号': i,
-            '使用部门': eq.department.name,
-            '计量器具类别': eq.category.name,
-            '计量器具名称': eq.name,
-            '型号/规格': eq.model,
-            '准确度等级': eq.accuracy_level,
-            '测量范围': eq.measurement_range,
-            '内部编号': eq.internal_id,
-            '出厂编号': eq.manufacturer_id or '',
-            '检定周期': eq.calibration_cycle,
-            '检定（校准）日期': eq.calibration_date.strftime('%Y-%m-%d') if eq.calibration_date is not None else '',
-            '有效期至': eq.valid_until.strftime('%Y-%m-%d') if eq.valid_until is not None else '',
-            '安装地点': eq.installation_location,
-            '分度值': eq.scale_value or '',
-            '制造厂家': eq.manufacturer,
-            '出厂日期': eq.manufacture_date.strftime('%Y-%m-%d') if eq.manufacture_date is not None else '',
-            '检定方式': eq.calibration_method,
-            '证书编号': eq.certificate_number or '',
-            '检定机构': eq.verification_agency or '',
-            '证书形式': eq.certificate_form or '',
-            '管理级别': eq.management_level or '',
-            '原值/元': eq.original_value or '',
-            '设备状态': eq.status,
-            '状态变更时间': eq.status_change_date.strftime('%Y-%m-%d') if eq.status_change_date is not None else '',
-            '备注': eq.notes
-        })
-    
-    df = pd.DataFrame(data)
-    
-    # 重新排列列顺序，确保序号在第一列
-    columns = ['序号'] + [col for col in df.columns if col != '序号']
-    df = df[columns]
-    
-    # 替换NaN值为空字符串
-    df = df.fillna('')
-    
-    # 创建Excel文件
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name='搜索结果', index=False)
-    output.seek(0)
-    
-    filename = f"设备搜索结果_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    encoded_filename = quote(filename)
-    return Response(
-        content=output.getvalue(),
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}"}
+    user_id, is_admin = current_user.id, current_user.is_admin
+    return _export_equipments(
+        lambda session: equipment.search_equipments_query(
+            session, search=search_params, user_id=user_id, is_admin=is_admin
+        ),
+        '搜索结果', f"设备搜索结果_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
     )
 
 @router.get("/utils/generate-internal-id")
@@ -910,7 +757,8 @@ def generate_internal_id_endpoint(category_id: int,
                                 db: Session = Depends(get_db)):
     """生成内部编号"""
     try:
-        internal_id = generate_internal_id(db, category_id, equipment_name)
+        # 只预览下一个编号，不占用序列号（创建设备时才分配）
+        internal_id = generate_internal_id(db, category_id, equipment_name, reserve=False)
         return {"internal_id": internal_id}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -0,0 +1,169 @@
+"""
+导出任务 API
+登记后台导出任务、查询任务状态并下载导出文件（支持 Range 分段下载）
+"""
+
+from datetime import datetime
+from functools import partial
+from typing import Callable, List, NamedTuple
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import FileResponse
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+
+from app.db.database import get_db
+from app.core.config import settings
+from app.core.export_worker import export_worker
+from app.api.auth import get_current_user
+from app.api.equipment import monthly_plan_logger, monthly_plan_range, monthly_plan_sheets
+from app.api.import_export import equipment_export_sheets, export_audit_logger, filtered_export
+from app.crud import equipment
+from app.crud import export_jobs as export_crud
+from app.crud.permission_scope import permission_fingerprint
+from app.models.export_job import ExportStatus
+from app.models.models import User
+from app.schemas.schemas import ExportJobCreate, ExportJobResponse
+from app.utils.export_stream import XLSX_MEDIA_TYPE
+
+router = APIRouter()
+
+EXPORT_TYPES = ("all", "filtered", "monthly_plan")
+
+
+class ExportSpec(NamedTuple):
+    params: dict                                      # 影响导出内容的参数（用作缓存键）
+    filename: str
+    build_sheets: Callable                            # build_sheets(on_complete) -> 工作表
+    audit_logger: Callable[[int], Callable]           # audit_logger(user_id) -> on_complete(会话, 导出台数)
+
+
+def _export_spec(request: ExportJobCreate, user_id: int, is_admin: bool) -> ExportSpec:
+    """按导出类型确定导出参数、文件名和工作表（与对应的同步导出接口内容相同）"""
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+    if request.export_type == "all":
+        def build_query(session: Session):
+            return equipment.filter_equipments_query(session, user_id=user_id, is_admin=is_admin)
+
+        return ExportSpec(
+            {}, f"设备台账_全部_{timestamp}.xlsx",
+            partial(equipment_export_sheets, build_query, '设备台账'),
+            lambda log_user_id: export_audit_logger(log_user_id, "导出全部", "导出全部设备数据，共")
+        )
+
+    if request.export_type == "filtered":
+        export = filtered_export(request.filters or {}, user_id, is_admin)
+        return ExportSpec(
+            export.params, f"设备台账_筛选_{timestamp}.xlsx",
+            partial(equipment_export_sheets, export.build_query, '筛选设备'),
+            lambda log_user_id: export_audit_logger(log_user_id, export.action, export.description)
+        )
+
+    if request.export_type == "monthly_plan":
+        start_date, end_date = monthly_plan_range(datetime.now().date())
+        return ExportSpec(
+            {"start_date": start_date.isoformat(), "end_date": end_date.isoformat()},
+            f"选中设备_{timestamp}.xlsx",
+            partial(monthly_plan_sheets, start_date, end_date, user_id, is_admin),
+            monthly_plan_logger
+        )
+
+    raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"export_type 必须是 {', '.join(EXPORT_TYPES)} 之一"
+    )
+
+
+def _get_authorized_job(db: Session, job_id: int, current_user: User):
+    job = export_crud.get_export_job(db, job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="导出任务不存在"
+        )
+    if not current_user.is_admin and job.user_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="无权访问此导出任务"
+        )
+    return job
+
+
+@router.post("/", response_model=ExportJobResponse)
+def create_export_job(
+    request: ExportJobCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    登记导出任务
+
+    数据未变更时，相同参数、相同权限范围的导出直接复用已生成的文件（返回的任务已完成，cached 为 true）；
+    否则在后台生成，通过任务详情接口查询状态，完成后从 download_url 下载。
+    """
+    user_id, is_admin = current_user.id, current_user.is_admin
+    try:
+        spec = _export_spec(request, user_id, is_admin)
+    except ValidationError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"筛选条件无效: {e}")
+
+    export_crud.purge_exports(db, settings.EXPORT_RETENTION_SECONDS)
+    job = export_crud.create_export_job(
+        db, user_id, request.export_type, spec.params, spec.filename,
+        scope=permission_fingerprint(db, user_id, is_admin)
+    )
+
+    if job.status == ExportStatus.COMPLETED:
+        # 复用已有文件：直接记录导出日志
+        spec.audit_logger(user_id)(db, job.row_count or 0)
+    elif not job.cached:
+        def on_exported(session: Session, finished_job) -> None:
+            spec.audit_logger(finished_job.user_id)(session, finished_job.row_count or 0)
+
+        export_worker.submit(job.id, partial(export_crud.run_export_job, job.id, spec.build_sheets, on_exported))
+    return job
+
+
+@router.get("/", response_model=List[ExportJobResponse])
+def list_export_jobs(
+    limit: int = 20,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """最近的导出任务（管理员可查看全部用户的任务）"""
+    return export_crud.list_export_jobs(
+        db, user_id=None if current_user.is_admin else current_user.id, limit=min(max(limit, 1), 100)
+    )
+
+
+@router.get("/{job_id}", response_model=ExportJobResponse)
+def get_export_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """获取导出任务状态"""
+    return _get_authorized_job(db, job_id, current_user)
+
+
+@router.get("/{job_id}/download")
+def download_export_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """下载导出文件（支持 Range 请求，可断点续传）"""
+    job = _get_authorized_job(db, job_id, current_user)
+    if job.status != ExportStatus.COMPLETED:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="导出任务尚未完成"
+        )
+    path = export_crud.artifact_path(job.cache_key)
+    if not path.exists():
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="导出文件已过期，请重新导出"
+        )
+    return FileResponse(path, media_type=XLSX_MEDIA_TYPE, filename=job.filename)
@@ -1,113 +1,225 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Response, Form
-from typing import Optional
+from fastapi.responses import JSONResponse
+from functools import partial
+from typing import Callable, Dict, Iterator, NamedTuple, Optional
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 import pandas as pd
 import io
 from urllib.parse import quote
 from datetime import datetime
 from app.db.database import get_db
-from app.crud import equipment, departments, categories
-from app.schemas.schemas import Equipment, ImportTemplate, AuditLogCreate
+from app.crud import equipment
+from app.schemas.schemas import ImportTemplate, AuditLogCreate
 from app.api.auth import get_current_admin_user, get_current_user
 from app.api.audit_logs import create_audit_log
+from app.utils.export_stream import QUERY_BATCH_SIZE, XlsxSheet, xlsx_response
+from app.utils.import_reader import (
+    is_supported_file, spool_upload, read_header, count_rows, remove_spooled_file
+)
 
 router = APIRouter()
 
-def get_responsible_person(db: Session, category_id: int) -> str:
-    """获取负责指定设备类别的用户名"""
-    from app.models.models import UserCategory
-    user_category = db.query(UserCategory).filter(
-        UserCategory.category_id == category_id
-    ).first()
-    return user_category.user.username if user_category else ''
-
-def generate_export_data(equipments, db: Session) -> tuple:
-    """生成导出数据，返回(data_df, dynamic_columns)"""
-    data = []
-    has_status_change_date = False
-    has_external_inspection = False
-    has_responsible_person = False
-    
-    # 基础列
-    base_columns = [
-        '序号', '使用部门', '设备类别', '计量器具名称', '型号/规格', '准确度等级', 
-        '测量范围', '内部编号', '出厂编号', '检定周期', '检定(校准)日期', '有效期至', '安装地点', 
-        '分度值', '制造厂家', '出厂日期', '检定方式', '检定结果', '管理级别', '原值/元', '设备状态', '备注'
-    ]
-    
-    # 动态列
+class ExportLookups(NamedTuple):
+    departments: Dict[int, str]          # 部门ID -> 部门名称
+    categories: Dict[int, str]           # 设备类别ID -> 类别名称
+    responsible_persons: Dict[int, str]  # 设备类别ID -> 器具负责人用户名
+
+def load_export_lookups(db: Session) -> ExportLookups:
+    """一次性加载导出需要的部门名称、类别名称和各类别的器具负责人，导出时不再逐行查询"""
+    from app.models.models import Department, EquipmentCategory, User, UserCategory
+
+    responsible_persons = {}
+    rows = db.query(UserCategory.category_id, User.username).join(
+        User, UserCategory.user_id == User.id
+    ).order_by(UserCategory.id)
+    for category_id, username in rows:
+        # 一个类别有多个负责人时取第一个
+        responsible_persons.setdefault(category_id, username)
+
+    return ExportLookups(
+        departments=dict(db.query(Department.id, Department.name).all()),
+        categories=dict(db.query(EquipmentCategory.id, EquipmentCategory.name).all()),
+        responsible_persons=responsible_persons
+    )
+
+# 设备台账导出的基础列
+EXPORT_BASE_COLUMNS = [
+    '序号', '使用部门', '设备类别', '计量器具名称', '型号/规格', '准确度等级', 
+    '测量范围', '内部编号', '出厂编号', '检定周期', '检定(校准)日期', '有效期至', '安装地点', 
+    '分度值', '制造厂家', '出厂日期', '检定方式', '检定结果', '管理级别', '原值/元', '设备状态', '备注'
+]
+
+# 动态列说明（导出范围内有对应数据时才导出该列）
+DYNAMIC_COLUMN_NOTES = {
+    '负责人': '负责人: 负责此设备类别的器具负责人账号名',
+    '状态变更时间': '状态变更时间: 设备状态为停用或报废时显示',
+    '证书编号': '证书编号: 检定方式为外检时显示',
+    '检定机构': '检定机构: 检定方式为外检时显示',
+    '证书形式': '证书形式: 检定方式为外检时显示'
+}
+
+def export_dynamic_columns(query, lookups: ExportLookups) -> list:
+    """
+    确定导出的动态列
+
+    流式写出时表头须在第一行数据之前确定，因此按导出范围分别查询是否存在
+    有负责人的设备类别、有状态变更时间的停用/报废设备和外检设备。
+    """
+    from app.models.models import Equipment
+
+    scope = query.enable_eagerloads(False).order_by(None).with_entities(Equipment.id)
+
+    def has_rows(*criteria) -> bool:
+        return scope.filter(*criteria).limit(1).first() is not None
+
     dynamic_columns = []
-    
+    if has_rows(Equipment.category_id.in_(list(lookups.responsible_persons))):
+        dynamic_columns.append('负责人')
+    if has_rows(Equipment.status.in_(['停用', '报废']), Equipment.status_change_date.isnot(None)):
+        dynamic_columns.append('状态变更时间')
+    if has_rows(Equipment.calibration_method == '外检'):
+        dynamic_columns.extend(['证书编号', '检定机构', '证书形式'])
+    return dynamic_columns
+
+def generate_export_rows(equipments, lookups: ExportLookups, dynamic_columns: list) -> Iterator[list]:
+    """
+    逐行生成导出数据：基础列 + 动态列（与表头 EXPORT_BASE_COLUMNS + dynamic_columns 对应）
+
+    部门、类别名称和负责人取自预先加载的 lookups，不访问设备的关联对象。
+    """
     for i, eq in enumerate(equipments, 1):
-        row_data = {
-            '序号': i,
-            '使用部门': eq.department.name,
-            '设备类别': eq.category.name,
-            '计量器具名称': eq.name,
-            '型号/规格': eq.model,
-            '准确度等级': eq.accuracy_level,
-            '测量范围': eq.measurement_range,
-            '内部编号': eq.internal_id,
-            '出厂编号': eq.manufacturer_id or '',
-            '检定周期': eq.calibration_cycle,
-            '检定(校准)日期': eq.calibration_date.strftime('%Y-%m-%d') if eq.calibration_date else '',
-            '有效期至': eq.valid_until.strftime('%Y-%m-%d') if eq.valid_until else '',
-            '安装地点': eq.installation_location,
-            '分度值': eq.scale_value or '',
-            '制造厂家': eq.manufacturer,
-            '出厂日期': eq.manufacture_date.strftime('%Y-%m-%d') if eq.manufacture_date else '',
-            '检定方式': eq.calibration_method,
-            '检定结果': eq.current_calibration_result or '合格',
-            '管理级别': eq.management_level or '',
-            '原值/元': eq.original_value or '',
-            '设备状态': eq.status,
-            '备注': eq.notes
-        }
-        
-        # 检查是否需要状态变更时间列
-        if eq.status in ['停用', '报废'] and eq.status_change_date:
-            has_status_change_date = True
-            row_data['状态变更时间'] = eq.status_change_date.strftime('%Y-%m-%d')
-        
-        # 检查是否需要外检信息列
-        if eq.calibration_method == '外检':
-            has_external_inspection = True
-            row_data['证书编号'] = eq.certificate_number or ''
-            row_data['检定机构'] = eq.verification_agency or ''
-            row_data['证书形式'] = eq.certificate_form or ''
+        row = [
+            i,
+            lookups.departments.get(eq.department_id, ''),
+            lookups.categories.get(eq.category_id, ''),
+            eq.name,
+            eq.model,
+            eq.accuracy_level,
+            eq.measurement_range,
+            eq.internal_id,
+            eq.manufacturer_id or '',
+            eq.calibration_cycle,
+            eq.calibration_date.strftime('%Y-%m-%d') if eq.calibration_date else '',
+            eq.valid_until.strftime('%Y-%m-%d') if eq.valid_until else '',
+            eq.installation_location,
+            eq.scale_value or '',
+            eq.manufacturer,
+            eq.manufacture_date.strftime('%Y-%m-%d') if eq.manufacture_date else '',
+            eq.calibration_method,
+            eq.current_calibration_result or '合格',
+            eq.management_level or '',
+            eq.original_value or '',
+            eq.status,
+            eq.notes
+        ]
         
-        # 检查是否需要负责人列
-        responsible_person = get_responsible_person(db, eq.category_id)
-        if responsible_person:
-            has_responsible_person = True
-            row_data['负责人'] = responsible_person
+        external = eq.calibration_method == '外检'
+        for column in dynamic_columns:
+            if column == '负责人':
+                row.append(lookups.responsible_persons.get(eq.category_id, ''))
+            elif column == '状态变更时间':
+                # 设备状态为停用或报废时显示
+                row.append(eq.status_change_date.strftime('%Y-%m-%d')
+                           if eq.status in ['停用', '报废'] and eq.status_change_date else '')
+            elif column == '证书编号':
+                row.append((eq.certificate_number or '') if external else '')
+            elif column == '检定机构':
+                row.append((eq.verification_agency or '') if external else '')
+            elif column == '证书形式':
+                row.append((eq.certificate_form or '') if external else '')
         
-        data.append(row_data)
-    
-    # 构建最终的列顺序
-    final_columns = base_columns.copy()
-    
-    if has_responsible_person:
-        final_columns.append('负责人')
-        dynamic_columns.append('负责人')
-    
-    if has_status_change_date:
-        final_columns.append('状态变更时间')
-        dynamic_columns.append('状态变更时间')
-    
-    if has_external_inspection:
-        external_columns = ['证书编号', '检定机构', '证书形式']
-        final_columns.extend(external_columns)
-        dynamic_columns.extend(external_columns)
-    
-    df = pd.DataFrame(data)
-    if not df.empty:
-        df = df[final_columns]
-    
-    # 替换NaN值为空字符串
-    df = df.fillna('')
-    
-    return df, dynamic_columns
+        yield row
+
+def equipment_export_sheets(build_query, sheet_title: str, on_complete=None) -> Iterator[XlsxSheet]:
+    """
+    设备台账导出的工作表
+
+    在导出自己的会话中预先加载关联名称和负责人、确定动态列，再分批读取设备并逐行写出
+    （查询次数与导出行数无关），有动态列时附加动态列说明工作表；
+    全部写出后以 (会话, 导出台数) 调用 on_complete。
+    """
+    from app.db.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        query = build_query(db)
+        lookups = load_export_lookups(db)
+        if query is None:
+            dynamic_columns, equipments = [], []
+        else:
+            dynamic_columns = export_dynamic_columns(query, lookups)
+            # 关联名称取自 lookups，设备查询不再连接部门和类别表
+            equipments = query.enable_eagerloads(False).yield_per(QUERY_BATCH_SIZE)
+        exported = 0
+
+        def rows():
+            nonlocal exported
+            for row in generate_export_rows(equipments, lookups, dynamic_columns):
+                exported += 1
+                yield row
+
+        yield XlsxSheet(sheet_title, EXPORT_BASE_COLUMNS + dynamic_columns, rows())
+
+        if dynamic_columns:
+            yield XlsxSheet('动态列说明', ['动态列', '说明'], [
+                [column, DYNAMIC_COLUMN_NOTES[column]] for column in dynamic_columns
+            ])
+
+        if on_complete:
+            on_complete(db, exported)
+    finally:
+        db.close()
+
+def stream_equipment_export(build_query, sheet_title: str, filename: str, on_complete=None):
+    """流式导出设备台账（工作表见 equipment_export_sheets）"""
+    return xlsx_response(equipment_export_sheets(build_query, sheet_title, on_complete), filename)
+
+def export_audit_logger(user_id: int, action: str, description: str):
+    """导出完成后记录操作日志的回调：description 后接导出台数"""
+    def log_export(session: Session, count: int) -> None:
+        log_data = AuditLogCreate(
+            user_id=user_id,
+            action=action,
+            description=f"{description}{count}台",
+            operation_type="equipment",
+            target_table="equipments"
+        )
+        create_audit_log(db=session, log_data=log_data)
+    return log_export
+
+class FilteredExport(NamedTuple):
+    build_query: Callable[[Session], object]
+    params: dict       # 规范化后的筛选条件（补全默认值，用作导出缓存键）
+    action: str        # 操作日志的操作名称
+    description: str   # 操作日志的描述（后接导出台数）
+
+def filtered_export(filters: dict, user_id: int, is_admin: bool) -> FilteredExport:
+    """解析导出的筛选条件：包含搜索词时按搜索导出，否则按筛选条件导出"""
+    if filters.get('query'):
+        from app.schemas.schemas import EquipmentSearch
+
+        search_params = EquipmentSearch(**filters)
+        return FilteredExport(
+            lambda session: equipment.search_equipments_query(
+                session, search=search_params, user_id=user_id, is_admin=is_admin
+            ),
+            search_params.model_dump(mode="json"),
+            "导出搜索结果",
+            f"导出搜索结果，查询词: '{filters['query']}'，共"
+        )
+
+    from app.schemas.schemas import EquipmentFilter
+
+    equipment_filter = EquipmentFilter(**filters)
+    return FilteredExport(
+        lambda session: equipment.filter_equipments_query(
+            session, filters=equipment_filter, user_id=user_id, is_admin=is_admin
+        ),
+        equipment_filter.model_dump(mode="json"),
+        "导出筛选",
+        "导出筛选设备数据，共"
+    )
 
 @router.get("/template", response_model=ImportTemplate)
 def get_import_template():
@@ -227,6 +339,8 @@ async def import_equipment_data(
     file: UploadFile = File(...),
     overwrite: str = Form("false"),  # 使用Form字段
     session_id: Optional[int] = Form(None),  # 导入会话ID
+    background: str = Form("false"),  # 为true时提交后立即返回，通过SSE获取进度
+    dry_run: str = Form("false"),  # 为true时只预览导入结果，不写入数据
     db: Session = Depends(get_db),
     current_user = Depends(get_current_admin_user)
 ):
@@ -234,23 +348,27 @@ async def import_equipment_data(
 
     # 手动转换overwrite参数为布尔值
     overwrite_bool = overwrite.lower() in ['true', '1', 'yes', 'on']
+    dry_run_bool = dry_run.lower() in ['true', '1', 'yes', 'on']
 
-    if not file.filename or not file.filename.endswith(('.xlsx', '.xls')):
-        raise HTTPException(status_code=400, detail="只支持Excel文件格式")
+    if not is_supported_file(file.filename):
+        raise HTTPException(status_code=400, detail="只支持Excel或CSV文件格式")
 
+    from app.crud import import_session as import_crud
+    from app.schemas.schemas import ImportSessionCreate
+    from app.models.import_session import ImportStatus
+
+    source_path = None
     try:
-        # 读取Excel文件
-        contents = await file.read()
-        df = pd.read_excel(io.BytesIO(contents))
+        # 上传文件按块写入暂存目录，后台任务逐块读取，不在内存中保留整个文件
+        source_path, file_size = await spool_upload(file)
+        columns = await run_in_threadpool(read_header, source_path)
+        total_rows = await run_in_threadpool(count_rows, source_path)
 
-        # 将所有NaN值替换为空字符串，避免空单元格显示为"nan"
-        df = df.fillna('')
+        if dry_run_bool:
+            # 试运行：只预览每行的处理结果，不创建导入会话、不写入数据
+            return await _preview_equipment_import(db, source_path, columns, overwrite_bool)
 
         # 创建或更新导入会话
-        from app.crud import import_session as import_crud
-        from app.schemas.schemas import ImportSessionCreate
-        from app.models.import_session import ImportStatus
-
         if session_id:
             # 使用现有会话
             import_session = import_crud.get_import_session(db, session_id)
@@ -260,16 +378,16 @@ async def import_equipment_data(
             # 更新会话状态为处理中
             import_crud.update_import_session(db, session_id, {
                 "status": ImportStatus.PROCESSING,
-                "total_rows": len(df)
+                "total_rows": total_rows
             })
         else:
             # 创建新会话
             session_data = ImportSessionCreate(
                 user_id=current_user.id,
                 filename=file.filename,
-                file_size=len(contents),
+                file_size=file_size,
                 overwrite_existing=overwrite_bool,
-                total_rows=len(df),
+                total_rows=total_rows,
                 notes="通过Web界面导入"
             )
             import_session = import_crud.create_import_session(db, session_data)
@@ -296,449 +414,221 @@ async def import_equipment_data(
         db.commit()
         
         # 验证必需的列（内部编号由系统自动生成，出厂编号为可选）
-        required_columns = [
-            '使用部门', '设备类别', '计量器具名称', '型号/规格', '准确度等级',
-            '检定周期', '检定(校准)日期', '检定方式', '检定结果'
-        ]
-        
-        missing_columns = [col for col in required_columns if col not in df.columns]
+        from app.utils.import_validation import REQUIRED_COLUMNS
+
+        missing_columns = [col for col in REQUIRED_COLUMNS if col not in columns]
         if missing_columns:
             raise HTTPException(
                 status_code=400, 
                 detail=f"缺少必需的列: {', '.join(missing_columns)}"
             )
-        
-        success_count = 0
-        update_count = 0
-        skip_count = 0  # 新增跳过计数器
-        error_count = 0
-        processed_rows = 0
-        detailed_results = []
-
-        for index, row in df.iterrows():
-            row_number = int(float(index)) + 2  # Excel行号从2开始（第1行是标题）
-            processed_rows += 1
-
-            # 定期更新进度（每处理3行更新一次，提高实时性）
-            if processed_rows % 3 == 0:
-                import_crud.update_progress(
-                    db, session_id,
-                    processed_rows=processed_rows,
-                    success_count=success_count,
-                    update_count=update_count,
-                    error_count=error_count
-                )
-                # 添加调试日志
-                print(f"进度更新: {processed_rows}/{len(df)} 成功:{success_count} 更新:{update_count} 错误:{error_count}")
-
-            result = {
-                "row": row_number,
-                "internal_id": "",  # 将在生成后填充
-                "name": str(row['计量器具名称']),
-                "status": "",
-                "message": ""
-            }
-            
-            try:
-                # 验证部门
-                department = departments.get_department_by_name(db, str(row['使用部门']))
-                if not department:
-                    result["status"] = "失败"
-                    result["message"] = f"部门'{row['使用部门']}'不存在"
-                    detailed_results.append(result)
-                    error_count += 1
-                    continue
-                
-                # 验证设备类别
-                category = categories.get_category_by_name(db, str(row['设备类别']))
-                if not category:
-                    result["status"] = "失败"
-                    result["message"] = f"设备类别'{row['设备类别']}'不存在"
-                    detailed_results.append(result)
-                    error_count += 1
-                    continue
-                
-                # 验证计量器具名称
-                equipment_name = str(row['计量器具名称'])
-                if category.predefined_names:
-                    # 如果类别有预定义器具名称列表，验证器具名称是否在列表中
-                    if equipment_name not in category.predefined_names:
-                        result["status"] = "失败"
-                        # 提供更友好的错误信息，包含可用的器具名称
-                        available_names = ', '.join(category.predefined_names[:5])  # 只显示前5个，避免信息过长
-                        if len(category.predefined_names) > 5:
-                            available_names += f" 等(共{len(category.predefined_names)}种)"
-                        result["message"] = f"计量器具名称'{equipment_name}'不在设备类别'{category.name}'的预定义器具名称列表中。可用名称包括：{available_names}"
-                        detailed_results.append(result)
-                        error_count += 1
-                        continue
-                
-                # 验证检定周期
-                calibration_cycle = str(row['检定周期'])
-                if calibration_cycle not in ['6个月', '12个月', '24个月', '36个月', '随坏随换']:
-                    result["status"] = "失败"
-                    result["message"] = "检定周期必须是'6个月'、'12个月'、'24个月'、'36个月'或'随坏随换'"
-                    detailed_results.append(result)
-                    error_count += 1
-                    continue
-                
-                # 验证检定方式
-                calibration_method = str(row['检定方式'])
-                if calibration_method not in ['内检', '外检']:
-                    result["status"] = "失败"
-                    result["message"] = "检定方式必须是'内检'或'外检'"
-                    detailed_results.append(result)
-                    error_count += 1
-                    continue
-                
-                # 验证检定结果（所有设备必填）
-                calibration_result = str(row['检定结果'])
-                if calibration_result not in ['合格', '不合格']:
-                    result["status"] = "失败"
-                    result["message"] = "检定结果必须是'合格'或'不合格'"
-                    detailed_results.append(result)
-                    error_count += 1
-                    continue
-                
-                # 验证外检必填字段
-                if calibration_method == '外检':
-                    external_fields = {
-                        '证书编号': row.get('证书编号', ''),
-                        '检定机构': row.get('检定机构', ''),
-                        '证书形式': row.get('证书形式', '')
-                    }
-                    
-                    for field_name, field_value in external_fields.items():
-                        if pd.isna(field_value) or str(field_value).strip() == '':
-                            result["status"] = "失败"
-                            result["message"] = f"外检时'{field_name}'为必填项"
-                            detailed_results.append(result)
-                            error_count += 1
-                            continue
-                    
-                    # 验证证书形式字段值
-                    certificate_form = str(row.get('证书形式', '')).strip()
-                    if certificate_form not in ['校准证书', '检定证书']:
-                        result["status"] = "失败"
-                        result["message"] = "证书形式必须是'校准证书'或'检定证书'"
-                        detailed_results.append(result)
-                        error_count += 1
-                        continue
-                
-                # 验证日期格式（随坏随换设备可选）
-                calibration_date = None
-                calibration_date_str = str(row['检定(校准)日期']).strip()
-                
-                if calibration_cycle == "随坏随换":
-                    # 随坏随换设备：如果有检定日期且格式正确才导入
-                    if calibration_date_str and calibration_date_str != '':
-                        try:
-                            calibration_date_parsed = pd.to_datetime(calibration_date_str).date()
-                            # 确保不是NaT
-                            if pd.notna(calibration_date_parsed):
-                                calibration_date = calibration_date_parsed
-                        except:
-                            # 随坏随换设备的检定日期格式错误时跳过，不设为必填项
-                            calibration_date = None
-                    # 如果没有检定日期或格式错误，calibration_date保持为None
-                else:
-                    # 非随坏随换设备：必须填写检定日期
-                    if not calibration_date_str or calibration_date_str == '':
-                        result["status"] = "失败"
-                        result["message"] = "检定(校准)日期为必填项"
-                        detailed_results.append(result)
-                        error_count += 1
-                        continue
-                    
-                    try:
-                        calibration_date_parsed = pd.to_datetime(calibration_date_str).date()
-                        # 确保不是NaT
-                        if pd.notna(calibration_date_parsed):
-                            calibration_date = calibration_date_parsed
-                        else:
-                            result["status"] = "失败"
-                            result["message"] = "检定日期格式错误，请使用YYYY-MM-DD格式"
-                            detailed_results.append(result)
-                            error_count += 1
-                            continue
-                    except:
-                        result["status"] = "失败"
-                        result["message"] = "检定日期格式错误，请使用YYYY-MM-DD格式"
-                        detailed_results.append(result)
-                        error_count += 1
-                        continue
-                
-                manufacture_date = None
-                if pd.notna(row.get('出厂日期')):
-                    try:
-                        manufacture_date_parsed = pd.to_datetime(row['出厂日期']).date()
-                        # 确保不是NaT
-                        if pd.notna(manufacture_date_parsed):
-                            manufacture_date = manufacture_date_parsed
-                    except:
-                        result["status"] = "失败"
-                        result["message"] = "出厂日期格式错误，请使用YYYY-MM-DD格式"
-                        detailed_results.append(result)
-                        error_count += 1
-                        continue
-                
-                # 自动计算有效期至（随坏随换设备无有效期）
-                from datetime import timedelta
-                if calibration_cycle == "随坏随换":
-                    valid_until = None
-                else:
-                    cycle_days = {
-                        '6个月': 180,
-                        '12个月': 365,
-                        '24个月': 730,
-                        '36个月': 1095
-                    }
-                    valid_until = calibration_date + timedelta(days=cycle_days[calibration_cycle] - 1) if calibration_date else None
-                
-                # 自动设置管理级别（外检时设为"-"）
-                management_level = str(row.get('管理级别', '')) if calibration_method == '内检' else '-'
-                
-                # 验证设备状态
-                status_change_date = None
-                equipment_status = str(row.get('设备状态', '在用')).strip()
-                
-                # 验证状态值是否合法
-                if equipment_status not in ['在用', '停用', '报废']:
-                    result["status"] = "失败"
-                    result["message"] = f"设备状态'{equipment_status}'不合法，只能是'在用'、'停用'或'报废'"
-                    detailed_results.append(result)
-                    error_count += 1
-                    continue
-                
-                # 验证状态变更时间
-                if equipment_status in ['停用', '报废']:
-                    status_change_date_input = row.get('状态变更时间')
-                    # 状态变更时间为非必填项，如果提供了就验证格式
-                    if pd.notna(status_change_date_input) and str(status_change_date_input).strip() != '':
-                        try:
-                            status_change_date_parsed = pd.to_datetime(status_change_date_input).date()
-                            # 确保不是NaT
-                            if pd.notna(status_change_date_parsed):
-                                status_change_date = status_change_date_parsed
-                        except:
-                            result["status"] = "失败"
-                            result["message"] = "状态变更时间格式错误，请使用YYYY-MM-DD格式"
-                            detailed_results.append(result)
-                            error_count += 1
-                            continue
-                    # 如果没有提供状态变更时间，保持为None（可选填）
-                
-                # 自动生成内部编号（仅在新建设备时生成）
-                from app.utils.auto_id import generate_internal_id
-                generated_internal_id = None
-                
-                # 安全地转换原值字段
-                original_value = None
-                if pd.notna(row.get('原值/元')) and str(row['原值/元']).strip() != '':
-                    try:
-                        original_value = float(str(row['原值/元']).strip())
-                    except (ValueError, TypeError):
-                        original_value = None
-                
-                # 先检查是否存在相同设备，以决定是否需要生成内部编号
-                from app.models.models import Equipment
-                manufacturer_id = str(row.get('出厂编号', '')).strip()
-                existing_equipment = None
-
-                # 验证出厂编号必须填写且不能为空
-                if not manufacturer_id:
-                    result["status"] = "失败"
-                    result["message"] = "出厂编号为必填项，不能为空"
-                    detailed_results.append(result)
-                    error_count += 1
-                    continue
-
-                # 检查出厂编号唯一性
-                existing_equipment = db.query(Equipment).filter(
-                    Equipment.manufacturer_id == manufacturer_id
-                ).first()
-
-                # 根据是否覆盖现有设备来决定内部编号
-                if existing_equipment:
-                    # 覆盖模式：保留现有内部编号
-                    generated_internal_id = existing_equipment.internal_id
-                else:
-                    # 新建设备：生成新的内部编号
-                    generated_internal_id = generate_internal_id(db, int(float(category.id)), str(row['计量器具名称']))
-
-                # 更新result对象中的internal_id
-                result["internal_id"] = generated_internal_id
-
-                # 创建设备数据
-                from app.schemas.schemas import EquipmentCreate, EquipmentUpdate
-
-                equipment_data = EquipmentCreate(
-                    department_id=int(float(department.id)),
-                    category_id=int(float(category.id)),
-                    name=str(row['计量器具名称']),
-                    model=str(row['型号/规格']),
-                    accuracy_level=str(row['准确度等级']),
-                    measurement_range=str(row.get('测量范围', '')) if pd.notna(row.get('测量范围')) else '',
-                    calibration_cycle=calibration_cycle,
-                    calibration_date=calibration_date,
-                    calibration_method=calibration_method,
-                    current_calibration_result=calibration_result,
-                    internal_id=generated_internal_id,
-                    manufacturer_id=manufacturer_id,
-                    installation_location=str(row.get('安装地点', '')) if pd.notna(row.get('安装地点')) else '',
-                    manufacturer=str(row.get('制造厂家', '')) if pd.notna(row.get('制造厂家')) else '',
-                    manufacture_date=manufacture_date,
-                    scale_value=str(row.get('分度值', '')) if pd.notna(row.get('分度值')) else '',
-                    management_level=management_level,
-                    original_value=original_value,
-                    status=equipment_status,
-                    status_change_date=status_change_date,
-                    certificate_number=str(row.get('证书编号', '')) if calibration_method == '外检' and pd.notna(row.get('证书编号')) else '',
-                    verification_agency=str(row.get('检定机构', '')) if calibration_method == '外检' and pd.notna(row.get('检定机构')) else '',
-                    certificate_form=str(row.get('证书形式', '')) if calibration_method == '外检' and pd.notna(row.get('证书形式')) else '',
-                    notes=str(row.get('备注', '')) if pd.notna(row.get('备注')) else ''
-                )
-                
-                if existing_equipment:
-                    if overwrite_bool:
-                        # 智能覆盖：只更新有变化的字段
-                        update_fields = {}
-
-                        # 比较各个字段，只包含有变化的
-                        if existing_equipment.department_id != equipment_data.department_id:
-                            update_fields["department_id"] = equipment_data.department_id
-                        if existing_equipment.category_id != equipment_data.category_id:
-                            update_fields["category_id"] = equipment_data.category_id
-                        if existing_equipment.name != equipment_data.name:
-                            update_fields["name"] = equipment_data.name
-                        if existing_equipment.model != equipment_data.model:
-                            update_fields["model"] = equipment_data.model
-                        if existing_equipment.accuracy_level != equipment_data.accuracy_level:
-                            update_fields["accuracy_level"] = equipment_data.accuracy_level
-                        if existing_equipment.measurement_range != equipment_data.measurement_range:
-                            update_fields["measurement_range"] = equipment_data.measurement_range
-                        if existing_equipment.calibration_cycle != equipment_data.calibration_cycle:
-                            update_fields["calibration_cycle"] = equipment_data.calibration_cycle
-                        if existing_equipment.calibration_date != equipment_data.calibration_date:
-                            update_fields["calibration_date"] = equipment_data.calibration_date
-                        if existing_equipment.calibration_method != equipment_data.calibration_method:
-                            update_fields["calibration_method"] = equipment_data.calibration_method
-                        if existing_equipment.current_calibration_result != equipment_data.current_calibration_result:
-                            update_fields["current_calibration_result"] = equipment_data.current_calibration_result
-                        if existing_equipment.installation_location != equipment_data.installation_location:
-                            update_fields["installation_location"] = equipment_data.installation_location
-                        if existing_equipment.manufacturer != equipment_data.manufacturer:
-                            update_fields["manufacturer"] = equipment_data.manufacturer
-                        if existing_equipment.manufacture_date != equipment_data.manufacture_date:
-                            update_fields["manufacture_date"] = equipment_data.manufacture_date
-                        if existing_equipment.scale_value != equipment_data.scale_value:
-                            update_fields["scale_value"] = equipment_data.scale_value
-                        if existing_equipment.management_level != equipment_data.management_level:
-                            update_fields["management_level"] = equipment_data.management_level
-                        if existing_equipment.original_value != equipment_data.original_value:
-                            update_fields["original_value"] = equipment_data.original_value
-                        if existing_equipment.status != equipment_data.status:
-                            update_fields["status"] = equipment_data.status
-                        if existing_equipment.status_change_date != equipment_data.status_change_date:
-                            update_fields["status_change_date"] = equipment_data.status_change_date
-                        if existing_equipment.certificate_number != equipment_data.certificate_number:
-                            update_fields["certificate_number"] = equipment_data.certificate_number
-                        if existing_equipment.verification_agency != equipment_data.verification_agency:
-                            update_fields["verification_agency"] = equipment_data.verification_agency
-                        if existing_equipment.certificate_form != equipment_data.certificate_form:
-                            update_fields["certificate_form"] = equipment_data.certificate_form
-                        if existing_equipment.notes != equipment_data.notes:
-                            update_fields["notes"] = equipment_data.notes
-
-                        # 如果有字段需要更新
-                        if update_fields:
-                            update_data = EquipmentUpdate(**update_fields)
-                            updated_equipment = equipment.update_equipment(
-                                db, equipment_id=int(float(existing_equipment.id)), equipment_update=update_data, preserve_internal_id=True
-                            )
-                        else:
-                            # 没有变化，跳过更新
-                            updated_equipment = existing_equipment
-                        
-                        # 导入操作不记录单个设备的审计日志，避免产生大量通知
-                        # log_data = AuditLogCreate(
-                        #     user_id=current_user.id,
-                        #     equipment_id=int(float(existing_equipment.id)),
-                        #     action="导入更新",
-                        #     description=f"通过Excel导入更新设备: {updated_equipment.name if updated_equipment else '未知设备'}",
-                        #     operation_type="equipment",
-                        #     target_table="equipments",
-                        #     target_id=int(float(existing_equipment.id))
-                        # )
-                        # create_audit_log(db=db, log_data=log_data)
-
-                        if update_fields:
-                            # 有实际更新
-                            result["status"] = "更新"
-                            result["message"] = f"成功更新{len(update_fields)}个字段"
-                            update_count += 1
-                        else:
-                            # 无变化
-                            result["status"] = "跳过"
-                            result["message"] = "设备数据无变化，跳过更新"
-                            skip_count += 1
-
-                        detailed_results.append(result)
-                    else:
-                        result["status"] = "失败"
-                        result["message"] = f"出厂编号'{manufacturer_id}'的设备已存在，无法重复导入"
-                        detailed_results.append(result)
-                        error_count += 1
-                    continue
-                
-                # 创建新设备
-                new_equipment = equipment.create_equipment(db, equipment_data)
-                
-                # 导入操作不记录单个设备的审计日志，避免产生大量通知
-                # log_data = AuditLogCreate(
-                #     user_id=current_user.id,
-                #     equipment_id=int(float(new_equipment.id)),
-                #     action="导入",
-                #     description=f"通过Excel导入设备: {new_equipment.name}",
-                #     operation_type="equipment",
-                #     target_table="equipments",
-                #     target_id=int(float(new_equipment.id))
-                # )
-                # create_audit_log(db=db, log_data=log_data)
-                
-                result["status"] = "成功"
-                result["message"] = "成功导入新设备"
-                detailed_results.append(result)
-                success_count += 1
-                
-            except Exception as e:
-                result["status"] = "失败"
-                result["message"] = f"处理数据时发生错误: {str(e)}"
-                detailed_results.append(result)
-                error_count += 1
-                continue
-        
-        # 完成导入会话
-        import_crud.complete_import_session(
-            db, session_id,
+
+        # 记录暂存文件并清除旧断点和逐行结果（复用会话时替换之前上传的文件），导入中断后可从断点继续
+        import_crud.discard_import_source(db, session_id)
+        import_crud.clear_row_results(db, session_id)
+        import_session = import_crud.update_import_session(db, session_id, {
+            "source_path": source_path,
+            "checkpoint": None,
+            "total_rows": total_rows,
+            "overwrite_existing": overwrite_bool
+        })
+
+        # 提交到后台导入任务，进度通过 /api/import-sessions/{id}/events 推送
+        job = submit_equipment_import(import_session)
+
+    except Exception as e:
+        remove_spooled_file(source_path)
+        # 标记导入会话失败（试运行不涉及会话）
+        if session_id and not dry_run_bool:
+            import_crud.fail_import_session(db, session_id, str(e))
+        raise HTTPException(status_code=500, detail=f"导入失败: {str(e)}")
+
+    # 后续不再访问数据库，提前释放连接
+    db.close()
+
+    if background.lower() in ['true', '1', 'yes', 'on']:
+        return JSONResponse(status_code=202, content={
+            "message": "导入任务已提交",
+            "session_id": session_id,
+            "status": "processing",
+            "events_url": f"/api/import-sessions/{session_id}/events"
+        })
+
+    # 兼容同步调用：等待后台任务完成后返回导入结果（等待期间不占用事件循环和数据库连接）
+    from app.core.import_worker import ImportCancelled
+    try:
+        result = await job.wait()
+    except ImportCancelled:
+        raise HTTPException(status_code=409, detail="导入已取消")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"导入失败: {str(e)}")
+
+    # 同步调用按原格式返回全部逐行结果
+    return {**result, "detailed_results": await run_in_threadpool(_load_all_row_results, session_id)}
+
+def submit_equipment_import(import_session):
+    """将导入会话提交到后台导入任务（新上传与断点续传共用，从会话的断点开始）"""
+    from app.core.import_worker import import_worker
+    return import_worker.submit(
+        import_session.id,
+        partial(
+            _run_equipment_import,
+            source_path=import_session.source_path, session_id=import_session.id,
+            overwrite=import_session.overwrite_existing, batch_size=import_session.batch_size,
+            user_id=import_session.user_id
+        ),
+        total_rows=import_session.total_rows
+    )
+
+def _run_equipment_import(job, source_path: str, session_id: int, overwrite: bool,
+                          batch_size: int, user_id: int) -> dict:
+    """
+    在后台导入任务中执行：逐块读取、校验、分批写入、完成会话并记录操作日志
+
+    每批提交时在同一事务中写入本批及之前校验失败行的逐行结果（import_row_results），
+    并把断点（已处理到的数据行及截至该行的计数）写入会话；
+    从断点继续时跳过断点之前的行，已提交的行不会被重复写入。
+    """
+    from collections import deque
+    from app.db.database import SessionLocal
+    from app.core.config import settings
+    from app.crud import import_session as import_crud
+    from app.crud.equipment_import import import_equipment_records, STATUS_COUNTERS
+    from app.core.import_worker import ImportCancelled
+    from app.models.import_session import ImportSession, ImportStatus
+    from app.utils.import_reader import iter_import_chunks
+    from app.utils.import_validation import (
+        load_lookup_frames, validate_import_frame, iter_equipment_records, error_records
+    )
+
+    db = SessionLocal()
+    keep_source = False
+    import_session = import_crud.get_import_session(db, session_id)
+    checkpoint = dict(import_session.checkpoint or {}) if import_session else {}
+    start_row = checkpoint.get("row", 0)
+    # 断点之前的计数（断点之前各行的结果已在 import_row_results 中）
+    base_counts = {counter: checkpoint.get(counter, 0) for counter in STATUS_COUNTERS.values()}
+
+    def save_interrupted_progress() -> None:
+        """中断时按断点写回计数和失败行样本（断点之后的行继续导入时会重新处理）"""
+        counts = {counter: checkpoint.get(counter, 0) for counter in STATUS_COUNTERS.values()}
+        import_crud.update_import_session(db, session_id, {
+            "detailed_results": import_crud.get_error_sample(db, session_id),
+            "processed_rows": sum(counts.values()),
+            "success_count": counts["success_count"],
+            "update_count": counts["update_count"],
+            "error_count": counts["error_count"]
+        })
+
+    try:
+        lookups = load_lookup_frames(db)
+        # 本次读取的行数、校验失败的行数，以及尚未写入结果表的校验失败行（按行号递增）
+        read_state = {"rows": 0, "errors": 0, "committed_errors": 0}
+        pending_errors = deque()
+
+        def validated_records():
+            """
+            逐块读取并校验，产出通过校验的记录
+
+            校验按块整列执行，块过小时固定开销占主导，因此读取块不小于 IMPORT_READ_CHUNK_ROWS；
+            写入仍按 batch_size 分批。
+            """
+            chunk_size = max(batch_size, settings.IMPORT_READ_CHUNK_ROWS)
+            for chunk in iter_import_chunks(source_path, chunk_size, start_row=start_row):
+                validation = validate_import_frame(chunk, lookups)
+                read_state["rows"] += len(chunk)
+                read_state["errors"] += len(validation.errors)
+                pending_errors.extend(error_records(validation.errors))
+                yield from iter_equipment_records(validation.rows)
+
+        def take_pending_errors(before_row: Optional[int] = None) -> list:
+            errors = []
+            while pending_errors and (before_row is None or pending_errors[0]["row"] < before_row):
+                errors.append(pending_errors.popleft())
+            read_state["committed_errors"] += len(errors)
+            return errors
+
+        def save_checkpoint(batch_db, batch_results: list, counts: dict) -> None:
+            """在本批事务中写入逐行结果并记录断点：本批最后一行之前的行均已处理"""
+            last_row = batch_results[-1]["row"]
+            import_crud.add_row_results(batch_db, session_id, take_pending_errors(last_row) + batch_results)
+
+            batch_checkpoint = {"row": last_row - 1}  # Excel行号 = 数据行号 + 2
+            for counter in STATUS_COUNTERS.values():
+                batch_checkpoint[counter] = base_counts[counter] + counts[counter]
+            batch_checkpoint["error_count"] += read_state["committed_errors"]
+            batch_db.query(ImportSession).filter(ImportSession.id == session_id).update(
+                {"checkpoint": batch_checkpoint}, synchronize_session=False
+            )
+            pending_checkpoint["value"] = batch_checkpoint
+
+        # 通过校验的行按批写入（每批一个事务）；进度保存在任务中，按限速写回会话
+        pending_checkpoint = {"value": None}
+
+        def report_progress(batch_rows: int, counts: dict) -> None:
+            # 本批已提交，断点生效
+            checkpoint.update(pending_checkpoint["value"])
+
+            validation_errors = read_state["errors"]
+            written = sum(counts.values())
+            job.update(
+                total_rows=max(job.total_rows, start_row + read_state["rows"]),
+                processed_rows=sum(base_counts.values()) + validation_errors + written,
+                success_count=base_counts["success_count"] + counts["success_count"],
+                update_count=base_counts["update_count"] + counts["update_count"],
+                skip_count=base_counts["skip_count"] + counts["skip_count"],
+                error_count=base_counts["error_count"] + validation_errors + counts["error_count"]
+            )
+            # 暂停时在批次之间等待，取消时结束任务
+            job.checkpoint()
+
+        if start_row:
+            job.update(
+                processed_rows=sum(base_counts.values()),
+                **base_counts
+            )
+
+        outcome = import_equipment_records(
+            db, validated_records(),
+            overwrite=overwrite,
+            batch_size=batch_size,
+            on_batch=report_progress,
+            before_commit=save_checkpoint,
+            collect_results=False
+        )
+        success_count = base_counts["success_count"] + outcome["success_count"]
+        update_count = base_counts["update_count"] + outcome["update_count"]
+        skip_count = base_counts["skip_count"] + outcome["skip_count"]  # 新增跳过计数
+        error_count = base_counts["error_count"] + read_state["errors"] + outcome["error_count"]
+        total_rows = success_count + update_count + skip_count + error_count
+
+        # 最后一批之后的校验失败行与完成状态一起提交；会话中只保留失败行样本
+        import_crud.add_row_results(db, session_id, take_pending_errors())
+        error_sample = import_crud.get_error_sample(db, session_id)
+
+        # 总行数改为实际处理的行数：xlsx 的预估行数包含被跳过的空行、仅有格式的行
+        job.update(
+            total_rows=total_rows,
+            processed_rows=total_rows,
             success_count=success_count,
             update_count=update_count,
-            error_count=error_count,
-            detailed_results=detailed_results
+            skip_count=skip_count,
+            error_count=error_count
         )
 
-        # 最终更新processed_rows
-        import_crud.update_progress(
+        # 完成导入会话
+        import_crud.complete_import_session(
             db, session_id,
-            processed_rows=processed_rows,
             success_count=success_count,
             update_count=update_count,
-            error_count=error_count
+            error_count=error_count,
+            detailed_results=error_sample,
+            total_rows=total_rows
         )
 
         # 记录总体操作日志
         log_data = AuditLogCreate(
-            user_id=current_user.id,
+            user_id=user_id,
             action="批量导入",
             description=f"批量导入设备数据，新增{success_count}条，更新{update_count}条，跳过{skip_count}条，失败{error_count}条",
             operation_type="equipment",
@@ -751,22 +641,109 @@ async def import_equipment_data(
             "session_id": session_id,
             "success_count": success_count,
             "update_count": update_count,
-            "skip_count": skip_count,  # 新增跳过计数
+            "skip_count": skip_count,
             "error_count": error_count,
-            "detailed_results": detailed_results,
+            # 失败行样本；全部逐行结果通过 results_url 分页查询
+            "detailed_results": error_sample,
+            "results_url": f"/api/import-sessions/{session_id}/results",
             "summary": {
-                "total_rows": len(df),
+                "total_rows": total_rows,
                 "processed": success_count + update_count + skip_count + error_count,
-                "success_rate": round((success_count + update_count) / len(df) * 100, 2) if len(df) > 0 else 0,
-                "skip_rate": round(skip_count / len(df) * 100, 2) if len(df) > 0 else 0
+                "success_rate": round((success_count + update_count) / total_rows * 100, 2) if total_rows > 0 else 0,
+                "skip_rate": round(skip_count / total_rows * 100, 2) if total_rows > 0 else 0
             }
         }
-        
+
+    except ImportCancelled:
+        # 已提交的批次保留，写回取消时的进度
+        db.rollback()
+        job.flush()
+        import_session = import_crud.get_import_session(db, session_id)
+        if import_session and import_session.status != ImportStatus.CANCELLED:
+            # 不是用户取消（如服务关闭），标记为失败，保留暂存文件以便从断点继续
+            keep_source = True
+            save_interrupted_progress()
+            import_crud.fail_import_session(
+                db, session_id, f"导入任务被中断，可从第{checkpoint.get('row', 0) + 2}行继续"
+            )
+        raise
     except Exception as e:
-        # 标记导入会话失败
-        if 'session_id' in locals():
-            import_crud.fail_import_session(db, session_id, str(e))
-        raise HTTPException(status_code=500, detail=f"导入失败: {str(e)}")
+        # 保留暂存文件，排除问题后可从断点继续
+        db.rollback()
+        keep_source = True
+        save_interrupted_progress()
+        import_crud.fail_import_session(db, session_id, str(e))
+        raise
+    finally:
+        if not keep_source:
+            import_crud.discard_import_source(db, session_id)
+        db.close()
+
+
+def _load_all_row_results(session_id: int) -> list:
+    """读取会话的全部逐行结果（同步上传接口按原格式返回）"""
+    from app.db.database import SessionLocal
+    from app.crud import import_session as import_crud
+
+    db = SessionLocal()
+    try:
+        return import_crud.get_row_results(db, session_id, limit=None)[0]
+    finally:
+        db.close()
+
+async def _preview_equipment_import(db: Session, source_path: str, columns: list, overwrite: bool) -> dict:
+    """试运行导入：汇总每行的预计结果，逐行差异写入差异表供下载"""
+    from uuid import uuid4
+    from app.core.config import settings
+    from app.crud.equipment_import_preview import (
+        PREVIEW_DIR, preview_path, preview_import_file, purge_previews
+    )
+    from app.utils.import_validation import REQUIRED_COLUMNS
+
+    try:
+        missing_columns = [col for col in REQUIRED_COLUMNS if col not in columns]
+        if missing_columns:
+            raise HTTPException(
+                status_code=400,
+                detail=f"缺少必需的列: {', '.join(missing_columns)}"
+            )
+
+        purge_previews(settings.IMPORT_PREVIEW_RETENTION_SECONDS)
+        PREVIEW_DIR.mkdir(parents=True, exist_ok=True)
+        token = uuid4().hex
+        summary = await run_in_threadpool(
+            preview_import_file, db, source_path, overwrite, str(preview_path(token))
+        )
+    finally:
+        remove_spooled_file(source_path)
+
+    return {
+        "dry_run": True,
+        "overwrite_existing": overwrite,
+        **summary,
+        "diff_url": f"/api/import/preview/{token}"
+    }
+
+@router.get("/preview/{token}")
+def download_import_preview(
+    token: str,
+    current_user = Depends(get_current_admin_user)
+):
+    """下载试运行导入生成的差异表"""
+    from fastapi.responses import FileResponse
+    from app.crud.equipment_import_preview import preview_path
+
+    if len(token) != 32 or any(c not in '0123456789abcdef' for c in token):
+        raise HTTPException(status_code=404, detail="预览结果不存在或已过期")
+    path = preview_path(token)
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="预览结果不存在或已过期")
+
+    return FileResponse(
+        path=str(path),
+        filename=f"导入预览_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    )
 
 @router.get("/export/all")
 def export_all_equipments(
@@ -774,63 +751,11 @@ def export_all_equipments(
     current_user = Depends(get_current_user)
 ):
     """导出所有设备数据"""
-    equipments = equipment.get_equipments(
-        db, skip=0, limit=10000,
-        user_id=current_user.id, is_admin=current_user.is_admin
-    )
-    
-    df, dynamic_columns = generate_export_data(equipments, db)
-    
-    # 创建Excel文件
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name='设备台账', index=False)
-        
-        # 获取工作表对象并移除保护
-        worksheet = writer.sheets['设备台账']
-        worksheet.protection.sheet = False
-        worksheet.protection.autoFilter = False
-        
-        # 添加动态列说明工作表
-        if dynamic_columns:
-            explanation_data = {
-                '动态列': dynamic_columns,
-                '说明': [
-                    '负责人: 负责此设备类别的器具负责人账号名',
-                    '状态变更时间: 设备状态为停用或报废时显示',
-                    '证书编号: 检定方式为外检时显示',
-                    '检定机构: 检定方式为外检时显示',
-                    '证书形式: 检定方式为外检时显示'
-                ][:len(dynamic_columns)]
-            }
-            explanation_df = pd.DataFrame(explanation_data)
-            # 替换NaN值为空字符串
-            explanation_df = explanation_df.fillna('')
-            explanation_df.to_excel(writer, sheet_name='动态列说明', index=False)
-            
-            # 移除动态列说明工作表的保护
-            explanation_worksheet = writer.sheets['动态列说明']
-            explanation_worksheet.protection.sheet = False
-    
-    output.seek(0)
-    
-    filename = f"设备台账_全部_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    encoded_filename = quote(filename, safe='')
-    
-    # 记录操作日志
-    log_data = AuditLogCreate(
-        user_id=current_user.id,
-        action="导出全部",
-        description=f"��出全部设备数据，共{len(equipments)}台",
-        operation_type="equipment",
-        target_table="equipments"
-    )
-    create_audit_log(db=db, log_data=log_data)
-    
-    return Response(
-        content=output.getvalue(),
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}"}
+    user_id, is_admin = current_user.id, current_user.is_admin
+    return stream_equipment_export(
+        lambda session: equipment.filter_equipments_query(session, user_id=user_id, is_admin=is_admin),
+        '设备台账', f"设备台账_全部_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+        export_audit_logger(user_id, "导出全部", "导出全部设备数据，共")
     )
 
 @router.post("/export/filtered")
@@ -840,82 +765,9 @@ def export_filtered_equipments(
     current_user = Depends(get_current_user)
 ):
     """根据筛选条件导出设备数据"""
-    
-    # 检查是否包含搜索查询
-    if 'query' in filters and filters['query']:
-        # 如果包含搜索查询，使用搜索API
-        from app.schemas.schemas import EquipmentSearch
-        
-        search_params = EquipmentSearch(**filters)
-        equipments = equipment.search_equipments(
-            db, search=search_params, skip=0, limit=10000,
-            user_id=current_user.id, is_admin=current_user.is_admin
-        )
-        
-        # 记录操作日志
-        log_data = AuditLogCreate(
-            user_id=current_user.id,
-            action="导出搜索结果",
-            description=f"导出搜索结果，查询词: '{filters['query']}'，共{len(equipments)}台",
-            operation_type="equipment",
-            target_table="equipments"
-        )
-        create_audit_log(db=db, log_data=log_data)
-    else:
-        # 否则使用传统筛选API
-        from app.schemas.schemas import EquipmentFilter
-        
-        equipment_filter = EquipmentFilter(**filters)
-        equipments = equipment.filter_equipments(
-            db, filters=equipment_filter, skip=0, limit=10000,
-            user_id=current_user.id, is_admin=current_user.is_admin
-        )
-        
-        # 记录操作日志
-        log_data = AuditLogCreate(
-            user_id=current_user.id,
-            action="导出筛选",
-            description=f"导出筛选设备数据，共{len(equipments)}台",
-            operation_type="equipment",
-            target_table="equipments"
-        )
-        create_audit_log(db=db, log_data=log_data)
-    
-    df, dynamic_columns = generate_export_data(equipments, db)
-    
-    # 创建Excel文件
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name='筛选设备', index=False)
-        
-        # 添加动态列说明工作表
-        if dynamic_columns:
-            explanation_data = {
-                '动态列': dynamic_columns,
-                '说明': [
-                    '负责人: 负责此设备类别的器具负责人账号名',
-                    '状态变更时间: 设备状态为停用或报废时显示',
-                    '证书编号: 检定方式为外检时显示',
-                    '检定机构: 检定方式为外检时显示',
-                    '证书形式: 检定方式为外检时显示'
-                ][:len(dynamic_columns)]
-            }
-            explanation_df = pd.DataFrame(explanation_data)
-            # 替换NaN值为空字符串
-            explanation_df = explanation_df.fillna('')
-            explanation_df.to_excel(writer, sheet_name='动态列说明', index=False)
-            
-            # 移除动态列说明工作表的保护
-            explanation_worksheet = writer.sheets['动态列说明']
-            explanation_worksheet.protection.sheet = False
-    
-    output.seek(0)
-    
-    filename = f"设备台账_筛选_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    encoded_filename = quote(filename, safe='')
-    
-    return Response(
-        content=output.getvalue(),
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}"}
-    )
\ No newline at end of file
+    user_id = current_user.id
+    export = filtered_export(filters, user_id, current_user.is_admin)
+    return stream_equipment_export(
+        export.build_query, '筛选设备', f"设备台账_筛选_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+        export_audit_logger(user_id, export.action, export.description)
+    )
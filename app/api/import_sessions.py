@@ -3,13 +3,21 @@
 提供导入进度跟踪、状态管理和结果查询功能
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+import json
+import os
+from datetime import datetime, timedelta
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
 from app.db.database import get_db
+from app.core.config import settings
 from app.api.auth import get_current_user
 from app.crud import import_session as import_crud
+from app.core.import_worker import import_worker
 from app.schemas.schemas import (
     ImportSessionCreate, ImportSessionResponse, ImportSessionUpdate,
     ImportSessionSummary, ImportProgressUpdate
@@ -69,6 +77,157 @@ def get_import_session(
     return import_session
 
 
+def _session_snapshot(import_session) -> dict:
+    """数据库中的会话进度（内存中没有对应任务时使用，如任务在其他进程或已结束）"""
+    status_value = getattr(import_session.status, "value", import_session.status)
+    return {
+        "session_id": import_session.id,
+        "status": status_value,
+        "progress": import_session.progress,
+        "total_rows": import_session.total_rows,
+        "processed_rows": import_session.processed_rows,
+        "success_count": import_session.success_count,
+        "update_count": import_session.update_count,
+        "skip_count": None,
+        "error_count": import_session.error_count,
+        "error_message": import_session.error_message,
+    }
+
+
+def _get_authorized_session(db: Session, session_id: int, current_user: User):
+    import_session = import_crud.get_import_session(db, session_id)
+    if not import_session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="导入会话不存在"
+        )
+    if not current_user.is_admin and import_session.user_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="无权访问此导入会话"
+        )
+    return import_session
+
+
+@router.get("/{session_id}/progress")
+def get_import_progress(
+    session_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """获取导入进度（优先取后台任务的内存进度）"""
+    import_session = _get_authorized_session(db, session_id, current_user)
+    job = import_worker.get(session_id)
+    return job.snapshot() if job else _session_snapshot(import_session)
+
+
+@router.get("/{session_id}/results")
+def get_import_row_results(
+    session_id: int,
+    status_filter: Optional[str] = Query(None, description="按结果筛选：成功/更新/跳过/失败"),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """分页获取导入的逐行结果（按行号排序）"""
+    _get_authorized_session(db, session_id, current_user)
+    records, total = import_crud.get_row_results(
+        db, session_id, status=status_filter, skip=(page - 1) * page_size, limit=page_size
+    )
+    return {
+        "records": records,
+        "total": total,
+        "page": page,
+        "page_size": page_size,
+        "total_pages": (total + page_size - 1) // page_size
+    }
+
+
+# SSE 心跳间隔；任务不在本进程时读取数据库的间隔（秒）
+EVENT_KEEPALIVE_SECONDS = 15
+EVENT_DB_POLL_SECONDS = 2
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+@router.get("/{session_id}/events")
+async def stream_import_events(
+    session_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    以 Server-Sent Events 推送导入进度
+
+    事件类型：progress（进度变化）、done（任务结束，随后关闭连接）。
+    """
+    import_session = _get_authorized_session(db, session_id, current_user)
+    snapshot = _session_snapshot(import_session)
+    active = import_session.is_active
+    # 推送期间不再需要数据库会话，释放连接
+    db.close()
+
+    async def job_events(job):
+        event = job.subscribe()
+        try:
+            version = -1
+            while True:
+                if job.version != version:
+                    version = job.version
+                    data = job.snapshot()
+                    if job.finished:
+                        yield _sse("done", data)
+                        return
+                    yield _sse("progress", data)
+                event.clear()
+                try:
+                    await asyncio.wait_for(event.wait(), EVENT_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+        finally:
+            job.unsubscribe(event)
+
+    async def session_events():
+        # 任务不在本进程：按固定间隔读取数据库中的会话进度
+        from app.db.database import SessionLocal
+        last = None
+        while True:
+            poll_db = SessionLocal()
+            try:
+                current = import_crud.get_import_session(poll_db, session_id)
+                data = _session_snapshot(current) if current else None
+                still_active = bool(current and current.is_active)
+            finally:
+                poll_db.close()
+            if data is None or not still_active:
+                yield _sse("done", data or snapshot)
+                return
+            if data != last:
+                last = data
+                yield _sse("progress", data)
+            await asyncio.sleep(EVENT_DB_POLL_SECONDS)
+
+    async def events():
+        job = import_worker.get(session_id)
+        if job is not None:
+            async for chunk in job_events(job):
+                yield chunk
+        elif active:
+            async for chunk in session_events():
+                yield chunk
+        else:
+            yield _sse("done", snapshot)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/", response_model=List[ImportSessionResponse])
 def get_user_import_sessions(
     skip: int = 0,
@@ -246,6 +405,9 @@ def cancel_import_session(
     try:
         # 取消会话
         cancelled_session = import_crud.cancel_import_session(db, session_id, reason)
+        # 通知后台任务在下一批之前结束；任务不在本进程时由其自行清理，已中断的会话在此删除暂存文件
+        if not import_worker.cancel(session_id):
+            import_crud.discard_import_source(db, session_id)
 
         if not cancelled_session:
             raise HTTPException(
@@ -296,6 +458,8 @@ def pause_import_session(
     try:
         # 暂停会话
         paused_session = import_crud.pause_import_session(db, session_id)
+        # 后台任务在当前批次提交后暂停
+        import_worker.pause(session_id)
 
         if not paused_session:
             raise HTTPException(
@@ -320,7 +484,7 @@ def resume_import_session(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """恢复导入会话"""
+    """恢复导入会话（已暂停的任务继续执行；任务已中断时从断点继续导入）"""
     # 获取会话
     import_session = import_crud.get_import_session(db, session_id)
     if not import_session:
@@ -336,33 +500,54 @@ def resume_import_session(
             detail="无权恢复此导入会话"
         )
 
-    # 检查状态
-    if import_session.status != "paused":
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="只能恢复已暂停的导入会话"
-        )
-
-    try:
-        # 恢复会话
-        resumed_session = import_crud.resume_import_session(db, session_id)
-
-        if not resumed_session:
+    job = import_worker.get(session_id)
+    if job is not None and not job.finished:
+        # 任务在本进程中：解除暂停
+        if import_session.status != "paused":
             raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="恢复导入会话失败"
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="只能恢复已暂停的导入会话"
             )
+        import_crud.resume_import_session(db, session_id)
+        import_worker.resume(session_id)
+        return {"message": "导入会话已恢复", "session_id": session_id}
 
+    stale_before = datetime.now() - timedelta(seconds=settings.IMPORT_STALE_SECONDS)
+    if import_session.status == "paused" and import_crud.has_live_worker(db, session_id, stale_before):
+        # 任务在其他进程中暂停：修改会话状态，该进程轮询到后继续
+        import_crud.resume_import_session(db, session_id)
         return {"message": "导入会话已恢复", "session_id": session_id}
 
-    except HTTPException:
-        raise
+    # 执行任务的进程已退出（或任务失败）：从断点继续
+    if not import_session.source_path or not os.path.exists(import_session.source_path):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="只能恢复已暂停或已中断的导入会话（导入文件已不存在时需重新上传）"
+        )
+    if not import_crud.claim_import_session(db, session_id, stale_before):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="导入会话正在处理中或不可继续"
+        )
+
+    try:
+        from app.api.import_export import submit_equipment_import
+        db.refresh(import_session)
+        submit_equipment_import(import_session)
     except Exception as e:
+        import_crud.fail_import_session(db, session_id, str(e))
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"恢复导入会话失败: {str(e)}"
         )
 
+    start_row = (import_session.checkpoint or {}).get("row", 0)
+    return {
+        "message": f"导入会话已从第{start_row + 2}行继续",
+        "session_id": session_id,
+        "events_url": f"/api/import-sessions/{session_id}/events"
+    }
+
 
 @router.delete("/{session_id}")
 def delete_import_session(
@@ -1,107 +1,75 @@
 from fastapi import APIRouter, Depends, Query, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import func, select, and_, or_, case
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import func, and_, or_, case
 from datetime import datetime, date, timedelta
 from calendar import monthrange
 from typing import List, Dict, Any, Optional
 from app.db.database import get_db
-from app.crud import equipment
+from app.crud import equipment_stats
+from app.crud.permission_scope import equipment_scope_tags
+from app.core.cache import cached
+from app.core.cache_config import CacheConfig
+from starlette.concurrency import run_in_threadpool
+from app.crud.permission_scope import authorized_equipment_clause
 from app.api.auth import get_current_user
-from app.models.models import Equipment, EquipmentCategory, Department
+from app.utils.export_stream import XlsxSheet, csv_response, iter_query, xlsx_response
+from app.models.models import Equipment, EquipmentCategory, Department, EquipmentStats
 
 router = APIRouter()
 
-@router.get("/overview")
-async def get_reports_overview(
-    db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
-):
-    """获取报表概览数据"""
-    
-    # 基础查询条件
-    base_query = db.query(Equipment)
-    if not current_user.is_admin:
-        from app.models.models import UserEquipmentPermission
-        # 修复权限冲突：需要同时匹配category_id和equipment_name
-        # 由于报表需要复杂的权限过滤，这里使用子查询方式
-
-        equipment_subquery = db.query(
-            Equipment.id
+def _reports_overview(db: Session, current_user) -> dict:
+    """报表概览数据（同步查询）"""
+    scope = {"user_id": current_user.id, "is_admin": current_user.is_admin}
+    
+    # 按类别、部门、状态汇总设备数量（一次汇总表查询）
+    summary_query = equipment_stats.stats_query(
+        db, EquipmentCategory.name, Department.name, EquipmentStats.status,
+        func.sum(EquipmentStats.equipment_count), **scope
+    )
+    rows = []
+    if summary_query is not None:
+        rows = summary_query.join(
+            EquipmentCategory, EquipmentCategory.id == EquipmentStats.category_id
         ).join(
-            UserEquipmentPermission,
-            and_(
-                Equipment.category_id == UserEquipmentPermission.category_id,
-                Equipment.name == UserEquipmentPermission.equipment_name,
-                UserEquipmentPermission.user_id == current_user.id
-            )
-        ).subquery()
-
-        authorized_equipment_ids = select(equipment_subquery.c.id)
-        base_query = base_query.filter(Equipment.id.in_(authorized_equipment_ids))
-    
-    # 设备状态统计
-    total_count = base_query.count()
-    active_count = base_query.filter(Equipment.status == "在用").count()
-    inactive_count = base_query.filter(Equipment.status.in_(["停用", "报废"])).count()
+            Department, Department.id == EquipmentStats.department_id
+        ).group_by(
+            EquipmentCategory.id, EquipmentCategory.name,
+            Department.id, Department.name, EquipmentStats.status
+        ).all()
+    
+    # 设备状态统计、类别分布、部门分布
+    total_count = 0
+    active_count = 0
+    inactive_count = 0
+    category_counts = {}
+    department_counts = {}
+    for category_name, department_name, status, count in rows:
+        count = count or 0
+        total_count += count
+        active = count if status == "在用" else 0
+        active_count += active
+        if status in ("停用", "报废"):
+            inactive_count += count
+        for counts, name in ((category_counts, category_name), (department_counts, department_name)):
+            item = counts.setdefault(name, {"name": name, "total": 0, "active": 0})
+            item["total"] += count
+            item["active"] += active
     
     # 检定相关统计
     today = date.today()
-    overdue_count = base_query.filter(
-        and_(
-            Equipment.status == "在用",
-            Equipment.valid_until < today
-        )
-    ).count()
+    overdue_count = equipment_stats.count_overdue(db, today, **scope)
     
     # 本月待检
     current_month_start = date(today.year, today.month, 1)
     _, last_day = monthrange(today.year, today.month)
     current_month_end = date(today.year, today.month, last_day)
     
-    monthly_due_count = base_query.filter(
-        and_(
-            Equipment.status == "在用",
-            Equipment.valid_until.between(current_month_start, current_month_end)
-        )
-    ).count()
-    
-    # 设备类别分布
-    category_stats = db.query(
-        EquipmentCategory.name,
-        func.count(Equipment.id).label('count'),
-        func.sum(case((Equipment.status == "在用", 1), else_=0)).label('active_count'),
-    ).join(Equipment).group_by(EquipmentCategory.id, EquipmentCategory.name)
-    
-    if not current_user.is_admin:
-        category_stats = category_stats.filter(Equipment.id.in_(authorized_equipment_ids))
-    
-    category_distribution = [
-        {
-            "name": name,
-            "total": count,
-            "active": active_count or 0
-        }
-        for name, count, active_count in category_stats.all()
-    ]
+    monthly_due_count = equipment_stats.count_valid_between(
+        db, current_month_start, current_month_end, **scope
+    )
     
-    # 部门分布
-    department_stats = db.query(
-        Department.name,
-        func.count(Equipment.id).label('count'),
-        func.sum(case((Equipment.status == "在用", 1), else_=0)).label('active_count'),
-    ).join(Equipment).group_by(Department.id, Department.name)
-    
-    if not current_user.is_admin:
-        department_stats = department_stats.filter(Equipment.id.in_(authorized_equipment_ids))
-    
-    department_distribution = [
-        {
-            "name": name,
-            "total": count,
-            "active": active_count or 0
-        }
-        for name, count, active_count in department_stats.all()
-    ]
+    category_distribution = [item for item in category_counts.values() if item["total"]]
+    department_distribution = [item for item in department_counts.values() if item["total"]]
     
     return {
         "overview": {
@@ -115,8 +83,21 @@ async def get_reports_overview(
         "department_distribution": department_distribution
     }
 
+@router.get("/overview")
+@cached(
+    ttl=CacheConfig.get_cache_ttl_for_api("reports_overview"),
+    key_prefix=CacheConfig.get_cache_prefix_for_api("reports_overview"),
+    tags=[equipment_scope_tags]
+)
+async def get_reports_overview(
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """获取报表概览数据 - 基于设备统计汇总表，支持缓存（缓存读写异步，查询在线程池中执行）"""
+    return await run_in_threadpool(_reports_overview, db, current_user)
+
 @router.get("/calibration-stats")
-async def get_calibration_stats(
+def get_calibration_stats(
     start_date: Optional[date] = Query(None),
     end_date: Optional[date] = Query(None),
     db: Session = Depends(get_db),
@@ -134,23 +115,10 @@ async def get_calibration_stats(
     # 基础查询
     base_query = db.query(Equipment).filter(Equipment.status == "在用")
     if not current_user.is_admin:
-        from app.models.models import UserEquipmentPermission
         # 修复权限冲突：需要同时匹配category_id和equipment_name
-        # 由于报表需要复杂的权限过滤，这里使用子查询方式
 
-        equipment_subquery = db.query(
-            Equipment.id
-        ).join(
-            UserEquipmentPermission,
-            and_(
-                Equipment.category_id == UserEquipmentPermission.category_id,
-                Equipment.name == UserEquipmentPermission.equipment_name,
-                UserEquipmentPermission.user_id == current_user.id
-            )
-        ).subquery()
-
-        authorized_equipment_ids = select(equipment_subquery.c.id)
-        base_query = base_query.filter(Equipment.id.in_(authorized_equipment_ids))
+        permission_clause = authorized_equipment_clause(current_user.id)
+        base_query = base_query.filter(permission_clause)
     
     # 检定方式统计
     calibration_method_stats = db.query(
@@ -231,7 +199,7 @@ async def get_calibration_stats(
     }
 
 @router.get("/equipment-trends")
-async def get_equipment_trends(
+def get_equipment_trends(
     months: int = Query(12, ge=1, le=24),
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
@@ -250,22 +218,9 @@ async def get_equipment_trends(
         # 基础查询
         base_query = db.query(Equipment)
         if not current_user.is_admin:
-            from app.models.models import UserEquipmentPermission
             # 修复权限冲突：需要同时匹配category_id和equipment_name
-            # 由于报表需要复杂的权限过滤，这里使用子查询方式
-            equipment_subquery = db.query(
-                Equipment.id
-            ).join(
-                UserEquipmentPermission,
-                and_(
-                    Equipment.category_id == UserEquipmentPermission.category_id,
-                    Equipment.name == UserEquipmentPermission.equipment_name,
-                    UserEquipmentPermission.user_id == current_user.id
-                )
-            ).subquery()
-
-            authorized_equipment_ids = select(equipment_subquery.c.id)
-            base_query = base_query.filter(Equipment.id.in_(authorized_equipment_ids))
+            permission_clause = authorized_equipment_clause(current_user.id)
+            base_query = base_query.filter(permission_clause)
         
         # 统计各状态设备数量
         total_count = base_query.filter(
@@ -307,7 +262,7 @@ async def get_equipment_trends(
     }
 
 @router.get("/department-comparison")
-async def get_department_comparison(
+def get_department_comparison(
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
@@ -316,23 +271,10 @@ async def get_department_comparison(
     # 基础查询
     base_query = db.query(Equipment)
     if not current_user.is_admin:
-        from app.models.models import UserEquipmentPermission
         # 修复权限冲突：需要同时匹配category_id和equipment_name
-        # 由于报表需要复杂的权限过滤，这里使用子查询方式
 
-        equipment_subquery = db.query(
-            Equipment.id
-        ).join(
-            UserEquipmentPermission,
-            and_(
-                Equipment.category_id == UserEquipmentPermission.category_id,
-                Equipment.name == UserEquipmentPermission.equipment_name,
-                UserEquipmentPermission.user_id == current_user.id
-            )
-        ).subquery()
-
-        authorized_equipment_ids = select(equipment_subquery.c.id)
-        base_query = base_query.filter(Equipment.id.in_(authorized_equipment_ids))
+        permission_clause = authorized_equipment_clause(current_user.id)
+        base_query = base_query.filter(permission_clause)
     
     # 部门详细统计
     department_stats = db.query(
@@ -391,11 +333,11 @@ async def export_reports_data(
     if report_type == "overview":
         data = await get_reports_overview(db, current_user)
     elif report_type == "calibration":
-        data = await get_calibration_stats(start_date, end_date, db, current_user)
+        data = await run_in_threadpool(get_calibration_stats, start_date, end_date, db, current_user)
     elif report_type == "trends":
-        data = await get_equipment_trends(12, db, current_user)
+        data = await run_in_threadpool(get_equipment_trends, 12, db, current_user)
     elif report_type == "department":
-        data = await get_department_comparison(db, current_user)
+        data = await run_in_threadpool(get_department_comparison, db, current_user)
     else:
         return {"error": "不支持的报表类型"}
     
@@ -411,7 +353,7 @@ async def export_reports_data(
 
 
 @router.get("/equipment-stats")
-async def get_equipment_stats(
+def get_equipment_stats(
     sort_by: str = Query("original_value", description="主排序字段：original_value, name, status, department, category"),
     sort_order: str = Query("desc", description="主排序方向：asc, desc"),
     sort_by2: str = Query(None, description="次排序字段：original_value, name, status, department, category"),
@@ -424,25 +366,13 @@ async def get_equipment_stats(
     """获取设备统计数据，支持按原值排序"""
 
     # 确保所有需要的模型都已导入
-    from app.models.models import UserEquipmentPermission
 
     # 权限控制：普通用户只能查看授权设备的统计
     query = db.query(Equipment)
     if not current_user.is_admin:
         # 修复权限冲突：需要同时匹配category_id和equipment_name
-        equipment_subquery = db.query(
-            Equipment.id
-        ).join(
-            UserEquipmentPermission,
-            and_(
-                Equipment.category_id == UserEquipmentPermission.category_id,
-                Equipment.name == UserEquipmentPermission.equipment_name,
-                UserEquipmentPermission.user_id == current_user.id
-            )
-        ).subquery()
-
-        authorized_equipment_ids = select(equipment_subquery.c.id)
-        query = query.filter(Equipment.id.in_(authorized_equipment_ids))
+        permission_clause = authorized_equipment_clause(current_user.id)
+        query = query.filter(permission_clause)
 
     # 获取总数
     
@@ -675,7 +605,7 @@ async def get_equipment_stats(
     }
 
 @router.get("/calibration-records")
-async def get_calibration_records(
+def get_calibration_records(
     start_date: Optional[str] = Query(None),
     end_date: Optional[str] = Query(None),
     page: int = Query(1, ge=1),
@@ -690,23 +620,10 @@ async def get_calibration_records(
     
     # 权限控制
     if not current_user.is_admin:
-        from app.models.models import UserEquipmentPermission
         # 修复权限冲突：需要同时匹配category_id和equipment_name
-        # 由于报表需要复杂的权限过滤，这里使用子查询方式
-
-        equipment_subquery = db.query(
-            Equipment.id
-        ).join(
-            UserEquipmentPermission,
-            and_(
-                Equipment.category_id == UserEquipmentPermission.category_id,
-                Equipment.name == UserEquipmentPermission.equipment_name,
-                UserEquipmentPermission.user_id == current_user.id
-            )
-        ).subquery()
 
-        authorized_equipment_ids = select(equipment_subquery.c.id)
-        query = query.filter(Equipment.id.in_(authorized_equipment_ids))
+        permission_clause = authorized_equipment_clause(current_user.id)
+        query = query.filter(permission_clause)
     
     # 日期范围过滤
     if start_date:
@@ -757,121 +674,72 @@ async def get_calibration_records(
 
 
 @router.get("/export")
-async def export_reports(
+def export_reports(
     start_date: Optional[str] = Query(None),
     end_date: Optional[str] = Query(None),
     format: str = Query("excel", regex="^(excel|csv)$"),
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
-    """导出统计报表"""
-    from fastapi.responses import StreamingResponse
-    import io
-    import pandas as pd
-    
+    """导出统计报表（在导出自己的会话中分批读取检定记录并流式写出）"""
     try:
+        start_dt = datetime.strptime(start_date, "%Y-%m-%d").date() if start_date else None
+        end_dt = datetime.strptime(end_date, "%Y-%m-%d").date() if end_date else None
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=f"Export failed: {str(e)}")
+    
+    user_id, is_admin = current_user.id, current_user.is_admin
+    
+    def build_query(session: Session):
         # 获取检定记录数据
-        query = db.query(Equipment).filter(Equipment.calibration_date.isnot(None))
+        query = session.query(Equipment).options(
+            joinedload(Equipment.department),
+            joinedload(Equipment.category)
+        ).filter(Equipment.calibration_date.isnot(None))
         
         # 权限控制
-        if not current_user.is_admin:
-            from app.models.models import UserEquipmentPermission
+        if not is_admin:
             # 修复权限冲突：需要同时匹配category_id和equipment_name
-            equipment_subquery = db.query(
-                Equipment.id
-            ).join(
-                UserEquipmentPermission,
-                and_(
-                    Equipment.category_id == UserEquipmentPermission.category_id,
-                    Equipment.name == UserEquipmentPermission.equipment_name,
-                    UserEquipmentPermission.user_id == current_user.id
-                )
-            ).subquery()
-
-            authorized_equipment_ids = select(equipment_subquery.c.id)
-            query = query.filter(Equipment.id.in_(authorized_equipment_ids))
+            permission_clause = authorized_equipment_clause(user_id)
+            query = query.filter(permission_clause)
         
         # 日期范围过滤
-        if start_date:
-            start_dt = datetime.strptime(start_date, "%Y-%m-%d").date()
+        if start_dt:
             query = query.filter(Equipment.calibration_date >= start_dt)
         
-        if end_date:
-            end_dt = datetime.strptime(end_date, "%Y-%m-%d").date()
+        if end_dt:
             query = query.filter(Equipment.calibration_date <= end_dt)
         
-        equipments = query.order_by(Equipment.calibration_date.desc()).all()
-        
-        # 构建数据
-        data = []
-        for equipment in equipments:
-            data.append({
-                "内部编号": equipment.internal_id or "",
-                "出厂编号": equipment.manufacturer_id or "",
-                "设备名称": equipment.name or "",
-                "型号规格": equipment.model or "",
-                "所属部门": equipment.department.name if equipment.department else "未知部门",
-                "设备类别": equipment.category.name if equipment.category else "其他",
-                "检定日期": equipment.calibration_date.strftime("%Y-%m-%d") if equipment.calibration_date else "",
-                "有效期至": equipment.valid_until.strftime("%Y-%m-%d") if equipment.valid_until else "",
-                "设备状态": equipment.status or "",
-                "检定机构": equipment.verification_agency or "",
-                "证书编号": equipment.certificate_number or ""
-            })
-        
-        df = pd.DataFrame(data)
-        
-        # 生成文件
-        if format == "excel":
-            output = io.BytesIO()
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                df.to_excel(writer, sheet_name='检定记录', index=False)
-            output.seek(0)
-            
-            filename = f"calibration_records_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-            headers = {
-                'Content-Disposition': f'attachment; filename="{filename}"'
-            }
-            
-            return StreamingResponse(
-                io.BytesIO(output.getvalue()),
-                media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                headers=headers
-            )
-        else:  # CSV导出
-            import csv
-            output = io.BytesIO()
-            
-            # 使用utf-8编码写入CSV
-            with io.TextIOWrapper(output, encoding='utf-8', newline='') as text_output:
-                writer = csv.writer(text_output)
-                
-                # 写入表头
-                writer.writerow(data[0].keys() if data else [])
-                
-                # 写入数据
-                for row in data:
-                    writer.writerow(row.values())
-            
-            output.seek(0)
-            
-            filename = f"calibration_records_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-            headers = {
-                'Content-Disposition': f'attachment; filename="{filename}"'
-            }
-            
-            return StreamingResponse(
-                io.BytesIO(output.getvalue()),
-                media_type='text/csv',
-                headers=headers
-            )
-            
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Export failed: {str(e)}")
+        return query.order_by(Equipment.calibration_date.desc())
+    
+    columns = ["内部编号", "出厂编号", "设备名称", "型号规格", "所属部门", "设备类别",
+               "检定日期", "有效期至", "设备状态", "检定机构", "证书编号"]
+    rows = (
+        [
+            equipment.internal_id or "",
+            equipment.manufacturer_id or "",
+            equipment.name or "",
+            equipment.model or "",
+            equipment.department.name if equipment.department else "未知部门",
+            equipment.category.name if equipment.category else "其他",
+            equipment.calibration_date.strftime("%Y-%m-%d") if equipment.calibration_date else "",
+            equipment.valid_until.strftime("%Y-%m-%d") if equipment.valid_until else "",
+            equipment.status or "",
+            equipment.verification_agency or "",
+            equipment.certificate_number or ""
+        ]
+        for equipment in iter_query(build_query)
+    )
+    
+    # 生成文件
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    if format == "excel":
+        return xlsx_response([XlsxSheet('检定记录', columns, rows)], f"calibration_records_{timestamp}.xlsx")
+    return csv_response(columns, rows, f"calibration_records_{timestamp}.csv")
 
 
 @router.get("/instrument-quantity-stats")
-async def get_instrument_quantity_stats(
+def get_instrument_quantity_stats(
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
@@ -882,23 +750,10 @@ async def get_instrument_quantity_stats(
     
     # 权限控制
     if not current_user.is_admin:
-        from app.models.models import UserEquipmentPermission
         # 修复权限冲突：需要同时匹配category_id和equipment_name
-        # 由于报表需要复杂的权限过滤，这里使用子查询方式
-
-        equipment_subquery = db.query(
-            Equipment.id
-        ).join(
-            UserEquipmentPermission,
-            and_(
-                Equipment.category_id == UserEquipmentPermission.category_id,
-                Equipment.name == UserEquipmentPermission.equipment_name,
-                UserEquipmentPermission.user_id == current_user.id
-            )
-        ).subquery()
 
-        authorized_equipment_ids = select(equipment_subquery.c.id)
-        query = query.filter(Equipment.id.in_(authorized_equipment_ids))
+        permission_clause = authorized_equipment_clause(current_user.id)
+        query = query.filter(permission_clause)
     
     # 按设备类别统计数量，优化查询性能
     category_stats = db.query(
@@ -913,7 +768,7 @@ async def get_instrument_quantity_stats(
     
     # 应用权限过滤
     if not current_user.is_admin:
-        category_stats = category_stats.filter(Equipment.id.in_(authorized_equipment_ids))
+        category_stats = category_stats.filter(permission_clause)
     
     # 按类别分组并按数量降序排列
     category_results = category_stats.group_by(
@@ -6,8 +6,9 @@ from app.db.database import get_db
 from app.crud import users
 from app.schemas.schemas import User, UserCreate, UserUpdate, UserCategory, UserEquipmentPermission, UserEquipmentPermissionCreate
 from app.api.auth import get_current_admin_user, get_current_user
-from app.core.cache import cached, invalidate_cache_pattern
-from app.core.cache_config import CacheConfig, CacheInvalidationRules
+from app.core.cache import cached, invalidate_cache_tags
+from app.core.cache_config import CacheConfig, CacheInvalidationRules, CacheTag
+from app.crud.permission_scope import invalidate_permission_scope
 from pydantic import BaseModel, Field
 import secrets
 import string
@@ -33,10 +34,19 @@ class SecurityQuestionSetup(BaseModel):
     security_question: str = Field(..., description="安全问题", min_length=5, max_length=200)
     security_answer: str = Field(..., description="安全答案", min_length=1, max_length=100)
 
+def _invalidate_permission_caches(user_id: int):
+    """器具权限变更后失效权限范围及依赖它的列表、统计缓存"""
+    invalidate_permission_scope(user_id)
+    try:
+        invalidate_cache_tags(*CacheInvalidationRules.PERMISSION_CHANGE_TAGS, CacheTag.user(user_id))
+    except Exception as e:
+        print(f"警告：清除缓存失败: {e}")
+
 @router.get("/", response_model=List[User])
 @cached(
     ttl=CacheConfig.get_cache_ttl_for_api("users_list"),
-    key_prefix=CacheConfig.get_cache_prefix_for_api("users_list")
+    key_prefix=CacheConfig.get_cache_prefix_for_api("users_list"),
+    tags=[CacheTag.USERS]
 )
 def read_users(skip: int = 0, limit: int = 100,
                db: Session = Depends(get_db),
@@ -56,9 +66,7 @@ def create_user(user: UserCreate,
 
     # 创建用户后失效相关缓存
     try:
-        patterns = CacheInvalidationRules.USER_CHANGE_PATTERNS
-        for pattern in patterns:
-            invalidate_cache_pattern(pattern)
+        invalidate_cache_tags(*CacheInvalidationRules.USER_CHANGE_TAGS)
     except Exception as e:
         print(f"警告：清除缓存失败: {e}")
 
@@ -122,9 +130,7 @@ def update_user(user_id: int, user_update: UserUpdate,
 
     # 更新用户后失效相关缓存
     try:
-        patterns = CacheInvalidationRules.USER_CHANGE_PATTERNS
-        for pattern in patterns:
-            invalidate_cache_pattern(pattern)
+        invalidate_cache_tags(*CacheInvalidationRules.USER_CHANGE_TAGS)
     except Exception as e:
         print(f"警告：清除缓存失败: {e}")
 
@@ -166,9 +172,7 @@ def delete_user(user_id: int,
 
     # 删除用户后失效相关缓存
     try:
-        patterns = CacheInvalidationRules.USER_CHANGE_PATTERNS
-        for pattern in patterns:
-            invalidate_cache_pattern(pattern)
+        invalidate_cache_tags(*CacheInvalidationRules.USER_CHANGE_TAGS)
     except Exception as e:
         print(f"警告：清除缓存失败: {e}")
 
@@ -347,6 +351,7 @@ def assign_equipment_permission(user_id: int, permission_data: UserEquipmentPerm
         db.add(permission)
         db.commit()
         db.refresh(permission)
+        _invalidate_permission_caches(user_id)
         
         return {"message": "Equipment permission assigned successfully", "permission": permission}
         
@@ -408,6 +413,7 @@ def update_user_equipment_permissions(user_id: int, permissions_data: dict,
             db.add(permission)
         
         db.commit()
+        _invalidate_permission_caches(user_id)
         return {"message": "User equipment permissions updated successfully"}
         
     except ValueError as e:
@@ -430,6 +436,7 @@ def delete_equipment_permission(user_id: int, permission_id: int,
     
     db.delete(permission)
     db.commit()
+    _invalidate_permission_caches(user_id)
     
     return {"message": "Equipment permission deleted successfully"}
 
@@ -0,0 +1,204 @@
+"""
+异步缓存服务
+
+供 async def 接口使用的缓存服务，基于 redis.asyncio 和连接池，缓存读写不阻塞事件循环：
+- 与同步 CacheService 使用相同的键前缀、序列化方式和标签版本号，两条路径互相可见、可互相失效
+- 进程内 L1 / 内存降级层与同步服务共用（纯内存操作，不会阻塞）
+- 批量读写使用 MGET 与 pipeline，一次往返完成
+
+Redis 不可用（启动时同步服务连接失败）时直接使用内存层；
+运行中 Redis 出错时在 retry_interval 秒内不再尝试，避免每个请求都等待超时。
+"""
+
+import logging
+import pickle
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import redis.asyncio as aioredis
+
+from app.core.cache import CacheService, cache_service
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncCacheService:
+    """基于 redis.asyncio 的异步缓存服务"""
+
+    def __init__(self, sync_service: CacheService, max_connections: int = 50,
+                 socket_timeout: float = 1.0, retry_interval: int = 30):
+        """
+        Args:
+            sync_service: 同步缓存服务（共用连接参数、键前缀、L1 和标签版本号）
+            max_connections: 连接池最大连接数
+            socket_timeout: 单次 Redis 操作超时（秒）
+            retry_interval: Redis 出错后暂停使用的时长（秒）
+        """
+        self._sync = sync_service
+        self.max_connections = max_connections
+        self.socket_timeout = socket_timeout
+        self.retry_interval = retry_interval
+        self._client: Optional[aioredis.Redis] = None
+        self._suspended_until = 0.0
+
+    @property
+    def _memory_cache(self):
+        return self._sync._memory_cache
+
+    def _redis(self) -> Optional[aioredis.Redis]:
+        """获取异步客户端（首次使用时在当前事件循环中创建连接池）"""
+        if self._sync.redis_client is None or time.monotonic() < self._suspended_until:
+            return None
+        if self._client is None:
+            kwargs = self._sync.redis_client.connection_pool.connection_kwargs
+            pool = aioredis.ConnectionPool(
+                host=kwargs.get("host", "localhost"),
+                port=kwargs.get("port", 6379),
+                db=kwargs.get("db", 0),
+                password=kwargs.get("password"),
+                max_connections=self.max_connections,
+                socket_connect_timeout=self.socket_timeout,
+                socket_timeout=self.socket_timeout
+            )
+            self._client = aioredis.Redis(connection_pool=pool)
+        return self._client
+
+    def _suspend(self, operation: str, error: Exception) -> None:
+        logger.error(f"异步缓存{operation}失败，{self.retry_interval}秒内改用进程内缓存: {error}")
+        self._suspended_until = time.monotonic() + self.retry_interval
+
+    async def get(self, key: str) -> Optional[Any]:
+        """获取缓存值，不存在返回None"""
+        return (await self.get_many([key]))[0]
+
+    async def get_many(self, keys: Sequence[str]) -> List[Optional[Any]]:
+        """批量获取缓存值（L1 未命中的键一次 MGET）"""
+        if not keys:
+            return []
+        cache_keys = [self._sync._make_key(key) for key in keys]
+        client = self._redis()
+        if client is None:
+            if self._sync.redis_client is not None:
+                # Redis 暂停使用期间只读 L1
+                return [self._memory_cache.get(key) for key in cache_keys]
+            return [self._sync.get(key) for key in keys]
+
+        use_l1 = self._sync._use_l1
+        values = [self._memory_cache.get(key) if use_l1 else None for key in cache_keys]
+        missing = [index for index, value in enumerate(values) if value is None]
+        if not missing:
+            return values
+
+        try:
+            fetched = await client.mget([cache_keys[index] for index in missing])
+        except Exception as e:
+            self._suspend("获取", e)
+            return values
+
+        for index, data in zip(missing, fetched):
+            if data:
+                values[index] = pickle.loads(data)
+                if use_l1:
+                    self._memory_cache.set(cache_keys[index], values[index], self._sync.l1_ttl)
+        return values
+
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
+        """设置缓存值"""
+        return await self.set_many({key: value}, ttl)
+
+    async def set_many(self, items: Dict[str, Any], ttl: Optional[int] = None) -> bool:
+        """批量设置缓存值（pipeline 一次往返）"""
+        if not items:
+            return True
+        ttl = ttl or self._sync.default_ttl
+        client = self._redis()
+        if client is None:
+            if self._sync.redis_client is not None:
+                return False
+            return all([self._sync.set(key, value, ttl) for key, value in items.items()])
+
+        try:
+            pipe = client.pipeline(transaction=False)
+            for key, value in items.items():
+                pipe.setex(self._sync._make_key(key), ttl, pickle.dumps(value))
+            await pipe.execute()
+        except Exception as e:
+            self._suspend("设置", e)
+            return False
+
+        if self._sync._use_l1:
+            for key, value in items.items():
+                self._memory_cache.set(self._sync._make_key(key), value, min(ttl, self._sync.l1_ttl))
+        return True
+
+    async def delete(self, key: str) -> bool:
+        """删除缓存"""
+        cache_key = self._sync._make_key(key)
+        deleted = self._memory_cache.delete(cache_key)
+        client = self._redis()
+        if client is None:
+            return deleted
+        try:
+            return bool(await client.delete(cache_key))
+        except Exception as e:
+            self._suspend("删除", e)
+            return False
+
+    async def get_generations(self, tags: Sequence[str]) -> List[int]:
+        """获取标签的当前版本号（与 CacheService.get_generations 一致）"""
+        if not tags:
+            return []
+        client = self._redis()
+        if client is None:
+            if self._sync.redis_client is not None:
+                # Redis 暂停使用期间无法确认版本号，返回 -1 使缓存键不与任何已有条目重合
+                return [-1] * len(tags)
+            return self._sync.get_generations(tags)
+
+        keys = [self._sync._generation_key(tag) for tag in tags]
+        use_l1 = self._sync._use_l1
+        values = [self._memory_cache.get(key) if use_l1 else None for key in keys]
+        missing = [index for index, value in enumerate(values) if value is None]
+        if missing:
+            try:
+                fetched = await client.mget([keys[index] for index in missing])
+            except Exception as e:
+                self._suspend("获取标签版本", e)
+                return [-1] * len(tags)
+            for index, raw in zip(missing, fetched):
+                values[index] = int(raw) if raw else 0
+                if use_l1:
+                    self._memory_cache.set(keys[index], values[index], self._sync.l1_ttl)
+        return values
+
+    async def bump_generations(self, tags: Iterable[str]) -> int:
+        """递增标签版本号（pipeline 一次往返），返回失效的标签数量"""
+        tags = sorted(set(tags))
+        if not tags:
+            return 0
+        client = self._redis()
+        if client is None:
+            return self._sync.bump_generations(tags)
+
+        try:
+            pipe = client.pipeline(transaction=False)
+            for tag in tags:
+                pipe.incr(self._sync._generation_key(tag))
+            values = await pipe.execute()
+        except Exception as e:
+            self._suspend("标签失效", e)
+            return 0
+        if self._sync._use_l1:
+            for tag, value in zip(tags, values):
+                self._memory_cache.set(self._sync._generation_key(tag), value, self._sync.l1_ttl)
+        return len(tags)
+
+    async def close(self) -> None:
+        """关闭连接池（应用关闭时调用）"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# 全局异步缓存服务实例
+async_cache_service = AsyncCacheService(cache_service)
@@ -0,0 +1,365 @@
+"""
+操作日志批量写入
+
+操作日志不再逐条 add/commit/refresh：create_audit_log、log_audit 默认把日志交给 audit_writer，
+由后台线程每 AUDIT_FLUSH_INTERVAL 秒或缓冲达到 AUDIT_BATCH_SIZE 条时一次多行插入。
+- 日志先追加到本进程的 spool 文件（预写日志）再进入内存缓冲；每次写入时换出当前 spool 文件，
+  这批日志提交后删除该文件。进程崩溃遗留的 spool 文件在下次启动时回放，
+  回放时跳过已写入的日志（提交后、删除文件前崩溃的情况）
+- 等待写入的日志达到 AUDIT_QUEUE_SIZE 条时（如数据库暂时不可用），新日志只追加到溢出 spool 文件，
+  内存占用有上限；之后写入恢复时从文件补写
+- 需要与业务数据在同一事务中持久化的日志（回滚记录、删除前保存的完整旧数据）不经过这里，
+  见 app/crud/audit_logs.py 的 save_audit_log(transactional=True)
+"""
+
+import atexit
+import json
+import logging
+import os
+import re
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Deque, List, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# spool 文件名：写入中 audit-<pid>-<序号>.jsonl、溢出 audit-<pid>-overflow.jsonl、待回放 replay-<pid>-<序号>.jsonl
+_SPOOL_FILE = re.compile(r"^(audit|replay)-(\d+)-(\d+|overflow)\.jsonl$")
+
+# 回放 spool 文件时每次插入的条数
+REPLAY_CHUNK_SIZE = 1000
+
+
+def _encode(values: dict) -> str:
+    return json.dumps({**values, "created_at": values["created_at"].isoformat()}, ensure_ascii=False, default=str)
+
+
+def _decode(line: str) -> dict:
+    values = json.loads(line)
+    values["created_at"] = datetime.fromisoformat(values["created_at"])
+    return values
+
+
+def _utc_naive(value: datetime) -> datetime:
+    """比较用：带时区的时间转换为 UTC 后去掉时区（SQLite 中按 UTC 保存，不带时区）"""
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _process_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    if os.name == "nt":
+        # Windows 上无法用信号探测进程（单进程部署），视为已退出
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+def _remove(path: Path) -> None:
+    try:
+        os.remove(path)
+    except OSError as e:
+        logger.warning(f"删除操作日志 spool 文件失败 {path}: {e}")
+
+
+class AuditWriter:
+    """操作日志写入器：内存缓冲 + spool 文件，后台线程批量插入 audit_logs"""
+
+    def __init__(self, spool_dir: str, batch_size: int = 200, flush_interval: float = 1.0,
+                 max_pending: int = 10000, fsync: bool = False):
+        self.spool_dir = Path(spool_dir)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.fsync = fsync
+
+        self._lock = threading.Lock()          # 保护缓冲和 spool 文件
+        self._flush_lock = threading.Lock()    # 同一时间只有一个线程写入数据库
+        self._start_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._atexit_registered = False
+
+        self._buffer: List[dict] = []
+        self._segment = None                   # 当前 spool 文件
+        self._segment_path: Optional[Path] = None
+        self._sequence = 0
+        # 已换出 spool 文件、等待插入的批次
+        self._batches: Deque[Tuple[Path, List[dict]]] = deque()
+        self._pending = 0
+        self._has_spooled = False              # 有溢出或待回放的 spool 文件
+
+    # ---- 写入 ----
+
+    def submit(self, values: dict) -> None:
+        """
+        登记一条操作日志（audit_logs 的列值，不含 id；created_at 必须已设置）
+
+        日志写入 spool 文件后即返回，由后台线程插入数据库。
+        """
+        if self._thread is None:
+            self.start()
+        line = _encode(values) + "\n"
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._append_overflow(line)
+                return
+            if self._segment is None:
+                self._open_segment()
+            self._segment.write(line)
+            self._segment.flush()
+            if self.fsync:
+                os.fsync(self._segment.fileno())
+            self._buffer.append(values)
+            self._pending += 1
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self._wakeup.set()
+
+    def _next_path(self, kind: str) -> Path:
+        self._sequence += 1
+        return self.spool_dir / f"{kind}-{os.getpid()}-{self._sequence}.jsonl"
+
+    def _open_segment(self) -> None:
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        self._segment_path = self._next_path("audit")
+        self._segment = open(self._segment_path, "a", encoding="utf-8")
+
+    def _overflow_path(self) -> Path:
+        return self.spool_dir / f"audit-{os.getpid()}-overflow.jsonl"
+
+    def _append_overflow(self, line: str) -> None:
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        with open(self._overflow_path(), "a", encoding="utf-8") as file:
+            file.write(line)
+            file.flush()
+            if self.fsync:
+                os.fsync(file.fileno())
+        self._has_spooled = True
+
+    def _rotate(self) -> None:
+        """换出当前 spool 文件（调用方持有 _lock）"""
+        if not self._buffer:
+            return
+        self._segment.close()
+        self._batches.append((self._segment_path, self._buffer))
+        self._segment, self._segment_path, self._buffer = None, None, []
+
+    # ---- 插入数据库 ----
+
+    def flush(self) -> int:
+        """
+        把等待中的日志插入数据库，返回插入条数
+
+        插入失败（如数据库暂时不可用）时日志保留在缓冲和 spool 文件中，下次重试。
+        """
+        with self._flush_lock:
+            with self._lock:
+                self._rotate()
+                batches = list(self._batches)
+
+            written = 0
+            for path, entries in batches:
+                try:
+                    self._write(entries)
+                except Exception as e:
+                    logger.warning(f"写入操作日志失败，稍后重试: {e}")
+                    return written
+                with self._lock:
+                    self._batches.popleft()
+                    self._pending -= len(entries)
+                _remove(path)
+                written += len(entries)
+
+            if self._has_spooled:
+                written += self._replay_spooled()
+            return written
+
+    def _write(self, entries: List[dict], skip_written: bool = False) -> None:
+        """多行插入一批日志（同一事务）"""
+        from sqlalchemy.exc import DataError, IntegrityError
+        from app.db.database import SessionLocal
+        from app.models.models import AuditLog
+
+        table = AuditLog.__table__
+        db = SessionLocal()
+        try:
+            if skip_written:
+                entries = self._unwritten(db, table, entries)
+                if not entries:
+                    return
+            try:
+                db.execute(table.insert(), entries)
+                db.commit()
+            except (IntegrityError, DataError):
+                db.rollback()
+                self._write_rows(db, table, entries)
+        finally:
+            db.close()
+
+    @staticmethod
+    def _write_rows(db, table, entries: List[dict]) -> None:
+        """批量插入违反约束时逐条插入：关联的设备已删除时不再关联设备，其余无法插入的日志记录到应用日志"""
+        from sqlalchemy.exc import DataError, IntegrityError
+
+        for values in entries:
+            attempts = [values]
+            if values.get("equipment_id") is not None:
+                attempts.append({**values, "equipment_id": None})
+            for attempt in attempts:
+                try:
+                    with db.begin_nested():
+                        db.execute(table.insert(), [attempt])
+                    break
+                except (IntegrityError, DataError) as e:
+                    error = e
+            else:
+                logger.error(f"操作日志无法写入，已丢弃: {values.get('action')} {values.get('description')}: {error}")
+        db.commit()
+
+    @staticmethod
+    def _unwritten(db, table, entries: List[dict]) -> List[dict]:
+        """回放时去掉已写入的日志（按 创建时间、用户、操作、描述 比较）"""
+        times = [entry["created_at"] for entry in entries]
+        written = {
+            (_utc_naive(created_at), user_id, action, description)
+            for created_at, user_id, action, description in db.execute(
+                table.select().with_only_columns(
+                    table.c.created_at, table.c.user_id, table.c.action, table.c.description
+                ).where(table.c.created_at >= min(times), table.c.created_at <= max(times))
+            )
+        }
+        return [
+            entry for entry in entries
+            if (_utc_naive(entry["created_at"]), entry["user_id"], entry["action"], entry["description"]) not in written
+        ]
+
+    # ---- spool 文件回放 ----
+
+    def _claim(self, path: Path) -> None:
+        """把 spool 文件改名为本进程的待回放文件（其他进程同时认领时只有一个成功）"""
+        try:
+            os.replace(path, self._next_path("replay"))
+        except OSError:
+            return
+        self._has_spooled = True
+
+    def _replay_spooled(self) -> int:
+        """补写溢出文件和遗留的 spool 文件；缓冲仍有积压时不补写"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                return 0
+            overflow = self._overflow_path()
+            if overflow.exists():
+                self._claim(overflow)
+            pid = str(os.getpid())
+            paths = sorted(
+                (path for path in self.spool_dir.glob("replay-*.jsonl")
+                 if (match := _SPOOL_FILE.match(path.name)) and match.group(2) == pid),
+                key=lambda path: int(_SPOOL_FILE.match(path.name).group(3))
+            )
+
+        written = 0
+        for path in paths:
+            try:
+                written += self._replay_file(path)
+            except Exception as e:
+                logger.warning(f"回放操作日志 spool 文件失败，稍后重试 {path}: {e}")
+                return written
+            _remove(path)
+        with self._lock:
+            self._has_spooled = self._overflow_path().exists()
+        return written
+
+    def _replay_file(self, path: Path) -> int:
+        written = 0
+        chunk = []
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    chunk.append(_decode(line))
+                except ValueError:
+                    # 崩溃时写了一半的行
+                    logger.warning(f"跳过无法解析的操作日志 spool 行: {line[:200]}")
+                    continue
+                if len(chunk) >= REPLAY_CHUNK_SIZE:
+                    self._write(chunk, skip_written=True)
+                    written += len(chunk)
+                    chunk = []
+        if chunk:
+            self._write(chunk, skip_written=True)
+            written += len(chunk)
+        return written
+
+    # ---- 生命周期 ----
+
+    def start(self) -> None:
+        """认领已退出进程遗留的 spool 文件并启动后台写入线程（首次登记日志时自动调用）"""
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            if self.spool_dir.exists():
+                spooled = [(path, _SPOOL_FILE.match(path.name)) for path in self.spool_dir.iterdir()]
+                spooled = [(path, match) for path, match in spooled if match]
+                # 序号从已有文件之后开始，改名时不会覆盖其他文件
+                self._sequence = max(
+                    [int(match.group(3)) for _, match in spooled if match.group(3).isdigit()], default=0
+                )
+                for path, match in spooled:
+                    pid = int(match.group(2))
+                    # 与本进程相同的 pid 来自之前的运行（如容器中的 1 号进程），本进程此时尚未写入
+                    if pid == os.getpid() or not _process_alive(pid):
+                        self._claim(path)
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._thread.start()
+            if not self._atexit_registered:
+                atexit.register(self.shutdown)
+                self._atexit_registered = True
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"操作日志写入线程出错: {e}")
+
+    def shutdown(self, timeout: float = 10.0) -> None:
+        """停止后台线程并写入剩余日志（写入失败的日志留在 spool 文件中，下次启动时回放）"""
+        thread = self._thread
+        if thread is None:
+            return
+        self._stopped.set()
+        self._wakeup.set()
+        thread.join(timeout)
+        self._thread = None
+        self.flush()
+
+
+# 全局操作日志写入器
+audit_writer = AuditWriter(
+    settings.AUDIT_SPOOL_DIR,
+    batch_size=settings.AUDIT_BATCH_SIZE,
+    flush_interval=settings.AUDIT_FLUSH_INTERVAL,
+    max_pending=settings.AUDIT_QUEUE_SIZE,
+    fsync=settings.AUDIT_SPOOL_FSYNC
+)
@@ -4,22 +4,43 @@ Redis缓存服务模块
 提供高性能的API响应缓存功能，支持多种缓存策略和自动失效机制。
 """
 
+import hashlib
+import inspect
 import json
 import pickle
-from typing import Any, Optional, Union, Callable
+import threading
+from typing import Any, Callable, Iterable, List, Optional, Sequence, Union
 from functools import wraps
 import redis
-from datetime import timedelta
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from enum import Enum
 import logging
 
+from pydantic import BaseModel
+from pydantic.fields import FieldInfo
+from sqlalchemy.orm import Session
+
+from app.core.cache_config import cache_metrics
+from app.core.config import settings
+from app.core.memory_cache import MemoryCache
+
 logger = logging.getLogger(__name__)
 
 class CacheService:
-    """Redis缓存服务类"""
+    """
+    Redis缓存服务类
+
+    Redis 可用时：进程内 L1（短 TTL）+ Redis；
+    Redis 不可用时：进程内缓存作为主缓存（有容量上限，按条目 TTL 过期）。
+    """
 
     def __init__(self, host: str = 'localhost', port: int = 6379,
                  db: int = 0, password: Optional[str] = None,
-                 default_ttl: int = 300):
+                 default_ttl: int = 300,
+                 memory_max_entries: int = 10000,
+                 memory_max_bytes: int = 64 * 1024 * 1024,
+                 l1_ttl: int = 5):
         """
         初始化Redis缓存服务
 
@@ -29,9 +50,22 @@ class CacheService:
             db: 数据库编号
             password: Redis密码
             default_ttl: 默认过期时间（秒）
+            memory_max_entries: 进程内缓存最大条目数
+            memory_max_bytes: 进程内缓存字节数上限
+            l1_ttl: Redis 可用时进程内 L1 的过期时间（秒），0 表示不启用 L1；
+                多进程部署时其他进程的失效操作最多延迟该时长生效
         """
         self.default_ttl = default_ttl
         self.key_prefix = "inventory_system:"
+        self.l1_ttl = l1_ttl
+        self._memory_cache = MemoryCache(
+            max_entries=memory_max_entries,
+            max_bytes=memory_max_bytes,
+            default_ttl=default_ttl
+        )
+        # Redis 不可用时的标签版本号（不过期、不淘汰，数量与部门、类别、用户数相当）
+        self._generations = {}
+        self._generations_lock = threading.Lock()
 
         try:
             self.redis_client = redis.Redis(
@@ -50,7 +84,10 @@ class CacheService:
         except Exception as e:
             logger.warning(f"Redis连接失败，将使用内存缓存: {e}")
             self.redis_client = None
-            self._memory_cache = {}
+
+    @property
+    def _use_l1(self) -> bool:
+        return self.redis_client is not None and self.l1_ttl > 0
 
     def _make_key(self, key: str) -> str:
         """生成缓存键"""
@@ -70,9 +107,16 @@ class CacheService:
 
         try:
             if self.redis_client:
+                if self._use_l1:
+                    value = self._memory_cache.get(cache_key)
+                    if value is not None:
+                        return value
                 data = self.redis_client.get(cache_key)
                 if data:
-                    return pickle.loads(data)
+                    value = pickle.loads(data)
+                    if self._use_l1:
+                        self._memory_cache.set(cache_key, value, self.l1_ttl)
+                    return value
             else:
                 # 内存缓存降级
                 return self._memory_cache.get(cache_key)
@@ -99,11 +143,13 @@ class CacheService:
         try:
             if self.redis_client:
                 data = pickle.dumps(value)
-                return self.redis_client.setex(cache_key, ttl, data)
+                result = self.redis_client.setex(cache_key, ttl, data)
+                if self._use_l1:
+                    self._memory_cache.set(cache_key, value, min(ttl, self.l1_ttl))
+                return result
             else:
                 # 内存缓存降级
-                self._memory_cache[cache_key] = value
-                return True
+                return self._memory_cache.set(cache_key, value, ttl)
         except Exception as e:
             logger.error(f"缓存设置失败 {key}: {e}")
             return False
@@ -121,22 +167,35 @@ class CacheService:
         cache_key = self._make_key(key)
 
         try:
+            deleted = self._memory_cache.delete(cache_key)
             if self.redis_client:
                 return bool(self.redis_client.delete(cache_key))
-            else:
-                # 内存缓存降级
-                self._memory_cache.pop(cache_key, None)
-                return True
+            return deleted
         except Exception as e:
             logger.error(f"缓存删除失败 {key}: {e}")
             return False
 
+    def _scan_delete(self, pattern: str) -> int:
+        """按游标分批 SCAN 并删除匹配的键，不阻塞 Redis"""
+        count = 0
+        batch = []
+        for key in self.redis_client.scan_iter(match=pattern, count=500):
+            batch.append(key)
+            if len(batch) >= 500:
+                count += self.redis_client.unlink(*batch)
+                batch = []
+        if batch:
+            count += self.redis_client.unlink(*batch)
+        return count
+
     def delete_pattern(self, pattern: str) -> int:
         """
         批量删除匹配模式的缓存
 
+        需要遍历键空间，业务失效请使用标签（invalidate_cache_tags）。
+
         Args:
-            pattern: 匹配模式
+            pattern: 匹配模式（glob）
 
         Returns:
             删除的键数量
@@ -144,18 +203,10 @@ class CacheService:
         pattern = self._make_key(pattern)
 
         try:
+            count = self._memory_cache.delete_pattern(pattern)
             if self.redis_client:
-                keys = self.redis_client.keys(pattern)
-                if keys:
-                    return self.redis_client.delete(*keys)
-            else:
-                # 内存缓存降级
-                count = 0
-                keys_to_delete = [k for k in self._memory_cache.keys() if pattern.replace('*', '') in k]
-                for key in keys_to_delete:
-                    self._memory_cache.pop(key, None)
-                    count += 1
-                return count
+                return self._scan_delete(pattern)
+            return count
         except Exception as e:
             logger.error(f"批量缓存删除失败 {pattern}: {e}")
 
@@ -164,19 +215,79 @@ class CacheService:
     def clear_all(self) -> bool:
         """清空所有缓存"""
         try:
+            self._memory_cache.clear()
             if self.redis_client:
-                pattern = self._make_key("*")
-                keys = self.redis_client.keys(pattern)
-                if keys:
-                    self.redis_client.delete(*keys)
+                self._scan_delete(self._make_key("*"))
             else:
-                self._memory_cache.clear()
+                with self._generations_lock:
+                    self._generations.clear()
             logger.info("所有缓存已清空")
             return True
         except Exception as e:
             logger.error(f"清空缓存失败: {e}")
             return False
 
+    def _generation_key(self, tag: str) -> str:
+        return self._make_key(f"tag:{tag}")
+
+    def get_generations(self, tags: Sequence[str]) -> List[int]:
+        """
+        获取标签的当前版本号（一次 MGET），从未失效过的标签为 0
+
+        Redis 可用时版本号在 L1 中缓存 l1_ttl 秒。
+        """
+        if not tags:
+            return []
+        if not self.redis_client:
+            with self._generations_lock:
+                return [self._generations.get(tag, 0) for tag in tags]
+
+        keys = [self._generation_key(tag) for tag in tags]
+        values = [self._memory_cache.get(key) if self._use_l1 else None for key in keys]
+        missing = [index for index, value in enumerate(values) if value is None]
+        if missing:
+            try:
+                fetched = self.redis_client.mget([keys[index] for index in missing])
+            except Exception as e:
+                logger.error(f"获取缓存标签版本失败: {e}")
+                fetched = [None] * len(missing)
+            for index, raw in zip(missing, fetched):
+                values[index] = int(raw) if raw else 0
+                if self._use_l1:
+                    self._memory_cache.set(keys[index], values[index], self.l1_ttl)
+        return values
+
+    def bump_generations(self, tags: Iterable[str]) -> int:
+        """
+        递增标签版本号，使登记在这些标签下的缓存全部失效
+
+        Redis 中的版本号不设过期时间（过期后归零会让旧条目重新可见）。
+
+        Returns:
+            失效的标签数量
+        """
+        tags = sorted(set(tags))
+        if not tags:
+            return 0
+        if not self.redis_client:
+            with self._generations_lock:
+                for tag in tags:
+                    self._generations[tag] = self._generations.get(tag, 0) + 1
+            return len(tags)
+
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for tag in tags:
+                pipe.incr(self._generation_key(tag))
+            values = pipe.execute()
+        except Exception as e:
+            logger.error(f"缓存标签失效失败 {tags}: {e}")
+            return 0
+        if self._use_l1:
+            for tag, value in zip(tags, values):
+                self._memory_cache.set(self._generation_key(tag), value, self.l1_ttl)
+        return len(tags)
+
     def exists(self, key: str) -> bool:
         """
         检查缓存是否存在
@@ -214,87 +325,224 @@ class CacheService:
             if self.redis_client:
                 return self.redis_client.ttl(cache_key)
             else:
-                # 内存缓存无法获取TTL，返回默认值
-                return -1 if cache_key in self._memory_cache else -2
+                return self._memory_cache.ttl(cache_key)
         except Exception as e:
             logger.error(f"获取TTL失败 {key}: {e}")
             return -2
 
 # 全局缓存服务实例
-cache_service = CacheService()
+cache_service = CacheService(
+    memory_max_entries=settings.CACHE_MEMORY_MAX_ENTRIES,
+    memory_max_bytes=settings.CACHE_MEMORY_MAX_BYTES,
+    l1_ttl=settings.CACHE_L1_TTL
+)
+
+# 缓存键中参数部分超过该长度时改用摘要
+MAX_KEY_PARAMS_LENGTH = 200
+
+
+class UncacheableArgument(TypeError):
+    """参数无法稳定地序列化为缓存键（此次调用不走缓存）"""
+
+
+def _is_session(value: Any) -> bool:
+    return isinstance(value, Session)
+
+
+def _is_user(value: Any) -> bool:
+    """当前登录用户（ORM User 对象）"""
+    return hasattr(value, "is_admin") and hasattr(value, "id") and hasattr(value, "_sa_instance_state")
+
 
-def cache_key_generator(*args, **kwargs) -> str:
+def _parameter_default(parameter: inspect.Parameter) -> Any:
+    default = parameter.default
+    # FastAPI 的 Query(...) / Body(...) 等默认值
+    if isinstance(default, FieldInfo):
+        return default.default
+    return default
+
+
+def normalize_cache_value(value: Any) -> Any:
     """
-    生成缓存键的辅助函数
+    将参数值规范化为可稳定序列化的结构
 
-    Args:
-        *args: 位置参数
-        **kwargs: 关键字参数
+    Pydantic 模型展开为字段字典（去掉空值），日期转为 ISO 字符串，枚举取值；
+    其他无法稳定表示的对象（其 str() 通常包含内存地址）抛出 UncacheableArgument。
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, Enum):
+        return normalize_cache_value(value.value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, BaseModel):
+        value = value.model_dump(mode="json", exclude_none=True)
+    if isinstance(value, dict):
+        return {
+            str(key): normalize_cache_value(item)
+            for key, item in sorted(value.items(), key=lambda pair: str(pair[0]))
+            if item is not None
+        }
+    if isinstance(value, (list, tuple)):
+        return [normalize_cache_value(item) for item in value]
+    if isinstance(value, (set, frozenset)):
+        return sorted((normalize_cache_value(item) for item in value), key=repr)
+    raise UncacheableArgument(f"无法作为缓存键的参数类型: {type(value).__name__}")
+
+
+def user_scope(db: Optional[Session], user) -> str:
+    """
+    用户的缓存范围
 
-    Returns:
-        缓存键字符串
+    管理员为 "admin"，普通用户为器具权限集合的指纹（权限相同的用户共享缓存）。
     """
-    # 过滤掉不需要的参数（如Session对象）
-    filtered_kwargs = {k: v for k, v in kwargs.items()
-                       if not hasattr(v, '__class__') or 'Session' not in str(type(v))}
+    if user is None:
+        return "anonymous"
+    if db is None:
+        return "admin" if user.is_admin else f"user-{user.id}"
 
-    # 生成键的组成部分
-    key_parts = []
+    from app.crud.permission_scope import permission_fingerprint
+    return permission_fingerprint(db, user.id, user.is_admin)
 
-    # 添加函数名
-    if args and hasattr(args[0], '__name__'):
-        key_parts.append(args[0].__name__)
 
-    # 添加位置参数（过滤掉特殊对象）
-    for arg in args[1:]:
-        if not hasattr(arg, '__class__') or 'Session' not in str(type(arg)):
-            key_parts.append(str(arg))
+def _call_context(func: Callable, args: tuple, kwargs: dict):
+    """绑定调用参数，取出数据库会话和当前用户"""
+    bound = inspect.signature(func).bind_partial(*args, **kwargs)
+    db = next((value for value in bound.arguments.values() if _is_session(value)), None)
+    user = next((value for value in bound.arguments.values() if _is_user(value)), None)
+    return bound, db, user
+
+
+def build_cache_key(func: Callable, args: tuple, kwargs: dict) -> str:
+    """
+    根据函数签名生成缓存键：<函数>:<用户范围>:<规范化参数>
+
+    - 数据库会话不参与缓存键
+    - 当前用户替换为权限范围指纹
+    - 与默认值相同的参数、值为 None 的参数省略，?skip=0 与不传 skip 命中同一缓存
+    - 参数部分过长时使用 SHA-1 摘要
+
+    Raises:
+        UncacheableArgument: 存在无法稳定序列化的参数
+    """
+    bound, db, user = _call_context(func, args, kwargs)
+    parameters = bound.signature.parameters
 
-    # 添加关键字参数
-    if filtered_kwargs:
-        sorted_items = sorted(filtered_kwargs.items())
-        key_parts.extend(f"{k}={v}" for k, v in sorted_items)
+    params = {}
+    for name, value in bound.arguments.items():
+        if _is_session(value) or _is_user(value):
+            continue
+        if value is None or value == _parameter_default(parameters[name]):
+            continue
+        params[name] = normalize_cache_value(value)
+
+    params_part = json.dumps(params, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    if len(params_part) > MAX_KEY_PARAMS_LENGTH:
+        params_part = hashlib.sha1(params_part.encode("utf-8")).hexdigest()
+
+    return f"{func.__module__}.{func.__qualname__}:{user_scope(db, user)}:{params_part}"
+
+
+def resolve_cache_tags(tags: Sequence[Union[str, Callable]], db: Optional[Session], user) -> List[str]:
+    """
+    展开缓存标签
+
+    tags 中的字符串原样使用；可调用对象以 (db, current_user) 调用，返回该次调用依赖的标签
+    （如 permission_scope.equipment_scope_tags 按用户权限范围返回类别标签）。
+    """
+    resolved = set()
+    for tag in tags:
+        if callable(tag):
+            resolved.update(tag(db, user))
+        else:
+            resolved.add(tag)
+    return sorted(resolved)
+
+
+def _version_digest(tags: Sequence[str], generations: Sequence[int]) -> str:
+    if not tags:
+        return "v0"
+    raw = ",".join(f"{tag}={generation}" for tag, generation in zip(tags, generations))
+    return "v" + hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+
+
+def tag_version(tags: Sequence[str]) -> str:
+    """标签当前版本号的摘要，任一标签失效后摘要改变"""
+    return _version_digest(tags, cache_service.get_generations(tags))
 
-    return ":".join(key_parts)
 
 def cached(ttl: int = 300, key_prefix: str = "",
-          cache_key_func: Optional[Callable] = None):
+          cache_key_func: Optional[Callable] = None,
+          tags: Optional[Sequence[Union[str, Callable]]] = None):
     """
     缓存装饰器
 
+    缓存键由 build_cache_key 生成，按用户权限范围隔离；
+    指定 tags 时键中附带标签版本号，由 invalidate_cache_tags 失效。
+    命中、未命中、写入次数记录在 cache_metrics 中。
+
+    装饰 async def 函数时使用异步缓存服务（redis.asyncio），缓存读写不阻塞事件循环；
+    生成缓存键时可能查询权限（同步数据库会话），放到线程池中执行。
+
     Args:
         ttl: 缓存过期时间（秒）
         key_prefix: 缓存键前缀
-        cache_key_func: 自定义缓存键生成函数
+        cache_key_func: 自定义缓存键生成函数，参数与被装饰函数相同
+        tags: 缓存标签（见 CacheTag），元素为标签字符串或 (db, current_user) -> 标签列表 的函数
 
     Returns:
         装饰器函数
     """
+    def resolve_key(func: Callable, args: tuple, kwargs: dict):
+        """返回 (不含标签版本的缓存键, 标签列表)"""
+        if cache_key_func:
+            cache_key = cache_key_func(*args, **kwargs)
+        else:
+            cache_key = build_cache_key(func, args, kwargs)
+        resolved_tags = []
+        if tags:
+            _, db, user = _call_context(func, args, kwargs)
+            resolved_tags = resolve_cache_tags(tags, db, user)
+        return cache_key, resolved_tags
+
+    def full_key(cache_key: str, resolved_tags: Sequence[str], generations: Sequence[int]) -> str:
+        if tags:
+            cache_key = f"{cache_key}:{_version_digest(resolved_tags, generations)}"
+        if key_prefix:
+            cache_key = f"{key_prefix}:{cache_key}"
+        return cache_key
+
     def decorator(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+            return _async_cached(func)
+
         @wraps(func)
         def wrapper(*args, **kwargs):
             # 生成缓存键
-            if cache_key_func:
-                cache_key = cache_key_func(*args, **kwargs)
-            else:
-                cache_key = cache_key_generator(func, *args, **kwargs)
-
-            if key_prefix:
-                cache_key = f"{key_prefix}:{cache_key}"
+            try:
+                cache_key, resolved_tags = resolve_key(func, args, kwargs)
+            except UncacheableArgument as e:
+                logger.debug(f"跳过缓存 {func.__name__}: {e}")
+                return func(*args, **kwargs)
+            cache_key = full_key(cache_key, resolved_tags, cache_service.get_generations(resolved_tags))
 
             # 尝试从缓存获取
             cached_result = cache_service.get(cache_key)
             if cached_result is not None:
+                cache_metrics.record_hit()
                 logger.debug(f"缓存命中: {cache_key}")
                 return cached_result
+            cache_metrics.record_miss()
 
             # 执行原函数
             try:
                 result = func(*args, **kwargs)
 
                 # 存入缓存
-                if result is not None:
-                    cache_service.set(cache_key, result, ttl)
+                if result is not None and cache_service.set(cache_key, result, ttl):
+                    cache_metrics.record_set()
                     logger.debug(f"缓存设置: {cache_key}, TTL: {ttl}s")
 
                 return result
@@ -304,11 +552,63 @@ def cached(ttl: int = 300, key_prefix: str = "",
                 raise
 
         return wrapper
+
+    def _async_cached(func: Callable) -> Callable:
+        from starlette.concurrency import run_in_threadpool
+        from app.core.async_cache import async_cache_service
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            try:
+                cache_key, resolved_tags = await run_in_threadpool(resolve_key, func, args, kwargs)
+            except UncacheableArgument as e:
+                logger.debug(f"跳过缓存 {func.__name__}: {e}")
+                return await func(*args, **kwargs)
+            generations = await async_cache_service.get_generations(resolved_tags)
+            cache_key = full_key(cache_key, resolved_tags, generations)
+
+            cached_result = await async_cache_service.get(cache_key)
+            if cached_result is not None:
+                cache_metrics.record_hit()
+                logger.debug(f"缓存命中: {cache_key}")
+                return cached_result
+            cache_metrics.record_miss()
+
+            try:
+                result = await func(*args, **kwargs)
+
+                if result is not None and await async_cache_service.set(cache_key, result, ttl):
+                    cache_metrics.record_set()
+                    logger.debug(f"缓存设置: {cache_key}, TTL: {ttl}s")
+
+                return result
+
+            except Exception as e:
+                logger.error(f"函数执行失败，跳过缓存: {func.__name__}: {e}")
+                raise
+
+        return wrapper
+
     return decorator
 
+def invalidate_cache_tags(*tags: str) -> int:
+    """
+    失效登记在指定标签下的缓存（递增标签版本号，不扫描键空间）
+
+    Args:
+        tags: 缓存标签（见 CacheTag）
+
+    Returns:
+        失效的标签数量
+    """
+    count = cache_service.bump_generations(tags)
+    if count:
+        cache_metrics.record_delete(count)
+    return count
+
 def invalidate_cache_pattern(pattern: str) -> bool:
     """
-    失效匹配模式的缓存
+    失效匹配模式的缓存（SCAN 遍历键空间，业务失效请使用 invalidate_cache_tags）
 
     Args:
         pattern: 缓存键模式
@@ -316,7 +616,10 @@ def invalidate_cache_pattern(pattern: str) -> bool:
     Returns:
         是否成功
     """
-    return cache_service.delete_pattern(pattern)
+    deleted = cache_service.delete_pattern(pattern)
+    if deleted:
+        cache_metrics.record_delete(deleted)
+    return deleted
 
 def get_cache_stats() -> dict:
     """
@@ -330,6 +633,7 @@ def get_cache_stats() -> dict:
             info = cache_service.redis_client.info()
             return {
                 "redis_connected": True,
+                "l1_cache": cache_service._memory_cache.stats(),
                 "used_memory": info.get("used_memory_human", "N/A"),
                 "connected_clients": info.get("connected_clients", "N/A"),
                 "total_commands_processed": info.get("total_commands_processed", "N/A"),
@@ -341,6 +645,7 @@ def get_cache_stats() -> dict:
                 "redis_connected": False,
                 "cache_type": "memory",
                 "cached_keys": len(cache_service._memory_cache),
+                **cache_service._memory_cache.stats(),
             }
     except Exception as e:
         logger.error(f"获取缓存统计失败: {e}")
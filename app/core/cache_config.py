@@ -25,6 +25,7 @@ class CacheKeyPrefix:
     STATS = "stats"
     REPORTS = "reports"
     SYSTEM = "system"
+    AUDIT = "audit"
 
 class CacheConfig:
     """缓存配置类"""
@@ -97,6 +98,18 @@ class CacheConfig:
             "prefix": CacheKeyPrefix.EQUIPMENT,
             "description": "设备搜索结果"
         },
+        "equipment_page_count": {
+            "strategy": CacheStrategy.VERY_SHORT,
+            "prefix": CacheKeyPrefix.STATS,
+            "description": "设备分页查询总数（按筛选条件指纹缓存）"
+        },
+
+        # 操作日志
+        "audit_log_page_count": {
+            "strategy": CacheStrategy.VERY_SHORT,
+            "prefix": CacheKeyPrefix.AUDIT,
+            "description": "操作日志分页查询总数（按筛选条件指纹缓存）"
+        },
 
         # 用户管理
         "users_list": {
@@ -111,6 +124,11 @@ class CacheConfig:
         },
 
         # 统计报表
+        "reports_overview": {
+            "strategy": CacheStrategy.SHORT,
+            "prefix": CacheKeyPrefix.REPORTS,
+            "description": "报表概览"
+        },
         "reports_equipment_stats": {
             "strategy": CacheStrategy.MEDIUM,
             "prefix": CacheKeyPrefix.REPORTS,
@@ -166,50 +184,87 @@ class CacheConfig:
         """获取所有缓存配置"""
         return cls.API_CACHE_CONFIG.copy()
 
+class CacheTag:
+    """
+    缓存标签
+
+    缓存条目登记在若干标签下，键中包含这些标签的版本号；
+    失效某个标签只需递增其版本号，旧条目不再被读取并随 TTL 过期，无需扫描键空间。
+    """
+    EQUIPMENT = "equipment"        # 全部设备（管理员视角的列表、统计）
+    DEPARTMENTS = "departments"    # 部门信息（部门列表、设备列表中的部门名称）
+    CATEGORIES = "categories"      # 类别信息（类别列表、设备列表中的类别名称）
+    USERS = "users"                # 用户信息
+
+    @staticmethod
+    def department(department_id: int) -> str:
+        """某个部门的设备"""
+        return f"department:{department_id}"
+
+    @staticmethod
+    def category(category_id: int) -> str:
+        """某个类别的设备（非管理员按器具权限所在类别登记）"""
+        return f"category:{category_id}"
+
+    @staticmethod
+    def type_codes(category_id: int) -> str:
+        """某个类别的器具类型编号（该类别出现新器具名称、删除设备或修改设备名称时失效）"""
+        return f"type_codes:{category_id}"
+
+    @staticmethod
+    def user(user_id: int) -> str:
+        """某个用户的信息"""
+        return f"user:{user_id}"
+
+    @classmethod
+    def for_equipment(cls, department_id: int, category_id: int) -> list:
+        """设备变更时需要失效的标签"""
+        return [cls.EQUIPMENT, cls.department(department_id), cls.category(category_id)]
+
 class CacheInvalidationRules:
     """缓存失效规则"""
 
-    # 设备相关变更时需要失效的缓存模式
-    EQUIPMENT_CHANGE_PATTERNS = [
-        "dashboard:*",
-        "equipment:*",
-        "stats:*",
-        "reports:*"
+    # 全部设备相关缓存（手动清空用；设备写入由会话提交钩子按部门、类别精确失效，见 app/crud/cache_invalidation.py）
+    # 按权限范围缓存的设备数据都登记在部门、类别信息标签下
+    EQUIPMENT_CHANGE_TAGS = [
+        CacheTag.EQUIPMENT,
+        CacheTag.DEPARTMENTS,
+        CacheTag.CATEGORIES
+    ]
+
+    # 部门相关变更时需要失效的标签（设备列表、统计中包含部门名称）
+    DEPARTMENT_CHANGE_TAGS = [
+        CacheTag.DEPARTMENTS,
+        CacheTag.EQUIPMENT
     ]
 
-    # 部门相关变更时需要失效的缓存模式
-    DEPARTMENT_CHANGE_PATTERNS = [
-        "departments:*",
-        "dashboard:*",
-        "equipment:*",
-        "stats:*"
+    # 类别相关变更时需要失效的标签
+    CATEGORY_CHANGE_TAGS = [
+        CacheTag.CATEGORIES,
+        CacheTag.EQUIPMENT
     ]
 
-    # 类别相关变更时需要失效的缓存模式
-    CATEGORY_CHANGE_PATTERNS = [
-        "categories:*",
-        "dashboard:*",
-        "equipment:*",
-        "stats:*"
+    # 用户相关变更时需要失效的标签
+    USER_CHANGE_TAGS = [
+        CacheTag.USERS
     ]
 
-    # 用户相关变更时需要失效的缓存模式
-    USER_CHANGE_PATTERNS = [
-        "users:*",
-        "dashboard:*",
-        "stats:*"
+    # 器具权限变更时需要失效的标签（按权限范围缓存的条目键中带有权限指纹，权限变化后自然换键）
+    PERMISSION_CHANGE_TAGS = [
+        CacheTag.USERS
     ]
 
     @classmethod
-    def get_invalidation_patterns(cls, entity_type: str) -> list:
-        """根据实体类型获取需要失效的缓存模式"""
-        patterns_map = {
-            "equipment": cls.EQUIPMENT_CHANGE_PATTERNS,
-            "department": cls.DEPARTMENT_CHANGE_PATTERNS,
-            "category": cls.CATEGORY_CHANGE_PATTERNS,
-            "user": cls.USER_CHANGE_PATTERNS
+    def get_invalidation_tags(cls, entity_type: str) -> list:
+        """根据实体类型获取需要失效的标签"""
+        tags_map = {
+            "equipment": cls.EQUIPMENT_CHANGE_TAGS,
+            "department": cls.DEPARTMENT_CHANGE_TAGS,
+            "category": cls.CATEGORY_CHANGE_TAGS,
+            "user": cls.USER_CHANGE_TAGS,
+            "permission": cls.PERMISSION_CHANGE_TAGS
         }
-        return patterns_map.get(entity_type, [])
+        return tags_map.get(entity_type, [])
 
 class CacheMetrics:
     """缓存指标统计"""
@@ -232,9 +287,9 @@ class CacheMetrics:
         """记录缓存设置"""
         self.sets += 1
 
-    def record_delete(self):
+    def record_delete(self, count: int = 1):
         """记录缓存删除"""
-        self.deletes += 1
+        self.deletes += count
 
     def get_hit_rate(self) -> float:
         """获取命中率"""
@@ -12,5 +12,44 @@ class Settings:
     # 管理员默认账户
     ADMIN_USERNAME: str = os.getenv("ADMIN_USERNAME", "admin")
     ADMIN_PASSWORD: str = os.getenv("ADMIN_PASSWORD", "admin123")
+    
+    # 进程内缓存配置（Redis 不可用时的主缓存 / Redis 前的 L1）
+    CACHE_MEMORY_MAX_ENTRIES: int = int(os.getenv("CACHE_MEMORY_MAX_ENTRIES", "10000"))
+    CACHE_MEMORY_MAX_BYTES: int = int(os.getenv("CACHE_MEMORY_MAX_BYTES", str(64 * 1024 * 1024)))
+    CACHE_L1_TTL: int = int(os.getenv("CACHE_L1_TTL", "5"))
+
+    # 后台导入任务配置
+    IMPORT_WORKER_THREADS: int = int(os.getenv("IMPORT_WORKER_THREADS", "2"))
+    IMPORT_PROGRESS_FLUSH_INTERVAL: float = float(os.getenv("IMPORT_PROGRESS_FLUSH_INTERVAL", "2"))
+    # 导入文件每次读取并校验的最少行数（写入仍按会话的 batch_size 分批）
+    IMPORT_READ_CHUNK_ROWS: int = int(os.getenv("IMPORT_READ_CHUNK_ROWS", "1000"))
+    # 执行中的导入任务刷新心跳的间隔；超过 IMPORT_STALE_SECONDS 未刷新的会话视为已中断，可继续导入
+    IMPORT_HEARTBEAT_INTERVAL: float = float(os.getenv("IMPORT_HEARTBEAT_INTERVAL", "10"))
+    IMPORT_STALE_SECONDS: int = int(os.getenv("IMPORT_STALE_SECONDS", "60"))
+    # 导入会话中保留的失败行样本数（全部逐行结果在 import_row_results 表中分页查询）
+    IMPORT_ERROR_SAMPLE_SIZE: int = int(os.getenv("IMPORT_ERROR_SAMPLE_SIZE", "100"))
+    # 试运行导入生成的差异表保留时长
+    IMPORT_PREVIEW_RETENTION_SECONDS: int = int(os.getenv("IMPORT_PREVIEW_RETENTION_SECONDS", "3600"))
+
+    # 后台导出任务配置
+    EXPORT_WORKER_THREADS: int = int(os.getenv("EXPORT_WORKER_THREADS", "2"))
+    # 导出文件保留时长（被复用时重新计时）；超过 EXPORT_JOB_TIMEOUT_SECONDS 仍未完成的任务视为已中断
+    EXPORT_RETENTION_SECONDS: int = int(os.getenv("EXPORT_RETENTION_SECONDS", "86400"))
+    EXPORT_JOB_TIMEOUT_SECONDS: int = int(os.getenv("EXPORT_JOB_TIMEOUT_SECONDS", "1800"))
+
+    # 操作日志写入配置：关闭 AUDIT_ASYNC_WRITES 时每条日志单独提交
+    AUDIT_ASYNC_WRITES: bool = os.getenv("AUDIT_ASYNC_WRITES", "true").lower() in ("1", "true", "yes")
+    AUDIT_BATCH_SIZE: int = int(os.getenv("AUDIT_BATCH_SIZE", "200"))
+    AUDIT_FLUSH_INTERVAL: float = float(os.getenv("AUDIT_FLUSH_INTERVAL", "1"))
+    # 等待写入的日志上限；超过时（如数据库暂时不可用）日志只写入 spool 文件，恢复后补写
+    AUDIT_QUEUE_SIZE: int = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+    AUDIT_SPOOL_DIR: str = os.getenv("AUDIT_SPOOL_DIR", "data/audit_spool")
+    # 每条日志写入 spool 文件后 fsync（断电也不丢日志，写入变慢）
+    AUDIT_SPOOL_FSYNC: bool = os.getenv("AUDIT_SPOOL_FSYNC", "false").lower() in ("1", "true", "yes")
+    # 操作日志归档：audit_logs 只保留最近 AUDIT_HOT_MONTHS 个月（含本月），更早的按月移入归档库
+    # （已归档的日志不能回滚）；设为 0 关闭归档
+    AUDIT_ARCHIVE_DIR: str = os.getenv("AUDIT_ARCHIVE_DIR", "data/audit_archive")
+    AUDIT_HOT_MONTHS: int = int(os.getenv("AUDIT_HOT_MONTHS", "3"))
+    AUDIT_ARCHIVE_INTERVAL: int = int(os.getenv("AUDIT_ARCHIVE_INTERVAL", "86400"))
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
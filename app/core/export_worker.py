@@ -0,0 +1,52 @@
+"""
+后台导出任务
+
+导出任务提交到独立的线程池执行，不占用 HTTP 请求和导入任务的线程；
+任务状态保存在 export_jobs 表中（多进程部署时任何进程都可以查询），这里只负责调度。
+"""
+
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ExportWorker:
+    """导出任务线程池，按导出任务ID登记任务"""
+
+    def __init__(self, max_workers: int = 2):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="export-worker")
+        self._futures: Dict[int, Future] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, job_id: int, runner: Callable[[], None]) -> Future:
+        """提交导出任务；同一任务已在队列或执行中时返回已有的 Future"""
+        with self._lock:
+            existing = self._futures.get(job_id)
+            if existing is not None and not existing.done():
+                return existing
+            future = self._executor.submit(self._run, job_id, runner)
+            self._futures[job_id] = future
+            return future
+
+    def _run(self, job_id: int, runner: Callable[[], None]) -> None:
+        try:
+            runner()
+        except Exception as e:
+            logger.error(f"导出任务 {job_id} 执行失败: {e}")
+            raise
+        finally:
+            with self._lock:
+                self._futures.pop(job_id, None)
+
+    def shutdown(self) -> None:
+        """应用关闭时停止接收新任务；排队中的任务超时后标记为失败"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# 全局导出任务池
+export_worker = ExportWorker(max_workers=settings.EXPORT_WORKER_THREADS)
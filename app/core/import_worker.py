@@ -0,0 +1,366 @@
+"""
+后台导入任务
+
+导入不再在 HTTP 请求内执行，而是提交到线程池，按 ImportSession.id 登记任务：
+- 进度保存在内存中（ImportJob），按 IMPORT_PROGRESS_FLUSH_INTERVAL 限速写回 import_sessions 表，
+  不再每处理几行就提交一次
+- 进度变化时通知订阅者（SSE 接口），客户端无需轮询会话详情
+- 暂停、恢复、取消接口直接控制任务：任务在每批之间调用 checkpoint()，
+  暂停时在此等待，取消时抛出 ImportCancelled
+- 多进程部署时控制请求可能落在其他进程，任务写回进度时同时读取会话状态，
+  数据库中的暂停、取消同样生效
+- 任务池定期刷新所持会话的 heartbeat_at；进程退出后心跳停止，会话可由恢复接口从断点继续
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 任务状态（与 ImportStatus 取值一致）
+PROCESSING = "processing"
+PAUSED = "paused"
+CANCELLED = "cancelled"
+COMPLETED = "completed"
+FAILED = "failed"
+
+FINISHED_STATES = (CANCELLED, COMPLETED, FAILED)
+
+# 暂停期间检查数据库中会话状态的间隔（秒）
+PAUSE_POLL_INTERVAL = 2.0
+
+
+class ImportCancelled(Exception):
+    """导入任务已被取消"""
+
+
+class ImportJob:
+    """单个导入任务的内存状态"""
+
+    def __init__(self, session_id: int, total_rows: int = 0, flush_interval: float = 2.0):
+        self.session_id = session_id
+        self.state = PROCESSING
+        self.total_rows = total_rows
+        self.processed_rows = 0
+        self.success_count = 0
+        self.update_count = 0
+        self.skip_count = 0
+        self.error_count = 0
+        self.error_message: Optional[str] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.future: Optional[Future] = None
+        self.version = 0
+
+        self.flush_interval = flush_interval
+        self._last_flush = 0.0
+        self._lock = threading.Lock()
+        self._running = threading.Event()
+        self._running.set()
+        self._subscribers: List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = []
+
+    # ========== 进度 ==========
+
+    @property
+    def progress(self) -> int:
+        if self.total_rows <= 0:
+            return 100 if self.state == COMPLETED else 0
+        return min(100, int(self.processed_rows / self.total_rows * 100))
+
+    @property
+    def finished(self) -> bool:
+        return self.state in FINISHED_STATES
+
+    def snapshot(self) -> Dict[str, Any]:
+        """当前进度（SSE 推送和进度接口的返回内容）"""
+        return {
+            "session_id": self.session_id,
+            "status": self.state,
+            "progress": self.progress,
+            "total_rows": self.total_rows,
+            "processed_rows": self.processed_rows,
+            "success_count": self.success_count,
+            "update_count": self.update_count,
+            "skip_count": self.skip_count,
+            "error_count": self.error_count,
+            "error_message": self.error_message,
+        }
+
+    def update(self, **counters: int) -> None:
+        """更新内存中的进度并通知订阅者，按限速写回数据库"""
+        with self._lock:
+            for name, value in counters.items():
+                setattr(self, name, value)
+            self.version += 1
+        self._notify()
+
+        now = time.monotonic()
+        if now - self._last_flush >= self.flush_interval:
+            self._last_flush = now
+            self.flush()
+
+    def flush(self) -> None:
+        """将进度写回导入会话，并同步其他进程对会话状态的修改"""
+        from app.db.database import SessionLocal
+        from app.models.import_session import ImportSession, ImportStatus
+
+        db = SessionLocal()
+        try:
+            session = db.query(ImportSession).filter(ImportSession.id == self.session_id).first()
+            if session is None:
+                return
+            session.total_rows = self.total_rows
+            session.processed_rows = self.processed_rows
+            session.success_count = self.success_count
+            session.update_count = self.update_count
+            session.error_count = self.error_count
+            session.progress = self.progress
+            db_status = ImportStatus(session.status).value
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"导入会话 {self.session_id} 进度写回失败: {e}")
+            return
+        finally:
+            db.close()
+
+        if db_status == CANCELLED and self.state != CANCELLED:
+            self.cancel()
+        elif db_status == PAUSED and self.state == PROCESSING:
+            self.pause()
+
+    # ========== 控制 ==========
+
+    def pause(self) -> None:
+        if self.finished:
+            return
+        self._running.clear()
+        self._set_state(PAUSED)
+
+    def resume(self) -> None:
+        if self.finished:
+            return
+        self._set_state(PROCESSING)
+        self._running.set()
+
+    def cancel(self) -> None:
+        if self.finished:
+            return
+        self._set_state(CANCELLED)
+        self._running.set()
+
+    def checkpoint(self) -> None:
+        """
+        任务在每批之间调用：暂停时在此等待恢复，已取消时抛出 ImportCancelled
+
+        暂停期间定期读取数据库中的会话状态，使其他进程的恢复、取消请求也能生效。
+        """
+        while not self._running.wait(PAUSE_POLL_INTERVAL):
+            self._sync_paused_state()
+        if self.state == CANCELLED:
+            raise ImportCancelled()
+
+    def _sync_paused_state(self) -> None:
+        from app.db.database import SessionLocal
+        from app.models.import_session import ImportSession, ImportStatus
+
+        db = SessionLocal()
+        try:
+            status = db.query(ImportSession.status).filter(ImportSession.id == self.session_id).scalar()
+        except Exception as e:
+            logger.warning(f"读取导入会话 {self.session_id} 状态失败: {e}")
+            return
+        finally:
+            db.close()
+
+        if status is None or ImportStatus(status).value == CANCELLED:
+            self.cancel()
+        elif ImportStatus(status).value == PROCESSING:
+            self.resume()
+
+    def finish(self, state: str, result: Optional[Dict[str, Any]] = None,
+               error_message: Optional[str] = None) -> None:
+        self.result = result
+        self.error_message = error_message
+        self._set_state(state)
+        self._running.set()
+
+    def _set_state(self, state: str) -> None:
+        with self._lock:
+            self.state = state
+            self.version += 1
+        self._notify()
+
+    # ========== 订阅 ==========
+
+    def subscribe(self) -> asyncio.Event:
+        """在当前事件循环中订阅进度变化（返回的 Event 在进度变化时被置位）"""
+        event = asyncio.Event()
+        with self._lock:
+            self._subscribers.append((asyncio.get_running_loop(), event))
+        return event
+
+    def unsubscribe(self, event: asyncio.Event) -> None:
+        with self._lock:
+            self._subscribers = [item for item in self._subscribers if item[1] is not event]
+
+    def _notify(self) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for loop, event in subscribers:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # 事件循环已关闭
+                self.unsubscribe(event)
+
+    async def wait(self) -> Dict[str, Any]:
+        """等待任务结束并返回结果（不阻塞事件循环）"""
+        return await asyncio.wrap_future(self.future)
+
+
+class ImportWorker:
+    """导入任务线程池，按导入会话ID登记任务"""
+
+    def __init__(self, max_workers: int = 2, flush_interval: float = 2.0, retain_seconds: int = 600,
+                 heartbeat_interval: float = 10.0):
+        """
+        Args:
+            max_workers: 同时执行的导入任务数
+            flush_interval: 进度写回数据库的最小间隔（秒）
+            retain_seconds: 已结束的任务在内存中保留的时长（供SSE客户端获取最终状态）
+            heartbeat_interval: 刷新会话心跳的间隔（秒，排队中的任务同样刷新）
+        """
+        self.flush_interval = flush_interval
+        self.retain_seconds = retain_seconds
+        self.heartbeat_interval = heartbeat_interval
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="import-worker")
+        self._jobs: Dict[int, ImportJob] = {}
+        self._finished_at: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        self._heartbeat_thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def submit(self, session_id: int, runner: Callable[[ImportJob], Dict[str, Any]],
+               total_rows: int = 0) -> ImportJob:
+        """
+        提交导入任务
+
+        runner 在工作线程中执行，接收 ImportJob，通过 job.update() 报告进度、
+        在每批之间调用 job.checkpoint()，返回导入结果。
+        """
+        self._purge()
+        with self._lock:
+            existing = self._jobs.get(session_id)
+            if existing is not None and not existing.finished:
+                raise ValueError(f"导入会话 {session_id} 已有正在执行的任务")
+            job = ImportJob(session_id, total_rows=total_rows, flush_interval=self.flush_interval)
+            self._jobs[session_id] = job
+            self._finished_at.pop(session_id, None)
+            if self._heartbeat_thread is None:
+                self._heartbeat_thread = threading.Thread(
+                    target=self._heartbeat_loop, name="import-heartbeat", daemon=True
+                )
+                self._heartbeat_thread.start()
+
+        self._touch([session_id], datetime.now())
+        job.future = self._executor.submit(self._run, job, runner)
+        return job
+
+    def _run(self, job: ImportJob, runner: Callable[[ImportJob], Dict[str, Any]]) -> Dict[str, Any]:
+        try:
+            result = runner(job)
+        except ImportCancelled:
+            job.finish(CANCELLED)
+            raise
+        except Exception as e:
+            logger.error(f"导入会话 {job.session_id} 执行失败: {e}")
+            job.finish(FAILED, error_message=str(e))
+            raise
+        else:
+            job.finish(CANCELLED if job.state == CANCELLED else COMPLETED, result=result)
+            return result
+        finally:
+            with self._lock:
+                self._finished_at[job.session_id] = time.monotonic()
+            # 释放心跳，会话可立即由恢复接口继续
+            self._touch([job.session_id], None)
+
+    def _heartbeat_loop(self) -> None:
+        while not self._stopping.wait(self.heartbeat_interval):
+            with self._lock:
+                session_ids = [session_id for session_id, job in self._jobs.items() if not job.finished]
+            if session_ids:
+                self._touch(session_ids, datetime.now())
+
+    @staticmethod
+    def _touch(session_ids: List[int], heartbeat_at: Optional[datetime]) -> None:
+        """刷新（或清除）会话心跳"""
+        from app.db.database import SessionLocal
+        from app.models.import_session import ImportSession
+
+        db = SessionLocal()
+        try:
+            db.query(ImportSession).filter(ImportSession.id.in_(session_ids)).update(
+                {"heartbeat_at": heartbeat_at}, synchronize_session=False
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"导入会话心跳更新失败: {e}")
+        finally:
+            db.close()
+
+    def _purge(self) -> None:
+        """移除结束超过保留时长的任务"""
+        deadline = time.monotonic() - self.retain_seconds
+        with self._lock:
+            for session_id, finished_at in list(self._finished_at.items()):
+                if finished_at < deadline:
+                    self._finished_at.pop(session_id, None)
+                    self._jobs.pop(session_id, None)
+
+    def get(self, session_id: int) -> Optional[ImportJob]:
+        return self._jobs.get(session_id)
+
+    def pause(self, session_id: int) -> bool:
+        job = self.get(session_id)
+        if job is None or job.finished:
+            return False
+        job.pause()
+        return True
+
+    def resume(self, session_id: int) -> bool:
+        job = self.get(session_id)
+        if job is None or job.finished:
+            return False
+        job.resume()
+        return True
+
+    def cancel(self, session_id: int) -> bool:
+        job = self.get(session_id)
+        if job is None or job.finished:
+            return False
+        job.cancel()
+        return True
+
+    def shutdown(self) -> None:
+        """应用关闭时停止接收新任务，并让执行中的任务在下一批前结束"""
+        self._stopping.set()
+        for job in list(self._jobs.values()):
+            job.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# 全局导入任务池
+import_worker = ImportWorker(
+    max_workers=settings.IMPORT_WORKER_THREADS,
+    flush_interval=settings.IMPORT_PROGRESS_FLUSH_INTERVAL,
+    heartbeat_interval=settings.IMPORT_HEARTBEAT_INTERVAL
+)
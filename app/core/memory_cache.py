@@ -0,0 +1,141 @@
+"""
+进程内缓存
+
+带容量上限的 LRU 缓存，每个条目有独立的过期时间：
+- 超过条目数上限或字节数上限时淘汰最久未使用的条目
+- 读取时发现过期的条目立即删除
+- 按 glob 模式删除（语义与 Redis KEYS/SCAN 的 MATCH 一致）
+
+Redis 不可用时作为主缓存；Redis 可用时作为 L1，以较短的 TTL 缓存热点键，省去一次网络往返。
+"""
+
+import pickle
+import sys
+import threading
+import time
+from collections import OrderedDict
+from fnmatch import fnmatchcase
+from typing import Any, NamedTuple, Optional
+
+
+class _Entry(NamedTuple):
+    value: Any
+    expires_at: float
+    size: int
+
+
+def estimate_size(value: Any) -> int:
+    """估算条目占用的字节数（按序列化后的长度，与写入 Redis 的大小一致）"""
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+class MemoryCache:
+    """线程安全的 LRU + TTL 缓存"""
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024,
+                 default_ttl: int = 300):
+        """
+        Args:
+            max_entries: 最大条目数
+            max_bytes: 所有条目的字节数上限（单个条目超过上限时不缓存）
+            default_ttl: 默认过期时间（秒）
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return self.get_entry(key) is not None
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def _remove(self, key: str) -> Optional[_Entry]:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+        return entry
+
+    def _evict(self) -> None:
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.size
+            self.evictions += 1
+
+    def get_entry(self, key: str) -> Optional[_Entry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def get(self, key: str) -> Optional[Any]:
+        """获取缓存值，不存在或已过期返回None"""
+        entry = self.get_entry(key)
+        return entry.value if entry is not None else None
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
+        """
+        设置缓存值
+
+        Returns:
+            是否已缓存（单个条目超过字节数上限时返回False）
+        """
+        ttl = ttl or self.default_ttl
+        size = estimate_size(value)
+        with self._lock:
+            self._remove(key)
+            if size > self.max_bytes:
+                return False
+            self._entries[key] = _Entry(value, time.monotonic() + ttl, size)
+            self._bytes += size
+            self._evict()
+        return True
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            return self._remove(key) is not None
+
+    def delete_pattern(self, pattern: str) -> int:
+        """删除匹配 glob 模式的键，返回删除数量"""
+        with self._lock:
+            keys = [key for key in self._entries if fnmatchcase(key, pattern)]
+            for key in keys:
+                self._remove(key)
+        return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def ttl(self, key: str) -> int:
+        """剩余过期时间（秒），不存在返回-2"""
+        entry = self.get_entry(key)
+        if entry is None:
+            return -2
+        return max(0, int(entry.expires_at - time.monotonic()))
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+        }
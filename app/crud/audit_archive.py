@@ -0,0 +1,597 @@
+"""
+操作日志按月归档
+
+audit_logs 表只保留最近 AUDIT_HOT_MONTHS 个月的日志；更早的日志按创建月份移入归档库
+（AUDIT_ARCHIVE_DIR 下每月一个 SQLite 文件 audit_logs_YYYYMM.db）：
+- 归档库结构与 audit_logs 相同，旧值、新值以 zlib 压缩保存，按创建时间、用户、设备建索引
+- 归档按主键分块复制：先写入归档库（主键相同则跳过，可重复执行），再从 audit_logs 删除这一块，
+  每块单独提交，不再一次性大 DELETE；被未归档日志引用的日志（回滚关联）留在 audit_logs
+- /api/audit 的列表、详情照常查询：查询范围涉及已归档月份时按月合并 audit_logs 和归档库的结果
+  （fetch_page），只查询最近日志时不打开归档库
+- 已归档的日志只能查询，不能回滚（ArchivedAuditLogError）
+- 清理过期日志时整月过期的归档库直接删除文件
+- AUDIT_HOT_MONTHS <= 0 时不归档
+- 归档库始终是本地 SQLite 文件，主库为 SQLite 或 PostgreSQL 均适用
+"""
+
+import logging
+import re
+import threading
+import zlib
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import (
+    Boolean, Column, DateTime, Integer, LargeBinary, MetaData, String, Table, Text,
+    and_, case, create_engine, delete, desc, func, or_, select, update
+)
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.models import AuditLog
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = Path(settings.AUDIT_ARCHIVE_DIR)
+
+_ARCHIVE_FILE = re.compile(r"^audit_logs_(\d{4})(\d{2})\.db$")
+
+# 归档时每次复制、删除的行数
+ARCHIVE_CHUNK_SIZE = 1000
+
+# 压缩保存的列
+COMPRESSED_COLUMNS = ("old_value", "new_value")
+
+_metadata = MetaData()
+
+archive_table = Table(
+    "audit_logs", _metadata,
+    Column("id", Integer, primary_key=True),
+    Column("user_id", Integer, nullable=False),
+    Column("equipment_id", Integer),
+    Column("action", String(50), nullable=False),
+    Column("description", Text, nullable=False),
+    Column("old_value", LargeBinary),   # zlib 压缩的 UTF-8 文本
+    Column("new_value", LargeBinary),
+    Column("operation_type", String(20)),
+    Column("target_table", String(50)),
+    Column("target_id", Integer),
+    Column("parent_log_id", Integer),
+    Column("rollback_log_id", Integer),
+    Column("is_rollback", Boolean),
+    Column("rollback_reason", Text),
+    Column("ip_address", String(45)),
+    Column("user_agent", Text),
+    Column("created_at", DateTime, nullable=False),   # UTC，不带时区
+)
+_index_statements = (
+    "CREATE INDEX IF NOT EXISTS idx_archive_created ON audit_logs (created_at, id)",
+    "CREATE INDEX IF NOT EXISTS idx_archive_user_created ON audit_logs (user_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_archive_equipment ON audit_logs (equipment_id)",
+)
+
+_engines: Dict[Path, object] = {}
+# (归档库路径, 修改时间, 查询条件) -> 日志数
+_archive_counts: Dict[tuple, int] = {}
+# (归档库文件及修改时间, 用户) -> 分组统计
+_archive_statistics: Dict[tuple, dict] = {}
+_engines_lock = threading.Lock()
+_archive_lock = threading.Lock()
+
+
+class ArchivedAuditLogError(ValueError):
+    """操作日志已归档，不能再修改（如回滚）"""
+
+
+class AuditLogFilters(NamedTuple):
+    """操作日志查询条件（同时用于 audit_logs 和归档库）；owner_id 为普通用户只能查看自己日志的权限范围"""
+    owner_id: Optional[int] = None
+    user_id: Optional[int] = None
+    equipment_id: Optional[int] = None
+    action: Optional[str] = None
+    operation_type: Optional[str] = None
+    is_rollback: Optional[bool] = None
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+
+
+def audit_log_conditions(columns, filters: AuditLogFilters) -> list:
+    """
+    查询条件列表
+
+    Args:
+        columns: AuditLog 模型或归档表的 .c（按列名取列）
+    """
+    conditions = []
+    if filters.owner_id:
+        conditions.append(columns.user_id == filters.owner_id)
+    if filters.user_id:
+        conditions.append(columns.user_id == filters.user_id)
+    if filters.equipment_id:
+        conditions.append(columns.equipment_id == filters.equipment_id)
+    if filters.action:
+        conditions.append(columns.action == filters.action)
+    if filters.operation_type:
+        conditions.append(columns.operation_type == filters.operation_type)
+    if filters.is_rollback is not None:
+        conditions.append(columns.is_rollback == filters.is_rollback)
+    if filters.start_date:
+        conditions.append(columns.created_at >= filters.start_date)
+    if filters.end_date:
+        conditions.append(columns.created_at <= filters.end_date)
+    return conditions
+
+
+def utc_naive(value: Optional[datetime]) -> Optional[datetime]:
+    """带时区的时间转换为 UTC 后去掉时区；比较 audit_logs 和归档库的时间时使用"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def month_start(value: datetime) -> date:
+    return date(value.year, value.month, 1)
+
+
+def next_month(month: date) -> date:
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _as_datetime(month: date) -> datetime:
+    return datetime(month.year, month.month, 1)
+
+
+# ---- 归档库文件 ----
+
+def archive_path(month: date) -> Path:
+    return ARCHIVE_DIR / f"audit_logs_{month.year:04d}{month.month:02d}.db"
+
+
+def archived_months() -> List[date]:
+    """已有归档库的月份（从新到旧）"""
+    if not ARCHIVE_DIR.exists():
+        return []
+    months = []
+    for path in ARCHIVE_DIR.iterdir():
+        match = _ARCHIVE_FILE.match(path.name)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months, reverse=True)
+
+
+def _engine(month: date, create: bool = False):
+    """归档库的引擎（按文件缓存）；文件不存在且 create 为 False 时返回 None"""
+    path = archive_path(month)
+    with _engines_lock:
+        engine = _engines.get(path)
+        if engine is not None and path.exists():
+            return engine
+        if not path.exists() and not create:
+            return None
+        path.parent.mkdir(parents=True, exist_ok=True)
+        engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+        with engine.begin() as connection:
+            _metadata.create_all(connection)
+            for statement in _index_statements:
+                connection.exec_driver_sql(statement)
+        _engines[path] = engine
+        return engine
+
+
+def _drop_engine(month: date) -> None:
+    with _engines_lock:
+        engine = _engines.pop(archive_path(month), None)
+    if engine is not None:
+        engine.dispose()
+
+
+def _compress(value: Optional[str]) -> Optional[bytes]:
+    return zlib.compress(value.encode("utf-8")) if value is not None else None
+
+
+def _decompress(value: Optional[bytes]) -> Optional[str]:
+    return zlib.decompress(value).decode("utf-8") if value is not None else None
+
+
+def _to_archive_row(log: AuditLog) -> dict:
+    row = {column.name: getattr(log, column.name) for column in archive_table.columns}
+    for name in COMPRESSED_COLUMNS:
+        row[name] = _compress(row[name])
+    row["created_at"] = utc_naive(row["created_at"])
+    return row
+
+
+def _to_audit_log(row) -> AuditLog:
+    """归档行转换为（不属于任何会话的）AuditLog 对象"""
+    values = dict(row._mapping)
+    for name in COMPRESSED_COLUMNS:
+        values[name] = _decompress(values[name])
+    return AuditLog(**values)
+
+
+# ---- 归档 ----
+
+def _kept_ids(db: Session, start: datetime, end: datetime) -> set:
+    """
+    本月需要留在 audit_logs 的日志ID：被其他月份的日志（回滚关联）引用的日志，
+    以及被这些日志引用的日志（删除后外键会失效）
+    """
+    table = AuditLog.__table__.c
+    outside = or_(table.created_at < start, table.created_at >= end)
+    inside = and_(table.created_at >= start, table.created_at < end)
+    kept = set()
+    for column in (table.parent_log_id, table.rollback_log_id):
+        kept.update(value for (value,) in db.execute(select(column).where(outside, column.isnot(None))))
+    pending = set(kept)
+    while pending:
+        found = set()
+        for column in (table.parent_log_id, table.rollback_log_id):
+            found.update(value for (value,) in db.execute(
+                select(column).where(table.id.in_(pending), inside, column.isnot(None))
+            ))
+        pending = found - kept
+        kept |= pending
+    return kept
+
+
+def _month_chunks(db: Session, start: datetime, end: datetime, kept: set):
+    """按主键顺序分块读取本月要归档的日志"""
+    table = AuditLog.__table__
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(table).where(table.c.created_at >= start, table.c.created_at < end, table.c.id > last_id)
+            .order_by(table.c.id).limit(ARCHIVE_CHUNK_SIZE)
+        ).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+        rows = [row for row in rows if row.id not in kept]
+        if rows:
+            yield rows
+
+
+def _archive_month(db: Session, month: date) -> int:
+    """
+    把某月的日志移入归档库，返回移动的条数
+
+    先把整月日志复制到归档库，再分块从 audit_logs 删除：删除一块前先清空本月其他日志指向这一块的
+    回滚关联（关联已完整保存在归档库中），外键始终有效。中途失败时重新执行即可（归档库中已有的跳过）。
+    """
+    start, end = month_range(month)
+    start, end = _hot_bound(start), _hot_bound(end)
+    kept = _kept_ids(db, start, end)
+    engine = None
+    for rows in _month_chunks(db, start, end, kept):
+        engine = engine or _engine(month, create=True)
+        with engine.begin() as connection:
+            connection.execute(archive_table.insert().prefix_with("OR IGNORE"), [_to_archive_row(row) for row in rows])
+    if engine is None:
+        return 0
+
+    table = AuditLog.__table__
+    moved = 0
+    for rows in _month_chunks(db, start, end, kept):
+        ids = [row.id for row in rows]
+        db.execute(update(table).where(table.c.parent_log_id.in_(ids)).values(parent_log_id=None))
+        db.execute(update(table).where(table.c.rollback_log_id.in_(ids)).values(rollback_log_id=None))
+        db.execute(delete(table).where(table.c.id.in_(ids)))
+        db.commit()
+        moved += len(ids)
+    _archive_counts.clear()
+    return moved
+
+
+def archive_audit_logs(db: Session, hot_months: Optional[int] = None, today: Optional[date] = None) -> int:
+    """
+    把 hot_months 个月（含本月）之前的日志按月移入归档库；hot_months <= 0 时不归档
+
+    Returns:
+        移动的日志条数
+    """
+    hot_months = settings.AUDIT_HOT_MONTHS if hot_months is None else hot_months
+    if hot_months <= 0:
+        return 0  # 未启用归档
+    cutoff = add_months(month_start(today or date.today()), -(hot_months - 1))
+    with _archive_lock:
+        oldest = db.query(func.min(AuditLog.created_at)).filter(
+            AuditLog.created_at < _hot_bound(_as_datetime(cutoff))
+        ).scalar()
+        if oldest is None:
+            return 0
+        moved = 0
+        month = month_start(utc_naive(oldest))
+        while month < cutoff:
+            count = _archive_month(db, month)
+            if count:
+                logger.info(f"已归档 {month:%Y-%m} 的操作日志 {count} 条")
+            moved += count
+            month = next_month(month)
+        return moved
+
+
+# ---- 查询 ----
+
+def month_range(month: date) -> Tuple[datetime, datetime]:
+    return _as_datetime(month), _as_datetime(next_month(month))
+
+
+def _hot_bound(value: datetime) -> datetime:
+    """UTC 时间（不带时区）作为 audit_logs.created_at（带时区列）的查询边界"""
+    return value.replace(tzinfo=timezone.utc)
+
+
+def _overlaps(month: date, filters: AuditLogFilters) -> bool:
+    start, end = month_range(month)
+    filters = _utc_filters(filters)
+    if filters.start_date and filters.start_date >= end:
+        return False
+    if filters.end_date and filters.end_date < start:
+        return False
+    return True
+
+
+def _utc_filters(filters: AuditLogFilters) -> AuditLogFilters:
+    return filters._replace(start_date=utc_naive(filters.start_date), end_date=utc_naive(filters.end_date))
+
+
+def _archive_conditions(filters: AuditLogFilters) -> list:
+    return audit_log_conditions(archive_table.c, _utc_filters(filters))
+
+
+def count_archived(month: date, filters: AuditLogFilters) -> int:
+    """某月归档库中符合条件的日志数（归档库只在归档、清理时变化，按文件修改时间缓存）"""
+    path = archive_path(month)
+    try:
+        key = (path, path.stat().st_mtime_ns, filters)
+    except FileNotFoundError:
+        return 0
+    if key in _archive_counts:
+        return _archive_counts[key]
+
+    engine = _engine(month)
+    if engine is None:
+        return 0
+    with engine.connect() as connection:
+        count = connection.execute(
+            select(func.count()).select_from(archive_table).where(and_(True, *_archive_conditions(filters)))
+        ).scalar() or 0
+    if len(_archive_counts) >= 1024:
+        _archive_counts.clear()
+    _archive_counts[key] = count
+    return count
+
+
+def fetch_archived(month: date, filters: AuditLogFilters, skip: int, limit: int) -> List[AuditLog]:
+    """某月归档库中按创建时间倒序的一页日志"""
+    engine = _engine(month)
+    if engine is None or limit <= 0:
+        return []
+    with engine.connect() as connection:
+        rows = connection.execute(
+            select(archive_table).where(and_(True, *_archive_conditions(filters)))
+            .order_by(desc(archive_table.c.created_at), desc(archive_table.c.id))
+            .offset(skip).limit(limit)
+        ).all()
+    return [_to_audit_log(row) for row in rows]
+
+
+def _sort_key(log: AuditLog):
+    return utc_naive(log.created_at) or datetime.min, log.id
+
+
+def fetch_page(query, filters: AuditLogFilters, skip: int, limit: int) -> Optional[Tuple[List[AuditLog], int]]:
+    """
+    合并 audit_logs 和归档库的一页日志（按创建时间、ID倒序）及总数
+
+    时间轴按归档范围分段：归档范围之后、每个归档月份、归档范围之前。每段单独计数，
+    只读取当前页所在的段；某月在 audit_logs 中没有日志时（通常如此）直接在归档库中按偏移量取页。
+
+    Args:
+        query: 已加上筛选条件的 audit_logs 查询
+    Returns:
+        查询范围不涉及归档库时返回 None（由调用方按原方式查询）
+    """
+    months = [month for month in archived_months() if _overlaps(month, filters)]
+    if not months:
+        return None
+
+    created_at = AuditLog.created_at
+    span_start = _hot_bound(_as_datetime(months[-1]))
+    span_end = _hot_bound(_as_datetime(next_month(months[0])))
+    hot_total, newer, older = query.with_entities(
+        func.count(AuditLog.id),
+        func.coalesce(func.sum(case((created_at >= span_end, 1), else_=0)), 0),
+        func.coalesce(func.sum(case((created_at < span_start, 1), else_=0)), 0),
+    ).order_by(None).one()
+    hot_in_span = hot_total - newer - older
+
+    def hot_page(segment, offset, count):
+        return segment.order_by(desc(created_at), desc(AuditLog.id)).offset(offset).limit(count).all()
+
+    # (条数, 取页函数) 按时间从新到旧
+    segments = [(newer, lambda offset, count: hot_page(query.filter(created_at >= span_end), offset, count))]
+    month = months[0]
+    while month >= months[-1]:
+        start, end = month_range(month)
+        hot_segment = query.filter(created_at >= _hot_bound(start), created_at < _hot_bound(end))
+        hot_count = hot_segment.order_by(None).count() if hot_in_span else 0
+        archived_count = count_archived(month, filters) if month in months else 0
+
+        def month_page(offset, count, month=month, hot_segment=hot_segment, hot_count=hot_count):
+            if not hot_count:
+                return fetch_archived(month, filters, offset, count)
+            merged = {log.id: log for log in fetch_archived(month, filters, 0, offset + count)}
+            merged.update((log.id, log) for log in hot_page(hot_segment, 0, offset + count))
+            return sorted(merged.values(), key=_sort_key, reverse=True)[offset:offset + count]
+
+        segments.append((hot_count + archived_count, month_page))
+        month = add_months(month, -1)
+    segments.append((older, lambda offset, count: hot_page(query.filter(created_at < span_start), offset, count)))
+
+    items: List[AuditLog] = []
+    for count, page in segments:
+        if len(items) >= limit:
+            break
+        if skip >= count:
+            skip -= count
+            continue
+        items.extend(page(skip, limit - len(items)))
+        skip = 0
+    return items, hot_total + sum(count_archived(month, filters) for month in months)
+
+
+def get_archived_log(log_id: int, owner_id: Optional[int] = None) -> Optional[AuditLog]:
+    """按ID在归档库中查找日志（owner_id 不为空时只返回该用户的日志）"""
+    located = _locate(log_id)
+    if located is None:
+        return None
+    log = located[1]
+    if owner_id and log.user_id != owner_id:
+        return None
+    return log
+
+
+def get_archived_rollbacks(log: AuditLog) -> List[AuditLog]:
+    """已归档日志的回滚记录（与原日志在同一归档库中）"""
+    located = _locate(log.id)
+    if located is None:
+        return []
+    engine = _engine(located[0])
+    with engine.connect() as connection:
+        rows = connection.execute(
+            select(archive_table).where(
+                archive_table.c.parent_log_id == log.id, archive_table.c.is_rollback.is_(True)
+            ).order_by(archive_table.c.created_at)
+        ).all()
+    return [_to_audit_log(row) for row in rows]
+
+
+def _locate(log_id: int) -> Optional[Tuple[date, AuditLog]]:
+    for month in archived_months():
+        engine = _engine(month)
+        if engine is None:
+            continue
+        with engine.connect() as connection:
+            row = connection.execute(select(archive_table).where(archive_table.c.id == log_id)).first()
+        if row is not None:
+            return month, _to_audit_log(row)
+    return None
+
+
+def archived_statistics(owner_id: Optional[int] = None) -> Dict[Tuple[str, str, bool, str], int]:
+    """
+    归档库中按 (操作类型, 操作, 是否回滚, 日期) 分组的日志数（日期为 UTC 的 YYYY-MM-DD）
+
+    每个归档库一条分组查询；结果按归档库文件及其修改时间缓存，归档、清理后重新统计。
+    """
+    months = archived_months()
+    try:
+        key = (tuple((month, archive_path(month).stat().st_mtime_ns) for month in months), owner_id)
+    except FileNotFoundError:
+        key = None
+    if key is not None and key in _archive_statistics:
+        return _archive_statistics[key]
+
+    counts: Dict[Tuple[str, str, bool, str], int] = {}
+    columns = archive_table.c
+    day = func.date(columns.created_at)
+    for month in months:
+        engine = _engine(month)
+        if engine is None:
+            continue
+        query = select(columns.operation_type, columns.action, columns.is_rollback, day, func.count()).group_by(
+            columns.operation_type, columns.action, columns.is_rollback, day
+        )
+        if owner_id:
+            query = query.where(columns.user_id == owner_id)
+        with engine.connect() as connection:
+            for operation_type, action, is_rollback, created_day, count in connection.execute(query):
+                group = (operation_type, action, bool(is_rollback), str(created_day))
+                counts[group] = counts.get(group, 0) + count
+
+    if key is not None:
+        if len(_archive_statistics) >= 64:
+            _archive_statistics.clear()
+        _archive_statistics[key] = counts
+    return counts
+
+
+# ---- 清理 ----
+
+def cleanup_archives(cutoff: datetime) -> int:
+    """删除归档库中 cutoff 之前的日志（保留回滚记录），整月过期且无回滚记录的归档库直接删除文件"""
+    cutoff = utc_naive(cutoff)
+    deleted = 0
+    with _archive_lock:
+        for month in archived_months():
+            start, end = month_range(month)
+            if start >= cutoff:
+                continue
+            engine = _engine(month)
+            if engine is None:
+                continue
+            columns = archive_table.c
+            with engine.begin() as connection:
+                result = connection.execute(delete(archive_table).where(
+                    columns.created_at < cutoff, or_(columns.is_rollback.is_(False), columns.is_rollback.is_(None))
+                ))
+                remaining = connection.execute(select(func.count()).select_from(archive_table)).scalar()
+            deleted += result.rowcount or 0
+            if not remaining:
+                _drop_engine(month)
+                archive_path(month).unlink(missing_ok=True)
+            elif result.rowcount:
+                with engine.connect() as connection:
+                    connection.exec_driver_sql("VACUUM")
+    return deleted
+
+
+# ---- 定期归档 ----
+
+def _run_archive() -> None:
+    from app.db.database import SessionLocal
+    db = SessionLocal()
+    try:
+        archive_audit_logs(db)
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"操作日志归档失败: {e}")
+    finally:
+        db.close()
+
+
+def start_audit_archiver() -> Optional[threading.Thread]:
+    """
+    启动后台归档线程：启动时归档一次，之后每 AUDIT_ARCHIVE_INTERVAL 秒检查一次
+
+    AUDIT_HOT_MONTHS <= 0 时不启动（不归档，已有的归档库照常查询），返回 None
+    """
+    if settings.AUDIT_HOT_MONTHS <= 0:
+        logger.info("操作日志归档未启用（AUDIT_HOT_MONTHS <= 0）")
+        return None
+
+    def run() -> None:
+        while True:
+            _run_archive()
+            _stop.wait(settings.AUDIT_ARCHIVE_INTERVAL)
+            if _stop.is_set():
+                return
+
+    _stop.clear()
+    thread = threading.Thread(target=run, name="audit-archiver", daemon=True)
+    thread.start()
+    return thread
+
+
+def stop_audit_archiver() -> None:
+    _stop.set()
+
+
+_stop = threading.Event()
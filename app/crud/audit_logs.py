@@ -5,18 +5,63 @@
 
 import json
 from typing import Optional, List, Dict, Any, Tuple
-from datetime import datetime
+from datetime import datetime, timezone
 from sqlalchemy.orm import Session
-from sqlalchemy import select, and_, or_, desc
+from sqlalchemy import select, and_, or_, desc, func, case
 from sqlalchemy.orm import contains_eager
 
+from app.core.audit_writer import audit_writer
+from app.core.config import settings
 from app.models.models import AuditLog, Equipment, User, UserEquipmentPermission
 from app.schemas.schemas import AuditLogCreate, AuditLogRollback
+from app.crud.permission_scope import has_permission_grant
+from app.crud import search_index
+from app.crud.pagination import fetch_page_with_total
+from app.crud import audit_archive
+from app.crud.audit_archive import ArchivedAuditLogError, AuditLogFilters, audit_log_conditions
+
+# 清理过期日志时每次删除的行数
+CLEANUP_CHUNK_SIZE = 1000
+
+
+def save_audit_log(db: Session, audit_log: AuditLog, transactional: bool = False) -> AuditLog:
+    """
+    写入操作日志
+
+    默认交给 audit_writer 批量写入（返回的对象没有ID，不加入会话）；
+    transactional=True 时在调用方的会话中写入并 flush（取得ID），随调用方的事务提交或回滚，
+    用于回滚记录、删除前保存完整旧数据等必须与业务数据一起持久化的日志。
+    """
+    if audit_log.created_at is None:
+        audit_log.created_at = datetime.now(timezone.utc)
+
+    if transactional:
+        db.add(audit_log)
+        db.flush()
+        return audit_log
+
+    if not settings.AUDIT_ASYNC_WRITES:
+        db.add(audit_log)
+        db.commit()
+        db.refresh(audit_log)
+        return audit_log
+
+    values = {}
+    for column in AuditLog.__table__.columns:
+        if column.primary_key:
+            continue
+        value = getattr(audit_log, column.key)
+        if value is None and column.default is not None and column.default.is_scalar:
+            value = column.default.arg
+            setattr(audit_log, column.key, value)
+        values[column.key] = value
+    audit_writer.submit(values)
+    return audit_log
 
 
 def create_audit_log(db: Session, log_data: AuditLogCreate,
-                    ip_address: Optional[str] = None) -> AuditLog:
-    """创建操作日志记录"""
+                    ip_address: Optional[str] = None, transactional: bool = False) -> AuditLog:
+    """创建操作日志记录（写入方式见 save_audit_log）"""
     audit_log = AuditLog(
         user_id=log_data.user_id,
         equipment_id=log_data.equipment_id,
@@ -33,11 +78,13 @@ def create_audit_log(db: Session, log_data: AuditLogCreate,
         ip_address=ip_address,
         user_agent=log_data.user_agent
     )
+    return save_audit_log(db, audit_log, transactional=transactional)
 
-    db.add(audit_log)
-    db.commit()
-    db.refresh(audit_log)
-    return audit_log
+
+def flush_pending_audit_logs() -> None:
+    """查询前写入缓冲中的日志，刚记录的操作立即可见"""
+    if settings.AUDIT_ASYNC_WRITES:
+        audit_writer.flush()
 
 
 def get_audit_logs(
@@ -59,41 +106,39 @@ def get_audit_logs(
     管理员可以查看所有日志，普通用户可以查看自己的操作日志
     """
 
-    # 完全不加载任何关系，避免循环引用
-    query = db.query(AuditLog)
-
-    # 简化权限控制：管理员查看所有，普通用户查看自己的操作
-    if not is_admin and current_user_id:
-        # 普通用户只能查看自己的操作日志
-        query = query.filter(AuditLog.user_id == current_user_id)
-
-    # 应用筛选条件
-    if user_id:
-        query = query.filter(AuditLog.user_id == user_id)
-
-    if equipment_id:
-        query = query.filter(AuditLog.equipment_id == equipment_id)
-
-    if action:
-        query = query.filter(AuditLog.action == action)
-
-    if operation_type:
-        query = query.filter(AuditLog.operation_type == operation_type)
-
-    if is_rollback is not None:
-        query = query.filter(AuditLog.is_rollback == is_rollback)
-
-    if start_date:
-        query = query.filter(AuditLog.created_at >= start_date)
-
-    if end_date:
-        query = query.filter(AuditLog.created_at <= end_date)
+    flush_pending_audit_logs()
+
+    # 简化权限控制：管理员查看所有，普通用户只能查看自己的操作日志
+    filters = AuditLogFilters(
+        owner_id=current_user_id if not is_admin else None,
+        user_id=user_id,
+        equipment_id=equipment_id,
+        action=action,
+        operation_type=operation_type,
+        is_rollback=is_rollback,
+        start_date=start_date,
+        end_date=end_date,
+    )
+    return _fetch_audit_log_page(db, filters, skip, limit)
 
-    # 获取总数
-    total = query.count()
 
-    # 获取分页数据
-    items = query.order_by(desc(AuditLog.created_at)).offset(skip).limit(limit).all()
+def _fetch_audit_log_page(db: Session, filters: AuditLogFilters,
+                          skip: int, limit: int) -> Tuple[List[AuditLog], int]:
+    """按创建时间倒序分页；查询范围涉及已归档的月份时合并归档库的结果"""
+    # 完全不加载任何关系，避免循环引用
+    query = db.query(AuditLog).filter(*audit_log_conditions(AuditLog, filters))
+
+    page = audit_archive.fetch_page(query, filters, skip, limit)
+    if page is not None:
+        return page
+
+    # 获取分页数据和总数（一次查询）
+    items, total = fetch_page_with_total(
+        db, query.order_by(desc(AuditLog.created_at)), skip, limit,
+        cache_api="audit_log_page_count",
+        # 操作日志只追加，翻页时的总数在短 TTL 内允许不含最新的日志
+        tags=()
+    )
 
     return items, total
 
@@ -102,6 +147,8 @@ def get_audit_log_by_id(db: Session, log_id: int,
                        current_user_id: Optional[int] = None,
                        is_admin: bool = False) -> Optional[AuditLog]:
     """根据ID获取操作日志（支持权限控制）"""
+    flush_pending_audit_logs()
+
     # 完全不加载任何关系，避免循环引用
     query = db.query(AuditLog).filter(AuditLog.id == log_id)
 
@@ -109,7 +156,10 @@ def get_audit_log_by_id(db: Session, log_id: int,
     if not is_admin and current_user_id:
         query = query.filter(AuditLog.user_id == current_user_id)
 
-    return query.first()
+    log = query.first()
+    if log is None:
+        log = audit_archive.get_archived_log(log_id, owner_id=current_user_id if not is_admin else None)
+    return log
 
 
 def get_equipment_audit_logs(
@@ -132,12 +182,8 @@ def get_equipment_audit_logs(
         if not has_equipment_permission(db, current_user_id, equipment.category_id, equipment.name):
             return [], 0
 
-    query = db.query(AuditLog).filter(AuditLog.equipment_id == equipment_id)
-
-    total = query.count()
-    items = query.order_by(desc(AuditLog.created_at)).offset(skip).limit(limit).all()
-
-    return items, total
+    flush_pending_audit_logs()
+    return _fetch_audit_log_page(db, AuditLogFilters(equipment_id=equipment_id), skip, limit)
 
 
 def rollback_operation(db: Session, rollback_data: AuditLogRollback,
@@ -146,10 +192,18 @@ def rollback_operation(db: Session, rollback_data: AuditLogRollback,
     """
     回滚操作
     将设备状态恢复到指定操作之前的状态
+
+    Raises:
+        ArchivedAuditLogError: 原始日志已归档（有权查看时）
     """
     # 直接查询原始日志，不使用权限过滤
     original_log = db.query(AuditLog).filter(AuditLog.id == rollback_data.log_id).first()
     if not original_log:
+        archived_log = audit_archive.get_archived_log(
+            rollback_data.log_id, owner_id=current_user_id if not is_admin else None
+        )
+        if archived_log is not None:
+            raise ArchivedAuditLogError("该操作日志已归档，无法回滚")
         return None
 
     # 简化权限检查：管理员可以回滚任何操作，普通用户只能回滚自己的操作
@@ -203,12 +257,14 @@ def rollback_operation(db: Session, rollback_data: AuditLogRollback,
             rollback_reason=rollback_data.rollback_reason,
             user_agent=None
         ),
-        ip_address=ip_address
+        ip_address=ip_address,
+        transactional=True
     )
 
-    # 更新原始日志的回滚关联
+    # 更新原始日志的回滚关联（与回滚记录一起提交）
     original_log.rollback_log_id = rollback_log.id
     db.commit()
+    db.refresh(rollback_log)
 
     return rollback_log
 
@@ -219,6 +275,9 @@ def get_operation_history(db: Session, log_id: int,
     """获取操作的历史记录（包括回滚记录）"""
     # 直接查询，不使用权限过滤的函数
     original_log = db.query(AuditLog).filter(AuditLog.id == log_id).first()
+    archived = original_log is None
+    if archived:
+        original_log = audit_archive.get_archived_log(log_id)
     if not original_log:
         return None
 
@@ -227,10 +286,13 @@ def get_operation_history(db: Session, log_id: int,
         return None
 
     # 查找所有相关的回滚记录，避免循环引用
-    rollback_logs = db.query(AuditLog).filter(
-        AuditLog.parent_log_id == log_id,
-        AuditLog.is_rollback == True
-    ).order_by(AuditLog.created_at).all()
+    if archived:
+        rollback_logs = audit_archive.get_archived_rollbacks(original_log)
+    else:
+        rollback_logs = db.query(AuditLog).filter(
+            AuditLog.parent_log_id == log_id,
+            AuditLog.is_rollback == True
+        ).order_by(AuditLog.created_at).all()
 
     # 获取当前状态
     current_state = None
@@ -272,13 +334,7 @@ def get_user_authorized_equipment_ids(db: Session, user_id: int) -> List[Tuple[i
 
 def has_equipment_permission(db: Session, user_id: int, category_id: int, equipment_name: str) -> bool:
     """检查用户是否有特定设备的权限"""
-    permission = db.query(UserEquipmentPermission).filter(
-        UserEquipmentPermission.user_id == user_id,
-        UserEquipmentPermission.category_id == category_id,
-        UserEquipmentPermission.equipment_name == equipment_name
-    ).first()
-
-    return permission is not None
+    return has_permission_grant(db, user_id, category_id, equipment_name)
 
 
 def _rollback_equipment_operation(db: Session, original_log: AuditLog) -> bool:
@@ -342,6 +398,8 @@ def _rollback_equipment_operation(db: Session, original_log: AuditLog) -> bool:
         if any(field in old_data for field in ['calibration_date', 'valid_until', 'current_calibration_result']):
             _mark_calibration_history_as_rolled_back(db, original_log)
 
+        db.flush()
+        search_index.index_equipment(db, equipment.id)
         db.commit()
         return True
 
@@ -425,6 +483,8 @@ def _restore_deleted_equipment(db: Session, equipment_id: int, equipment_data: d
 
         # 添加到数据库
         db.add(equipment)
+        db.flush()
+        search_index.index_equipment(db, equipment.id)
         db.commit()
         db.refresh(equipment)
 
@@ -465,6 +525,8 @@ def _rollback_calibration_operation(db: Session, original_log: AuditLog) -> bool
         # 标记相关的检定历史记录为已回滚
         _mark_calibration_history_as_rolled_back(db, original_log)
 
+        db.flush()
+        search_index.index_equipment(db, equipment.id)
         db.commit()
         return True
 
@@ -474,61 +536,105 @@ def _rollback_calibration_operation(db: Session, original_log: AuditLog) -> bool
 
 
 def cleanup_old_audit_logs(db: Session, days: int = 365) -> int:
-    """清理指定天数之前的操作日志"""
+    """
+    清理指定天数之前的操作日志（保留回滚记录以便追踪）
+
+    audit_logs 按主键分块删除、每块单独提交，不长时间锁表；归档库中的过期日志一并清理。
+    """
     from datetime import timedelta
 
     cutoff_date = datetime.now() - timedelta(days=days)
+    expired = and_(
+        AuditLog.created_at < cutoff_date,
+        AuditLog.is_rollback == False  # 保留回滚记录以便追踪
+    )
 
-    # 删除超过指定天数的日志（保留重要的回滚记录）
-    deleted_count = db.query(AuditLog).filter(
-        and_(
-            AuditLog.created_at < cutoff_date,
-            AuditLog.is_rollback == False  # 保留回滚记录以便追踪
-        )
-    ).delete(synchronize_session=False)
+    deleted_count = 0
+    while True:
+        ids = [log_id for (log_id,) in db.query(AuditLog.id).filter(expired).limit(CLEANUP_CHUNK_SIZE)]
+        if not ids:
+            break
+        deleted_count += db.query(AuditLog).filter(AuditLog.id.in_(ids)).delete(synchronize_session=False)
+        db.commit()
 
-    db.commit()
-    return deleted_count
+    return deleted_count + audit_archive.cleanup_archives(cutoff_date)
 
 
 def get_audit_statistics(db: Session, current_user_id: Optional[int] = None,
-                        is_admin: bool = False) -> Dict[str, Any]:
-    """获取操作日志统计信息"""
+                        is_admin: bool = False, days: int = 30) -> Dict[str, Any]:
+    """
+    获取操作日志统计信息
 
-    base_query = db.query(AuditLog)
+    一条分组查询按 (操作类型, 操作, 是否回滚, 日期) 统计 audit_logs，同时附带最近7天的条数；
+    总数、各类统计和每日趋势都由分组结果汇总，再加上归档库的分组统计（已缓存）。
 
-    # 简化权限控制
-    if not is_admin and current_user_id:
-        base_query = base_query.filter(AuditLog.user_id == current_user_id)
+    Args:
+        days: 每日趋势（daily_stats）包含的天数，按 UTC 日期统计，截至今天
+    """
+    from datetime import timedelta
 
-    total_logs = base_query.count()
+    flush_pending_audit_logs()
 
-    # 按操作类型统计
-    operation_stats = {}
-    for op_type in ['equipment', 'calibration', 'attachment', 'user', 'system']:
-        count = base_query.filter(AuditLog.operation_type == op_type).count()
-        operation_stats[op_type] = count
+    owner_id = current_user_id if not is_admin else None
+    # 与每日趋势一样按 UTC 计算（created_at 以 UTC 保存）
+    seven_days_ago = datetime.now(timezone.utc) - timedelta(days=7)
 
-    # 按动作统计
-    action_stats = {}
+    day = func.date(AuditLog.created_at)
+    query = db.query(
+        AuditLog.operation_type, AuditLog.action, AuditLog.is_rollback, day,
+        func.count(AuditLog.id),
+        func.coalesce(func.sum(case((AuditLog.created_at >= seven_days_ago, 1), else_=0)), 0)
+    )
+    # 简化权限控制
+    if owner_id:
+        query = query.filter(AuditLog.user_id == owner_id)
+
+    groups: Dict[Tuple[str, str, bool, str], int] = dict(audit_archive.archived_statistics(owner_id=owner_id))
+    # 保留月数很少时最近7天的日志可能已归档，按日期计入（含起始日）
+    recent_day = seven_days_ago.date().isoformat()
+    recent_logs = sum(count for key, count in groups.items() if key[3] >= recent_day)
+    for op_type, action, is_rollback, created_day, count, recent in query.group_by(
+        AuditLog.operation_type, AuditLog.action, AuditLog.is_rollback, day
+    ):
+        key = (op_type, action, bool(is_rollback), str(created_day))
+        groups[key] = groups.get(key, 0) + count
+        recent_logs += recent
+
+    total_logs = 0
+    rollback_count = 0
+    # 按操作类型统计
+    operation_stats = {op_type: 0 for op_type in ['equipment', 'calibration', 'attachment', 'user', 'system']}
+    # 按动作统计（只列出有记录的动作）
     actions = ['创建', '更新', '删除', '检定', '状态变更', '回滚']
-    for action in actions:
-        count = base_query.filter(AuditLog.action == action).count()
-        if count > 0:
-            action_stats[action] = count
-
-    # 回滚操作统计
-    rollback_count = base_query.filter(AuditLog.is_rollback == True).count()
-
-    # 最近7天的操作趋势
-    from datetime import timedelta
-    seven_days_ago = datetime.now() - timedelta(days=7)
-    recent_logs = base_query.filter(AuditLog.created_at >= seven_days_ago).count()
+    action_stats = {}
+    daily_counts: Dict[str, List[int]] = {}
+    for (op_type, action, is_rollback, created_day), count in groups.items():
+        total_logs += count
+        if op_type in operation_stats:
+            operation_stats[op_type] += count
+        if action in actions:
+            action_stats[action] = action_stats.get(action, 0) + count
+        daily = daily_counts.setdefault(created_day, [0, 0])
+        daily[0] += count
+        if is_rollback:
+            rollback_count += count
+            daily[1] += count
+
+    action_stats = {action: action_stats[action] for action in actions if action_stats.get(action)}
+
+    # 每日趋势（没有日志的日期补 0）
+    today = datetime.now(timezone.utc).date()
+    daily_stats = []
+    for offset in range(days - 1, -1, -1):
+        created_day = (today - timedelta(days=offset)).isoformat()
+        count, rollbacks = daily_counts.get(created_day, (0, 0))
+        daily_stats.append({"date": created_day, "count": count, "rollback_count": rollbacks})
 
     return {
         "total_logs": total_logs,
         "operation_stats": operation_stats,
         "action_stats": action_stats,
         "rollback_count": rollback_count,
-        "recent_logs": recent_logs
-    }
\ No newline at end of file
+        "recent_logs": recent_logs,
+        "daily_stats": daily_stats
+    }
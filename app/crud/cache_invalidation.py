@@ -0,0 +1,110 @@
+"""
+设备变更的缓存失效
+
+在 Session 的 flush 钩子中记录新增、修改、删除的设备所在的部门和类别（修改前后都记录），
+事务提交后失效对应的缓存标签（CacheTag.for_equipment）；事务回滚则丢弃。
+设备创建、更新、删除、检定、批量操作和回滚都经过 ORM，因此无需在各接口单独失效缓存；
+绕过 ORM 的批量写入（如批量导入）调用 register_equipment_change 登记变更。
+
+可能改变器具类型编号的变更（预定义名称的第一台设备、删除设备、修改名称、类别或内部编号）
+同时失效该类别的 CacheTag.type_codes，其余设备写入不使类型编号索引重新计算。
+
+只有依赖该部门、类别的缓存失效：普通用户的缓存按其器具权限所在类别登记，
+其他类别的设备变更不影响其仪表盘和设备列表缓存。
+"""
+
+import logging
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app.models.models import Equipment
+from app.core.cache import invalidate_cache_tags
+from app.core.cache_config import CacheTag
+from app.crud.type_code_index import type_code_index
+
+logger = logging.getLogger(__name__)
+
+_TAGS_KEY = "cache_invalidation_tags"
+
+# 影响器具类型编号的设备属性
+TYPE_CODE_ATTRIBUTES = ("category_id", "name", "internal_id")
+
+
+def _committed_value(state, attribute):
+    """属性修改前（数据库中）的值"""
+    history = state.attrs[attribute].history
+    if history.deleted:
+        return history.deleted[0]
+    return state.attrs[attribute].value
+
+
+def _equipment_tags(equipment: Equipment, committed: bool = False) -> list:
+    if committed:
+        state = inspect(equipment)
+        department_id = _committed_value(state, "department_id")
+        category_id = _committed_value(state, "category_id")
+    else:
+        department_id, category_id = equipment.department_id, equipment.category_id
+    return CacheTag.for_equipment(department_id, category_id)
+
+
+def _type_code_tags(category_id: int, name: str, removed: bool = False) -> list:
+    if type_code_index.changed_by(category_id, name, removed):
+        return [CacheTag.type_codes(category_id)]
+    return []
+
+
+def register_equipment_change(session: Session, department_id: int, category_id: int) -> None:
+    """登记绕过 ORM 写入的设备变更，随事务提交失效缓存"""
+    session.info.setdefault(_TAGS_KEY, set()).update(CacheTag.for_equipment(department_id, category_id))
+
+
+def register_type_code_change(session: Session, category_id: int, name: str, removed: bool = False) -> None:
+    """登记绕过 ORM 新增（removed 为 True 时为删除或改名前）的设备，可能改变类型编号时随事务提交失效"""
+    session.info.setdefault(_TAGS_KEY, set()).update(_type_code_tags(category_id, name, removed))
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_equipment_tags(session, flush_context, instances):
+    tags = set()
+    for obj in session.new:
+        if isinstance(obj, Equipment):
+            tags.update(_equipment_tags(obj))
+            tags.update(_type_code_tags(obj.category_id, obj.name))
+    for obj in session.deleted:
+        if isinstance(obj, Equipment):
+            state = inspect(obj)
+            tags.update(_equipment_tags(obj, committed=True))
+            tags.update(_type_code_tags(
+                _committed_value(state, "category_id"), _committed_value(state, "name"), removed=True
+            ))
+    for obj in session.dirty:
+        if isinstance(obj, Equipment) and session.is_modified(obj, include_collections=False):
+            tags.update(_equipment_tags(obj, committed=True))
+            tags.update(_equipment_tags(obj))
+            state = inspect(obj)
+            if any(state.attrs[attribute].history.has_changes() for attribute in TYPE_CODE_ATTRIBUTES):
+                tags.update(_type_code_tags(
+                    _committed_value(state, "category_id"), _committed_value(state, "name"), removed=True
+                ))
+                tags.update(_type_code_tags(obj.category_id, obj.name))
+    if tags:
+        session.info.setdefault(_TAGS_KEY, set()).update(tags)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    tags = session.info.pop(_TAGS_KEY, None)
+    if tags:
+        try:
+            invalidate_cache_tags(*tags)
+        except Exception as e:
+            logger.warning(f"设备变更后失效缓存失败: {e}")
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_after_rollback(session, previous_transaction):
+    # 只在最外层事务回滚时丢弃（保存点回滚时外层事务的变更仍会提交）
+    if previous_transaction.parent is None:
+        session.info.pop(_TAGS_KEY, None)
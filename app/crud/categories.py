@@ -1,6 +1,7 @@
 from sqlalchemy.orm import Session
 from app.models.models import EquipmentCategory
 from app.schemas.schemas import EquipmentCategoryCreate
+from app.crud import search_index
 from typing import List
 
 def get_categories(db: Session, skip: int = 0, limit: int = 100):
@@ -52,8 +53,13 @@ def update_category(db: Session, category_id: int, category: EquipmentCategoryCr
         if 'predefined_names' not in category_data or category_data['predefined_names'] is None:
             category_data.pop('predefined_names', None)
         
+        name_changed = category_data.get('name') is not None and category_data['name'] != db_category.name
         for field, value in category_data.items():
             setattr(db_category, field, value)
+        if name_changed:
+            # 类别名称参与设备全文检索，改名后同步该类别下设备的索引
+            db.flush()
+            search_index.reindex_equipments(db, category_id=category_id)
         db.commit()
         db.refresh(db_category)
         
@@ -7,7 +7,7 @@
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import and_, func
 from datetime import datetime, date, timedelta
-from app.models.models import User, Department, Equipment, EquipmentCategory, DepartmentUserLog
+from app.models.models import User, Department, Equipment, EquipmentCategory, EquipmentStats, DepartmentUserLog
 from app.schemas.schemas import (
     DepartmentUserCreate, 
     DepartmentUserPasswordChange, 
@@ -15,6 +15,9 @@ from app.schemas.schemas import (
     DepartmentEquipmentFilter
 )
 from app.core.security import get_password_hash, verify_password
+from app.core.cache_config import CacheTag
+from app.crud import equipment_stats
+from app.crud.pagination import fetch_page_with_total
 from typing import List, Optional
 
 def get_department_user_by_id(db: Session, user_id: int):
@@ -161,43 +164,33 @@ def get_department_equipment_count(db: Session, department_id: int):
     return db.query(Equipment).filter(Equipment.department_id == department_id).count()
 
 def get_department_equipment_stats(db: Session, department_id: int):
-    """获取部门设备统计信息"""
+    """获取部门设备统计信息（基于设备统计汇总表）"""
     today = date.today()
     thirty_days_later = today + timedelta(days=30)
     
-    # 总设备数
-    total_count = db.query(Equipment).filter(Equipment.department_id == department_id).count()
+    # 按类别、状态汇总部门设备数
+    rows = equipment_stats.stats_query(
+        db, EquipmentCategory.name, EquipmentCategory.id, EquipmentStats.status,
+        func.sum(EquipmentStats.equipment_count).label('count'),
+        is_admin=True, department_id=department_id
+    ).join(
+        EquipmentCategory, EquipmentCategory.id == EquipmentStats.category_id
+    ).group_by(EquipmentCategory.id, EquipmentCategory.name, EquipmentStats.status).all()
     
-    # 在用设备数
-    active_count = db.query(Equipment).filter(
-        Equipment.department_id == department_id,
-        Equipment.status == "在用"
-    ).count()
+    # 总设备数、在用设备数
+    total_count = sum(item.count or 0 for item in rows)
+    category_distribution = [item for item in rows if item.status == "在用" and item.count]
+    active_count = sum(item.count for item in category_distribution)
     
     # 30天内到期设备数
-    due_in_30_days = db.query(Equipment).filter(
-        Equipment.department_id == department_id,
-        Equipment.status == "在用",
-        Equipment.valid_until <= thirty_days_later,
-        Equipment.valid_until >= today
-    ).count()
+    due_in_30_days = equipment_stats.count_valid_between(
+        db, today, thirty_days_later, is_admin=True, department_id=department_id
+    )
     
     # 已到期设备数
-    overdue_count = db.query(Equipment).filter(
-        Equipment.department_id == department_id,
-        Equipment.status == "在用",
-        Equipment.valid_until < today
-    ).count()
-    
-    # 设备类别分布
-    category_distribution = db.query(
-        EquipmentCategory.name,
-        EquipmentCategory.id,
-        func.count(Equipment.id).label('count')
-    ).join(Equipment).filter(
-        Equipment.department_id == department_id,
-        Equipment.status == "在用"
-    ).group_by(EquipmentCategory.id, EquipmentCategory.name).all()
+    overdue_count = equipment_stats.count_overdue(
+        db, today, is_admin=True, department_id=department_id
+    )
     
     category_dist = [
         {
@@ -223,6 +216,25 @@ def get_department_equipment_list(
     filters: Optional[DepartmentEquipmentFilter] = None
 ):
     """获取部门设备列表"""
+    query = department_equipment_query(db, department_id, filters)
+    items, total = fetch_page_with_total(
+        db, query, skip, limit,
+        tags=[CacheTag.DEPARTMENTS, CacheTag.CATEGORIES, CacheTag.department(department_id)]
+    )
+    
+    return {
+        "items": items,
+        "total": total,
+        "skip": skip,
+        "limit": limit
+    }
+
+def department_equipment_query(
+    db: Session,
+    department_id: int,
+    filters: Optional[DepartmentEquipmentFilter] = None
+):
+    """部门设备查询（列表与流式导出共用）"""
     query = db.query(Equipment).filter(Equipment.department_id == department_id).options(
         joinedload(Equipment.category)
     )
@@ -266,15 +278,7 @@ def get_department_equipment_list(
             else:
                 query = query.filter(Equipment.status == filters.status)
     
-    total = query.count()
-    items = query.offset(skip).limit(limit).all()
-    
-    return {
-        "items": items,
-        "total": total,
-        "skip": skip,
-        "limit": limit
-    }
+    return query
 
 def get_department_equipment_by_id(db: Session, equipment_id: int, department_id: int):
     """获取部门的特定设备详情"""
@@ -1,6 +1,7 @@
 from sqlalchemy.orm import Session
 from app.models.models import Department
 from app.schemas.schemas import DepartmentCreate
+from app.crud import search_index
 from typing import List
 
 def get_departments(db: Session, skip: int = 0, limit: int = 100):
@@ -38,9 +39,14 @@ def update_department(db: Session, department_id: int, department):
     if db_department:
         # 只更新非None的字段
         update_data = department.dict(exclude_unset=True)
+        name_changed = update_data.get("name") is not None and update_data["name"] != db_department.name
         for field, value in update_data.items():
             if value is not None:  # 只更新非None值
                 setattr(db_department, field, value)
+        if name_changed:
+            # 部门名称参与设备全文检索，改名后同步该部门下设备的索引
+            db.flush()
+            search_index.reindex_equipments(db, department_id=department_id)
         db.commit()
         db.refresh(db_department)
     return db_department
@@ -1,7 +1,12 @@
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_, or_, select, cast, String, func
-from app.models.models import Equipment, UserEquipmentPermission, Department, EquipmentCategory, EquipmentAttachment
+from sqlalchemy import and_, or_, cast, String, case
+from app.models.models import Equipment, Department, EquipmentCategory
 from app.schemas.schemas import EquipmentCreate, EquipmentUpdate, EquipmentFilter, EquipmentSearch
+from app.crud.permission_scope import (
+    apply_permission_scope, get_permission_grants, has_permission_grant, permission_scope_tags
+)
+# equipment_stats、cache_invalidation 在导入时注册汇总表维护和缓存失效的会话钩子
+from app.crud import search_index, pagination, equipment_rows, equipment_stats, cache_invalidation  # noqa: F401
 from datetime import date, timedelta
 from typing import List, Optional
 
@@ -10,23 +15,13 @@ def get_user_equipment_permissions(db: Session, user_id: int):
     获取用户的设备权限列表，返回(category_id, equipment_name)的元组列表
     这样可以确保权限检查同时考虑类别和器具名称
     """
-    permissions = db.query(UserEquipmentPermission.category_id, UserEquipmentPermission.equipment_name).filter(
-        UserEquipmentPermission.user_id == user_id
-    ).all()
-
-    return [(perm.category_id, perm.equipment_name) for perm in permissions]
+    return sorted(get_permission_grants(db, user_id))
 
 def has_equipment_permission(db: Session, user_id: int, category_id: int, equipment_name: str) -> bool:
     """
     检查用户是否有指定类别和器具名称的设备权限
     """
-    permission = db.query(UserEquipmentPermission).filter(
-        UserEquipmentPermission.user_id == user_id,
-        UserEquipmentPermission.category_id == category_id,
-        UserEquipmentPermission.equipment_name == equipment_name
-    ).first()
-
-    return permission is not None
+    return has_permission_grant(db, user_id, category_id, equipment_name)
 
 def get_equipments_for_external_api(
     db: Session,
@@ -91,99 +86,122 @@ def get_equipments_count(db: Session, user_id: Optional[int] = None, is_admin: b
     query = db.query(Equipment)
     
     # 如果不是管理员，只能看到被授权的设备
-    if not is_admin and user_id:
-        user_permissions = get_user_equipment_permissions(db, user_id)
-
-        if user_permissions:
-            # 使用更复杂的权限检查：同时检查category_id和equipment_name
-            permission_conditions = []
-            for category_id, equipment_name in user_permissions:
-                permission_conditions.append(
-                    and_(
-                        Equipment.category_id == category_id,
-                        Equipment.name == equipment_name
-                    )
-                )
-            query = query.filter(or_(*permission_conditions))
-        else:
-            # 如果没有权限，返回空结果
-            return 0
+    query = apply_permission_scope(query, db, user_id, is_admin)
+    if query is None:
+        # 如果没有权限，返回空结果
+        return 0
     
     return query.count()
 
-def get_equipments(db: Session, skip: int = 0, limit: int = 100,
-                  sort_field: str = "valid_until", 
-                  sort_order: str = "asc",
-                  user_id: Optional[int] = None, is_admin: bool = False):
+def _scoped_equipment_query(db: Session, user_id: Optional[int] = None, is_admin: bool = False):
+    """带部门、类别预加载和权限过滤的设备查询；用户没有任何器具权限时返回 None"""
     query = db.query(Equipment).options(
         joinedload(Equipment.department),
         joinedload(Equipment.category)
     )
     
     # 如果不是管理员，只能看到被授权的设备
-    if not is_admin and user_id:
-        user_permissions = get_user_equipment_permissions(db, user_id)
+    return apply_permission_scope(query, db, user_id, is_admin)
 
-        if user_permissions:
-            # 使用更复杂的权限检查：同时检查category_id和equipment_name
-            permission_conditions = []
-            for category_id, equipment_name in user_permissions:
-                permission_conditions.append(
-                    and_(
-                        Equipment.category_id == category_id,
-                        Equipment.name == equipment_name
-                    )
-                )
-            query = query.filter(or_(*permission_conditions))
-        else:
-            # 如果没有权限，返回空结果
-            return []
+def _apply_equipment_filters(query, filters):
+    """应用部门、类别、状态和有效期范围筛选条件（EquipmentFilter / EquipmentSearch 通用）"""
+    if filters.department_id:
+        query = query.filter(Equipment.department_id == filters.department_id)
+    
+    if filters.category_id:
+        query = query.filter(Equipment.category_id == filters.category_id)
+    
+    if filters.status:
+        query = query.filter(Equipment.status == filters.status)
+    
+    if filters.next_calibration_start:
+        query = query.filter(Equipment.valid_until >= filters.next_calibration_start)
+    
+    if filters.next_calibration_end:
+        query = query.filter(Equipment.valid_until <= filters.next_calibration_end)
+    
+    return query
+
+def _apply_sorting(query, sort_field: str, sort_order: str, match=None):
+    """
+    添加排序
+    
+    所有排序都以设备ID作为最后一个排序键，保证顺序稳定，可用于游标分页。
+    
+    Returns:
+        (排序后的查询, 排序签名, 排序键列表)；按相关度排序时排序键为 None（不支持游标分页）
+    """
+    descending = sort_order != "asc"
+    
+    if sort_field == "relevance" and match is not None:
+        # 按全文检索相关度排序（score越小越相关）
+        query = query.order_by(match.c.score.asc(), Equipment.id.asc())
+        return query, pagination.sort_signature(sort_field, "asc"), None
     
-    # 添加排序
     if sort_field == "name":
-        query = query.order_by(Equipment.name.asc() if sort_order == "asc" else Equipment.name.desc())
+        keys = [pagination.SortKey(Equipment.name, lambda e: e.name, descending)]
     elif sort_field == "department":
-        query = query.join(Equipment.department).order_by(
-            Department.name.asc() if sort_order == "asc" else Department.name.desc()
-        )
+        query = query.join(Equipment.department)
+        keys = [pagination.SortKey(Department.name, lambda e: e.department.name, descending)]
     elif sort_field == "category":
-        query = query.join(Equipment.category).order_by(
-            EquipmentCategory.name.asc() if sort_order == "asc" else EquipmentCategory.name.desc()
-        )
-    elif sort_field == "valid_until":
-        # 特殊处理：确保随坏随换设备（valid_until为null）总是排在最后
-        if sort_order == "asc":
-            # 升序：非null值按升序，null值排在最后
-            query = query.order_by(
-                Equipment.valid_until.asc().nulls_last()
-            )
-        else:
-            # 降序：非null值按降序，null值排在最后
-            query = query.order_by(
-                Equipment.valid_until.desc().nulls_last()
-            )
+        query = query.join(Equipment.category)
+        keys = [pagination.SortKey(EquipmentCategory.name, lambda e: e.category.name, descending)]
     else:
-        # 默认按有效期至升序排序，随坏随换设备排在最后
-        query = query.order_by(Equipment.valid_until.asc().nulls_last())
+        # 默认按有效期至排序，确保随坏随换设备（valid_until为null）总是排在最后
+        sort_field = "valid_until"
+        keys = [pagination.SortKey(Equipment.valid_until, lambda e: e.valid_until, descending, nullable=True)]
+    
+    keys.append(pagination.SortKey(Equipment.id, lambda e: e.id, descending))
+    signature = pagination.sort_signature(sort_field, "desc" if descending else "asc")
+    return pagination.order_by_keys(query, keys), signature, keys
+
+def _empty_page(skip: int, limit: int):
+    return {"items": [], "total": 0, "skip": skip, "limit": limit}
+
+def filter_equipments_query(db: Session, filters: Optional[EquipmentFilter] = None,
+                            user_id: Optional[int] = None, is_admin: bool = False,
+                            sort_field: str = "valid_until", sort_order: str = "asc"):
+    """带权限过滤、筛选条件和排序的设备查询（列表与流式导出共用）；用户没有任何器具权限时返回 None"""
+    query = _scoped_equipment_query(db, user_id, is_admin)
+    if query is None:
+        return None
+    
+    if filters is not None:
+        query = _apply_equipment_filters(query, filters)
+    query, _, _ = _apply_sorting(query, sort_field, sort_order)
+    return query
+
+def get_equipments(db: Session, skip: int = 0, limit: int = 100,
+                  sort_field: str = "valid_until", 
+                  sort_order: str = "asc",
+                  user_id: Optional[int] = None, is_admin: bool = False):
+    query = filter_equipments_query(db, None, user_id, is_admin, sort_field, sort_order)
+    if query is None:
+        # 如果没有权限，返回空结果
+        return []
     
     return query.offset(skip).limit(limit).all()
 
 def get_equipments_paginated(db: Session, skip: int = 0, limit: int = 100,
                            sort_field: str = "valid_until", 
                            sort_order: str = "asc",
-                           user_id: Optional[int] = None, is_admin: bool = False):
-    """获取分页设备数据"""
-    items = get_equipments(db, skip=skip, limit=limit, 
-                          sort_field=sort_field, sort_order=sort_order,
-                          user_id=user_id, is_admin=is_admin)
-    total = get_equipments_count(db, user_id=user_id, is_admin=is_admin)
+                           user_id: Optional[int] = None, is_admin: bool = False,
+                           cursor: Optional[str] = None,
+                           total_mode: str = pagination.TOTAL_EXACT):
+    """
+    获取分页设备数据
     
-    return {
-        "items": items,
-        "total": total,
-        "skip": skip,
-        "limit": limit
-    }
+    传入 cursor 时按游标定位下一页（忽略 skip），返回结果中的 next_cursor 用于继续翻页
+    """
+    query = _scoped_equipment_query(db, user_id, is_admin)
+    if query is None:
+        # 如果没有权限，返回空结果
+        return _empty_page(skip, limit)
+    
+    query, signature, keys = _apply_sorting(query, sort_field, sort_order)
+    return pagination.paginate(db, query, keys, signature, skip=skip, limit=limit,
+                               cursor=cursor, total_mode=total_mode,
+                               tags=permission_scope_tags(db, user_id, is_admin))
 
 def get_equipment(db: Session, equipment_id: int, user_id: Optional[int] = None,
                  is_admin: bool = False):
@@ -204,7 +222,18 @@ def get_equipment(db: Session, equipment_id: int, user_id: Optional[int] = None,
 
     return query.first()
 
-def create_equipment(db: Session, equipment: EquipmentCreate):
+def selected_equipments_query(db: Session, equipment_ids: List[int], user_id: Optional[int] = None,
+                              is_admin: bool = False):
+    """按给定顺序查询选中的设备（无权限的设备被过滤掉）；用户没有任何器具权限时返回 None"""
+    query = _scoped_equipment_query(db, user_id, is_admin)
+    if query is None:
+        return None
+    
+    order = {equipment_id: position for position, equipment_id in enumerate(dict.fromkeys(equipment_ids))}
+    return query.filter(Equipment.id.in_(order)).order_by(case(order, value=Equipment.id))
+
+def prepare_equipment_create(equipment: EquipmentCreate) -> dict:
+    """新建设备的列值（补全有效期至、管理级别、状态变更时间）"""
     # 自动计算有效期至（如果检定周期不是"随坏随换"）
     valid_until = None
     if equipment.calibration_cycle != "随坏随换" and equipment.calibration_date:
@@ -228,13 +257,67 @@ def create_equipment(db: Session, equipment: EquipmentCreate):
         else:
             # 如果没有提供状态变更时间，使用当前日期
             equipment_data["status_change_date"] = date.today()
-    
-    db_equipment = Equipment(**equipment_data)
+
+    return equipment_data
+
+def create_equipment(db: Session, equipment: EquipmentCreate):
+    db_equipment = Equipment(**prepare_equipment_create(equipment))
     db.add(db_equipment)
+    db.flush()
+    search_index.index_equipment(db, db_equipment.id)
     db.commit()
     db.refresh(db_equipment)
     return db_equipment
 
+def prepare_equipment_update(db_equipment, update_data: dict) -> dict:
+    """
+    补全设备更新的联动字段（有效期至、管理级别、状态变更时间）
+
+    db_equipment 为更新前的设备（ORM 对象或带同名属性的查询行），返回补全后的 update_data。
+    """
+    # 如果更新了检定日期或检定周期，重新计算有效期至
+    if "calibration_date" in update_data or "calibration_cycle" in update_data:
+        calibration_date = update_data.get("calibration_date", db_equipment.calibration_date)
+        calibration_cycle = update_data.get("calibration_cycle", db_equipment.calibration_cycle)
+        
+        # 只有当检定周期不是"随坏随换"且有检定日期时才计算有效期
+        if calibration_cycle != "随坏随换" and calibration_date:
+            update_data["valid_until"] = calculate_valid_until(
+                calibration_date, calibration_cycle
+            )
+        else:
+            update_data["valid_until"] = None
+    
+    # 处理管理级别：如果检定方式为外检，管理级别设为"-"
+    if "calibration_method" in update_data and update_data["calibration_method"] == "外检":
+        update_data["management_level"] = "-"
+    
+    # 处理状态变更时间
+    if "status" in update_data:
+        if update_data["status"] in ["停用", "报废"]:
+            # 如果设备状态变为停用或报废，自动清空有效期至
+            update_data["valid_until"] = None
+            
+            # 如果提供了状态变更时间，使用提供的时间
+            if "status_change_date" in update_data and update_data["status_change_date"]:
+                pass  # 使用提供的日期
+            elif str(db_equipment.status) == "在用":
+                # 只有当设备原本是在用状态且没有提供状态变更时间时，才使用当前日期
+                update_data["status_change_date"] = date.today()
+            # 如果设备原本就是停用或报废状态且没有提供新的状态变更时间，保留原有时间
+        else:
+            # 如果状态改为在用，清除状态变更时间
+            update_data["status_change_date"] = None
+            
+            # 如果设备从停用/报废状态恢复为在用，且检定周期不是"随坏随换"且有检定日期，重新计算有效期至
+            if update_data["status"] == "在用" and db_equipment.status in ["停用", "报废"]:
+                if db_equipment.calibration_cycle != "随坏随换" and db_equipment.calibration_date:
+                    update_data["valid_until"] = calculate_valid_until(
+                        db_equipment.calibration_date, db_equipment.calibration_cycle
+                    )
+
+    return update_data
+
 def update_equipment(db: Session, equipment_id: int, equipment_update: EquipmentUpdate, preserve_internal_id: bool = False):
     from app.utils.auto_id import generate_internal_id
 
@@ -259,50 +342,13 @@ def update_equipment(db: Session, equipment_id: int, equipment_update: Equipment
             except ValueError as e:
                 raise ValueError(f"生成内部编号失败: {str(e)}")
         
-        # 如果更新了检定日期或检定周期，重新计算有效期至
-        if "calibration_date" in update_data or "calibration_cycle" in update_data:
-            calibration_date = update_data.get("calibration_date", db_equipment.calibration_date)
-            calibration_cycle = update_data.get("calibration_cycle", db_equipment.calibration_cycle)
-            
-            # 只有当检定周期不是"随坏随换"且有检定日期时才计算有效期
-            if calibration_cycle != "随坏随换" and calibration_date:
-                update_data["valid_until"] = calculate_valid_until(
-                    calibration_date, calibration_cycle
-                )
-            else:
-                update_data["valid_until"] = None
-        
-        # 处理管理级别：如果检定方式为外检，管理级别设为"-"
-        if "calibration_method" in update_data and update_data["calibration_method"] == "外检":
-            update_data["management_level"] = "-"
-        
-        # 处理状态变更时间
-        if "status" in update_data:
-            if update_data["status"] in ["停用", "报废"]:
-                # 如果设备状态变为停用或报废，自动清空有效期至
-                update_data["valid_until"] = None
-                
-                # 如果提供了状态变更时间，使用提供的时间
-                if "status_change_date" in update_data and update_data["status_change_date"]:
-                    pass  # 使用提供的日期
-                elif str(db_equipment.status) == "在用":
-                    # 只有当设备原本是在用状态且没有提供状态变更时间时，才使用当前日期
-                    update_data["status_change_date"] = date.today()
-                # 如果设备原本就是停用或报废状态且没有提供新的状态变更时间，保留原有时间
-            else:
-                # 如果状态改为在用，清除状态变更时间
-                update_data["status_change_date"] = None
-                
-                # 如果设备从停用/报废状态恢复为在用，且检定周期不是"随坏随换"且有检定日期，重新计算有效期至
-                if update_data["status"] == "在用" and db_equipment.status in ["停用", "报废"]:
-                    if db_equipment.calibration_cycle != "随坏随换" and db_equipment.calibration_date:
-                        update_data["valid_until"] = calculate_valid_until(
-                            db_equipment.calibration_date, db_equipment.calibration_cycle
-                        )
-        
+        update_data = prepare_equipment_update(db_equipment, update_data)
+
         for field, value in update_data.items():
             setattr(db_equipment, field, value)
         
+        db.flush()
+        search_index.index_equipment(db, equipment_id)
         db.commit()
         db.refresh(db_equipment)
     return db_equipment
@@ -332,6 +378,7 @@ def delete_equipment(db: Session, equipment_id: int):
         db.query(CalibrationHistory).filter(CalibrationHistory.equipment_id == equipment_id).delete()
         
         # 删除设备
+        search_index.remove_equipment(db, equipment_id)
         db.delete(db_equipment)
         db.commit()
         return True
@@ -343,134 +390,46 @@ def filter_equipments_count(db: Session, filters: EquipmentFilter, user_id: Opti
     query = db.query(Equipment)
     
     # 权限控制 - 修复权限冲突问题
-    if not is_admin and user_id:
-        user_permissions = get_user_equipment_permissions(db, user_id)
-
-        if user_permissions:
-            # 使用更复杂的权限检查：同时检查category_id和equipment_name
-            permission_conditions = []
-            for category_id, equipment_name in user_permissions:
-                permission_conditions.append(
-                    and_(
-                        Equipment.category_id == category_id,
-                        Equipment.name == equipment_name
-                    )
-                )
-            query = query.filter(or_(*permission_conditions))
-        else:
-            # 如果没有权限，返回空结果
-            return 0
+    query = apply_permission_scope(query, db, user_id, is_admin)
+    if query is None:
+        # 如果没有权限，返回空结果
+        return 0
     
     # 应用筛选条件
-    if filters.department_id:
-        query = query.filter(Equipment.department_id == filters.department_id)
-    
-    if filters.category_id:
-        query = query.filter(Equipment.category_id == filters.category_id)
-    
-    if filters.status:
-        query = query.filter(Equipment.status == filters.status)
-    
-    if filters.next_calibration_start:
-        query = query.filter(Equipment.valid_until >= filters.next_calibration_start)
-    
-    if filters.next_calibration_end:
-        query = query.filter(Equipment.valid_until <= filters.next_calibration_end)
-    
-    return query.count()
+    return _apply_equipment_filters(query, filters).count()
 
 def filter_equipments(db: Session, filters: EquipmentFilter, user_id: Optional[int] = None, 
                      is_admin: bool = False, skip: int = 0, limit: int = 100,
                      sort_field: str = "valid_until", 
                      sort_order: str = "asc"):
-    query = db.query(Equipment).options(
-        joinedload(Equipment.department),
-        joinedload(Equipment.category)
-    )
-    
-    # 权限控制 - 修复权限冲突问题
-    if not is_admin and user_id:
-        user_permissions = get_user_equipment_permissions(db, user_id)
-
-        if user_permissions:
-            # 使用更复杂的权限检查：同时检查category_id和equipment_name
-            permission_conditions = []
-            for category_id, equipment_name in user_permissions:
-                permission_conditions.append(
-                    and_(
-                        Equipment.category_id == category_id,
-                        Equipment.name == equipment_name
-                    )
-                )
-            query = query.filter(or_(*permission_conditions))
-        else:
-            # 如果没有权限，返回空结果
-            return []
-    
-    # 应用筛选条件
-    if filters.department_id:
-        query = query.filter(Equipment.department_id == filters.department_id)
-    
-    if filters.category_id:
-        query = query.filter(Equipment.category_id == filters.category_id)
-    
-    if filters.status:
-        query = query.filter(Equipment.status == filters.status)
-    
-    if filters.next_calibration_start:
-        query = query.filter(Equipment.valid_until >= filters.next_calibration_start)
-    
-    if filters.next_calibration_end:
-        query = query.filter(Equipment.valid_until <= filters.next_calibration_end)
-    
-    # 添加排序
-    if sort_field == "name":
-        query = query.order_by(Equipment.name.asc() if sort_order == "asc" else Equipment.name.desc())
-    elif sort_field == "department":
-        query = query.join(Equipment.department).order_by(
-            Department.name.asc() if sort_order == "asc" else Department.name.desc()
-        )
-    elif sort_field == "category":
-        query = query.join(Equipment.category).order_by(
-            EquipmentCategory.name.asc() if sort_order == "asc" else EquipmentCategory.name.desc()
-        )
-    elif sort_field == "valid_until":
-        # 特殊处理：确保随坏随换设备（valid_until为null）总是排在最后
-        if sort_order == "asc":
-            # 升序：非null值按升序，null值排在最后
-            query = query.order_by(
-                Equipment.valid_until.asc().nulls_last()
-            )
-        else:
-            # 降序：非null值按降序，null值排在最后
-            query = query.order_by(
-                Equipment.valid_until.desc().nulls_last()
-            )
-    else:
-        # 默认按有效期至升序排序，随坏随换设备排在最后
-        query = query.order_by(Equipment.valid_until.asc().nulls_last())
+    query = filter_equipments_query(db, filters, user_id, is_admin, sort_field, sort_order)
+    if query is None:
+        # 如果没有权限，返回空结果
+        return []
     
     return query.offset(skip).limit(limit).all()
 
 def filter_equipments_paginated(db: Session, filters: EquipmentFilter, user_id: Optional[int] = None, 
                                is_admin: bool = False, skip: int = 0, limit: int = 100,
                                sort_field: str = "valid_until", 
-                               sort_order: str = "asc"):
-    """获取分页筛选设备数据"""
-    items = filter_equipments(db, filters, user_id, is_admin, skip, limit,
-                             sort_field=sort_field, sort_order=sort_order)
-    total = filter_equipments_count(db, filters, user_id, is_admin)
-    
-    return {
-        "items": items,
-        "total": total,
-        "skip": skip,
-        "limit": limit
-    }
-
-def get_equipments_due_for_calibration(db: Session, start_date: date, end_date: date,
-                                     user_id: Optional[int] = None, is_admin: bool = False):
-    """获取指定日期范围内需要检定的设备"""
+                               sort_order: str = "asc",
+                               cursor: Optional[str] = None,
+                               total_mode: str = pagination.TOTAL_EXACT):
+    """获取分页筛选设备数据（支持游标分页）"""
+    query = _scoped_equipment_query(db, user_id, is_admin)
+    if query is None:
+        # 如果没有权限，返回空结果
+        return _empty_page(skip, limit)
+    
+    query = _apply_equipment_filters(query, filters)
+    query, signature, keys = _apply_sorting(query, sort_field, sort_order)
+    return pagination.paginate(db, query, keys, signature, skip=skip, limit=limit,
+                               cursor=cursor, total_mode=total_mode,
+                               tags=permission_scope_tags(db, user_id, is_admin))
+
+def due_for_calibration_query(db: Session, start_date: date, end_date: date,
+                              user_id: Optional[int] = None, is_admin: bool = False):
+    """指定日期范围内需要检定的在用设备查询（按有效期至升序）；用户没有任何器具权限时返回 None"""
     query = db.query(Equipment).options(
         joinedload(Equipment.department),
         joinedload(Equipment.category)
@@ -482,26 +441,20 @@ def get_equipments_due_for_calibration(db: Session, start_date: date, end_date:
         )
     )
     
-    if not is_admin and user_id:
-        # 修复权限冲突：同时检查category_id和equipment_name
-        user_permissions = get_user_equipment_permissions(db, user_id)
-
-        if user_permissions:
-            permission_conditions = []
-            for category_id, equipment_name in user_permissions:
-                permission_conditions.append(
-                    and_(
-                        Equipment.category_id == category_id,
-                        Equipment.name == equipment_name
-                    )
-                )
-            query = query.filter(or_(*permission_conditions))
-        else:
-            # 如果没有权限，返回空结果
-            return []
+    query = apply_permission_scope(query, db, user_id, is_admin)
+    if query is None:
+        return None
     
     # 按有效期至升序排序
-    query = query.order_by(Equipment.valid_until.asc().nulls_last())
+    return query.order_by(Equipment.valid_until.asc().nulls_last())
+
+def get_equipments_due_for_calibration(db: Session, start_date: date, end_date: date,
+                                     user_id: Optional[int] = None, is_admin: bool = False):
+    """获取指定日期范围内需要检定的设备"""
+    query = due_for_calibration_query(db, start_date, end_date, user_id, is_admin)
+    if query is None:
+        # 如果没有权限，返回空结果
+        return []
     
     return query.all()
 
@@ -515,289 +468,166 @@ def get_overdue_equipments(db: Session, user_id: Optional[int] = None, is_admin:
         )
     )
     
-    if not is_admin and user_id:
-        # 修复权限冲突：同时检查category_id和equipment_name
-        user_permissions = get_user_equipment_permissions(db, user_id)
-
-        if user_permissions:
-            permission_conditions = []
-            for category_id, equipment_name in user_permissions:
-                permission_conditions.append(
-                    and_(
-                        Equipment.category_id == category_id,
-                        Equipment.name == equipment_name
-                    )
-                )
-            query = query.filter(or_(*permission_conditions))
-        else:
-            # 如果没有权限，返回空结果
-            return []
+    query = apply_permission_scope(query, db, user_id, is_admin)
+    if query is None:
+        # 如果没有权限，返回空结果
+        return []
     
     # 按有效期至升序排序（最早超期的排在前面）
     query = query.order_by(Equipment.valid_until.asc().nulls_last())
     
     return query.all()
 
-def search_equipments_count(db: Session, search: EquipmentSearch, user_id: Optional[int] = None, 
-                           is_admin: bool = False):
-    """获取搜索结果总数"""
-    query = db.query(Equipment).options(
-        joinedload(Equipment.department),
-        joinedload(Equipment.category)
-    )
-    
-    # 权限控制 - 修复权限冲突问题
-    if not is_admin and user_id:
-        user_permissions = get_user_equipment_permissions(db, user_id)
-
-        if user_permissions:
-            # 使用更复杂的权限检查：同时检查category_id和equipment_name
-            permission_conditions = []
-            for category_id, equipment_name in user_permissions:
-                permission_conditions.append(
-                    and_(
-                        Equipment.category_id == category_id,
-                        Equipment.name == equipment_name
-                    )
-                )
-            query = query.filter(or_(*permission_conditions))
-        else:
-            # 如果没有权限，返回空结果
-            return 0
-    
-    # 构建搜索条件
+def _like_search_conditions(db: Session, search_text: str):
+    """LIKE 模糊搜索条件（全文检索索引不可用时使用）"""
     search_conditions = []
-    if search.query:
-        search_term = f"%{search.query}%"
-        search_conditions.extend([
-            Equipment.name.ilike(search_term),
-            Equipment.model.ilike(search_term),
-            Equipment.internal_id.ilike(search_term),
-            Equipment.manufacturer.ilike(search_term),
-            Equipment.manufacturer_id.ilike(search_term),
-            Equipment.installation_location.ilike(search_term),
-            Equipment.notes.ilike(search_term),
-            Equipment.accuracy_level.ilike(search_term),
-            Equipment.measurement_range.ilike(search_term),
-            Equipment.calibration_method.ilike(search_term)
-        ])
-        
-        # 添加原值/元字段搜索支持
-        # 尝试将搜索词转换为数字，如果成功则搜索原值字段
-        try:
-            # 移除可能的货币符号和空格
-            clean_search_term = search.query.replace(',', '').replace('，', '').replace(' ', '').strip()
-            if clean_search_term:
-                # 尝试转换为浮点数
-                search_value = float(clean_search_term)
-                
-                # 精确匹配
-                search_conditions.append(Equipment.original_value == search_value)
-                
-                # 更精确的模糊匹配：只匹配包含完整搜索词的数值
-                # 例如搜索"1500"会匹配"1500.0"但不会匹配"1000.0"
-                search_conditions.append(
-                    cast(Equipment.original_value, String).ilike(f"%{clean_search_term}.%")
-                )
-                search_conditions.append(
-                    cast(Equipment.original_value, String).ilike(f"{clean_search_term}.%")
-                )
-        except ValueError:
-            # 如果转换失败，只进行字符串匹配，但排除NULL值
+    search_term = f"%{search_text}%"
+    search_conditions.extend([
+        Equipment.name.ilike(search_term),
+        Equipment.model.ilike(search_term),
+        Equipment.internal_id.ilike(search_term),
+        Equipment.manufacturer.ilike(search_term),
+        Equipment.manufacturer_id.ilike(search_term),
+        Equipment.installation_location.ilike(search_term),
+        Equipment.notes.ilike(search_term),
+        Equipment.accuracy_level.ilike(search_term),
+        Equipment.measurement_range.ilike(search_term),
+        Equipment.calibration_method.ilike(search_term)
+    ])
+    
+    # 添加原值/元字段搜索支持
+    # 尝试将搜索词转换为数字，如果成功则搜索原值字段
+    try:
+        # 移除可能的货币符号和空格
+        clean_search_term = search_text.replace(',', '').replace('，', '').replace(' ', '').strip()
+        if clean_search_term:
+            # 尝试转换为浮点数
+            search_value = float(clean_search_term)
+            
+            # 精确匹配
+            search_conditions.append(Equipment.original_value == search_value)
+            
+            # 更精确的模糊匹配：只匹配包含完整搜索词的数值
+            # 例如搜索"1500"会匹配"1500.0"但不会匹配"1000.0"
             search_conditions.append(
-                and_(
-                    Equipment.original_value.isnot(None),
-                    cast(Equipment.original_value, String).ilike(search_term)
-                )
+                cast(Equipment.original_value, String).ilike(f"%{clean_search_term}.%")
+            )
+            search_conditions.append(
+                cast(Equipment.original_value, String).ilike(f"{clean_search_term}.%")
+            )
+    except ValueError:
+        # 如果转换失败，只进行字符串匹配，但排除NULL值
+        search_conditions.append(
+            and_(
+                Equipment.original_value.isnot(None),
+                cast(Equipment.original_value, String).ilike(search_term)
             )
+        )
     
     # 添加部门名称搜索
-    if search.query:
-        department_subquery = db.query(Department.id).filter(
-            Department.name.ilike(f"%{search.query}%")
-        )
-        search_conditions.append(Equipment.department_id.in_(department_subquery))
+    department_subquery = db.query(Department.id).filter(
+        Department.name.ilike(search_term)
+    )
+    search_conditions.append(Equipment.department_id.in_(department_subquery))
     
     # 添加类别名称搜索
-    if search.query:
-        category_subquery = db.query(EquipmentCategory.id).filter(
-            EquipmentCategory.name.ilike(f"%{search.query}%")
-        )
-        search_conditions.append(Equipment.category_id.in_(category_subquery))
+    category_subquery = db.query(EquipmentCategory.id).filter(
+        EquipmentCategory.name.ilike(search_term)
+    )
+    search_conditions.append(Equipment.category_id.in_(category_subquery))
     
-    if search_conditions:
-        query = query.filter(or_(*search_conditions))
+    return search_conditions
+
+def _apply_text_search(db: Session, query, search_text: Optional[str]):
+    """
+    应用搜索词条件
+    全文检索索引可用时先用索引缩小候选集（返回匹配子查询用于相关度排序），
+    再在候选集上复核LIKE条件，结果与原有模糊搜索一致；索引不可用时直接使用LIKE条件
+    """
+    if not search_text:
+        return query, None
     
-    # 添加其他筛选条件
-    if search.department_id:
-        query = query.filter(Equipment.department_id == search.department_id)
+    match = search_index.search_match_subquery(db, search_text)
+    if match is not None:
+        query = query.join(match, Equipment.id == match.c.equipment_id)
     
-    if search.category_id:
-        query = query.filter(Equipment.category_id == search.category_id)
+    return query.filter(or_(*_like_search_conditions(db, search_text))), match
+
+def search_equipments_count(db: Session, search: EquipmentSearch, user_id: Optional[int] = None, 
+                           is_admin: bool = False):
+    """获取搜索结果总数"""
+    query = db.query(Equipment)
     
-    if search.status:
-        query = query.filter(Equipment.status == search.status)
+    # 权限控制 - 修复权限冲突问题
+    query = apply_permission_scope(query, db, user_id, is_admin)
+    if query is None:
+        # 如果没有权限，返回空结果
+        return 0
     
-    # 添加日期筛选条件
-    if search.next_calibration_start:
-        query = query.filter(Equipment.valid_until >= search.next_calibration_start)
+    # 构建搜索条件
+    query, _ = _apply_text_search(db, query, search.query)
     
-    if search.next_calibration_end:
-        query = query.filter(Equipment.valid_until <= search.next_calibration_end)
+    # 添加其他筛选条件
+    return _apply_equipment_filters(query, search).count()
+
+def _search_query(db: Session, search: EquipmentSearch, user_id: Optional[int], is_admin: bool):
+    """构建搜索查询，返回 (查询, 全文检索匹配子查询)；用户没有任何器具权限时查询为 None"""
+    query = _scoped_equipment_query(db, user_id, is_admin)
+    if query is None:
+        return None, None
     
-    return query.count()
+    # 构建搜索条件
+    query, match = _apply_text_search(db, query, search.query)
+    
+    # 添加其他筛选条件
+    return _apply_equipment_filters(query, search), match
 
 def search_equipments(db: Session, search: EquipmentSearch, user_id: Optional[int] = None, 
                      is_admin: bool = False, skip: int = 0, limit: int = 100,
                      sort_field: str = "valid_until", sort_order: str = "asc"):
     """全文本搜索设备"""
-    query = db.query(Equipment).options(
-        joinedload(Equipment.department),
-        joinedload(Equipment.category)
-    )
+    query = search_equipments_query(db, search, user_id, is_admin, sort_field, sort_order)
+    if query is None:
+        # 如果没有权限，返回空结果
+        return []
     
-    # 权限控制 - 修复权限冲突问题
-    if not is_admin and user_id:
-        user_permissions = get_user_equipment_permissions(db, user_id)
+    return query.offset(skip).limit(limit).all()
 
-        if user_permissions:
-            # 使用更复杂的权限检查：同时检查category_id和equipment_name
-            permission_conditions = []
-            for category_id, equipment_name in user_permissions:
-                permission_conditions.append(
-                    and_(
-                        Equipment.category_id == category_id,
-                        Equipment.name == equipment_name
-                    )
-                )
-            query = query.filter(or_(*permission_conditions))
-        else:
-            # 如果没有权限，返回空结果
-            return []
+def search_equipments_query(db: Session, search: EquipmentSearch, user_id: Optional[int] = None,
+                            is_admin: bool = False, sort_field: str = "valid_until", sort_order: str = "asc"):
+    """排序后的搜索查询（列表与流式导出共用）；用户没有任何器具权限时返回 None"""
+    query, match = _search_query(db, search, user_id, is_admin)
+    if query is None:
+        return None
     
-    # 构建搜索条件
-    search_conditions = []
-    if search.query:
-        search_term = f"%{search.query}%"
-        search_conditions.extend([
-            Equipment.name.ilike(search_term),
-            Equipment.model.ilike(search_term),
-            Equipment.internal_id.ilike(search_term),
-            Equipment.manufacturer.ilike(search_term),
-            Equipment.manufacturer_id.ilike(search_term),
-            Equipment.installation_location.ilike(search_term),
-            Equipment.notes.ilike(search_term),
-            Equipment.accuracy_level.ilike(search_term),
-            Equipment.measurement_range.ilike(search_term),
-            Equipment.calibration_method.ilike(search_term)
-        ])
-        
-        # 添加原值/元字段搜索支持
-        # 尝试将搜索词转换为数字，如果成功则搜索原值字段
-        try:
-            # 移除可能的货币符号和空格
-            clean_search_term = search.query.replace(',', '').replace('，', '').replace(' ', '').strip()
-            if clean_search_term:
-                # 尝试转换为浮点数
-                search_value = float(clean_search_term)
-                
-                # 精确匹配
-                search_conditions.append(Equipment.original_value == search_value)
-                
-                # 更精确的模糊匹配：只匹配包含完整搜索词的数值
-                # 例如搜索"1500"会匹配"1500.0"但不会匹配"1000.0"
-                search_conditions.append(
-                    cast(Equipment.original_value, String).ilike(f"%{clean_search_term}.%")
-                )
-                search_conditions.append(
-                    cast(Equipment.original_value, String).ilike(f"{clean_search_term}.%")
-                )
-        except ValueError:
-            # 如果转换失败，只进行字符串匹配，但排除NULL值
-            search_conditions.append(
-                and_(
-                    Equipment.original_value.isnot(None),
-                    cast(Equipment.original_value, String).ilike(search_term)
-                )
-            )
-    
-    # 添加部门名称搜索
-    if search.query:
-        department_subquery = db.query(Department.id).filter(
-            Department.name.ilike(f"%{search.query}%")
-        )
-        search_conditions.append(Equipment.department_id.in_(department_subquery))
-    
-    # 添加类别名称搜索
-    if search.query:
-        category_subquery = db.query(EquipmentCategory.id).filter(
-            EquipmentCategory.name.ilike(f"%{search.query}%")
-        )
-        search_conditions.append(Equipment.category_id.in_(category_subquery))
-    
-    if search_conditions:
-        query = query.filter(or_(*search_conditions))
-    
-    # 添加其他筛选条件
-    if search.department_id:
-        query = query.filter(Equipment.department_id == search.department_id)
-    
-    if search.category_id:
-        query = query.filter(Equipment.category_id == search.category_id)
-    
-    if search.status:
-        query = query.filter(Equipment.status == search.status)
-    
-    # 添加日期筛选条件
-    if search.next_calibration_start:
-        query = query.filter(Equipment.valid_until >= search.next_calibration_start)
-    
-    if search.next_calibration_end:
-        query = query.filter(Equipment.valid_until <= search.next_calibration_end)
-    
-    # 添加排序逻辑
-    if sort_field == "name":
-        query = query.order_by(Equipment.name.asc() if sort_order == "asc" else Equipment.name.desc())
-    elif sort_field == "department":
-        query = query.join(Equipment.department).order_by(
-            Department.name.asc() if sort_order == "asc" else Department.name.desc()
-        )
-    elif sort_field == "category":
-        query = query.join(Equipment.category).order_by(
-            EquipmentCategory.name.asc() if sort_order == "asc" else EquipmentCategory.name.desc()
-        )
-    elif sort_field == "valid_until":
-        # 特殊处理：确保随坏随换设备（valid_until为null）总是排在最后
-        if sort_order == "asc":
-            # 升序：非null值按升序，null值排在最后
-            query = query.order_by(
-                Equipment.valid_until.asc().nulls_last()
-            )
-        else:
-            # 降序：非null值按降序，null值排在最后
-            query = query.order_by(
-                Equipment.valid_until.desc().nulls_last()
-            )
-    else:
-        # 默认按有效期至升序排序，随坏随换设备排在最后
-        query = query.order_by(Equipment.valid_until.asc().nulls_last())
-    
-    return query.offset(skip).limit(limit).all()
+    query, _, _ = _apply_sorting(query, sort_field, sort_order, match)
+    return query
 
 def search_equipments_paginated(db: Session, search: EquipmentSearch, user_id: Optional[int] = None,
                                is_admin: bool = False, skip: int = 0, limit: int = 100,
-                               sort_field: str = "valid_until", sort_order: str = "asc"):
-    """获取分页搜索结果"""
-    items = search_equipments(db, search, user_id, is_admin, skip, limit, sort_field, sort_order)
-    total = search_equipments_count(db, search, user_id, is_admin)
-
-    return {
-        "items": items,
-        "total": total,
-        "skip": skip,
-        "limit": limit
-    }
-
+                               sort_field: str = "valid_until", sort_order: str = "asc",
+                               cursor: Optional[str] = None,
+                               total_mode: str = pagination.TOTAL_EXACT):
+    """获取分页搜索结果（相关度排序不支持游标分页）"""
+    query, match = _search_query(db, search, user_id, is_admin)
+    if query is None:
+        # 如果没有权限，返回空结果
+        return _empty_page(skip, limit)
+    
+    query, signature, keys = _apply_sorting(query, sort_field, sort_order, match)
+    return pagination.paginate(db, query, keys, signature, skip=skip, limit=limit,
+                               cursor=cursor, total_mode=total_mode,
+                               tags=permission_scope_tags(db, user_id, is_admin))
+
+def _sort_projection(query, sort_field: str, sort_order: str):
+    """列表投影查询的排序（按设备字段排序，设备ID兜底保证顺序稳定）"""
+    if hasattr(Equipment, sort_field):
+        sort_column = getattr(Equipment, sort_field)
+        if sort_order.lower() == 'desc':
+            query = query.order_by(sort_column.desc(), Equipment.id.desc())
+        else:
+            query = query.order_by(sort_column.asc(), Equipment.id.asc())
+    return query
 
 def get_equipments_with_attachment_count(db: Session, skip: int = 0, limit: int = 100,
                                        sort_field: str = "valid_until",
@@ -805,95 +635,27 @@ def get_equipments_with_attachment_count(db: Session, skip: int = 0, limit: int
                                        user_id: Optional[int] = None, is_admin: bool = False):
     """
     获取设备列表，包含附件数量统计
-    解决N+1查询问题，使用单次查询获取所有数据
+    只查询列表需要的列（见 equipment_rows），结果为可直接序列化的字典，不实例化ORM对象
     """
-    # 构建附件统计子查询
-    attachment_count_subquery = db.query(
-        EquipmentAttachment.equipment_id,
-        func.count(EquipmentAttachment.id).label('attachment_count')
-    ).group_by(EquipmentAttachment.equipment_id).subquery()
-
-    # 主查询，左连接附件统计
-    query = db.query(Equipment, attachment_count_subquery.c.attachment_count).options(
-        joinedload(Equipment.department),
-        joinedload(Equipment.category)
-    ).outerjoin(
-        attachment_count_subquery,
-        Equipment.id == attachment_count_subquery.c.equipment_id
-    )
+    query = equipment_rows.list_projection_query(db)
 
     # 权限控制
-    if not is_admin and user_id:
-        user_permissions = get_user_equipment_permissions(db, user_id)
-        if user_permissions:
-            permission_conditions = []
-            for category_id, equipment_name in user_permissions:
-                permission_conditions.append(
-                    and_(
-                        Equipment.category_id == category_id,
-                        Equipment.name == equipment_name
-                    )
-                )
-            query = query.filter(or_(*permission_conditions))
-        else:
-            return {"total": 0, "items": [], "skip": skip, "limit": limit}
+    query = apply_permission_scope(query, db, user_id, is_admin)
+    if query is None:
+        # 如果没有权限，返回空结果
+        return {"total": 0, "items": [], "skip": skip, "limit": limit}
 
     # 添加排序
-    if hasattr(Equipment, sort_field):
-        sort_column = getattr(Equipment, sort_field)
-        if sort_order.lower() == 'desc':
-            query = query.order_by(sort_column.desc())
-        else:
-            query = query.order_by(sort_column.asc())
-
-    # 计算总数
-    total = query.count()
+    query = _sort_projection(query, sort_field, sort_order)
 
-    # 分页并获取结果
-    query = query.offset(skip).limit(limit)
-    results = query.all()
-
-    # 构建响应数据
-    equipment_list = []
-    for equipment, attachment_count in results:
-        equipment_dict = {
-            'id': equipment.id,
-            'department_id': equipment.department_id,
-            'category_id': equipment.category_id,
-            'name': equipment.name,
-            'model': equipment.model,
-            'accuracy_level': equipment.accuracy_level,
-            'measurement_range': equipment.measurement_range,
-            'calibration_cycle': equipment.calibration_cycle,
-            'calibration_date': equipment.calibration_date,
-            'valid_until': equipment.valid_until,
-            'calibration_method': equipment.calibration_method,
-            'current_calibration_result': equipment.current_calibration_result,
-            'internal_id': equipment.internal_id,
-            'manufacturer_id': equipment.manufacturer_id,
-            'installation_location': equipment.installation_location,
-            'manufacturer': equipment.manufacturer,
-            'manufacture_date': equipment.manufacture_date,
-            'scale_value': equipment.scale_value,
-            'management_level': equipment.management_level,
-            'original_value': equipment.original_value,
-            'status': equipment.status,
-            'status_change_date': equipment.status_change_date,
-            'certificate_number': equipment.certificate_number,
-            'verification_agency': equipment.verification_agency,
-            'certificate_form': equipment.certificate_form,
-            'notes': equipment.notes,
-            'created_at': equipment.created_at,
-            'updated_at': equipment.updated_at,
-            'attachment_count': attachment_count or 0,  # 确保有默认值
-            'department': equipment.department,
-            'category': equipment.category
-        }
-        equipment_list.append(equipment_dict)
+    # 分页并获取结果（同一次查询返回总数）
+    results, total = pagination.fetch_page_with_total(
+        db, query, skip, limit, tags=permission_scope_tags(db, user_id, is_admin)
+    )
 
     return {
         "total": total,
-        "items": equipment_list,
+        "items": equipment_rows.rows_to_items(results),
         "skip": skip,
         "limit": limit
     }
@@ -905,62 +667,28 @@ def search_equipments_with_attachment_count(db: Session, search: EquipmentSearch
                                            sort_field: str = "valid_until", sort_order: str = "asc"):
     """
     搜索设备，包含附件数量统计
-    解决N+1查询问题，使用单次查询获取所有数据
+    只查询列表需要的列（见 equipment_rows），结果为可直接序列化的字典，不实例化ORM对象
     """
-    # 构建附件统计子查询
-    attachment_count_subquery = db.query(
-        EquipmentAttachment.equipment_id,
-        func.count(EquipmentAttachment.id).label('attachment_count')
-    ).group_by(EquipmentAttachment.equipment_id).subquery()
-
-    # 主查询，左连接附件统计
-    query = db.query(Equipment, attachment_count_subquery.c.attachment_count).options(
-        joinedload(Equipment.department),
-        joinedload(Equipment.category)
-    ).outerjoin(
-        attachment_count_subquery,
-        Equipment.id == attachment_count_subquery.c.equipment_id
-    )
+    query = equipment_rows.list_projection_query(db)
 
     # 权限控制
-    if not is_admin and user_id:
-        user_permissions = get_user_equipment_permissions(db, user_id)
-        if user_permissions:
-            permission_conditions = []
-            for category_id, equipment_name in user_permissions:
-                permission_conditions.append(
-                    and_(
-                        Equipment.category_id == category_id,
-                        Equipment.name == equipment_name
-                    )
-                )
-            query = query.filter(or_(*permission_conditions))
-        else:
-            return {"total": 0, "items": [], "skip": skip, "limit": limit}
+    query = apply_permission_scope(query, db, user_id, is_admin)
+    if query is None:
+        # 如果没有权限，返回空结果
+        return {"total": 0, "items": [], "skip": skip, "limit": limit}
 
     # 构建搜索条件
-    search_conditions = []
-    if search.query:
-        search_term = f"%{search.query}%"
-        search_conditions.append(
-            or_(
-                Equipment.name.ilike(search_term),
-                Equipment.internal_id.ilike(search_term),
-                Equipment.model.ilike(search_term),
-                Equipment.accuracy_level.ilike(search_term),
-                Equipment.measurement_range.ilike(search_term),
-                Equipment.notes.ilike(search_term)
-            )
-        )
+    query, match = _apply_text_search(db, query, search.query)
 
     # 应用其他搜索字段
+    search_conditions = []
     if search.category_id:
         search_conditions.append(Equipment.category_id == search.category_id)
     if search.department_id:
         search_conditions.append(Equipment.department_id == search.department_id)
     if search.status:
         search_conditions.append(Equipment.status == search.status)
-    if search.management_level:
+    if getattr(search, "management_level", None):
         search_conditions.append(Equipment.management_level == search.management_level)
 
     # 应用搜索条件
@@ -968,61 +696,19 @@ def search_equipments_with_attachment_count(db: Session, search: EquipmentSearch
         query = query.filter(and_(*search_conditions))
 
     # 添加排序
-    if hasattr(Equipment, sort_field):
-        sort_column = getattr(Equipment, sort_field)
-        if sort_order.lower() == 'desc':
-            query = query.order_by(sort_column.desc())
-        else:
-            query = query.order_by(sort_column.asc())
-
-    # 计算总数
-    total = query.count()
-
-    # 分页并获取结果
-    query = query.offset(skip).limit(limit)
-    results = query.all()
+    if sort_field == "relevance" and match is not None:
+        query = query.order_by(match.c.score.asc(), Equipment.id.asc())
+    else:
+        query = _sort_projection(query, sort_field, sort_order)
 
-    # 构建响应数据
-    equipment_list = []
-    for equipment, attachment_count in results:
-        equipment_dict = {
-            'id': equipment.id,
-            'department_id': equipment.department_id,
-            'category_id': equipment.category_id,
-            'name': equipment.name,
-            'model': equipment.model,
-            'accuracy_level': equipment.accuracy_level,
-            'measurement_range': equipment.measurement_range,
-            'calibration_cycle': equipment.calibration_cycle,
-            'calibration_date': equipment.calibration_date,
-            'valid_until': equipment.valid_until,
-            'calibration_method': equipment.calibration_method,
-            'current_calibration_result': equipment.current_calibration_result,
-            'internal_id': equipment.internal_id,
-            'manufacturer_id': equipment.manufacturer_id,
-            'installation_location': equipment.installation_location,
-            'manufacturer': equipment.manufacturer,
-            'manufacture_date': equipment.manufacture_date,
-            'scale_value': equipment.scale_value,
-            'management_level': equipment.management_level,
-            'original_value': equipment.original_value,
-            'status': equipment.status,
-            'status_change_date': equipment.status_change_date,
-            'certificate_number': equipment.certificate_number,
-            'verification_agency': equipment.verification_agency,
-            'certificate_form': equipment.certificate_form,
-            'notes': equipment.notes,
-            'created_at': equipment.created_at,
-            'updated_at': equipment.updated_at,
-            'attachment_count': attachment_count or 0,  # 确保有默认值
-            'department': equipment.department,
-            'category': equipment.category
-        }
-        equipment_list.append(equipment_dict)
+    # 分页并获取结果（同一次查询返回总数）
+    results, total = pagination.fetch_page_with_total(
+        db, query, skip, limit, tags=permission_scope_tags(db, user_id, is_admin)
+    )
 
     return {
         "total": total,
-        "items": equipment_list,
+        "items": equipment_rows.rows_to_items(results),
         "skip": skip,
         "limit": limit
-    }
\ No newline at end of file
+    }
@@ -0,0 +1,304 @@
+"""
+设备批量导入写入
+
+导入数据经 app.utils.import_validation 校验后，由这里按批写入：
+- 部门、类别已在校验阶段一次性解析；已存在的设备每批按出厂编号做一次 IN 查询
+- 内部编号由 InternalIdAllocator 分配：每批按新设备数量为每个 类别代码-类型编号 前缀预留一段序列号
+- 新设备用一条 insert().values([...]) 写入；需要覆盖的设备用一条
+  INSERT ... ON CONFLICT (internal_id) DO UPDATE 写入（行中带现有设备的内部编号，必然冲突）
+- 每批一个事务；批量语句失败时回滚该批的保存点，再逐行在各自的保存点中重试，只有出错的行记为失败
+- before_commit 回调在每批提交前执行，调用方可在同一事务中记录断点，断点与数据同时生效
+
+Core 语句不经过 ORM flush，汇总表、全文检索索引和缓存失效在写入时显式维护。
+"""
+
+import logging
+from collections import Counter
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import bindparam, func, update
+from sqlalchemy.orm import Session
+
+from app.models.models import Equipment
+from app.schemas.schemas import EquipmentCreate, EquipmentUpdate
+from app.crud import search_index
+from app.crud.cache_invalidation import register_equipment_change, register_type_code_change
+from app.crud.equipment import prepare_equipment_create, prepare_equipment_update
+from app.crud.equipment_stats import KEY_ATTRIBUTES, apply_deltas, stats_key
+from app.utils.auto_id import InternalIdAllocator
+
+logger = logging.getLogger(__name__)
+
+# 覆盖导入时比较的字段，只有这些字段变化才更新
+COMPARED_FIELDS = (
+    "department_id", "category_id", "name", "model", "accuracy_level", "measurement_range",
+    "calibration_cycle", "calibration_date", "calibration_method", "current_calibration_result",
+    "installation_location", "manufacturer", "manufacture_date", "scale_value", "management_level",
+    "original_value", "status", "status_change_date", "certificate_number", "verification_agency",
+    "certificate_form", "notes"
+)
+
+_TABLE = Equipment.__table__
+
+# upsert 写入的列（主键和时间戳除外）
+WRITABLE_COLUMNS = tuple(
+    column.name for column in _TABLE.columns if column.name not in ("id", "created_at", "updated_at")
+)
+
+# 导入结果状态与计数字段
+STATUS_COUNTERS = {
+    "成功": "success_count",
+    "更新": "update_count",
+    "跳过": "skip_count",
+    "失败": "error_count",
+}
+
+ImportRecord = Tuple[int, dict]  # (Excel行号, 设备字段)
+
+
+class _PendingWrite(NamedTuple):
+    result: dict
+    values: dict
+    current: Optional[object]  # 覆盖更新前的设备行，新增为None
+    changed_fields: int
+
+
+def _fail(result: dict, message: str) -> None:
+    result["status"] = "失败"
+    result["message"] = message
+
+
+def iter_batches(records: Iterable[ImportRecord], batch_size: int) -> Iterator[List[ImportRecord]]:
+    """
+    按批大小切分导入记录
+
+    同一批内出厂编号重复时提前结束该批，使后一行在下一批中能查到前一行写入的设备。
+    """
+    batch_size = max(1, batch_size or 1)
+    batch, seen = [], set()
+    for row_number, record in records:
+        manufacturer_id = record["manufacturer_id"]
+        if len(batch) >= batch_size or manufacturer_id in seen:
+            yield batch
+            batch, seen = [], set()
+        batch.append((row_number, record))
+        seen.add(manufacturer_id)
+    if batch:
+        yield batch
+
+
+def load_existing_equipments(db: Session, manufacturer_ids: List[str]) -> Dict[str, object]:
+    """按出厂编号查询已存在的设备（同一出厂编号有多台时取最早的一台）"""
+    rows = db.query(*_TABLE.columns).filter(
+        Equipment.manufacturer_id.in_(set(manufacturer_ids))
+    ).order_by(Equipment.id).all()
+
+    existing = {}
+    for row in rows:
+        existing.setdefault(row.manufacturer_id, row)
+    return existing
+
+
+def _plan_batch(db: Session, batch: List[ImportRecord], overwrite: bool,
+                allocator: InternalIdAllocator) -> Tuple[List[dict], List[_PendingWrite]]:
+    """确定每行的处理方式：新增、覆盖、跳过或失败"""
+    existing = load_existing_equipments(db, [record["manufacturer_id"] for _, record in batch])
+    results, pending, creates = [], [], []
+
+    for row_number, record in batch:
+        result = {
+            "row": row_number,
+            "internal_id": "",
+            "name": record["name"],
+            "status": "",
+            "message": ""
+        }
+        results.append(result)
+
+        try:
+            current = existing.get(record["manufacturer_id"])
+            if current is None:
+                # 新建设备：先校验数据，校验通过后再分配内部编号（校验失败的行不占用序列号）
+                creates.append((result, EquipmentCreate(**record)))
+                continue
+
+            # 已存在设备：保留现有内部编号
+            result["internal_id"] = current.internal_id
+            equipment_data = EquipmentCreate(internal_id=current.internal_id, **record)
+
+            if not overwrite:
+                _fail(result, f"出厂编号'{record['manufacturer_id']}'的设备已存在，无法重复导入")
+                continue
+
+            # 智能覆盖：只更新有变化的字段
+            update_fields = {
+                field: getattr(equipment_data, field) for field in COMPARED_FIELDS
+                if getattr(current, field) != getattr(equipment_data, field)
+            }
+            if not update_fields:
+                result["status"] = "跳过"
+                result["message"] = "设备数据无变化，跳过更新"
+                continue
+
+            update_data = prepare_equipment_update(
+                current, EquipmentUpdate(**update_fields).model_dump(exclude_unset=True)
+            )
+            values = {column: getattr(current, column) for column in WRITABLE_COLUMNS}
+            values.update(update_data)
+            pending.append(_PendingWrite(result, values, current, len(update_fields)))
+        except Exception as e:
+            _fail(result, f"处理数据时发生错误: {str(e)}")
+
+    allocator.reserve((data.category_id, data.name) for _, data in creates)
+    for result, equipment_data in creates:
+        try:
+            result["internal_id"] = allocator.allocate(equipment_data.category_id, equipment_data.name)
+            equipment_data = equipment_data.model_copy(update={"internal_id": result["internal_id"]})
+            pending.append(_PendingWrite(result, prepare_equipment_create(equipment_data), None, 0))
+        except Exception as e:
+            _fail(result, f"处理数据时发生错误: {str(e)}")
+
+    return results, pending
+
+
+def _upsert(db: Session, rows: List[dict]) -> None:
+    """按内部编号覆盖已存在的设备"""
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        statement = insert(_TABLE).values(rows)
+        assignments = {column: statement.excluded[column] for column in WRITABLE_COLUMNS if column != "internal_id"}
+        assignments["updated_at"] = func.now()
+        db.execute(statement.on_conflict_do_update(index_elements=[_TABLE.c.internal_id], set_=assignments))
+        return
+
+    # 其他数据库：executemany UPDATE
+    db.execute(
+        update(_TABLE).where(_TABLE.c.internal_id == bindparam("match_internal_id")).values(updated_at=func.now()),
+        [{**row, "match_internal_id": row["internal_id"]} for row in rows]
+    )
+
+
+def _write(db: Session, pending: List[_PendingWrite]) -> None:
+    """写入一组设备，并维护汇总表、全文检索索引和缓存失效"""
+    inserts = [item.values for item in pending if item.current is None]
+    updates = [item.values for item in pending if item.current is not None]
+    if inserts:
+        db.execute(_TABLE.insert().values(inserts))
+    if updates:
+        _upsert(db, updates)
+
+    deltas = Counter()
+    for item in pending:
+        deltas[stats_key(*(item.values[attribute] for attribute in KEY_ATTRIBUTES))] += 1
+        register_equipment_change(db, item.values["department_id"], item.values["category_id"])
+        if item.current is None:
+            register_type_code_change(db, item.values["category_id"], item.values["name"])
+        else:
+            deltas[stats_key(*(getattr(item.current, attribute) for attribute in KEY_ATTRIBUTES))] -= 1
+            register_equipment_change(db, item.current.department_id, item.current.category_id)
+            if (item.current.category_id, item.current.name) != (item.values["category_id"], item.values["name"]):
+                register_type_code_change(db, item.current.category_id, item.current.name, removed=True)
+                register_type_code_change(db, item.values["category_id"], item.values["name"])
+    apply_deltas(db, deltas)
+
+    internal_ids = [item.values["internal_id"] for item in pending]
+    equipment_ids = [
+        equipment_id for (equipment_id,) in
+        db.query(Equipment.id).filter(Equipment.internal_id.in_(internal_ids)).all()
+    ]
+    search_index.index_equipments(db, equipment_ids)
+
+
+def _succeed(item: _PendingWrite) -> None:
+    if item.current is None:
+        item.result["status"] = "成功"
+        item.result["message"] = "成功导入新设备"
+    else:
+        item.result["status"] = "更新"
+        item.result["message"] = f"成功更新{item.changed_fields}个字段"
+
+
+def write_batch(db: Session, pending: List[_PendingWrite],
+                before_commit: Optional[Callable[[], None]] = None) -> None:
+    """
+    在一个事务中写入一批设备
+
+    批量语句失败时回滚该批的保存点，逐行在各自的保存点中重试，出错的行记为失败。
+    before_commit 在提交前执行（此时每行的结果已确定），其写入与本批数据一起提交。
+    """
+    if not pending:
+        if before_commit:
+            before_commit()
+        db.commit()
+        return
+
+    try:
+        with db.begin_nested():
+            _write(db, pending)
+    except Exception as e:
+        logger.warning(f"导入批量写入失败，逐行重试: {e}")
+        for item in pending:
+            try:
+                with db.begin_nested():
+                    _write(db, [item])
+            except Exception as row_error:
+                _fail(item.result, f"处理数据时发生错误: {str(row_error)}")
+            else:
+                _succeed(item)
+    else:
+        for item in pending:
+            _succeed(item)
+
+    if before_commit:
+        before_commit()
+    db.commit()
+
+
+def import_equipment_records(
+    db: Session,
+    records: Iterable[ImportRecord],
+    overwrite: bool = False,
+    batch_size: int = 50,
+    on_batch: Optional[Callable[[int, Dict[str, int]], None]] = None,
+    before_commit: Optional[Callable[[Session, List[dict], Dict[str, int]], None]] = None,
+    collect_results: bool = True
+) -> dict:
+    """
+    批量导入已校验的设备记录
+
+    Args:
+        records: (Excel行号, 设备字段) 序列，字段与 EquipmentCreate 对应（不含内部编号）
+        overwrite: 出厂编号已存在时是否覆盖
+        batch_size: 每批行数（每批一个事务）
+        on_batch: 每批提交后回调 (本批行数, 累计计数)
+        before_commit: 每批提交前回调 (数据库会话, 本批结果, 含本批的累计计数)，在本批事务中执行
+        collect_results: 是否在返回值中汇总逐行结果（调用方自行保存结果时传 False，避免占用内存）
+
+    Returns:
+        {"results": [...], "success_count", "update_count", "skip_count", "error_count"}
+    """
+    counts = {counter: 0 for counter in STATUS_COUNTERS.values()}
+    results = []
+    allocator = InternalIdAllocator(db)
+
+    for batch in iter_batches(records, batch_size):
+        batch_results, pending = _plan_batch(db, batch, overwrite, allocator)
+
+        def count_batch() -> None:
+            for result in batch_results:
+                counts[STATUS_COUNTERS[result["status"]]] += 1
+            if before_commit:
+                before_commit(db, batch_results, dict(counts))
+
+        write_batch(db, pending, before_commit=count_batch)
+        if collect_results:
+            results.extend(batch_results)
+
+        if on_batch:
+            on_batch(len(batch), dict(counts))
+
+    return {"results": results, **counts}
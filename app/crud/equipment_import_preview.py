@@ -0,0 +1,215 @@
+"""
+设备导入预览（试运行）
+
+按与正式导入相同的规则计算每行的处理结果，不写入任何数据：
+- 逐块读取、按列校验（与正式导入共用 import_reader / import_validation）
+- 每块的出厂编号用一次 IN 查询取得已存在的设备，之后逐行在内存中比较并记录预计结果，
+  文件内重复的出厂编号与前一行的导入结果比较（与正式导入逐批写入后的效果一致）
+- 覆盖导入时按正式导入比较的字段得到每行的变更字段
+- 新设备的内部编号由 InternalIdAllocator 预先推算（只读取序列当前值，不占用序列号）
+
+结果逐行写入 openpyxl write-only 工作簿（差异表），内存占用不随行数增长。
+"""
+
+import os
+import time
+from collections import Counter
+from datetime import date
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pandas as pd
+from openpyxl import Workbook
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.crud.equipment_import import COMPARED_FIELDS, load_existing_equipments
+from app.utils.auto_id import InternalIdAllocator
+from app.utils.import_reader import iter_import_chunks
+from app.utils.import_validation import (
+    FIELD_COLUMNS, ImportValidation, LookupFrames, load_lookup_frames, validate_import_frame,
+    iter_equipment_records
+)
+
+# 预览差异表的存放目录
+PREVIEW_DIR = Path("data/imports/previews")
+
+PREVIEW_COLUMNS = ['行号', '出厂编号', '计量器具名称', '预计结果', '内部编号', '变更字段数', '说明']
+
+# 预计结果与正式导入结果的对应：新增 -> 成功
+CREATE, UPDATE, SKIP, FAIL = '新增', '更新', '跳过', '失败'
+
+PREVIEW_COUNTERS = {
+    CREATE: "create_count",
+    UPDATE: "update_count",
+    SKIP: "skip_count",
+    FAIL: "error_count",
+}
+
+
+def _rule_errors(rows: pd.DataFrame) -> pd.Series:
+    """EquipmentCreate 中检定结果与设备状态的联动规则（正式导入在构造 EquipmentCreate 时失败）"""
+    messages = pd.Series('', index=rows.index, dtype=object)
+    qualified = rows['current_calibration_result'] == '合格'
+    messages[qualified & ~rows['status'].isin(['在用', '停用'])] = \
+        "检定结果为合格时，设备状态只能是'在用'或'停用'"
+    messages[~qualified & (rows['status'] != '报废')] = \
+        "新建设备时，检定结果为不合格的设备状态必须设置为'报废'"
+    return messages
+
+
+class ImportPreview:
+    """累计预览结果并逐行写入差异表"""
+
+    def __init__(self, db: Session, lookups: LookupFrames, overwrite: bool, sample_size: int = 100):
+        self.db = db
+        self.overwrite = overwrite
+        self.sample_size = sample_size
+        self.allocator = InternalIdAllocator(db, reserve_numbers=False)
+        # 出厂编号 -> 当前（或文件中前一行导入后）的设备字段；已确认不存在的出厂编号
+        self.state: Dict[str, dict] = {}
+        self.missing = set()
+
+        self.counts = Counter()
+        self.field_changes = Counter()
+        self.sample: List[dict] = []
+        self.names = {
+            'department_id': dict(zip(lookups.departments['department_id'], lookups.departments['department_name'])),
+            'category_id': dict(zip(lookups.categories['category_id'], lookups.categories['category_name'])),
+        }
+
+        self.workbook = Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet('导入预览')
+        self.sheet.append(PREVIEW_COLUMNS)
+
+    def _display(self, field: str, value) -> str:
+        if value is None or pd.isna(value):
+            return ''
+        if field in self.names:
+            return str(self.names[field].get(value, value))
+        if isinstance(value, date):
+            return value.isoformat()
+        return str(value)
+
+    def _fetch_existing(self, manufacturer_ids) -> None:
+        """一次 IN 查询取得本块中尚未加载的出厂编号对应的设备"""
+        unknown = [mid for mid in set(manufacturer_ids) if mid not in self.state and mid not in self.missing]
+        if not unknown:
+            return
+        existing = load_existing_equipments(self.db, unknown)
+        for mid in unknown:
+            current = existing.get(mid)
+            if current is None:
+                self.missing.add(mid)
+            else:
+                self.state[mid] = {
+                    'internal_id': current.internal_id,
+                    **{field: getattr(current, field) for field in COMPARED_FIELDS}
+                }
+
+    def _preview_record(self, row: int, record: dict) -> tuple:
+        """预览一行：与当前状态比较后更新状态，使文件中后出现的同一出厂编号与本行的导入结果比较"""
+        mid, name = record['manufacturer_id'], record['name']
+        values = {field: record[field] for field in COMPARED_FIELDS}
+        current = self.state.get(mid)
+
+        if current is None:
+            # 新设备：推算内部编号
+            internal_id = self.allocator.allocate(record['category_id'], name)
+            self.state[mid] = {'internal_id': internal_id, **values}
+            return row, mid, name, CREATE, internal_id, 0, '将导入新设备'
+
+        internal_id = current['internal_id']
+        if not self.overwrite:
+            return row, mid, name, FAIL, internal_id, 0, f"出厂编号'{mid}'的设备已存在，无法重复导入"
+
+        changed = [field for field in COMPARED_FIELDS if current[field] != values[field]]
+        if not changed:
+            return row, mid, name, SKIP, internal_id, 0, '设备数据无变化，跳过更新'
+
+        changes = []
+        for field in changed:
+            label = FIELD_COLUMNS.get(field, field)
+            self.field_changes[label] += 1
+            old, new = self._display(field, current[field]), self._display(field, values[field])
+            changes.append(f"{label}: {old or '(空)'} → {new or '(空)'}")
+        self.state[mid] = {'internal_id': internal_id, **values}
+        return row, mid, name, UPDATE, internal_id, len(changed), '；'.join(changes)
+
+    def add(self, validation: ImportValidation) -> None:
+        """预览一块校验后的数据"""
+        results = [
+            (record['row'], '', record['name'], FAIL, '', 0, record['message'])
+            for record in validation.errors.to_dict('records')
+        ]
+
+        rows = validation.rows
+        rule_errors = _rule_errors(rows)
+        for (row, mid, name), message in zip(
+                rows.loc[rule_errors != '', ['row', 'manufacturer_id', 'name']].itertuples(index=False),
+                rule_errors[rule_errors != '']):
+            results.append((row, mid, name, FAIL, '', 0, message))
+        rows = rows[rule_errors == '']
+
+        if len(rows):
+            self._fetch_existing(rows['manufacturer_id'])
+            results.extend(self._preview_record(row, record) for row, record in iter_equipment_records(rows))
+
+        results.sort(key=lambda item: item[0])
+        for result in results:
+            row, mid, name, action, internal_id, changed_count, message = result
+            self.counts[action] += 1
+            self.sheet.append([int(row), mid, name, action, internal_id, changed_count, message])
+            if action in (UPDATE, FAIL) and len(self.sample) < self.sample_size:
+                self.sample.append(dict(zip(
+                    ['row', 'manufacturer_id', 'name', 'action', 'internal_id', 'changed_fields', 'message'],
+                    [int(row), mid, name, action, internal_id, changed_count, message]
+                )))
+
+    def save(self, output_path: str) -> dict:
+        """保存差异表并返回汇总"""
+        self.workbook.save(output_path)
+        summary = {counter: self.counts[action] for action, counter in PREVIEW_COUNTERS.items()}
+        return {
+            "total_rows": sum(summary.values()),
+            **summary,
+            "field_changes": dict(self.field_changes.most_common()),
+            "sample": self.sample
+        }
+
+
+def preview_import_file(db: Session, source_path: str, overwrite: bool, output_path: str,
+                        chunk_size: Optional[int] = None) -> dict:
+    """
+    预览导入文件的处理结果（不写入数据库）
+
+    Args:
+        source_path: 暂存的导入文件
+        overwrite: 按覆盖导入预览（否则已存在的设备计为失败）
+        output_path: 差异表保存路径
+
+    Returns:
+        汇总：各预计结果的行数、各字段的变更次数和更新/失败行样本
+    """
+    lookups = load_lookup_frames(db)
+    preview = ImportPreview(db, lookups, overwrite, sample_size=settings.IMPORT_ERROR_SAMPLE_SIZE)
+    for chunk in iter_import_chunks(source_path, chunk_size or settings.IMPORT_READ_CHUNK_ROWS):
+        preview.add(validate_import_frame(chunk, lookups))
+    return preview.save(output_path)
+
+
+def preview_path(token: str) -> Path:
+    return PREVIEW_DIR / f"{token}.xlsx"
+
+
+def purge_previews(max_age_seconds: int) -> None:
+    """删除超过保留时长的差异表"""
+    if not PREVIEW_DIR.exists():
+        return
+    deadline = time.time() - max_age_seconds
+    for path in PREVIEW_DIR.glob("*.xlsx"):
+        try:
+            if path.stat().st_mtime < deadline:
+                os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,79 @@
+"""
+设备列表的列投影查询
+
+列表视图只需要设备、部门、类别的部分列，这里直接 SELECT 这些列得到元组，
+再按列名组装为可直接序列化的字典，不经过 ORM 对象实例化、identity map 和 Pydantic 校验。
+输出结构与 schemas.Equipment 一致（部门、类别为嵌套对象，类别代码字段名为 category_code）。
+"""
+
+from typing import List, Sequence
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, Query
+
+from app.models.models import Equipment, Department, EquipmentCategory, EquipmentAttachment
+
+# 列表视图输出的设备字段（与 schemas.Equipment 对应）
+EQUIPMENT_FIELDS = (
+    "id", "department_id", "category_id", "name", "model", "accuracy_level",
+    "measurement_range", "calibration_cycle", "calibration_date", "valid_until",
+    "calibration_method", "current_calibration_result", "internal_id",
+    "manufacturer_id", "installation_location", "manufacturer", "manufacture_date",
+    "scale_value", "management_level", "original_value", "status",
+    "status_change_date", "certificate_number", "verification_agency",
+    "certificate_form", "notes", "created_at", "updated_at"
+)
+
+DEPARTMENT_FIELDS = ("id", "name", "code", "description", "created_at")
+
+# 类别的 code 列在接口中输出为 category_code
+CATEGORY_FIELDS = ("id", "name", "category_code", "description", "predefined_names", "created_at")
+_CATEGORY_COLUMNS = ("id", "name", "code", "description", "predefined_names", "created_at")
+
+_EQUIPMENT_COUNT = len(EQUIPMENT_FIELDS)
+_DEPARTMENT_END = _EQUIPMENT_COUNT + len(DEPARTMENT_FIELDS)
+_CATEGORY_END = _DEPARTMENT_END + len(CATEGORY_FIELDS)
+
+
+def attachment_count_column():
+    """
+    附件数量（关联子查询）
+
+    只对当前页的设备逐行统计，配合 equipment_attachments.equipment_id 索引，
+    避免先对整张附件表分组聚合再外连接。
+    """
+    return select(func.count(EquipmentAttachment.id)).where(
+        EquipmentAttachment.equipment_id == Equipment.id
+    ).correlate(Equipment).scalar_subquery()
+
+
+def list_projection_query(db: Session) -> Query:
+    """
+    构建列表投影查询
+
+    结果每行依次为：设备字段、部门字段、类别字段、附件数量；
+    以 Equipment 为主表，可直接叠加权限、筛选、全文检索条件。
+    """
+    columns = [getattr(Equipment, field) for field in EQUIPMENT_FIELDS]
+    columns += [getattr(Department, field) for field in DEPARTMENT_FIELDS]
+    columns += [getattr(EquipmentCategory, field) for field in _CATEGORY_COLUMNS]
+    columns.append(attachment_count_column())
+
+    return db.query(*columns).select_from(Equipment).join(
+        Department, Equipment.department_id == Department.id
+    ).join(
+        EquipmentCategory, Equipment.category_id == EquipmentCategory.id
+    )
+
+
+def rows_to_items(rows: Sequence[Sequence]) -> List[dict]:
+    """将投影查询的结果元组组装为列表项字典"""
+    items = []
+    append = items.append
+    for row in rows:
+        item = dict(zip(EQUIPMENT_FIELDS, row[:_EQUIPMENT_COUNT]))
+        item["department"] = dict(zip(DEPARTMENT_FIELDS, row[_EQUIPMENT_COUNT:_DEPARTMENT_END]))
+        item["category"] = dict(zip(CATEGORY_FIELDS, row[_DEPARTMENT_END:_CATEGORY_END]))
+        item["attachment_count"] = row[_CATEGORY_END]
+        append(item)
+    return items
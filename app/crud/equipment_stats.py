@@ -0,0 +1,337 @@
+"""
+设备统计汇总表
+
+equipment_stats 按 (部门, 类别, 器具名称, 状态, 有效期月份) 汇总设备数量，
+仪表盘、报表概览和部门统计都从这张表做少量索引求和，不再逐次扫描设备表。
+
+维护方式：在 Session 的 flush 钩子中比较设备新增、修改、删除前后的汇总键，
+把数量增减合并后写入汇总表，随设备数据在同一事务中提交。
+设备创建、更新、删除、检定、批量操作和回滚都经过 ORM，因此无需在各处单独调用。
+绕过 ORM 的批量写入（Core insert/update）需要自行调用 apply_deltas 或 rebuild_equipment_stats。
+
+汇总表只有月份精度；查询日期区间时，完整月份取汇总表，区间两端不完整的月份
+在设备表上按 (status, valid_until) 索引做一次范围计数。
+"""
+
+import logging
+from calendar import monthrange
+from collections import Counter
+from datetime import date, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import and_, or_, event, func, inspect, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.models import Equipment, EquipmentStats, UserEquipmentPermission
+from app.crud.permission_scope import authorized_equipment_clause, get_permission_grants
+
+logger = logging.getLogger(__name__)
+
+# 汇总键字段（设备属性），valid_until 在汇总表中折算为月份
+KEY_ATTRIBUTES = ("department_id", "category_id", "name", "status", "valid_until")
+
+StatsKey = Tuple[int, int, str, str, str]
+
+# 汇总表中与 StatsKey 对应的列（唯一约束 uq_equipment_stats_key）
+KEY_COLUMNS = ("department_id", "category_id", "name", "status", "valid_month")
+
+_DELTAS_KEY = "equipment_stats_deltas"
+
+
+def month_key(value: Optional[date]) -> str:
+    """有效期至所在月份，无有效期返回空串"""
+    if value is None:
+        return ""
+    return f"{value.year:04d}-{value.month:02d}"
+
+
+def stats_key(department_id, category_id, name, status, valid_until) -> StatsKey:
+    return (department_id, category_id, name, status or "", month_key(valid_until))
+
+
+# ========== 增量维护 ==========
+
+def _committed_value(state, attribute):
+    """属性修改前（数据库中）的值"""
+    history = state.attrs[attribute].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return state.attrs[attribute].value
+
+
+def _committed_key(equipment: Equipment) -> StatsKey:
+    state = inspect(equipment)
+    return stats_key(*(_committed_value(state, attribute) for attribute in KEY_ATTRIBUTES))
+
+
+def _current_key(equipment: Equipment) -> StatsKey:
+    return stats_key(*(getattr(equipment, attribute) for attribute in KEY_ATTRIBUTES))
+
+
+def _collect_deltas(session: Session) -> Counter:
+    deltas = Counter()
+
+    for obj in session.new:
+        if isinstance(obj, Equipment):
+            deltas[_current_key(obj)] += 1
+
+    for obj in session.deleted:
+        if isinstance(obj, Equipment):
+            deltas[_committed_key(obj)] -= 1
+
+    for obj in session.dirty:
+        if isinstance(obj, Equipment) and session.is_modified(obj, include_collections=False):
+            old_key, new_key = _committed_key(obj), _current_key(obj)
+            if old_key != new_key:
+                deltas[old_key] -= 1
+                deltas[new_key] += 1
+
+    return Counter({key: delta for key, delta in deltas.items() if delta})
+
+
+@event.listens_for(Session, "before_flush")
+def _capture_equipment_changes(session, flush_context, instances):
+    deltas = _collect_deltas(session)
+    if deltas:
+        session.info.setdefault(_DELTAS_KEY, Counter()).update(deltas)
+
+
+@event.listens_for(Session, "after_flush")
+def _write_equipment_changes(session, flush_context):
+    deltas = session.info.pop(_DELTAS_KEY, None)
+    if deltas:
+        apply_deltas(session, deltas)
+
+
+def _load_old_value_on_set(target, value, oldvalue, initiator):
+    return value
+
+
+# 汇总键属性被赋值时先加载旧值，保证 flush 时能拿到修改前的汇总键
+for _attribute in KEY_ATTRIBUTES:
+    event.listen(getattr(Equipment, _attribute), "set", _load_old_value_on_set,
+                 active_history=True, retval=True)
+
+
+def apply_deltas(db: Session, deltas: Dict[StatsKey, int]) -> None:
+    """
+    将设备数量增减写入汇总表
+
+    在调用方的事务中执行；键不存在时插入新行。
+    SQLite / PostgreSQL 用 INSERT ... ON CONFLICT DO UPDATE 原子地插入或累加，
+    并发事务同时插入同一个键时不会违反唯一约束。
+    """
+    # 在 flush 钩子中调用，直接在连接上执行 Core 语句，避免再次触发 autoflush
+    connection = db.connection()
+    table = EquipmentStats.__table__
+    rows = [
+        dict(zip(KEY_COLUMNS, key), equipment_count=delta)
+        for key, delta in deltas.items() if delta
+    ]
+    if not rows:
+        return
+
+    dialect = connection.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        statement = insert(table).values(rows)
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=[table.c[column] for column in KEY_COLUMNS],
+            set_={"equipment_count": table.c.equipment_count + statement.excluded.equipment_count}
+        ))
+        return
+
+    # 其他数据库：先累加，键不存在时在保存点中插入，与并发插入冲突则改为累加
+    for row in rows:
+        _add_count(connection, table, row)
+
+
+def _add_count(connection, table, row: dict) -> None:
+    condition = and_(*(table.c[column] == row[column] for column in KEY_COLUMNS))
+    result = connection.execute(
+        update(table).where(condition).values(equipment_count=table.c.equipment_count + row["equipment_count"])
+    )
+    if result.rowcount:
+        return
+    try:
+        with connection.begin_nested():
+            connection.execute(table.insert().values(**row))
+    except IntegrityError:
+        _add_count(connection, table, row)
+
+
+def rebuild_equipment_stats(db: Session) -> int:
+    """全量重建汇总表，返回汇总的设备数"""
+    counts = Counter()
+    rows = db.query(
+        Equipment.department_id, Equipment.category_id, Equipment.name,
+        Equipment.status, Equipment.valid_until, func.count(Equipment.id)
+    ).group_by(
+        Equipment.department_id, Equipment.category_id, Equipment.name,
+        Equipment.status, Equipment.valid_until
+    ).all()
+    for department_id, category_id, name, status, valid_until, count in rows:
+        counts[stats_key(department_id, category_id, name, status, valid_until)] += count
+
+    db.query(EquipmentStats).delete(synchronize_session=False)
+    if counts:
+        db.execute(EquipmentStats.__table__.insert(), [
+            {
+                "department_id": key[0], "category_id": key[1], "name": key[2],
+                "status": key[3], "valid_month": key[4], "equipment_count": count
+            }
+            for key, count in counts.items()
+        ])
+    db.commit()
+    return sum(counts.values())
+
+
+def ensure_equipment_stats(engine: Engine) -> bool:
+    """
+    校验汇总表与设备表按状态的数量是否一致，不一致时（首次启用、绕过ORM的写入等）全量重建
+
+    Returns:
+        是否执行了重建
+    """
+    from app.db.database import SessionLocal
+    db = SessionLocal()
+    try:
+        expected = {
+            status or "": count for status, count in
+            db.query(Equipment.status, func.count(Equipment.id)).group_by(Equipment.status).all()
+        }
+        actual = {
+            status: count for status, count in
+            db.query(EquipmentStats.status, func.sum(EquipmentStats.equipment_count))
+            .group_by(EquipmentStats.status).all() if count
+        }
+        if expected == actual:
+            return False
+        count = rebuild_equipment_stats(db)
+        logger.info(f"设备统计汇总表已重建，共 {count} 台设备")
+        return True
+    finally:
+        db.close()
+
+
+# ========== 查询 ==========
+
+def stats_query(db: Session, *columns, user_id: Optional[int] = None, is_admin: bool = False,
+                department_id: Optional[int] = None):
+    """
+    汇总表查询（带权限范围）
+
+    汇总键包含类别和器具名称，权限过滤直接与 user_equipment_permissions 连接。
+    用户没有任何器具权限时返回 None。
+    """
+    query = db.query(*columns).select_from(EquipmentStats)
+
+    if not is_admin and user_id:
+        if not get_permission_grants(db, user_id):
+            return None
+        query = query.join(
+            UserEquipmentPermission,
+            and_(
+                UserEquipmentPermission.user_id == user_id,
+                UserEquipmentPermission.category_id == EquipmentStats.category_id,
+                UserEquipmentPermission.equipment_name == EquipmentStats.name
+            )
+        )
+
+    if department_id is not None:
+        query = query.filter(EquipmentStats.department_id == department_id)
+
+    return query
+
+
+def _equipment_range_count(db: Session, ranges: Iterable[Tuple[date, date]], status: str,
+                           user_id: Optional[int], is_admin: bool,
+                           department_id: Optional[int]) -> int:
+    """在设备表上统计若干有效期区间内的设备数（用于不完整的月份）"""
+    ranges = [(start, end) for start, end in ranges if start <= end]
+    if not ranges:
+        return 0
+
+    query = db.query(func.count(Equipment.id)).filter(
+        Equipment.status == status,
+        or_(*[Equipment.valid_until.between(start, end) for start, end in ranges])
+    )
+    if department_id is not None:
+        query = query.filter(Equipment.department_id == department_id)
+    if not is_admin and user_id:
+        query = query.filter(authorized_equipment_clause(user_id))
+    return query.scalar() or 0
+
+
+def _month_end(value: date) -> date:
+    return date(value.year, value.month, monthrange(value.year, value.month)[1])
+
+
+def _next_month_start(value: date) -> date:
+    return _month_end(value) + timedelta(days=1)
+
+
+def count_valid_between(db: Session, start: date, end: date, status: str = "在用",
+                        user_id: Optional[int] = None, is_admin: bool = False,
+                        department_id: Optional[int] = None) -> int:
+    """
+    统计有效期至在 [start, end] 内的设备数
+
+    完整月份取汇总表，两端不完整的月份查询设备表。
+    """
+    if start > end:
+        return 0
+
+    first_full = start if start.day == 1 else _next_month_start(start)
+    last_full = end if end == _month_end(end) else date(end.year, end.month, 1) - timedelta(days=1)
+
+    if first_full > last_full:
+        # 区间内没有完整月份
+        return _equipment_range_count(db, [(start, end)], status, user_id, is_admin, department_id)
+
+    query = stats_query(db, func.sum(EquipmentStats.equipment_count),
+                        user_id=user_id, is_admin=is_admin, department_id=department_id)
+    if query is None:
+        return 0
+    full_months = query.filter(
+        EquipmentStats.status == status,
+        EquipmentStats.valid_month.between(month_key(first_full), month_key(last_full))
+    ).scalar() or 0
+
+    partial = _equipment_range_count(
+        db,
+        [(start, first_full - timedelta(days=1)), (last_full + timedelta(days=1), end)],
+        status, user_id, is_admin, department_id
+    )
+    return full_months + partial
+
+
+def count_overdue(db: Session, today: Optional[date] = None, status: str = "在用",
+                  user_id: Optional[int] = None, is_admin: bool = False,
+                  department_id: Optional[int] = None) -> int:
+    """统计有效期至早于今天的设备数：之前的月份取汇总表，本月取设备表"""
+    today = today or date.today()
+    current_month_start = date(today.year, today.month, 1)
+
+    query = stats_query(db, func.sum(EquipmentStats.equipment_count),
+                        user_id=user_id, is_admin=is_admin, department_id=department_id)
+    if query is None:
+        return 0
+    past_months = query.filter(
+        EquipmentStats.status == status,
+        EquipmentStats.valid_month != "",
+        EquipmentStats.valid_month < month_key(today)
+    ).scalar() or 0
+
+    this_month = _equipment_range_count(
+        db, [(current_month_start, today - timedelta(days=1))],
+        status, user_id, is_admin, department_id
+    )
+    return past_months + this_month
@@ -0,0 +1,234 @@
+"""
+后台导出任务
+
+导出请求登记为 ExportJob，由 export_worker 在后台生成 XLSX 文件，HTTP 请求不再等待工作簿生成：
+- 缓存键 = hash(导出类型和参数, 权限范围指纹, 数据版本)；导出文件按缓存键保存在 EXPORT_DIR
+- 数据版本为导出内容所依赖的缓存标签（设备、部门、类别、用户）的版本摘要（tag_version）：
+  设备写入提交后由 cache_invalidation 钩子失效，部门、类别（含负责人）、用户名修改由各接口失效
+- 数据未变更（数据版本相同）时，相同参数、相同权限范围的导出直接复用已有文件，不再重新查询生成
+- 未连接 Redis 时标签版本号只在进程内有效（重启后归零），数据版本附带进程标识，不复用重启前的文件
+- 同一缓存键已有任务在生成时，新任务等待该任务完成后共用其文件，不重复生成
+- 导出文件超过 EXPORT_RETENTION_SECONDS 未被复用即删除
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.cache import cache_service, tag_version
+from app.core.cache_config import CacheTag
+from app.core.config import settings
+from app.models.export_job import ExportJob, ExportStatus
+from app.utils.export_stream import XlsxSheet, write_xlsx
+
+logger = logging.getLogger(__name__)
+
+# 导出文件的存放目录
+EXPORT_DIR = Path("data/exports")
+
+UNFINISHED_STATES = (ExportStatus.PENDING, ExportStatus.PROCESSING)
+
+# 导出内容依赖的数据：设备及其部门、类别名称和负责人（用户名）
+EXPORT_DATA_TAGS = (CacheTag.EQUIPMENT, CacheTag.DEPARTMENTS, CacheTag.CATEGORIES, CacheTag.USERS)
+
+_PROCESS_TOKEN = uuid.uuid4().hex[:8]
+
+
+def current_data_version() -> str:
+    """导出数据的当前版本"""
+    version = tag_version(EXPORT_DATA_TAGS)
+    if cache_service.redis_client is None:
+        return f"{version}-{_PROCESS_TOKEN}"
+    return version
+
+
+def export_cache_key(export_type: str, params: Optional[dict], scope: str, data_version: str) -> str:
+    """导出缓存键：参数按键排序序列化，与请求中的字段顺序无关"""
+    payload = json.dumps(
+        {"type": export_type, "params": params or {}, "scope": scope, "version": data_version},
+        sort_keys=True, ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def artifact_path(cache_key: str) -> Path:
+    return EXPORT_DIR / f"{cache_key}.xlsx"
+
+
+def _timeout_deadline() -> datetime:
+    return datetime.now() - timedelta(seconds=settings.EXPORT_JOB_TIMEOUT_SECONDS)
+
+
+def _latest_job(db: Session, cache_key: str, statuses) -> Optional[ExportJob]:
+    return db.query(ExportJob).filter(
+        ExportJob.cache_key == cache_key,
+        ExportJob.status.in_(statuses)
+    ).order_by(ExportJob.id.desc()).first()
+
+
+def create_export_job(db: Session, user_id: int, export_type: str, params: Optional[dict],
+                      filename: str, scope: str) -> ExportJob:
+    """
+    登记导出任务
+
+    已有相同缓存键的导出文件时任务直接完成（cached=True）；
+    相同缓存键的任务正在生成时，新任务以 cached=True 等待其完成；
+    其余任务状态为 pending，由调用方提交给 export_worker。
+
+    Args:
+        params: 影响导出内容的参数（已规范化，如补全默认值、日期转为字符串）
+        scope: 权限范围指纹（permission_fingerprint）
+    """
+    data_version = current_data_version()
+    cache_key = export_cache_key(export_type, params, scope, data_version)
+    now = datetime.now()
+    job = ExportJob(
+        user_id=user_id, export_type=export_type, params=params or {}, filename=filename,
+        cache_key=cache_key, data_version=data_version, status=ExportStatus.PENDING, created_at=now
+    )
+
+    path = artifact_path(cache_key)
+    if path.exists():
+        source = _latest_job(db, cache_key, [ExportStatus.COMPLETED])
+        try:
+            # 复用时重新计时保留时长
+            os.utime(path)
+            job.file_size = path.stat().st_size
+        except OSError:
+            pass
+        else:
+            job.status = ExportStatus.COMPLETED
+            job.cached = True
+            job.row_count = source.row_count if source else None
+            job.started_at = job.completed_at = now
+    else:
+        running = db.query(ExportJob.id).filter(
+            ExportJob.cache_key == cache_key,
+            ExportJob.status.in_(UNFINISHED_STATES),
+            ExportJob.cached.is_(False),
+            ExportJob.created_at >= _timeout_deadline()
+        ).first()
+        job.cached = running is not None
+
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def get_export_job(db: Session, job_id: int) -> Optional[ExportJob]:
+    """获取导出任务；超时仍未完成的任务（进程退出等原因中断）标记为失败"""
+    job = db.query(ExportJob).filter(ExportJob.id == job_id).first()
+    if job is not None and job.status in UNFINISHED_STATES and job.created_at < _timeout_deadline():
+        job.status = ExportStatus.FAILED
+        job.error_message = "导出任务超时或已中断，请重新导出"
+        job.completed_at = datetime.now()
+        db.commit()
+    return job
+
+
+def list_export_jobs(db: Session, user_id: Optional[int] = None, limit: int = 20):
+    """最近的导出任务（user_id 为空时返回全部用户的任务）"""
+    query = db.query(ExportJob)
+    if user_id is not None:
+        query = query.filter(ExportJob.user_id == user_id)
+    return query.order_by(ExportJob.id.desc()).limit(limit).all()
+
+
+def run_export_job(job_id: int, build_sheets: Callable[[Callable[[Session, int], None]], Iterable[XlsxSheet]],
+                   on_exported: Optional[Callable[[Session, ExportJob], None]] = None) -> None:
+    """
+    生成导出文件（在 export_worker 的线程中执行）
+
+    Args:
+        build_sheets: 以 on_complete 构建工作表，数据全部写出后以 (会话, 导出行数) 调用 on_complete
+        on_exported: 对得到该文件的每个任务（本任务及等待它的任务）调用一次，用于记录导出日志
+    """
+    from app.db.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        job = db.query(ExportJob).filter(ExportJob.id == job_id).first()
+        if job is None or job.status != ExportStatus.PENDING:
+            return
+        job.status = ExportStatus.PROCESSING
+        job.started_at = datetime.now()
+        db.commit()
+
+        path = artifact_path(job.cache_key)
+        row_count = None
+        try:
+            if path.exists():
+                # 排队期间相同缓存键的任务已生成文件
+                source = _latest_job(db, job.cache_key, [ExportStatus.COMPLETED])
+                row_count = source.row_count if source else None
+                job.cached = True
+            else:
+                counted = {}
+
+                def on_complete(session: Session, count: int) -> None:
+                    counted["rows"] = count
+
+                EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+                write_xlsx(build_sheets(on_complete), path)
+                row_count = counted.get("rows")
+            file_size = path.stat().st_size
+        except Exception as e:
+            logger.error(f"导出任务 {job_id} 执行失败: {e}")
+            db.rollback()
+            _finish_jobs(db, job, ExportStatus.FAILED, error_message=str(e))
+            return
+
+        finished = _finish_jobs(db, job, ExportStatus.COMPLETED, row_count=row_count, file_size=file_size)
+        if on_exported:
+            for finished_job in finished:
+                try:
+                    on_exported(db, finished_job)
+                except Exception as e:
+                    db.rollback()
+                    logger.warning(f"导出任务 {finished_job.id} 记录日志失败: {e}")
+    finally:
+        db.close()
+
+
+def _finish_jobs(db: Session, job: ExportJob, status: ExportStatus, **values) -> list:
+    """结束任务，以及等待同一缓存键的任务；返回这些任务"""
+    waiting = db.query(ExportJob).filter(
+        ExportJob.cache_key == job.cache_key,
+        ExportJob.status == ExportStatus.PENDING,
+        ExportJob.cached.is_(True),
+        ExportJob.id != job.id
+    ).all()
+    now = datetime.now()
+    for item in [job] + waiting:
+        item.status = status
+        item.completed_at = now
+        item.started_at = item.started_at or now
+        for name, value in values.items():
+            setattr(item, name, value)
+    db.commit()
+    return [job] + waiting
+
+
+def purge_exports(db: Session, max_age_seconds: int) -> None:
+    """删除超过保留时长的导出文件和任务记录"""
+    deadline = time.time() - max_age_seconds
+    if EXPORT_DIR.exists():
+        for path in list(EXPORT_DIR.glob("*.xlsx")) + list(EXPORT_DIR.glob("*.tmp")):
+            try:
+                if path.stat().st_mtime < deadline:
+                    os.remove(path)
+            except OSError:
+                pass
+    db.query(ExportJob).filter(
+        ExportJob.created_at < datetime.fromtimestamp(deadline)
+    ).delete(synchronize_session=False)
+    db.commit()
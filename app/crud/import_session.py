@@ -3,12 +3,17 @@
 """
 
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from typing import List, Optional, Dict, Any
+from sqlalchemy import and_, or_
+from typing import List, Optional, Dict, Any, Iterable, Tuple
 from datetime import datetime
 
-from app.models.import_session import ImportSession, ImportStatus
+from app.models.import_session import ImportSession, ImportRowResult, ImportStatus
+from app.core.config import settings
 from app.schemas.schemas import ImportSessionCreate, ImportSessionUpdate
+from app.utils.import_reader import remove_spooled_file
+
+# 可以从断点继续的状态（处理中、已暂停的会话还需心跳超时，即执行任务的进程已退出）
+RESUMABLE_STATUSES = [ImportStatus.PROCESSING, ImportStatus.PAUSED, ImportStatus.FAILED]
 
 
 def create_import_session(db: Session, session_data: ImportSessionCreate) -> ImportSession:
@@ -109,17 +114,65 @@ def update_progress(
     if import_session.total_rows > 0:
         import_session.progress = int((import_session.processed_rows / import_session.total_rows) * 100)
 
-    # 添加详细结果
+    # 逐行结果写入 import_row_results，会话中只保留失败行样本
     if detailed_result:
-        if not import_session.detailed_results:
-            import_session.detailed_results = []
-        import_session.detailed_results.append(detailed_result)
+        add_row_results(db, session_id, [detailed_result])
+        if detailed_result.get("status") == "失败":
+            sample = list(import_session.detailed_results or [])
+            if len(sample) < settings.IMPORT_ERROR_SAMPLE_SIZE:
+                import_session.detailed_results = sample + [detailed_result]
 
     db.commit()
     db.refresh(import_session)
     return import_session
 
 
+def add_row_results(db: Session, session_id: int, results: Iterable[dict]) -> None:
+    """批量写入逐行结果（不提交，随调用方的事务一起生效）"""
+    rows = [
+        {
+            "session_id": session_id,
+            "row": int(result["row"]),
+            "internal_id": result.get("internal_id") or "",
+            "name": result.get("name") or "",
+            "status": result["status"],
+            "message": result.get("message") or ""
+        }
+        for result in results
+    ]
+    if rows:
+        db.execute(ImportRowResult.__table__.insert(), rows)
+
+
+def get_row_results(
+    db: Session,
+    session_id: int,
+    status: Optional[str] = None,
+    skip: int = 0,
+    limit: Optional[int] = 100
+) -> Tuple[List[dict], int]:
+    """分页获取逐行结果（按行号排序），返回 (结果, 总数)"""
+    query = db.query(ImportRowResult).filter(ImportRowResult.session_id == session_id)
+    if status:
+        query = query.filter(ImportRowResult.status == status)
+
+    total = query.count()
+    query = query.order_by(ImportRowResult.row).offset(skip)
+    if limit is not None:
+        query = query.limit(limit)
+    return [result.to_dict() for result in query.all()], total
+
+
+def get_error_sample(db: Session, session_id: int) -> List[dict]:
+    """失败行样本：行号最小的 IMPORT_ERROR_SAMPLE_SIZE 条失败结果"""
+    return get_row_results(db, session_id, status="失败", limit=settings.IMPORT_ERROR_SAMPLE_SIZE)[0]
+
+
+def clear_row_results(db: Session, session_id: int) -> None:
+    """删除会话的逐行结果（会话重新导入时调用，不提交）"""
+    db.query(ImportRowResult).filter(ImportRowResult.session_id == session_id).delete(synchronize_session=False)
+
+
 def add_error_detail(db: Session, session_id: int, error_detail: dict) -> Optional[ImportSession]:
     """添加错误详情"""
     import_session = get_import_session(db, session_id)
@@ -142,9 +195,14 @@ def complete_import_session(
     update_count: int = None,
     error_count: int = None,
     detailed_results: List[dict] = None,
-    error_details: List[dict] = None
+    error_details: List[dict] = None,
+    total_rows: int = None
 ) -> Optional[ImportSession]:
-    """完成导入会话"""
+    """
+    完成导入会话
+
+    total_rows 为实际处理的行数（含跳过的行），提供时总行数和已处理行数都设为该值
+    """
     import_session = get_import_session(db, session_id)
     if not import_session:
         return None
@@ -170,8 +228,11 @@ def complete_import_session(
     if error_count is not None:
         total_processed += error_count
 
+    if total_rows is not None:
+        import_session.total_rows = total_rows
+        import_session.processed_rows = total_rows
     # 只有当total_processed大于0时才更新processed_rows
-    if total_processed > 0:
+    elif total_processed > 0:
         import_session.processed_rows = total_processed
 
     if detailed_results:
@@ -240,6 +301,47 @@ def resume_import_session(db: Session, session_id: int) -> Optional[ImportSessio
     return import_session
 
 
+def has_live_worker(db: Session, session_id: int, stale_before: datetime) -> bool:
+    """会话是否仍由某个进程中的任务持有（心跳晚于 stale_before）"""
+    return db.query(ImportSession.id).filter(
+        ImportSession.id == session_id,
+        ImportSession.heartbeat_at >= stale_before
+    ).first() is not None
+
+
+def claim_import_session(db: Session, session_id: int, stale_before: datetime) -> bool:
+    """
+    认领中断的导入会话以便从断点继续
+
+    只有暂存文件仍在、且心跳已清除或早于 stale_before 的会话可以认领；
+    条件更新保证多个进程同时请求时只有一个成功。
+    """
+    claimed = db.query(ImportSession).filter(
+        ImportSession.id == session_id,
+        ImportSession.status.in_(RESUMABLE_STATUSES),
+        ImportSession.source_path.isnot(None),
+        or_(ImportSession.heartbeat_at.is_(None), ImportSession.heartbeat_at < stale_before)
+    ).update({
+        "status": ImportStatus.PROCESSING,
+        "heartbeat_at": datetime.now(),
+        "error_message": None,
+        "completed_at": None
+    }, synchronize_session=False)
+    db.commit()
+    return claimed == 1
+
+
+def discard_import_source(db: Session, session_id: int) -> None:
+    """删除会话暂存的导入文件（导入完成或取消后不再需要断点续传）"""
+    import_session = get_import_session(db, session_id)
+    if not import_session or not import_session.source_path:
+        return
+
+    remove_spooled_file(import_session.source_path)
+    import_session.source_path = None
+    db.commit()
+
+
 def delete_import_session(db: Session, session_id: int, user_id: int) -> bool:
     """删除导入会话"""
     import_session = db.query(ImportSession).filter(
@@ -249,6 +351,8 @@ def delete_import_session(db: Session, session_id: int, user_id: int) -> bool:
     if not import_session:
         return False
 
+    remove_spooled_file(import_session.source_path)
+    clear_row_results(db, session_id)
     db.delete(import_session)
     db.commit()
     return True
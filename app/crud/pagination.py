@@ -0,0 +1,333 @@
+"""
+列表分页工具
+
+提供两种分页方式：
+- 偏移分页（skip/limit）：兼容现有前端的页码跳转
+- 游标分页（keyset）：按当前排序键 + 主键定位下一页，
+  翻页时数据库沿排序索引直接定位，耗时与页码无关
+
+游标是不透明的 base64 字符串，内容为排序签名和上一页最后一行的排序键值；
+排序方式变化后旧游标失效。
+
+总数统计：在取当前页的同一条 SQL 中附带一列不相关的 (SELECT count(*) FROM <筛选查询>)，
+一次往返同时得到分页数据和总数。没有使用 COUNT(*) OVER ()：窗口函数要求数据库先物化
+全部匹配行的所有列才能截取当前页，5 万台设备时首屏比单独计数慢一个数量级；
+标量子查询只执行一次，且只扫描筛选条件涉及的列。
+翻页时（skip > 0 或传入游标）筛选条件指纹不变则直接复用缓存的总数，只查询当前页。
+缓存的总数登记在调用方传入的缓存标签下（设备查询为权限范围标签），设备新增、删除、导入后失效。
+"""
+
+import base64
+import hashlib
+import json
+import logging
+from datetime import date, datetime
+from typing import Any, Callable, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, or_, text, func, select
+from sqlalchemy.orm import Query, Session
+
+from app.core.cache import cache_service, tag_version
+from app.core.cache_config import CacheConfig
+
+logger = logging.getLogger(__name__)
+
+# 默认每页条数和单页上限
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+
+# 总数统计方式
+TOTAL_EXACT = "exact"
+TOTAL_APPROXIMATE = "approximate"
+TOTAL_NONE = "none"
+TOTAL_MODES = (TOTAL_EXACT, TOTAL_APPROXIMATE, TOTAL_NONE)
+
+
+class InvalidCursorError(ValueError):
+    """游标无法解析或与当前排序不匹配"""
+
+
+class SortKey(NamedTuple):
+    """
+    游标分页的排序键
+
+    Attributes:
+        column: 排序列
+        getter: 从结果对象中取出该排序键值的函数
+        descending: 是否降序
+        nullable: 列是否可为空（空值统一排在最后）
+    """
+    column: Any
+    getter: Callable[[Any], Any]
+    descending: bool = False
+    nullable: bool = False
+
+
+def sort_signature(sort_field: str, sort_order: str) -> str:
+    return f"{sort_field}:{sort_order}"
+
+
+def order_by_keys(query: Query, keys: List[SortKey]) -> Query:
+    """按排序键依次排序，可空列的空值排在最后"""
+    clauses = []
+    for key in keys:
+        clause = key.column.desc() if key.descending else key.column.asc()
+        clauses.append(clause.nulls_last() if key.nullable else clause)
+    return query.order_by(*clauses)
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"d": value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if "dt" in value:
+            return datetime.fromisoformat(value["dt"])
+        if "d" in value:
+            return date.fromisoformat(value["d"])
+        raise InvalidCursorError("游标格式无效")
+    return value
+
+
+def encode_cursor(signature: str, keys: List[SortKey], item) -> str:
+    """根据一行结果生成指向其后一行的游标"""
+    payload = {
+        "s": signature,
+        "v": [_encode_value(key.getter(item)) for key in keys]
+    }
+    raw = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, signature: str, keys: List[SortKey]) -> List[Any]:
+    """
+    解析游标
+
+    Raises:
+        InvalidCursorError: 游标无法解析，或生成游标时的排序方式与当前不一致
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+        values = [_decode_value(value) for value in payload["v"]]
+        cursor_signature = payload["s"]
+    except InvalidCursorError:
+        raise
+    except Exception:
+        raise InvalidCursorError("游标格式无效")
+
+    if cursor_signature != signature or len(values) != len(keys):
+        raise InvalidCursorError("游标与当前排序方式不匹配，请从第一页重新加载")
+    return values
+
+
+def _after(key: SortKey, value):
+    """排序位置在 value 之后的条件（空值排在最后）"""
+    if value is None:
+        # 空值已是最后一组，单列上不存在更靠后的值
+        return None
+    condition = key.column < value if key.descending else key.column > value
+    if key.nullable:
+        condition = or_(condition, key.column.is_(None))
+    return condition
+
+
+def _equals(key: SortKey, value):
+    return key.column.is_(None) if value is None else key.column == value
+
+
+def seek_condition(keys: List[SortKey], values: List[Any]):
+    """
+    构造“位于游标之后”的条件
+
+    按排序键字典序展开：(k1 > v1) OR (k1 = v1 AND k2 > v2) OR ...
+    """
+    branches = []
+    prefix = []
+    for key, value in zip(keys, values):
+        after = _after(key, value)
+        if after is not None:
+            branches.append(and_(*prefix, after) if prefix else after)
+        prefix.append(_equals(key, value))
+    return or_(*branches)
+
+
+def estimate_count(db: Session, query: Query) -> Optional[int]:
+    """
+    估算查询结果行数
+
+    PostgreSQL 读取执行计划中的预估行数，无需扫描数据；
+    其他数据库无廉价的估算手段，返回 None 由调用方决定是否精确统计。
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return None
+
+    try:
+        statement = query.order_by(None).enable_eagerloads(False).statement
+        compiled = statement.compile(dialect=db.get_bind().dialect)
+        plan = db.execute(text(f"EXPLAIN (FORMAT JSON) {compiled}"), compiled.params).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+    except Exception as e:
+        logger.warning(f"估算查询行数失败，改为精确统计: {e}")
+        return None
+
+
+def count_total(db: Session, query: Query, total_mode: str = TOTAL_EXACT):
+    """
+    按指定方式统计总数
+
+    Returns:
+        (总数, 是否为估算值)；total_mode 为 none 时总数为 None
+    """
+    if total_mode == TOTAL_NONE:
+        return None, False
+
+    if total_mode == TOTAL_APPROXIMATE:
+        estimated = estimate_count(db, query)
+        if estimated is not None:
+            return estimated, True
+
+    return query.order_by(None).count(), False
+
+
+def filter_fingerprint(db: Session, query: Query) -> str:
+    """
+    查询筛选条件的指纹
+
+    由去掉排序、分页后的 SQL 文本及其绑定参数计算，
+    权限范围、筛选条件、搜索词任一变化都会得到不同的指纹。
+    """
+    statement = query.order_by(None).limit(None).offset(None).enable_eagerloads(False).statement
+    compiled = statement.compile(dialect=db.get_bind().dialect)
+    params = sorted((key, repr(value)) for key, value in compiled.params.items())
+    raw = f"{compiled}|{params}".encode("utf-8")
+    return hashlib.sha1(raw).hexdigest()
+
+
+def _count_cache_key(cache_api: str, fingerprint: str, tags: Sequence[str]) -> str:
+    return f"{CacheConfig.get_cache_prefix_for_api(cache_api)}:{cache_api}:{fingerprint}:{tag_version(tags)}"
+
+
+def fetch_page_with_total(db: Session, query: Query, skip: int, limit: int,
+                          count_query: Optional[Query] = None,
+                          cache_api: str = "equipment_page_count",
+                          reuse_cached_total: Optional[bool] = None,
+                          tags: Optional[Sequence[str]] = None) -> Tuple[list, int]:
+    """
+    一次往返获取当前页数据和总数
+
+    Args:
+        query: 已排序的查询
+        skip / limit: 分页参数
+        count_query: 统计总数所用的查询，默认与 query 相同；
+            游标分页时 query 附加了定位条件，需传入未定位的查询
+        cache_api: 总数缓存使用的缓存配置名（见 CacheConfig.API_CACHE_CONFIG）
+        reuse_cached_total: 是否优先使用缓存的总数，默认翻页（skip > 0）时复用
+        tags: 总数所依赖的缓存标签（同 @cached 的 tags），任一标签失效后不再复用；
+            为 None 时不缓存总数（每页都重新统计），为空序列时总数只随 TTL 过期
+
+    Returns:
+        (当前页数据, 总数)；数据行的形状与 query.all() 一致
+    """
+    if count_query is None:
+        count_query = query
+    if reuse_cached_total is None:
+        reuse_cached_total = skip > 0
+
+    cache_key = None
+    if tags is not None:
+        cache_key = _count_cache_key(cache_api, filter_fingerprint(db, count_query), tags)
+    ttl = CacheConfig.get_cache_ttl_for_api(cache_api)
+
+    if reuse_cached_total and cache_key is not None:
+        total = cache_service.get(cache_key)
+        if total is not None:
+            return query.offset(skip).limit(limit).all(), total
+
+    total_column = select(func.count()).select_from(
+        count_query.order_by(None).limit(None).offset(None).enable_eagerloads(False).subquery()
+    ).scalar_subquery().label("pagination_total")
+
+    single_entity = len(query.column_descriptions) == 1
+    rows = query.add_columns(total_column).offset(skip).limit(limit).all()
+    if rows:
+        total = rows[0][-1]
+        items = [row[0] for row in rows] if single_entity else [tuple(row[:-1]) for row in rows]
+        if cache_key is not None:
+            cache_service.set(cache_key, total, ttl)
+        return items, total
+
+    # 页码越界时拿不到总数，退回单独统计
+    items = []
+    total = count_query.order_by(None).count()
+    if cache_key is not None:
+        cache_service.set(cache_key, total, ttl)
+    return items, total
+
+
+def paginate(db: Session, query: Query, keys: Optional[List[SortKey]], signature: str,
+             skip: int = 0, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None,
+             total_mode: str = TOTAL_EXACT, tags: Optional[Sequence[str]] = None) -> dict:
+    """
+    分页查询
+
+    Args:
+        query: 已应用权限、筛选条件并按 keys 排序的查询（见 order_by_keys）
+        keys: 排序键，最后一个键须为唯一列（通常为主键）；为 None 时不支持游标分页
+        signature: 排序签名，用于校验游标
+        skip: 偏移量，传入 cursor 时忽略
+        limit: 每页条数
+        cursor: 上一页返回的 next_cursor
+        total_mode: 总数统计方式（exact/approximate/none）
+        tags: 翻页时复用的总数所依赖的缓存标签（见 fetch_page_with_total）
+
+    Returns:
+        {"items", "total", "skip", "limit", "next_cursor", "total_is_estimate"}
+
+    Raises:
+        InvalidCursorError: 游标无效，或当前排序方式不支持游标分页
+    """
+    if keys is not None and cursor:
+        values = decode_cursor(cursor, signature, keys)
+    elif cursor:
+        raise InvalidCursorError("当前排序方式不支持游标分页")
+    else:
+        values = None
+
+    page_query = query.filter(seek_condition(keys, values)) if values is not None else query
+    if values is not None:
+        skip = 0
+
+    # 支持游标分页时多取一行，用于判断是否还有下一页
+    fetch = limit + 1 if keys is not None else limit
+
+    if total_mode == TOTAL_EXACT:
+        rows, total = fetch_page_with_total(
+            db, page_query, skip, fetch, count_query=query,
+            reuse_cached_total=skip > 0 or values is not None, tags=tags
+        )
+        total_is_estimate = False
+    else:
+        total, total_is_estimate = count_total(db, query, total_mode)
+        rows = page_query.offset(skip).limit(fetch).all()
+
+    items = rows[:limit]
+    next_cursor = None
+    if keys is not None and len(rows) > limit:
+        next_cursor = encode_cursor(signature, keys, items[-1])
+
+    return {
+        "items": items,
+        "total": total,
+        "skip": skip,
+        "limit": limit,
+        "next_cursor": next_cursor,
+        "total_is_estimate": total_is_estimate
+    }
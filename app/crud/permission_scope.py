@@ -0,0 +1,150 @@
+"""
+设备权限范围模块
+
+统一解析用户的 (category_id, equipment_name) 器具权限并缓存解析结果，
+同时提供一个可复用的 EXISTS 半连接表达式。
+
+所有设备列表、计数、仪表盘和报表查询都通过 `apply_permission_scope` 接入权限过滤，
+无论用户拥有多少条器具权限，生成的 SQL 都相同，
+数据库可以复用同一个走 (user_id, category_id, equipment_name) 索引的执行计划，
+不再为每条权限拼接一个 OR 分支。
+"""
+
+import hashlib
+from typing import FrozenSet, List, Optional, Tuple
+
+from sqlalchemy import and_, exists
+from sqlalchemy.orm import Session, Query
+
+from app.models.models import Equipment, UserEquipmentPermission
+from app.core.cache import cache_service
+from app.core.cache_config import CacheConfig, CacheTag
+import logging
+
+logger = logging.getLogger(__name__)
+
+PermissionGrant = Tuple[int, str]
+
+_SCOPE_TTL = CacheConfig.get_cache_ttl_for_api("user_permissions")
+_SCOPE_PREFIX = f"{CacheConfig.get_cache_prefix_for_api('user_permissions')}:permission_scope"
+
+
+def _scope_cache_key(user_id: int) -> str:
+    return f"{_SCOPE_PREFIX}:{user_id}"
+
+
+def get_permission_grants(db: Session, user_id: int) -> FrozenSet[PermissionGrant]:
+    """
+    获取用户的器具权限集合（带缓存）
+
+    返回 (category_id, equipment_name) 的不可变集合，
+    权限变更时由 `invalidate_permission_scope` 失效。
+    """
+    cache_key = _scope_cache_key(user_id)
+    grants = cache_service.get(cache_key)
+    if grants is not None:
+        return grants
+
+    rows = db.query(
+        UserEquipmentPermission.category_id,
+        UserEquipmentPermission.equipment_name
+    ).filter(
+        UserEquipmentPermission.user_id == user_id
+    ).all()
+
+    grants = frozenset((row.category_id, row.equipment_name) for row in rows)
+    cache_service.set(cache_key, grants, _SCOPE_TTL)
+    return grants
+
+
+def has_permission_grant(db: Session, user_id: int, category_id: int, equipment_name: str) -> bool:
+    """基于缓存的权限集合检查用户是否拥有指定器具权限"""
+    return (category_id, equipment_name) in get_permission_grants(db, user_id)
+
+
+def permission_fingerprint(db: Session, user_id: Optional[int], is_admin: bool = False) -> str:
+    """
+    生成用户权限范围的指纹
+
+    管理员统一返回 "admin"；权限集合相同的用户得到相同的指纹，可用于缓存键。
+    """
+    if is_admin or not user_id:
+        return "admin"
+
+    grants = sorted(get_permission_grants(db, user_id))
+    if not grants:
+        return "none"
+
+    digest = hashlib.sha1(repr(grants).encode("utf-8")).hexdigest()[:16]
+    return f"scope-{digest}"
+
+
+def equipment_scope_tags(db: Optional[Session], user) -> List[str]:
+    """
+    按权限范围缓存的设备数据所依赖的缓存标签（用于 @cached(tags=...)）
+
+    管理员依赖全部设备；普通用户只依赖其器具权限所在的类别，
+    其他类别的设备变更不会使其缓存失效。设备列表、统计中包含部门和类别名称，同时依赖这两个标签。
+    """
+    if user is None:
+        return permission_scope_tags(db, None, True)
+    return permission_scope_tags(db, user.id, user.is_admin)
+
+
+def permission_scope_tags(db: Optional[Session], user_id: Optional[int], is_admin: bool = False) -> List[str]:
+    """按用户ID和管理员标志取得 equipment_scope_tags 的标签（供 crud 层缓存使用）"""
+    tags = [CacheTag.DEPARTMENTS, CacheTag.CATEGORIES]
+    if is_admin or not user_id or db is None:
+        return tags + [CacheTag.EQUIPMENT]
+
+    category_ids = {category_id for category_id, _ in get_permission_grants(db, user_id)}
+    return tags + [CacheTag.category(category_id) for category_id in sorted(category_ids)]
+
+
+def authorized_equipment_clause(user_id: int):
+    """
+    设备权限的半连接表达式
+
+    生成 EXISTS (SELECT 1 FROM user_equipment_permissions WHERE ...)，
+    与 Equipment 实体关联，可直接用于任意以 Equipment 为主表的查询。
+    """
+    return exists().where(
+        and_(
+            UserEquipmentPermission.user_id == user_id,
+            UserEquipmentPermission.category_id == Equipment.category_id,
+            UserEquipmentPermission.equipment_name == Equipment.name
+        )
+    )
+
+
+def apply_permission_scope(query: Query, db: Session, user_id: Optional[int],
+                           is_admin: bool = False) -> Optional[Query]:
+    """
+    为查询附加设备权限过滤
+
+    Returns:
+        过滤后的查询；用户没有任何器具权限时返回 None，调用方应直接返回空结果
+    """
+    if is_admin or not user_id:
+        return query
+
+    if not get_permission_grants(db, user_id):
+        return None
+
+    return query.filter(authorized_equipment_clause(user_id))
+
+
+def invalidate_permission_scope(user_id: Optional[int] = None) -> None:
+    """
+    失效用户权限范围缓存
+
+    Args:
+        user_id: 指定用户ID；为 None 时失效所有用户的权限范围缓存
+    """
+    try:
+        if user_id is None:
+            cache_service.delete_pattern(f"{_SCOPE_PREFIX}:*")
+        else:
+            cache_service.delete(_scope_cache_key(user_id))
+    except Exception as e:
+        logger.warning(f"失效权限范围缓存失败: {e}")
@@ -0,0 +1,333 @@
+"""
+设备全文检索索引
+
+为设备搜索提供可走索引的全文检索后端：
+- SQLite：FTS5 虚拟表 equipment_fts（rowid 即设备ID）
+- PostgreSQL：equipment_search_index 表上的 tsvector 列 + GIN 索引
+
+中文没有天然分词边界，写入索引前统一做 n-gram 切分：
+连续的中文字符输出单字和相邻二字组合，字母数字串输出全部后缀（查询时做前缀匹配），
+因此两种数据库都只需要最简单的按空格分词配置即可支持中文和子串检索。
+索引命中的是原有 LIKE 条件结果的超集，调用方在候选集上复核原条件即可得到一致的结果。
+
+索引在设备创建、更新、删除以及部门/类别改名时同步维护；
+索引不可用时（数据库不支持或尚未建立）调用方回退到原有的 LIKE 查询。
+"""
+
+import re
+import logging
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import text, Integer, Float
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.models.models import Equipment, Department, EquipmentCategory
+
+logger = logging.getLogger(__name__)
+
+SQLITE_FTS_TABLE = "equipment_fts"
+POSTGRES_INDEX_TABLE = "equipment_search_index"
+
+# 参与全文检索的设备字段
+SEARCHABLE_FIELDS = [
+    "name", "model", "internal_id", "manufacturer", "manufacturer_id",
+    "installation_location", "notes", "accuracy_level", "measurement_range",
+    "calibration_method"
+]
+
+_CJK_RANGES = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+_TOKEN_RE = re.compile(f"[{_CJK_RANGES}]+|[0-9a-z]+")
+_CJK_RE = re.compile(f"[{_CJK_RANGES}]")
+
+# 超过该长度的字母数字串不再展开后缀，避免索引膨胀
+_MAX_SUFFIX_WORD_LENGTH = 40
+
+# 每种数据库方言的索引可用状态（在 ensure_search_index 中检测）
+_available_backends = {}
+
+
+def _dialect_name(bind) -> str:
+    return bind.dialect.name
+
+
+def is_search_index_available(db: Session) -> bool:
+    """当前数据库是否已建立可用的全文检索索引"""
+    return _available_backends.get(_dialect_name(db.get_bind()), False)
+
+
+def tokenize(value: Optional[str]) -> List[str]:
+    """
+    将文本切分为索引词元
+
+    中文连续字符输出单字 + 二字组合；字母数字串转为小写后输出其所有后缀，
+    这样查询时的前缀匹配等价于子串匹配（如 "0012" 可以命中 "TEM-00012"）。
+    """
+    if not value:
+        return []
+
+    tokens = []
+    for run in _TOKEN_RE.findall(str(value).lower()):
+        if _CJK_RE.match(run):
+            tokens.extend(run)
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        elif len(run) <= _MAX_SUFFIX_WORD_LENGTH:
+            tokens.extend(run[i:] for i in range(len(run)))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def query_terms(query: Optional[str]) -> List[Tuple[str, bool]]:
+    """
+    将搜索词切分为查询词元
+
+    Returns:
+        (词元, 是否前缀匹配) 列表；中文取二字组合（单字查询取单字），字母数字串做前缀匹配
+    """
+    if not query:
+        return []
+
+    terms = []
+    for run in _TOKEN_RE.findall(query.lower()):
+        if _CJK_RE.match(run):
+            if len(run) == 1:
+                terms.append((run, False))
+            else:
+                terms.extend((run[i:i + 2], False) for i in range(len(run) - 1))
+        else:
+            terms.append((run, True))
+
+    # 去重并保持顺序
+    seen = set()
+    return [t for t in terms if not (t in seen or seen.add(t))]
+
+
+def _format_original_value(value) -> Optional[str]:
+    # 原值按 "1500.0" 的形式写入，"1500" 会切分为独立词元，与原有的数值匹配语义一致
+    if value is None:
+        return None
+    return repr(float(value))
+
+
+def build_search_document(equipment: Equipment, department_name: Optional[str],
+                          category_name: Optional[str]) -> str:
+    """根据设备字段及部门、类别名称生成索引文档（空格分隔的词元串）"""
+    values = [getattr(equipment, field, None) for field in SEARCHABLE_FIELDS]
+    values.append(_format_original_value(equipment.original_value))
+    values.extend([department_name, category_name])
+
+    tokens = []
+    for value in values:
+        tokens.extend(tokenize(value))
+    return " ".join(tokens)
+
+
+def ensure_search_index(engine: Engine) -> bool:
+    """
+    创建全文检索索引结构，索引条目数与设备数不一致时（首次启用、数据恢复等）执行一次全量重建
+
+    Returns:
+        索引是否可用
+    """
+    dialect = _dialect_name(engine)
+
+    try:
+        with engine.begin() as conn:
+            if dialect == "sqlite":
+                conn.execute(text(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_FTS_TABLE} "
+                    f"USING fts5(document, tokenize='unicode61')"
+                ))
+            elif dialect == "postgresql":
+                conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {POSTGRES_INDEX_TABLE} ("
+                    f"equipment_id INTEGER PRIMARY KEY REFERENCES equipments(id) ON DELETE CASCADE, "
+                    f"document TEXT NOT NULL DEFAULT '', "
+                    f"search_vector TSVECTOR GENERATED ALWAYS AS (to_tsvector('simple', document)) STORED)"
+                ))
+                conn.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS idx_{POSTGRES_INDEX_TABLE}_vector "
+                    f"ON {POSTGRES_INDEX_TABLE} USING GIN (search_vector)"
+                ))
+            else:
+                logger.info(f"数据库 {dialect} 不支持全文检索索引，设备搜索使用 LIKE 查询")
+                _available_backends[dialect] = False
+                return False
+    except Exception as e:
+        logger.warning(f"全文检索索引创建失败，设备搜索使用 LIKE 查询: {e}")
+        _available_backends[dialect] = False
+        return False
+
+    _available_backends[dialect] = True
+
+    from app.db.database import SessionLocal
+    db = SessionLocal()
+    try:
+        indexed = db.execute(text(f"SELECT COUNT(*) FROM {_index_table(dialect)}")).scalar() or 0
+        if indexed != db.query(Equipment.id).count():
+            count = rebuild_search_index(db)
+            logger.info(f"全文检索索引已重建，共 {count} 台设备")
+    finally:
+        db.close()
+
+    return True
+
+
+def _index_table(dialect: str) -> str:
+    return SQLITE_FTS_TABLE if dialect == "sqlite" else POSTGRES_INDEX_TABLE
+
+
+def _load_documents(db: Session, equipment_ids: Optional[Iterable[int]] = None,
+                    department_id: Optional[int] = None,
+                    category_id: Optional[int] = None) -> List[Tuple[int, str]]:
+    query = db.query(Equipment, Department.name, EquipmentCategory.name).outerjoin(
+        Department, Equipment.department_id == Department.id
+    ).outerjoin(
+        EquipmentCategory, Equipment.category_id == EquipmentCategory.id
+    )
+
+    if equipment_ids is not None:
+        query = query.filter(Equipment.id.in_(list(equipment_ids)))
+    if department_id is not None:
+        query = query.filter(Equipment.department_id == department_id)
+    if category_id is not None:
+        query = query.filter(Equipment.category_id == category_id)
+
+    return [
+        (equipment.id, build_search_document(equipment, department_name, category_name))
+        for equipment, department_name, category_name in query.all()
+    ]
+
+
+def _write_documents(db: Session, documents: List[Tuple[int, str]]) -> None:
+    if not documents:
+        return
+
+    dialect = _dialect_name(db.get_bind())
+    params = [{"equipment_id": equipment_id, "document": document} for equipment_id, document in documents]
+
+    if dialect == "sqlite":
+        db.execute(
+            text(f"DELETE FROM {SQLITE_FTS_TABLE} WHERE rowid = :equipment_id"),
+            [{"equipment_id": p["equipment_id"]} for p in params]
+        )
+        db.execute(
+            text(f"INSERT INTO {SQLITE_FTS_TABLE} (rowid, document) VALUES (:equipment_id, :document)"),
+            params
+        )
+    else:
+        db.execute(
+            text(
+                f"INSERT INTO {POSTGRES_INDEX_TABLE} (equipment_id, document) VALUES (:equipment_id, :document) "
+                f"ON CONFLICT (equipment_id) DO UPDATE SET document = EXCLUDED.document"
+            ),
+            params
+        )
+
+
+def index_equipment(db: Session, equipment_id: int) -> None:
+    """
+    同步单台设备的索引文档
+
+    在调用方的事务中执行（调用前需 flush），随设备写入一起提交；
+    索引写入失败只记录日志，不影响设备数据的保存。
+    """
+    index_equipments(db, [equipment_id])
+
+
+def index_equipments(db: Session, equipment_ids: Iterable[int]) -> None:
+    """批量同步多台设备的索引文档"""
+    if not is_search_index_available(db):
+        return
+
+    equipment_ids = list(equipment_ids)
+    if not equipment_ids:
+        return
+
+    try:
+        with db.begin_nested():
+            _write_documents(db, _load_documents(db, equipment_ids=equipment_ids))
+    except Exception as e:
+        logger.warning(f"全文检索索引同步失败 {equipment_ids[:10]}: {e}")
+
+
+def remove_equipment(db: Session, equipment_id: int) -> None:
+    """从索引中移除设备"""
+    if not is_search_index_available(db):
+        return
+
+    dialect = _dialect_name(db.get_bind())
+    try:
+        with db.begin_nested():
+            if dialect == "sqlite":
+                db.execute(text(f"DELETE FROM {SQLITE_FTS_TABLE} WHERE rowid = :equipment_id"),
+                           {"equipment_id": equipment_id})
+            else:
+                db.execute(text(f"DELETE FROM {POSTGRES_INDEX_TABLE} WHERE equipment_id = :equipment_id"),
+                           {"equipment_id": equipment_id})
+    except Exception as e:
+        logger.warning(f"全文检索索引删除失败 {equipment_id}: {e}")
+
+
+def reindex_equipments(db: Session, department_id: Optional[int] = None,
+                       category_id: Optional[int] = None) -> int:
+    """部门或类别改名后重建其下设备的索引文档"""
+    if not is_search_index_available(db):
+        return 0
+
+    try:
+        with db.begin_nested():
+            documents = _load_documents(db, department_id=department_id, category_id=category_id)
+            _write_documents(db, documents)
+        return len(documents)
+    except Exception as e:
+        logger.warning(f"全文检索索引重建失败: {e}")
+        return 0
+
+
+def rebuild_search_index(db: Session) -> int:
+    """全量重建全文检索索引"""
+    if not is_search_index_available(db):
+        return 0
+
+    table = _index_table(_dialect_name(db.get_bind()))
+    db.execute(text(f"DELETE FROM {table}"))
+    documents = _load_documents(db)
+    _write_documents(db, documents)
+    db.commit()
+    return len(documents)
+
+
+def search_match_subquery(db: Session, query: Optional[str]):
+    """
+    构造全文检索匹配子查询
+
+    Returns:
+        包含 equipment_id、score 两列的子查询（score 越小相关度越高）；
+        索引不可用或搜索词无可检索词元时返回 None，调用方应回退到 LIKE 查询
+    """
+    if not is_search_index_available(db):
+        return None
+
+    terms = query_terms(query)
+    if not terms:
+        return None
+
+    dialect = _dialect_name(db.get_bind())
+    if dialect == "sqlite":
+        match = " AND ".join(f'"{term}"*' if prefix else f'"{term}"' for term, prefix in terms)
+        statement = text(
+            f"SELECT rowid AS equipment_id, bm25({SQLITE_FTS_TABLE}) AS score "
+            f"FROM {SQLITE_FTS_TABLE} WHERE {SQLITE_FTS_TABLE} MATCH :match"
+        )
+    else:
+        match = " & ".join(f"{term}:*" if prefix else term for term, prefix in terms)
+        statement = text(
+            f"SELECT equipment_id, -ts_rank(search_vector, to_tsquery('simple', :match)) AS score "
+            f"FROM {POSTGRES_INDEX_TABLE} WHERE search_vector @@ to_tsquery('simple', :match)"
+        )
+
+    return statement.bindparams(match=match).columns(
+        equipment_id=Integer, score=Float
+    ).subquery("search_match")
@@ -0,0 +1,187 @@
+"""
+器具类型编号索引
+
+内部编号的中间一段（类型编号）由类别的预定义器具名称和该类别已有设备的内部编号共同决定
+（get_smart_name_mapping）。这里按类别代码预先计算 器具名称 -> 类型编号，生成内部编号、
+类别接口查询编号映射时直接查表，不再每次读取类别和该类别的全部设备：
+- 应用启动时 ensure_type_code_index 为全部类别建立索引
+- 索引条目按 CacheTag.CATEGORIES 和 CacheTag.type_codes(类别ID) 的版本号校验：类别或预定义名称修改
+  （接口失效 CATEGORY_CHANGE_TAGS）后，或可能改变类型编号的设备变更提交后（cache_invalidation 钩子
+  按 changed_by 判断：预定义名称的第一台设备、删除设备、修改设备的名称、类别或内部编号），
+  下次查询时重新计算该类别；其余设备写入不影响索引。多进程部署时其他进程的修改同样通过标签版本号生效
+- 重新计算在独立会话中读取已提交的数据，不受调用方未提交事务的影响
+"""
+
+import logging
+import threading
+from typing import Dict, FrozenSet, NamedTuple, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.cache import tag_version
+from app.core.cache_config import CacheTag
+from app.models.models import Equipment, EquipmentCategory
+from app.utils.predefined_name_manager import get_smart_name_mapping
+
+logger = logging.getLogger(__name__)
+
+
+class CategoryTypeCodes(NamedTuple):
+    """一个类别代码的类型编号"""
+    category_id: Optional[int]          # 没有使用该代码的类别时为 None
+    tags: Tuple[str, ...]               # 校验用的缓存标签
+    version: str                        # 计算时的标签版本摘要
+    predefined_names: FrozenSet[str]
+    equipment_names: FrozenSet[str]     # 该类别已有设备的器具名称
+    type_codes: Dict[str, str]          # 预定义器具名称 -> 类型编号
+
+
+def _category_tags(category_id: Optional[int]) -> Tuple[str, ...]:
+    if category_id is None:
+        return (CacheTag.CATEGORIES,)
+    return (CacheTag.CATEGORIES, CacheTag.type_codes(category_id))
+
+
+def _compute(category: Optional[EquipmentCategory], tags: Tuple[str, ...], version: str,
+             equipment_internal_ids: Dict[str, str]) -> CategoryTypeCodes:
+    """按预定义名称和已有设备（名称 -> 内部编号）计算类型编号"""
+    if category is None:
+        return CategoryTypeCodes(None, tags, version, frozenset(), frozenset(), {})
+    predefined_names = list(category.predefined_names or [])
+    type_codes = get_smart_name_mapping(
+        category.code, predefined_names, list(equipment_internal_ids), equipment_internal_ids
+    )
+    return CategoryTypeCodes(
+        category.id, tags, version, frozenset(predefined_names), frozenset(equipment_internal_ids), type_codes
+    )
+
+
+def _equipment_internal_ids(db: Session, category_id: Optional[int] = None) -> Dict[int, Dict[str, str]]:
+    """类别ID -> {设备名称: 内部编号}（同名设备取ID最大的一台）"""
+    query = db.query(Equipment.category_id, Equipment.name, Equipment.internal_id)
+    if category_id is not None:
+        query = query.filter(Equipment.category_id == category_id)
+    result: Dict[int, Dict[str, str]] = {}
+    for equipment_category_id, name, internal_id in query.order_by(Equipment.id).yield_per(5000):
+        result.setdefault(equipment_category_id, {})[name] = internal_id
+    return result
+
+
+def _reading_session(db: Optional[Session]) -> Session:
+    """读取已提交数据的独立会话（与调用方使用同一数据库）"""
+    if db is None:
+        from app.db.database import SessionLocal
+        return SessionLocal()
+    return Session(bind=db.get_bind())
+
+
+class TypeCodeIndex:
+    """按类别代码缓存的类型编号索引（进程内，线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._categories: Dict[str, CategoryTypeCodes] = {}
+
+    def build(self, db: Session) -> int:
+        """为全部设置了代码的类别建立索引，返回类别数"""
+        category_ids = [category_id for (category_id,) in db.query(EquipmentCategory.id)]
+        # 先取版本号再读取数据：读取期间提交的修改会使条目在下次查询时重新计算
+        versions = {category_id: tag_version(_category_tags(category_id)) for category_id in category_ids}
+        equipment = _equipment_internal_ids(db)
+
+        categories: Dict[str, CategoryTypeCodes] = {}
+        for category in db.query(EquipmentCategory).filter(
+            EquipmentCategory.id.in_(category_ids), EquipmentCategory.code.isnot(None)
+        ).order_by(EquipmentCategory.id):
+            if category.code and category.code not in categories:
+                categories[category.code] = _compute(
+                    category, _category_tags(category.id), versions[category.id], equipment.get(category.id, {})
+                )
+        with self._lock:
+            self._categories = categories
+        return len(categories)
+
+    def _load(self, db: Session, category_code: str, recheck: bool = True) -> CategoryTypeCodes:
+        """
+        从数据库计算一个类别代码的类型编号（同一代码有多个类别时取ID最小的）
+
+        recheck 为 True 时取得标签版本号后重新读取类别，避免以新版本号缓存旧数据
+        （会覆盖会话中该类别对象的属性，只用于独立会话）；为 False 时结果不可缓存。
+        """
+        query = db.query(EquipmentCategory).filter(
+            EquipmentCategory.code == category_code
+        ).order_by(EquipmentCategory.id)
+
+        category = query.first()
+        tags = _category_tags(category.id if category else None)
+        version = tag_version(tags) if recheck else ""
+        if recheck:
+            category = query.populate_existing().first()
+            if _category_tags(category.id if category else None) != tags:
+                version = ""  # 类别刚被删除或新建，不缓存结果
+        equipment = _equipment_internal_ids(db, category.id).get(category.id, {}) if category else {}
+        return _compute(category, tags, version, equipment)
+
+    def get(self, category_code: str, db: Optional[Session] = None) -> CategoryTypeCodes:
+        """
+        类别代码的类型编号（条目过期时重新计算）
+
+        Args:
+            db: 调用方的会话，只用于确定数据库；未提供时使用 SessionLocal
+        """
+        entry = self._categories.get(category_code)
+        if entry is not None and entry.version and tag_version(entry.tags) == entry.version:
+            return entry
+
+        reader = _reading_session(db)
+        try:
+            entry = self._load(reader, category_code)
+        except Exception as e:
+            if db is None:
+                raise
+            # 独立会话无法读取（如 SQLite 写锁），在调用方的会话中计算且不缓存
+            logger.warning(f"读取类别 {category_code} 的类型编号失败，改用当前会话: {e}")
+            reader.rollback()
+            return self._load(db, category_code, recheck=False)
+        finally:
+            reader.close()
+
+        if entry.version:
+            with self._lock:
+                self._categories[category_code] = entry
+        return entry
+
+    def changed_by(self, category_id: int, equipment_name: Optional[str], removed: bool = False) -> bool:
+        """
+        该类别新增（removed 为 True 时为删除）一台该名称的设备是否可能改变类型编号
+
+        预定义名称在有设备后按设备内部编号固定编号，删除最后一台后重新参与排序；
+        该名称已有设备时新增设备不改变编号。本进程没有该类别的条目时按可能改变处理。
+        """
+        entry = next((item for item in self._categories.values() if item.category_id == category_id), None)
+        if entry is None:
+            return True
+        if equipment_name not in entry.predefined_names:
+            return False
+        return removed or equipment_name not in entry.equipment_names
+
+    def type_code(self, category_code: str, equipment_name: str, db: Optional[Session] = None) -> Optional[str]:
+        """器具名称的类型编号；不在该类别的预定义名称中时返回 None"""
+        return self.get(category_code, db).type_codes.get(equipment_name)
+
+
+# 全局类型编号索引
+type_code_index = TypeCodeIndex()
+
+
+def ensure_type_code_index(engine) -> int:
+    """应用启动时为全部类别建立类型编号索引，返回类别数"""
+    from app.db.database import SessionLocal
+    db = SessionLocal()
+    try:
+        return type_code_index.build(db)
+    except Exception as e:
+        logger.warning(f"建立类型编号索引失败: {e}")
+        return 0
+    finally:
+        db.close()
@@ -1,4 +1,4 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import and_
 from app.models.models import User, UserCategory, UserEquipmentPermission
 from app.schemas.schemas import UserCreate, UserUpdate
@@ -13,7 +13,8 @@ def get_user_by_username(db: Session, username: str):
 
 def get_users(db: Session, skip: int = 0, limit: int = 100):
     # 只返回非部门用户（排除user_type为'department_user'的用户）
-    return db.query(User).filter(
+    # 预加载部门，列表结果会被缓存，命中时对象已脱离会话
+    return db.query(User).options(joinedload(User.department)).filter(
         User.user_type != 'department_user'
     ).offset(skip).limit(limit).all()
 
@@ -0,0 +1,68 @@
+"""
+导出任务模型
+记录后台导出任务的状态和生成的文件，同一缓存键的导出文件可在数据未变更时复用
+"""
+
+from sqlalchemy import Column, Integer, String, DateTime, Text, JSON, Boolean, Index, Enum as SQLEnum
+from sqlalchemy.sql import func
+import enum
+
+from app.db.database import Base
+
+
+class ExportStatus(str, enum.Enum):
+    """导出状态枚举"""
+    PENDING = "pending"        # 等待处理（或等待同一缓存键的任务完成）
+    PROCESSING = "processing"  # 正在生成
+    COMPLETED = "completed"    # 已完成
+    FAILED = "failed"          # 失败
+
+
+class ExportJob(Base):
+    """导出任务表"""
+    __tablename__ = "export_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    # 基本信息
+    user_id = Column(Integer, nullable=False, comment="操作用户ID")
+    export_type = Column(String(30), nullable=False, comment="导出类型")
+    params = Column(JSON, nullable=True, comment="导出参数（筛选条件等）")
+    filename = Column(String(255), nullable=False, comment="下载文件名")
+
+    # 缓存：相同的导出参数、权限范围和数据版本得到相同的缓存键，共用一个导出文件
+    cache_key = Column(String(64), nullable=False, comment="缓存键")
+    data_version = Column(String(32), default="", nullable=False, comment="生成时的数据版本（缓存标签版本摘要）")
+    cached = Column(Boolean, default=False, nullable=False, comment="是否复用了已有的导出文件")
+
+    # 状态信息
+    status = Column(SQLEnum(ExportStatus), default=ExportStatus.PENDING, nullable=False, comment="导出状态")
+    row_count = Column(Integer, nullable=True, comment="导出行数")
+    file_size = Column(Integer, nullable=True, comment="文件大小（字节）")
+    error_message = Column(Text, nullable=True, comment="错误信息")
+
+    # 时间信息
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), comment="创建时间")
+    started_at = Column(DateTime(timezone=True), nullable=True, comment="开始生成时间")
+    completed_at = Column(DateTime(timezone=True), nullable=True, comment="完成时间")
+
+    __table_args__ = (
+        # 按缓存键查找已完成或进行中的任务
+        Index('idx_export_jobs_cache_key_status', 'cache_key', 'status'),
+        Index('idx_export_jobs_user_created', 'user_id', 'created_at'),
+    )
+
+    def __repr__(self):
+        return f"<ExportJob(id={self.id}, export_type='{self.export_type}', status='{self.status}')>"
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (ExportStatus.COMPLETED, ExportStatus.FAILED)
+
+
+    @property
+    def download_url(self):
+        """已完成任务的下载地址"""
+        if self.status != ExportStatus.COMPLETED:
+            return None
+        return f"/api/export-jobs/{self.id}/download"
@@ -3,7 +3,9 @@
 用于跟踪和管理批量导入操作的进度和状态
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, Text, JSON, Boolean, Enum as SQLEnum
+from sqlalchemy import (
+    Column, Integer, String, DateTime, Text, JSON, Boolean, ForeignKey, UniqueConstraint, Index, Enum as SQLEnum
+)
 from sqlalchemy.sql import func
 import enum
 from datetime import datetime
@@ -43,14 +45,19 @@ class ImportSession(Base):
     update_count = Column(Integer, default=0, nullable=False, comment="更新设备数量")
     error_count = Column(Integer, default=0, nullable=False, comment="错误数量")
 
-    # 详细结果
-    detailed_results = Column(JSON, nullable=True, comment="详细处理结果")
+    # 详细结果（只保存前若干条失败行，逐行结果见 import_row_results）
+    detailed_results = Column(JSON, nullable=True, comment="失败行样本")
     error_details = Column(JSON, nullable=True, comment="错误详情")
 
     # 配置选项
     overwrite_existing = Column(Boolean, default=False, nullable=False, comment="是否覆盖已存在的设备")
     batch_size = Column(Integer, default=50, nullable=False, comment="批处理大小")
 
+    # 断点续传
+    source_path = Column(String(500), nullable=True, comment="暂存的导入文件路径")
+    checkpoint = Column(JSON, nullable=True, comment="最后提交的批次位置及计数")
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True, comment="执行任务的心跳时间")
+
     # 时间信息
     created_at = Column(DateTime(timezone=True), server_default=func.now(), comment="创建时间")
     started_at = Column(DateTime(timezone=True), nullable=True, comment="开始处理时间")
@@ -97,4 +104,32 @@ class ImportSession(Base):
             "status": self.status,
             "success_rate": self.success_rate,
             "duration": self.duration
-        }
\ No newline at end of file
+        }
+
+
+class ImportRowResult(Base):
+    """导入行结果表：每个数据行一条，随所在批次一起写入"""
+    __tablename__ = "import_row_results"
+
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(Integer, ForeignKey("import_sessions.id", ondelete="CASCADE"), nullable=False)
+    row = Column(Integer, nullable=False, comment="Excel行号")
+    internal_id = Column(String(50), nullable=True, comment="内部编号")
+    name = Column(Text, nullable=True, comment="计量器具名称")
+    status = Column(String(10), nullable=False, comment="处理结果：成功/更新/跳过/失败")
+    message = Column(Text, nullable=True, comment="说明")
+
+    __table_args__ = (
+        UniqueConstraint('session_id', 'row', name='uq_import_row_results_session_row'),
+        # 按结果筛选并按行号分页
+        Index('idx_import_row_results_session_status_row', 'session_id', 'status', 'row'),
+    )
+
+    def to_dict(self) -> dict:
+        return {
+            "row": self.row,
+            "internal_id": self.internal_id or "",
+            "name": self.name or "",
+            "status": self.status,
+            "message": self.message or ""
+        }
@@ -1,8 +1,10 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Date, Boolean, Float, JSON, UniqueConstraint, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Date, Boolean, Float, JSON, UniqueConstraint, Index, Enum as SQLEnum
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db.database import Base
-from app.models.import_session import ImportSession
+# 导入时把以下模块中的表注册到 Base.metadata（create_all 时一并创建）
+from app.models.import_session import ImportSession, ImportRowResult  # noqa: F401
+from app.models.export_job import ExportJob  # noqa: F401
 
 class User(Base):
     __tablename__ = "users"
@@ -172,6 +174,12 @@ class AuditLog(Base):
     user_agent = Column(Text)  # 用户代理信息
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        Index('idx_audit_logs_created_at', 'created_at'),
+        Index('idx_audit_logs_user_created', 'user_id', 'created_at'),
+        Index('idx_audit_logs_equipment_id', 'equipment_id'),
+    )
+
     # 关联
     user = relationship("User")
     equipment = relationship("Equipment", back_populates="audit_logs")
@@ -248,4 +256,31 @@ class CalibrationHistory(Base):
     equipment = relationship("Equipment", back_populates="calibration_history")
     creator = relationship("User", foreign_keys=[created_by])
     rollback_user = relationship("User", foreign_keys=[rolled_back_by])
-    attachments = relationship("EquipmentAttachment", back_populates="calibration_history")
\ No newline at end of file
+    attachments = relationship("EquipmentAttachment", back_populates="calibration_history")
+
+class EquipmentStats(Base):
+    """设备统计汇总表：按部门、类别、器具名称、状态、有效期月份汇总设备数量，随设备变更增量维护"""
+    __tablename__ = "equipment_stats"
+
+    id = Column(Integer, primary_key=True, index=True)
+    department_id = Column(Integer, ForeignKey("departments.id"), nullable=False)
+    category_id = Column(Integer, ForeignKey("equipment_categories.id"), nullable=False)
+    name = Column(String(100), nullable=False)  # 器具名称
+    status = Column(String(20), nullable=False)  # 设备状态
+    valid_month = Column(String(7), nullable=False, default="")  # 有效期至所在月份(YYYY-MM)，无有效期为空串
+    equipment_count = Column(Integer, nullable=False, default=0)  # 设备数量
+
+    __table_args__ = (
+        UniqueConstraint('department_id', 'category_id', 'name', 'status', 'valid_month',
+                         name='uq_equipment_stats_key'),
+        Index('idx_equipment_stats_category_name', 'category_id', 'name'),
+        Index('idx_equipment_stats_status_month', 'status', 'valid_month'),
+    )
+
+class InternalIdSequence(Base):
+    """内部编号序列表：按 类别代码-类型编号 前缀记录已分配的最大序列号，分配时原子递增"""
+    __tablename__ = "internal_id_sequences"
+
+    category_code = Column(String(10), primary_key=True)  # 类别代码
+    type_code = Column(String(20), primary_key=True)  # 设备类型编号
+    last_value = Column(Integer, nullable=False, default=0)  # 已分配的最大序列号
@@ -412,6 +412,17 @@ class TokenData(BaseModel):
 # 分页响应
 class PaginatedEquipment(BaseModel):
     items: List[Equipment]
+    total: Optional[int] = None  # total_mode=none 时不统计总数
+    skip: int
+    limit: int
+    next_cursor: Optional[str] = None  # 游标分页：下一页游标，为空表示已到最后一页
+    total_is_estimate: bool = False  # total 是否为估算值
+
+class EquipmentWithAttachmentCount(Equipment):
+    attachment_count: int = 0
+
+class PaginatedEquipmentWithAttachmentCount(BaseModel):
+    items: List[EquipmentWithAttachmentCount]
     total: int
     skip: int
     limit: int
@@ -644,6 +655,7 @@ class ImportSessionResponse(BaseModel):
     error_details: Optional[List[dict]] = None
     overwrite_existing: bool
     batch_size: int
+    checkpoint: Optional[dict] = None
     created_at: datetime
     started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
@@ -673,6 +685,32 @@ class ImportProgressUpdate(BaseModel):
     error_count: Optional[int] = None
     detailed_result: Optional[dict] = None
 
+# 导出任务
+class ExportJobCreate(BaseModel):
+    export_type: str  # all / filtered / monthly_plan
+    filters: Optional[dict] = None  # export_type 为 filtered 时的筛选条件（含 query 时按搜索导出）
+
+class ExportJobResponse(BaseModel):
+    id: int
+    user_id: int
+    export_type: str
+    params: Optional[dict] = None
+    filename: str
+    status: str
+    cached: bool
+    data_version: str
+    row_count: Optional[int] = None
+    file_size: Optional[int] = None
+    error_message: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    download_url: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+        use_enum_values = True
+
 class ImportErrorDetail(BaseModel):
     row_number: int
     error_message: str
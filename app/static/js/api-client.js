@@ -361,6 +361,8 @@ const EquipmentAPI = {
         if (params.limit) queryParams.append('limit', params.limit);
         if (params.sort_field) queryParams.append('sort_field', params.sort_field);
         if (params.sort_order) queryParams.append('sort_order', params.sort_order);
+        if (params.cursor) queryParams.append('cursor', params.cursor);
+        if (params.total_mode) queryParams.append('total_mode', params.total_mode);
         
         const endpoint = `/api/equipment/filter${queryParams.toString() ? '?' + queryParams.toString() : ''}`;
         return api.post(endpoint, filters);
@@ -372,6 +374,10 @@ const EquipmentAPI = {
         
         if (params.skip) queryParams.append('skip', params.skip);
         if (params.limit) queryParams.append('limit', params.limit);
+        if (params.sort_field) queryParams.append('sort_field', params.sort_field);
+        if (params.sort_order) queryParams.append('sort_order', params.sort_order);
+        if (params.cursor) queryParams.append('cursor', params.cursor);
+        if (params.total_mode) queryParams.append('total_mode', params.total_mode);
         
         const endpoint = `/api/equipment/search${queryParams.toString() ? '?' + queryParams.toString() : ''}`;
         return api.post(endpoint, searchParams);
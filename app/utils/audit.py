@@ -8,6 +8,7 @@ from datetime import datetime
 from sqlalchemy.orm import Session
 
 from app.models.models import AuditLog
+from app.crud.audit_logs import save_audit_log
 
 
 def log_audit(
@@ -17,10 +18,11 @@ def log_audit(
     description: str,
     equipment_id: Optional[int] = None,
     old_value: Optional[str] = None,
-    new_value: Optional[str] = None
+    new_value: Optional[str] = None,
+    transactional: bool = False
 ) -> AuditLog:
     """
-    记录审计日志
+    记录审计日志（默认批量异步写入，见 app/crud/audit_logs.py 的 save_audit_log）
     
     Args:
         db: 数据库会话
@@ -30,6 +32,7 @@ def log_audit(
         equipment_id: 相关设备ID（可选）
         old_value: 旧值（可选）
         new_value: 新值（可选）
+        transactional: 随调用方的事务写入（必须与业务数据一起持久化的日志）
     
     Returns:
         创建的审计日志记录
@@ -44,11 +47,7 @@ def log_audit(
         new_value=new_value
     )
     
-    db.add(audit_log)
-    db.commit()
-    db.refresh(audit_log)
-    
-    return audit_log
+    return save_audit_log(db, audit_log, transactional=transactional)
 
 
 def log_equipment_action(
@@ -1,14 +1,26 @@
 """
 自动编号功能模块
+
+内部编号的序列号由 internal_id_sequences 表按 类别代码-类型编号 前缀分配：
+- 分配时用一条 UPDATE ... RETURNING 原子递增（不支持 RETURNING 的数据库在同一事务中更新后读取，
+  更新持有行锁），并发创建不会得到相同的编号，也不再扫描该前缀下的全部内部编号
+- 递增随调用方的事务提交或回滚；批量导入按批预留一段连续的序列号
+- 前缀首次使用时按现有内部编号回填；应用启动时 sync_internal_id_sequences 校准全部前缀
 """
 
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import Optional
+from sqlalchemy import and_, func, select, update
+from sqlalchemy.exc import IntegrityError
+from typing import Dict, Iterable, Optional, Tuple
+import logging
 import re
-from app.models.models import Equipment, Department, EquipmentCategory
+from app.models.models import Equipment, Department, EquipmentCategory, InternalIdSequence
 from app.utils.equipment_mapping import get_equipment_type_code, get_equipment_sequence_number
 
+logger = logging.getLogger(__name__)
+
+_SEQUENCES = InternalIdSequence.__table__
+
 def generate_department_code(department_name: str) -> str:
     """
     根据部门名称生成部门代码
@@ -63,7 +75,8 @@ def generate_category_code(category_name: str) -> str:
     # 如果无法生成，返回默认代码
     return "OT"  # Other
 
-def generate_internal_id(db: Session, category_id: int, equipment_name: Optional[str] = None, equipment_id: Optional[int] = None) -> str:
+def generate_internal_id(db: Session, category_id: int, equipment_name: Optional[str] = None,
+                         equipment_id: Optional[int] = None, reserve: bool = True) -> str:
     """
     生成内部编号 (CC-TT-NNN格式)
     CC: 类别代码 (3位)
@@ -72,6 +85,7 @@ def generate_internal_id(db: Session, category_id: int, equipment_name: Optional
     
     参数:
         equipment_id: 设备ID，用于编辑时保持原有编号
+        reserve: 是否占用序列号（在调用方的事务中递增序列）；为 False 时只预览下一个编号
     """
     # 获取类别信息
     category = db.query(EquipmentCategory).filter(EquipmentCategory.id == category_id).first()
@@ -80,7 +94,7 @@ def generate_internal_id(db: Session, category_id: int, equipment_name: Optional
         raise ValueError("找不到指定的类别")
     
     # 生成类别代码
-    cat_code = category.code if category.code else generate_category_code(category.name)
+    cat_code = get_category_code(category)
     
     # 如果是编辑现有设备，尝试保持原有编号
     if equipment_id:
@@ -94,68 +108,235 @@ def generate_internal_id(db: Session, category_id: int, equipment_name: Optional
                     simplified_type_code = parsed['equipment_type_code']
                 else:
                     # 类别改变，重新生成类型编号
-                    type_code = get_equipment_type_code(cat_code, equipment_name) if equipment_name else f"{cat_code}-99"
+                    type_code = get_equipment_type_code(cat_code, equipment_name, db) if equipment_name else f"{cat_code}-99"
                     simplified_type_code = type_code.split('-')[1] if '-' in type_code else type_code
             except:
                 # 解析失败，重新生成
-                type_code = get_equipment_type_code(cat_code, equipment_name) if equipment_name else f"{cat_code}-99"
+                parsed = None
+                type_code = get_equipment_type_code(cat_code, equipment_name, db) if equipment_name else f"{cat_code}-99"
                 simplified_type_code = type_code.split('-')[1] if '-' in type_code else type_code
+            # 前缀不变时保持原有编号，不占用新的序列号
+            if parsed and (parsed['category_code'], parsed['equipment_type_code']) == (cat_code, simplified_type_code):
+                return existing_equipment.internal_id
         else:
             # 没有原有编号，重新生成
-            type_code = get_equipment_type_code(cat_code, equipment_name) if equipment_name else f"{cat_code}-99"
+            type_code = get_equipment_type_code(cat_code, equipment_name, db) if equipment_name else f"{cat_code}-99"
             simplified_type_code = type_code.split('-')[1] if '-' in type_code else type_code
     else:
         # 新建设备，生成新的类型编号
-        if equipment_name:
-            type_code = get_equipment_type_code(cat_code, equipment_name)
-            # 如果返回的是格式如"TEM-99"，则提取数字部分
-            if '-' in type_code:
-                simplified_type_code = type_code.split('-')[1]
-            else:
-                simplified_type_code = type_code
-        else:
-            # 如果没有提供设备名称，使用默认类型编号
-            simplified_type_code = "99"
-    
-    # 查询该类别-设备类型组合下的最大序列号
-    pattern = f"{cat_code}-{simplified_type_code}-(\\d+)"
-    
-    # 构建查询条件，排除当前编辑的设备（如果是编辑模式）
-    query = db.query(Equipment).filter(
-        Equipment.internal_id.like(f"{cat_code}-{simplified_type_code}-%")
-    )
-    
-    if equipment_id:
-        # 确保equipment_id是整数类型
-        equipment_id = int(float(equipment_id)) if equipment_id else None
-        query = query.filter(Equipment.id != equipment_id)
-    
-    result = query.all()
+        simplified_type_code = get_simplified_type_code(cat_code, equipment_name, db)
     
-    # 提取现有的序列号
+    # 从该类别-设备类型组合的序列中取下一个序列号
+    if reserve:
+        next_number = reserve_sequence(db, cat_code, simplified_type_code)
+    else:
+        next_number = get_max_sequence(db, cat_code, simplified_type_code) + 1
+
+    # 返回完整的内部编号
+    return format_internal_id(cat_code, simplified_type_code, next_number)
+
+def get_category_code(category: EquipmentCategory) -> str:
+    """类别代码（未设置时按名称生成）"""
+    return category.code if category.code else generate_category_code(category.name)
+
+def get_simplified_type_code(cat_code: str, equipment_name: Optional[str], db: Optional[Session] = None) -> str:
+    """新建设备的类型编号（内部编号的中间一段），从类型编号索引中查找"""
+    if not equipment_name:
+        # 如果没有提供设备名称，使用默认类型编号
+        return "99"
+    type_code = get_equipment_type_code(cat_code, equipment_name, db)
+    # 如果返回的是格式如"TEM-99"，则提取数字部分
+    return type_code.split('-')[1] if '-' in type_code else type_code
+
+def format_internal_id(cat_code: str, type_code: str, number: int) -> str:
+    """格式化内部编号：999以内序列号保持3位数，超过999后使用实际数字"""
+    sequence = f"{number:03d}" if number <= 999 else str(number)
+    return f"{cat_code}-{type_code}-{sequence}"
+
+def _split_internal_id(internal_id: Optional[str]) -> Optional[Tuple[str, str, int]]:
+    """拆分内部编号为 (类别代码, 类型编号, 序列号)，格式不符时返回 None"""
+    parts = (internal_id or "").split('-')
+    if len(parts) != 3 or not parts[2].isdigit():
+        return None
+    return parts[0], parts[1], int(parts[2])
+
+def scan_max_sequence(db: Session, cat_code: str, type_code: str) -> int:
+    """扫描 类别代码-类型编号 前缀下已使用的最大序列号（用于回填序列），没有时返回0"""
+    pattern = f"{re.escape(cat_code)}-{re.escape(type_code)}-(\\d+)"
     existing_numbers = []
-    for equipment in result:
-        match = re.match(pattern, equipment.internal_id)
+    for (internal_id,) in db.query(Equipment.internal_id).filter(
+        Equipment.internal_id.like(f"{cat_code}-{type_code}-%")
+    ):
+        match = re.match(pattern, internal_id)
         if match:
+            existing_numbers.append(int(match.group(1)))
+    return max(existing_numbers) if existing_numbers else 0
+
+def get_max_sequence(db: Session, cat_code: str, type_code: str) -> int:
+    """类别代码-类型编号 前缀已分配的最大序列号（只读；序列尚未创建时按现有内部编号计算），没有时返回0"""
+    last_value = db.execute(
+        select(_SEQUENCES.c.last_value).where(
+            and_(_SEQUENCES.c.category_code == cat_code, _SEQUENCES.c.type_code == type_code)
+        )
+    ).scalar()
+    if last_value is None:
+        return scan_max_sequence(db, cat_code, type_code)
+    return last_value
+
+def reserve_sequence(db: Session, cat_code: str, type_code: str, count: int = 1) -> int:
+    """
+    原子地预留 count 个连续序列号，返回其中第一个
+
+    递增在调用方的事务中执行，随事务提交生效、回滚撤销；事务提交前其他事务对同一前缀的分配等待行锁。
+    序列尚不存在时按现有内部编号回填后创建。
+    """
+    condition = and_(_SEQUENCES.c.category_code == cat_code, _SEQUENCES.c.type_code == type_code)
+    statement = update(_SEQUENCES).where(condition).values(last_value=_SEQUENCES.c.last_value + count)
+    if db.get_bind().dialect.update_returning:
+        last_value = db.execute(statement.returning(_SEQUENCES.c.last_value)).scalar()
+    elif db.execute(statement).rowcount:
+        last_value = db.execute(select(_SEQUENCES.c.last_value).where(condition)).scalar()
+    else:
+        last_value = None
+
+    if last_value is None:
+        last_value = scan_max_sequence(db, cat_code, type_code) + count
+        try:
+            with db.begin_nested():
+                db.execute(_SEQUENCES.insert().values(
+                    category_code=cat_code, type_code=type_code, last_value=last_value
+                ))
+        except IntegrityError:
+            # 其他事务同时创建了该序列，改为递增
+            return reserve_sequence(db, cat_code, type_code, count)
+    return last_value - count + 1
+
+def sync_internal_id_sequences(db: Session) -> int:
+    """
+    按现有内部编号校准序列表：每个前缀的 last_value 不小于已使用的最大序列号
+
+    用于首次启用序列表时回填，以及修正绕过分配器写入的内部编号（如手工修改数据库）。
+
+    Returns:
+        新建或调整的序列数
+    """
+    maxima: Dict[Tuple[str, str], int] = {}
+    for (internal_id,) in db.query(Equipment.internal_id).yield_per(5000):
+        parts = _split_internal_id(internal_id)
+        if parts:
+            prefix = parts[:2]
+            maxima[prefix] = max(maxima.get(prefix, 0), parts[2])
+
+    current = {
+        (category_code, type_code): last_value
+        for category_code, type_code, last_value in db.execute(
+            select(_SEQUENCES.c.category_code, _SEQUENCES.c.type_code, _SEQUENCES.c.last_value)
+        )
+    }
+    inserts = [
+        {"category_code": prefix[0], "type_code": prefix[1], "last_value": value}
+        for prefix, value in maxima.items() if prefix not in current
+    ]
+    updates = [(prefix, value) for prefix, value in maxima.items()
+               if prefix in current and current[prefix] < value]
+    if inserts:
+        db.execute(_SEQUENCES.insert(), inserts)
+    for (category_code, type_code), value in updates:
+        db.execute(update(_SEQUENCES).where(and_(
+            _SEQUENCES.c.category_code == category_code,
+            _SEQUENCES.c.type_code == type_code,
+            _SEQUENCES.c.last_value < value
+        )).values(last_value=value))
+    db.commit()
+    return len(inserts) + len(updates)
+
+def ensure_internal_id_sequences(engine) -> int:
+    """应用启动时校准内部编号序列表，返回新建或调整的序列数"""
+    from app.db.database import SessionLocal
+    db = SessionLocal()
+    try:
+        return sync_internal_id_sequences(db)
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"内部编号序列校准失败: {e}")
+        return 0
+    finally:
+        db.close()
+
+class InternalIdAllocator:
+    """
+    批量导入用的内部编号分配器
+
+    调用方每批先用 reserve() 按本批新设备的数量为每个 类别代码-类型编号 前缀预留一段序列号
+    （每个前缀一条 UPDATE），之后在内存中连续分配，不再逐台设备查询。
+    类别代码和类型编号同样按 (类别, 器具名称) 缓存。
+    分配后未写入的编号（写入失败的行）会留下空号，不影响唯一性。
+
+    预览（试运行）使用 reserve_numbers=False：只读取序列当前值，在内存中推算编号，不占用序列号。
+    """
+
+    def __init__(self, db: Session, reserve_numbers: bool = True):
+        self.db = db
+        self.reserve_numbers = reserve_numbers
+        self._category_codes = {}
+        self._type_codes = {}
+        # 前缀 -> [下一个可用序列号, 已预留的最大序列号]
+        self._blocks: Dict[Tuple[str, str], list] = {}
+
+    def _category_code(self, category_id: int) -> str:
+        if category_id not in self._category_codes:
+            category = self.db.query(EquipmentCategory).filter(EquipmentCategory.id == category_id).first()
+            if not category:
+                raise ValueError("找不到指定的类别")
+            self._category_codes[category_id] = get_category_code(category)
+        return self._category_codes[category_id]
+
+    def _prefix(self, category_id: int, equipment_name: Optional[str]) -> Tuple[str, str]:
+        cat_code = self._category_code(category_id)
+        type_key = (cat_code, equipment_name)
+        if type_key not in self._type_codes:
+            self._type_codes[type_key] = get_simplified_type_code(cat_code, equipment_name, self.db)
+        return cat_code, self._type_codes[type_key]
+
+    def _extend(self, prefix: Tuple[str, str], count: int) -> None:
+        block = self._blocks.get(prefix)
+        if not self.reserve_numbers:
+            if block is None:
+                first = get_max_sequence(self.db, *prefix) + 1
+                self._blocks[prefix] = [first, float("inf")]
+            return
+        first = reserve_sequence(self.db, prefix[0], prefix[1], count)
+        if block is not None and block[0] <= block[1] and block[1] + 1 == first:
+            block[1] = first + count - 1
+        else:
+            # 未用完的旧块留作空号（其他事务已在其后分配）
+            self._blocks[prefix] = [first, first + count - 1]
+
+    def reserve(self, keys: Iterable[Tuple[int, Optional[str]]]) -> None:
+        """为即将分配的 (类别ID, 器具名称) 预留序列号，每个前缀一次递增"""
+        needed: Dict[Tuple[str, str], int] = {}
+        for category_id, equipment_name in keys:
             try:
-                num = int(match.group(1))
-                existing_numbers.append(num)
+                prefix = self._prefix(category_id, equipment_name)
             except ValueError:
                 continue
-    
-    # 生成下一个序列号
-    next_number = 1
-    if existing_numbers:
-        next_number = max(existing_numbers) + 1
-    
-    # 格式化序列号：999以内保持3位数，超过999后使用实际数字
-    if next_number <= 999:
-        sequence = f"{next_number:03d}"
-    else:
-        sequence = str(next_number)
-    
-    # 返回完整的内部编号
-    return f"{cat_code}-{simplified_type_code}-{sequence}"
+            needed[prefix] = needed.get(prefix, 0) + 1
+        for prefix, count in needed.items():
+            block = self._blocks.get(prefix)
+            available = 0 if block is None else max(0, block[1] - block[0] + 1)
+            if count > available:
+                self._extend(prefix, count - available)
+
+    def allocate(self, category_id: int, equipment_name: Optional[str] = None) -> str:
+        """分配一个新的内部编号（未预留时单独预留一个）"""
+        prefix = self._prefix(category_id, equipment_name)
+        block = self._blocks.get(prefix)
+        if block is None or block[0] > block[1]:
+            self._extend(prefix, 1)
+            block = self._blocks[prefix]
+        number = block[0]
+        block[0] = number + 1
+        return format_internal_id(prefix[0], prefix[1], number)
 
 def validate_internal_id(internal_id: str) -> bool:
     """
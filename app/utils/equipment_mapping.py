@@ -182,15 +182,15 @@ EQUIPMENT_TYPE_MAPPING = {
     }
 }
 
-def get_equipment_type_code(category_code: str, equipment_name: str) -> str:
+def get_equipment_type_code(category_code: str, equipment_name: str, db=None) -> str:
     """
     根据类别代码和设备名称获取设备类型编号
-    现在优先使用智能编号系统
+    现在优先使用智能编号系统（按类别预先计算的类型编号索引，db 为调用方的数据库会话）
     """
     # 优先使用智能编号系统
     try:
         from app.utils.predefined_name_manager import get_smart_name_mapping_for_name
-        smart_number = get_smart_name_mapping_for_name(category_code, equipment_name)
+        smart_number = get_smart_name_mapping_for_name(category_code, equipment_name, db)
         return smart_number
     except Exception as e:
         # 如果智能编号管理失败，回退到映射表
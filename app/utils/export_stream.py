@@ -0,0 +1,266 @@
+"""
+流式导出
+
+查询结果用 yield_per 分批读取，逐行生成工作表 XML 并经 zipfile 直接压缩输出到 StreamingResponse：
+不在内存或临时文件中保留整个工作簿，内存占用与导出行数无关，首批数据行写出后即开始向客户端发送。
+
+- 单元格使用内联字符串、数字和日期，不需要共享字符串表（共享字符串表须在全部行写完后才能确定）
+- 流式响应在请求的数据库会话关闭之后才开始迭代，查询在导出自己打开的会话中执行，
+  因此由 build_query(db) 构建查询而不是直接传入查询对象
+"""
+
+import csv
+import io
+import os
+import re
+import tempfile
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Optional, Sequence
+from urllib.parse import quote
+from xml.sax.saxutils import escape, quoteattr
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Query, Session
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# 每次从数据库读取的行数；每写出多少行把已压缩的数据发送一次
+QUERY_BATCH_SIZE = 1000
+FLUSH_ROWS = 500
+
+_MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+_XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+# 日期单元格保存为自 1899-12-30 起的天数（设置日期格式）
+_EXCEL_EPOCH = datetime(1899, 12, 30)
+
+# XML 1.0 不允许的控制字符（openpyxl 遇到时报错，这里直接去掉）
+_ILLEGAL_CHARACTERS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+_STYLES = (
+    f'<styleSheet xmlns="{_MAIN_NS}">'
+    '<numFmts count="2"><numFmt numFmtId="164" formatCode="yyyy-mm-dd"/>'
+    '<numFmt numFmtId="165" formatCode="yyyy-mm-dd hh:mm:ss"/></numFmts>'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="4"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/>'
+    '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="165" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+
+class XlsxSheet(NamedTuple):
+    title: str
+    columns: Sequence[str]
+    rows: Iterable[Sequence]
+    widths: Optional[Sequence[float]] = None  # 列宽（字符数），流式写出时无法按内容自动计算
+
+
+class _Sink:
+    """zipfile 的只写输出：没有 seek，zipfile 按流式方式写出（数据描述符记录大小和校验值）"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._offset = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._offset
+
+    def flush(self) -> None:
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _cell(value, style: str = "") -> str:
+    if value is None or value == "":
+        return "<c/>"
+    if isinstance(value, bool):
+        value = "是" if value else "否"
+    elif isinstance(value, (int, float, Decimal)):
+        if value != value:  # NaN
+            return "<c/>"
+        return f"<c{style}><v>{value}</v></c>"
+    elif isinstance(value, datetime):
+        serial = (value.replace(tzinfo=None) - _EXCEL_EPOCH).total_seconds() / 86400
+        return f'<c s="3"><v>{serial}</v></c>'
+    elif isinstance(value, date):
+        return f'<c s="2"><v>{(value - _EXCEL_EPOCH.date()).days}</v></c>'
+    text = escape(_ILLEGAL_CHARACTERS.sub("", str(value)))
+    return f'<c{style} t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _row(values: Sequence, style: str = "") -> str:
+    return "<row>" + "".join(_cell(value, style) for value in values) + "</row>"
+
+
+def _sheet_start(sheet: XlsxSheet) -> str:
+    cols = ""
+    if sheet.widths:
+        cols = "<cols>" + "".join(
+            f'<col min="{index}" max="{index}" width="{width}" customWidth="1"/>'
+            for index, width in enumerate(sheet.widths, 1) if width
+        ) + "</cols>"
+    return f'{_XML_DECLARATION}<worksheet xmlns="{_MAIN_NS}">{cols}<sheetData>' + _row(sheet.columns, ' s="1"')
+
+
+def _package_parts(titles: List[str]) -> Iterator[tuple]:
+    """工作簿的其余部件：内容类型、关系、工作簿和样式"""
+    overrides = "".join(
+        f'<Override PartName="/xl/worksheets/sheet{index}.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        for index in range(1, len(titles) + 1)
+    )
+    yield "[Content_Types].xml", (
+        f'{_XML_DECLARATION}<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        f'{overrides}</Types>'
+    )
+    yield "_rels/.rels", (
+        f'{_XML_DECLARATION}<Relationships xmlns="{_PKG_REL_NS}">'
+        f'<Relationship Id="rId1" Type="{_REL_NS}/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    )
+    sheets = "".join(
+        f'<sheet name={quoteattr(title)} sheetId="{index}" r:id="rId{index}"/>'
+        for index, title in enumerate(titles, 1)
+    )
+    yield "xl/workbook.xml", (
+        f'{_XML_DECLARATION}<workbook xmlns="{_MAIN_NS}" xmlns:r="{_REL_NS}"><sheets>{sheets}</sheets></workbook>'
+    )
+    relationships = "".join(
+        f'<Relationship Id="rId{index}" Type="{_REL_NS}/worksheet" Target="worksheets/sheet{index}.xml"/>'
+        for index in range(1, len(titles) + 1)
+    )
+    yield "xl/_rels/workbook.xml.rels", (
+        f'{_XML_DECLARATION}<Relationships xmlns="{_PKG_REL_NS}">{relationships}'
+        f'<Relationship Id="rId{len(titles) + 1}" Type="{_REL_NS}/styles" Target="styles.xml"/>'
+        '</Relationships>'
+    )
+    yield "xl/styles.xml", _XML_DECLARATION + _STYLES
+
+
+def iter_xlsx(sheets: Iterable[XlsxSheet], flush_rows: int = FLUSH_ROWS) -> Iterator[bytes]:
+    """
+    逐块产出 XLSX 文件内容
+
+    sheets 可以是生成器：后面的工作表在前面的工作表写完之后才构建（例如根据已导出的数据决定是否附加说明表）。
+    """
+    sink = _Sink()
+    titles: List[str] = []
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for index, sheet in enumerate(sheets, 1):
+            titles.append(_ILLEGAL_CHARACTERS.sub("", sheet.title)[:31])
+            with archive.open(f"xl/worksheets/sheet{index}.xml", "w") as part:
+                buffer = [_sheet_start(sheet)]
+                for count, values in enumerate(sheet.rows, 1):
+                    buffer.append(_row(values))
+                    if count % flush_rows == 0:
+                        part.write("".join(buffer).encode("utf-8"))
+                        buffer.clear()
+                        data = sink.take()
+                        if data:
+                            yield data
+                buffer.append("</sheetData></worksheet>")
+                part.write("".join(buffer).encode("utf-8"))
+
+        for name, content in _package_parts(titles):
+            archive.writestr(name, content)
+    yield sink.take()
+
+
+def write_xlsx(sheets: Iterable[XlsxSheet], path) -> int:
+    """
+    把 XLSX 文件写到 path，返回文件大小
+
+    先写入同目录的临时文件再替换，读取方不会看到写了一半的文件。
+    """
+    fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, "wb") as output:
+            for data in iter_xlsx(sheets):
+                output.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return os.path.getsize(path)
+
+
+def iter_csv(columns: Sequence[str], rows: Iterable[Sequence], flush_rows: int = FLUSH_ROWS) -> Iterator[bytes]:
+    """逐块产出 UTF-8 CSV 内容"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for count, values in enumerate(rows, 1):
+        writer.writerow(values)
+        if count % flush_rows == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+def iter_query(build_query: Callable[[Session], Optional[Query]],
+               on_complete: Optional[Callable[[Session, int], None]] = None,
+               batch_size: int = QUERY_BATCH_SIZE) -> Iterator:
+    """
+    在独立会话中分批读取查询结果
+
+    Args:
+        build_query: 用给定会话构建查询；返回 None 表示没有可导出的数据（例如没有任何器具权限）
+        on_complete: 全部读取完成后以 (会话, 行数) 调用，用于记录导出日志
+    """
+    from app.db.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        count = 0
+        query = build_query(db)
+        if query is not None:
+            for item in query.yield_per(batch_size):
+                count += 1
+                yield item
+        if on_complete:
+            on_complete(db, count)
+    finally:
+        db.close()
+
+
+def attachment_headers(filename: str) -> dict:
+    return {"Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename, safe='')}"}
+
+
+def xlsx_response(sheets: Iterable[XlsxSheet], filename: str) -> StreamingResponse:
+    """以流式响应返回 XLSX 文件"""
+    return StreamingResponse(iter_xlsx(sheets), media_type=XLSX_MEDIA_TYPE, headers=attachment_headers(filename))
+
+
+def csv_response(columns: Sequence[str], rows: Iterable[Sequence], filename: str) -> StreamingResponse:
+    """以流式响应返回 CSV 文件"""
+    return StreamingResponse(iter_csv(columns, rows), media_type="text/csv", headers=attachment_headers(filename))
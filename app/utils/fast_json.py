@@ -0,0 +1,44 @@
+"""
+高性能JSON序列化
+
+列表接口直接返回查询出的原始值（日期、Decimal等），不经过 Pydantic 校验。
+安装了 orjson 时使用 orjson 序列化，否则回退到标准库 json。
+"""
+
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖
+    orjson = None
+
+
+def _default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    raise TypeError(f"无法序列化类型 {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """序列化为 UTF-8 编码的 JSON"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    """直接序列化的 JSON 响应，跳过 response_model 校验"""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
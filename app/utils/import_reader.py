@@ -0,0 +1,209 @@
+"""
+导入文件的流式读取
+
+上传文件先按块写入磁盘（data/imports），不在内存中保留完整内容；
+读取时按 chunk_size 行逐块产出 DataFrame，供校验和写入阶段按生成器流水线处理，
+内存占用与文件大小无关：
+- .xlsx：openpyxl read_only 模式逐行读取，不构建整张工作表
+- .csv：pandas 分块读取（快速路径，自动识别 UTF-8 / GBK 编码）
+- .xls：旧格式不支持流式读取，整表读取后分块产出
+
+每块 DataFrame 的索引为数据行号（从0开始，Excel行号 = 索引 + 2），与整表读取时一致。
+"""
+
+import csv
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+import pandas as pd
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+# 导入文件暂存目录（不在 /uploads 静态目录下，避免被直接访问）
+IMPORT_SPOOL_DIR = Path("data/imports")
+
+SUPPORTED_EXTENSIONS = ('.xlsx', '.xls', '.csv')
+
+_COPY_BUFFER_SIZE = 1024 * 1024
+_CSV_ENCODINGS = ('utf-8-sig', 'gbk')
+
+
+def is_supported_file(filename: Optional[str]) -> bool:
+    return bool(filename) and filename.lower().endswith(SUPPORTED_EXTENSIONS)
+
+
+async def spool_upload(file: UploadFile, directory: Path = IMPORT_SPOOL_DIR) -> Tuple[str, int]:
+    """
+    将上传文件按块写入暂存目录
+
+    Returns:
+        (文件路径, 文件大小)
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    extension = Path(file.filename or "").suffix.lower()
+    path = directory / f"{uuid.uuid4()}{extension}"
+
+    def copy() -> int:
+        file.file.seek(0)
+        with open(path, "wb") as output:
+            shutil.copyfileobj(file.file, output, _COPY_BUFFER_SIZE)
+        return os.path.getsize(path)
+
+    try:
+        size = await run_in_threadpool(copy)
+    except Exception:
+        remove_spooled_file(str(path))
+        raise
+    return str(path), size
+
+
+def remove_spooled_file(path: Optional[str]) -> None:
+    if path and os.path.exists(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _extension(path: str) -> str:
+    return Path(path).suffix.lower()
+
+
+def _column_names(header) -> List[str]:
+    """表头转换为列名（空表头按 pandas 的规则命名为 Unnamed: n）"""
+    return [
+        str(value).strip() if value is not None and str(value).strip() != '' else f"Unnamed: {index}"
+        for index, value in enumerate(header)
+    ]
+
+
+def _csv_encoding(path: str) -> str:
+    with open(path, 'rb') as source:
+        sample = source.read(64 * 1024)
+    for encoding in _CSV_ENCODINGS:
+        try:
+            sample.decode(encoding)
+            return encoding
+        except UnicodeDecodeError as e:
+            # 采样截断在多字节字符中间时仍视为该编码
+            if e.start >= len(sample) - 4:
+                return encoding
+    return _CSV_ENCODINGS[0]
+
+
+def read_header(path: str) -> List[str]:
+    """只读取表头"""
+    extension = _extension(path)
+    if extension == '.csv':
+        with open(path, newline='', encoding=_csv_encoding(path)) as source:
+            return _column_names(next(csv.reader(source), []))
+    if extension == '.xls':
+        return list(pd.read_excel(path, nrows=0).columns)
+
+    from openpyxl import load_workbook
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for header in workbook.active.iter_rows(min_row=1, max_row=1, values_only=True):
+            return _column_names(header)
+        return []
+    finally:
+        workbook.close()
+
+
+def count_rows(path: str) -> int:
+    """
+    估计数据行数（用于进度显示）
+
+    .xlsx 取工作表维度信息（不存在时为0，进度按已处理行数显示）；.csv 统计换行数。
+    """
+    extension = _extension(path)
+    if extension == '.csv':
+        lines = 0
+        with open(path, 'rb') as source:
+            for block in iter(lambda: source.read(_COPY_BUFFER_SIZE), b''):
+                lines += block.count(b'\n')
+        return max(0, lines - 1)
+    if extension == '.xls':
+        return len(pd.read_excel(path, usecols=[0]))
+
+    from openpyxl import load_workbook
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        max_row = workbook.active.max_row
+        return max(0, max_row - 1) if max_row else 0
+    finally:
+        workbook.close()
+
+
+def _frame(rows: List[tuple], row_numbers: List[int], columns: List[str]) -> pd.DataFrame:
+    width = len(columns)
+    rows = [tuple(row[:width]) + (None,) * (width - len(row)) for row in rows]
+    return pd.DataFrame(rows, columns=columns, index=pd.Index(row_numbers), dtype=object)
+
+
+def _iter_xlsx_chunks(path: str, chunk_size: int, start_row: int) -> Iterator[pd.DataFrame]:
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows_iter = workbook.active.iter_rows(values_only=True)
+        header = next(rows_iter, None)
+        if header is None:
+            return
+        columns = _column_names(header)
+
+        rows, row_numbers = [], []
+        for row_number, row in enumerate(rows_iter):
+            if row_number < start_row:
+                continue
+            # 跳过整行为空的行（read_only 模式会产出带格式的空行）
+            if all(value is None or (isinstance(value, str) and value.strip() == '') for value in row):
+                continue
+            rows.append(row)
+            row_numbers.append(row_number)
+            if len(rows) >= chunk_size:
+                yield _frame(rows, row_numbers, columns)
+                rows, row_numbers = [], []
+        if rows:
+            yield _frame(rows, row_numbers, columns)
+    finally:
+        workbook.close()
+
+
+def _iter_csv_chunks(path: str, chunk_size: int, start_row: int) -> Iterator[pd.DataFrame]:
+    reader = pd.read_csv(
+        path, dtype=str, keep_default_na=False, encoding=_csv_encoding(path),
+        chunksize=chunk_size, skiprows=range(1, start_row + 1) if start_row else None
+    )
+    with reader:
+        for chunk in reader:
+            chunk.columns = _column_names(chunk.columns)
+            chunk.index = chunk.index + start_row
+            yield chunk
+
+
+def _iter_xls_chunks(path: str, chunk_size: int, start_row: int) -> Iterator[pd.DataFrame]:
+    df = pd.read_excel(path)
+    for offset in range(start_row, len(df), chunk_size):
+        yield df.iloc[offset:offset + chunk_size]
+
+
+def iter_import_chunks(path: str, chunk_size: int, start_row: int = 0) -> Iterator[pd.DataFrame]:
+    """
+    逐块读取导入文件
+
+    Args:
+        path: 暂存的导入文件
+        chunk_size: 每块行数
+        start_row: 从第几个数据行开始（跳过之前的行）
+    """
+    chunk_size = max(1, chunk_size)
+    extension = _extension(path)
+    if extension == '.csv':
+        return _iter_csv_chunks(path, chunk_size, start_row)
+    if extension == '.xls':
+        return _iter_xls_chunks(path, chunk_size, start_row)
+    return _iter_xlsx_chunks(path, chunk_size, start_row)
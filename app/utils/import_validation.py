@@ -0,0 +1,274 @@
+"""
+设备导入数据的列式校验
+
+导入前对整张表按列一次性完成格式校验，不逐行调用 Python 逻辑：
+- 枚举字段（检定周期、检定方式、检定结果、证书形式、设备状态）用 isin 掩码校验
+- 每个日期列只调用一次 pd.to_datetime(errors='coerce')，无法解析的单元格为 NaT
+- 部门、设备类别按名称与预先加载的查找表 merge，得到 ID；预定义器具名称同样按 (类别, 名称) merge
+
+每行只报告第一个错误，错误顺序与原逐行校验一致。
+校验只读取部门、类别两张小表，不访问设备表；出厂编号重复等需要查库的检查由写入阶段完成。
+"""
+
+from typing import Dict, List, NamedTuple
+
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from app.models.models import Department, EquipmentCategory
+
+# 必需的列（内部编号由系统自动生成）
+REQUIRED_COLUMNS = [
+    '使用部门', '设备类别', '计量器具名称', '型号/规格', '准确度等级',
+    '检定周期', '检定(校准)日期', '检定方式', '检定结果'
+]
+
+CALIBRATION_CYCLES = ['6个月', '12个月', '24个月', '36个月', '随坏随换']
+CALIBRATION_METHODS = ['内检', '外检']
+CALIBRATION_RESULTS = ['合格', '不合格']
+CERTIFICATE_FORMS = ['校准证书', '检定证书']
+EQUIPMENT_STATUSES = ['在用', '停用', '报废']
+EXTERNAL_FIELDS = ['证书编号', '检定机构', '证书形式']
+
+# 错误报告的列（与导入结果 detailed_results 的字段一致）
+ERROR_COLUMNS = ['row', 'internal_id', 'name', 'status', 'message']
+
+# 通过校验的行输出的字段（与 EquipmentCreate 对应，internal_id 在写入阶段生成）
+EQUIPMENT_COLUMNS = [
+    'department_id', 'category_id', 'name', 'model', 'accuracy_level', 'measurement_range',
+    'calibration_cycle', 'calibration_date', 'calibration_method', 'current_calibration_result',
+    'manufacturer_id', 'installation_location', 'manufacturer', 'manufacture_date', 'scale_value',
+    'management_level', 'original_value', 'status', 'status_change_date',
+    'certificate_number', 'verification_agency', 'certificate_form', 'notes'
+]
+
+# 设备字段对应的导入列名（预览差异时显示）
+FIELD_COLUMNS = {
+    'department_id': '使用部门', 'category_id': '设备类别', 'name': '计量器具名称', 'model': '型号/规格',
+    'accuracy_level': '准确度等级', 'measurement_range': '测量范围', 'calibration_cycle': '检定周期',
+    'calibration_date': '检定(校准)日期', 'calibration_method': '检定方式',
+    'current_calibration_result': '检定结果', 'manufacturer_id': '出厂编号', 'installation_location': '安装地点',
+    'manufacturer': '制造厂家', 'manufacture_date': '出厂日期', 'scale_value': '分度值',
+    'management_level': '管理级别', 'original_value': '原值/元', 'status': '设备状态',
+    'status_change_date': '状态变更时间', 'certificate_number': '证书编号', 'verification_agency': '检定机构',
+    'certificate_form': '证书形式', 'notes': '备注'
+}
+
+
+class LookupFrames(NamedTuple):
+    departments: pd.DataFrame      # department_name, department_id
+    categories: pd.DataFrame       # category_name, category_id, category_code, available_names
+    predefined_names: pd.DataFrame  # category_id, name
+
+
+class ImportValidation(NamedTuple):
+    rows: pd.DataFrame    # 通过校验的行：row（Excel行号） + EQUIPMENT_COLUMNS
+    errors: pd.DataFrame  # 每个失败行一条：ERROR_COLUMNS
+
+
+def load_lookup_frames(db: Session) -> LookupFrames:
+    """一次性加载部门、类别及其预定义器具名称"""
+    departments = pd.DataFrame(
+        db.query(Department.name, Department.id).order_by(Department.id).all(),
+        columns=['department_name', 'department_id']
+    ).drop_duplicates('department_name')
+
+    category_rows = db.query(
+        EquipmentCategory.name, EquipmentCategory.id, EquipmentCategory.code,
+        EquipmentCategory.predefined_names
+    ).order_by(EquipmentCategory.id).all()
+
+    categories = []
+    predefined_names = []
+    for name, category_id, code, names in category_rows:
+        names = names or []
+        # 只显示前5个，避免信息过长
+        available_names = ', '.join(names[:5])
+        if len(names) > 5:
+            available_names += f" 等(共{len(names)}种)"
+        categories.append((name, category_id, code, available_names))
+        predefined_names.extend((category_id, item) for item in names)
+
+    return LookupFrames(
+        departments=departments,
+        categories=pd.DataFrame(
+            categories, columns=['category_name', 'category_id', 'category_code', 'available_names']
+        ).drop_duplicates('category_name'),
+        predefined_names=pd.DataFrame(
+            predefined_names, columns=['category_id', 'name']
+        ).drop_duplicates()
+    )
+
+
+def _text(df: pd.DataFrame, column: str, default: str = '') -> pd.Series:
+    """列转换为文本（等同逐格 str()），缺少的列以默认值填充"""
+    if column not in df.columns:
+        return pd.Series(default, index=df.index, dtype=object)
+    return df[column].astype(object).where(df[column].notna(), '').map(str)
+
+
+def _parse_dates(text: pd.Series) -> pd.Series:
+    """整列解析日期，空白和无法解析的单元格为 NaT"""
+    return pd.to_datetime(text.where(text != ''), errors='coerce', format='mixed')
+
+
+def _to_dates(parsed: pd.Series) -> pd.Series:
+    """datetime64 列转换为 date 对象列，NaT 为 None"""
+    return parsed.dt.date.astype(object).where(parsed.notna(), None)
+
+
+def validate_import_frame(df: pd.DataFrame, lookups: LookupFrames) -> ImportValidation:
+    """
+    校验导入数据
+
+    Args:
+        df: 读取的Excel数据（索引为从0开始的数据行号）
+        lookups: load_lookup_frames 加载的查找表
+
+    Returns:
+        ImportValidation(rows, errors)，两者按 Excel 行号排列
+    """
+    index = df.index
+    messages = pd.Series('', index=index, dtype=object)
+
+    def reject(mask: pd.Series, message) -> None:
+        """为尚无错误的行记录错误（message 为字符串或按行的 Series）"""
+        target = mask & (messages == '')
+        if target.any():
+            messages[target] = message if isinstance(message, str) else message[target]
+
+    department_name = _text(df, '使用部门')
+    category_name = _text(df, '设备类别')
+    name = _text(df, '计量器具名称')
+    cycle = _text(df, '检定周期')
+    method = _text(df, '检定方式')
+    result = _text(df, '检定结果')
+    status = _text(df, '设备状态', '在用').str.strip()
+    manufacturer_id = _text(df, '出厂编号').str.strip()
+    external = method == '外检'
+
+    # 部门、类别按名称 merge（many_to_one 的左连接保持左表行序）
+    resolved = pd.DataFrame({
+        'department_name': department_name, 'category_name': category_name
+    }).merge(
+        lookups.departments, on='department_name', how='left', validate='many_to_one'
+    ).merge(
+        lookups.categories, on='category_name', how='left', validate='many_to_one'
+    ).set_index(index)
+
+    reject(resolved['department_id'].isna(), "部门'" + department_name + "'不存在")
+    reject(resolved['category_id'].isna(), "设备类别'" + category_name + "'不存在")
+
+    # 预定义器具名称：类别有名称列表时，(类别, 名称) 必须在列表中
+    category_ids = resolved['category_id'].astype('Int64')
+    predefined = pd.DataFrame({'category_id': category_ids, 'name': name}).merge(
+        lookups.predefined_names.astype({'category_id': 'Int64'}),
+        on=['category_id', 'name'], how='left', indicator=True
+    ).set_index(index)
+    has_names = resolved['available_names'].fillna('') != ''
+    reject(
+        has_names & (predefined['_merge'] == 'left_only'),
+        "计量器具名称'" + name + "'不在设备类别'" + category_name
+        + "'的预定义器具名称列表中。可用名称包括：" + resolved['available_names'].fillna('')
+    )
+
+    reject(~cycle.isin(CALIBRATION_CYCLES),
+           "检定周期必须是'6个月'、'12个月'、'24个月'、'36个月'或'随坏随换'")
+    reject(~method.isin(CALIBRATION_METHODS), "检定方式必须是'内检'或'外检'")
+    reject(~result.isin(CALIBRATION_RESULTS), "检定结果必须是'合格'或'不合格'")
+
+    # 外检必填字段与证书形式
+    external_text = {field: _text(df, field) for field in EXTERNAL_FIELDS}
+    for field, text in external_text.items():
+        reject(external & (text.str.strip() == ''), f"外检时'{field}'为必填项")
+    reject(external & ~external_text['证书形式'].str.strip().isin(CERTIFICATE_FORMS),
+           "证书形式必须是'校准证书'或'检定证书'")
+
+    # 日期列各解析一次
+    calibration_text = _text(df, '检定(校准)日期').str.strip()
+    calibration_parsed = _parse_dates(calibration_text)
+    run_to_failure = cycle == '随坏随换'
+    reject(~run_to_failure & (calibration_text == ''), "检定(校准)日期为必填项")
+    reject(~run_to_failure & calibration_parsed.isna(), "检定日期格式错误，请使用YYYY-MM-DD格式")
+
+    manufacture_text = _text(df, '出厂日期').str.strip()
+    manufacture_parsed = _parse_dates(manufacture_text)
+    reject((manufacture_text != '') & manufacture_parsed.isna(), "出厂日期格式错误，请使用YYYY-MM-DD格式")
+
+    reject(~status.isin(EQUIPMENT_STATUSES),
+           "设备状态'" + status + "'不合法，只能是'在用'、'停用'或'报废'")
+
+    status_change_text = _text(df, '状态变更时间').str.strip()
+    status_change_parsed = _parse_dates(status_change_text)
+    stopped = status.isin(['停用', '报废'])
+    reject(stopped & (status_change_text != '') & status_change_parsed.isna(),
+           "状态变更时间格式错误，请使用YYYY-MM-DD格式")
+
+    reject(manufacturer_id == '', "出厂编号为必填项，不能为空")
+
+    row_numbers = pd.Series(index, index=index).astype(int) + 2  # Excel行号从2开始（第1行是标题）
+    failed = messages != ''
+
+    errors = pd.DataFrame({
+        'row': row_numbers[failed],
+        'internal_id': '',
+        'name': name[failed],
+        'status': '失败',
+        'message': messages[failed]
+    }, columns=ERROR_COLUMNS)
+
+    # 原值：无法转换为数字时置空（不作为错误）
+    original_value = pd.to_numeric(_text(df, '原值/元').str.strip(), errors='coerce')
+
+    def external_only(text: pd.Series) -> pd.Series:
+        return text.where(external, '')
+
+    passed = ~failed
+    rows = pd.DataFrame({
+        'row': row_numbers,
+        'department_id': resolved['department_id'].astype('Int64'),
+        'category_id': category_ids,
+        'name': name,
+        'model': _text(df, '型号/规格'),
+        'accuracy_level': _text(df, '准确度等级'),
+        'measurement_range': _text(df, '测量范围'),
+        'calibration_cycle': cycle,
+        'calibration_date': _to_dates(calibration_parsed),
+        'calibration_method': method,
+        'current_calibration_result': result,
+        'manufacturer_id': manufacturer_id,
+        'installation_location': _text(df, '安装地点'),
+        'manufacturer': _text(df, '制造厂家'),
+        'manufacture_date': _to_dates(manufacture_parsed),
+        'scale_value': _text(df, '分度值'),
+        # 外检时管理级别为"-"
+        'management_level': _text(df, '管理级别').where(~external, '-'),
+        'original_value': original_value.astype(object).where(original_value.notna(), None),
+        'status': status,
+        'status_change_date': _to_dates(status_change_parsed.where(stopped)),
+        'certificate_number': external_only(external_text['证书编号']),
+        'verification_agency': external_only(external_text['检定机构']),
+        'certificate_form': external_only(external_text['证书形式']),
+        'notes': _text(df, '备注')
+    })[passed]
+
+    return ImportValidation(rows=rows, errors=errors)
+
+
+def iter_equipment_records(rows: pd.DataFrame):
+    """逐行产出 (Excel行号, 设备字段字典)，值均为 Python 原生类型"""
+    for record in rows.to_dict('records'):
+        row_number = int(record.pop('row'))
+        record['department_id'] = int(record['department_id'])
+        record['category_id'] = int(record['category_id'])
+        if record['original_value'] is not None:
+            record['original_value'] = float(record['original_value'])
+        yield row_number, record
+
+
+def error_records(errors: pd.DataFrame) -> List[Dict]:
+    """错误报告转换为导入结果条目"""
+    return [
+        {**record, 'row': int(record['row'])}
+        for record in errors.to_dict('records')
+    ]
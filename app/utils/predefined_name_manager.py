@@ -3,6 +3,7 @@
 """
 
 from typing import List, Dict, Tuple
+from sqlalchemy.orm import Session
 from app.utils.equipment_mapping import EQUIPMENT_TYPE_MAPPING
 
 def get_smart_name_mapping(category_code: str, predefined_names: List[str], existing_equipment_names: List[str] = None, equipment_internal_ids: Dict[str, str] = None) -> Dict[str, str]:
@@ -22,10 +23,11 @@ def get_smart_name_mapping(category_code: str, predefined_names: List[str], exis
     
     name_mapping = {}
     used_numbers = set()
+    predefined_name_set = set(predefined_names)
     
     # 第一步：为有设备的器具分配固定编号（基于设备internal_id中的编号）
-    for name in existing_equipment_names:
-        if name in predefined_names:
+    for name in dict.fromkeys(existing_equipment_names):
+        if name in predefined_name_set:
             # 从设备的internal_id中提取编号
             internal_id = equipment_internal_ids.get(name, "")
             number = extract_number_from_internal_id(internal_id, category_code)
@@ -206,7 +208,7 @@ def remove_predefined_name_with_equipment_check(category_code: str, predefined_n
         equipment_internal_ids = {}
     
     # 检查要删除的名称是否有设备在使用
-    has_equipment = remove_name in existing_equipment_names
+    has_equipment = remove_name in set(existing_equipment_names)
     
     if has_equipment:
         # 如果有设备，不能删除
@@ -223,54 +225,24 @@ def remove_predefined_name_with_equipment_check(category_code: str, predefined_n
     
     return sorted_names, name_mapping
 
-def get_smart_name_mapping_for_name(category_code: str, equipment_name: str) -> str:
+def get_smart_name_mapping_for_name(category_code: str, equipment_name: str, db: Session = None) -> str:
     """
     为单个设备名称获取智能编号
     
     参数：
         category_code: 类别代码
         equipment_name: 设备名称
+        db: 调用方的数据库会话（只用于确定数据库，未提供时使用默认数据库）
     
     返回：
         该名称的智能编号
     """
-    # 从数据库获取该类别的所有预定义名称和设备信息
+    # 从类型编号索引中查找（按类别预先计算，类别或设备变更后重新计算）
     try:
-        import json
-        import sqlite3
-        
-        conn = sqlite3.connect('data/inventory.db')
-        cursor = conn.cursor()
-        
-        # 获取预定义名称
-        cursor.execute('SELECT predefined_names FROM equipment_categories WHERE code = ?', (category_code,))
-        result = cursor.fetchone()
-        
-        if result:
-            predefined_names_json = result[0]
-            predefined_names = json.loads(predefined_names_json) if predefined_names_json else []
-            
-            # 如果设备名称在预定义名称中，使用智能编号映射
-            if equipment_name in predefined_names:
-                # 获取该类别下的所有设备信息
-                cursor.execute('''
-                    SELECT e.name, e.internal_id, c.id 
-                    FROM equipments e 
-                    JOIN equipment_categories c ON e.category_id = c.id 
-                    WHERE c.code = ?
-                ''', (category_code,))
-                
-                equipment_data = cursor.fetchall()
-                existing_equipment_names = [item[0] for item in equipment_data]
-                equipment_internal_ids = {item[0]: item[1] for item in equipment_data}
-                
-                # 使用智能编号映射
-                mapping = get_smart_name_mapping(category_code, predefined_names, existing_equipment_names, equipment_internal_ids)
-                if equipment_name in mapping:
-                    conn.close()
-                    return mapping[equipment_name]
-        
-        conn.close()
+        from app.crud.type_code_index import type_code_index
+        number = type_code_index.type_code(category_code, equipment_name, db)
+        if number:
+            return number
     except Exception as e:
         pass  # 静默处理数据库错误
     
@@ -283,4 +255,4 @@ def get_smart_name_mapping_for_name(category_code: str, equipment_name: str) ->
         return str(number)
     except Exception as e:
         # 最后的备用方案
-        return "99"
\ No newline at end of file
+        return "99"
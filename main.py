@@ -23,6 +23,7 @@ from app.api.audit_logs import router as audit_logs_router
 from app.api.categories import router as categories_router
 from app.api.import_export import router as import_export_router
 from app.api.import_sessions import router as import_sessions_router
+from app.api.export_jobs import router as export_jobs_router
 from app.api.attachments import router as attachments_router
 from app.api.settings import router as settings_router
 from app.api.reports import router as reports_router
@@ -46,6 +47,26 @@ app_logger.info("正在启动设备台账管理系统...")
 models.Base.metadata.create_all(bind=engine)
 app_logger.info("数据库表创建完成")
 
+# 创建设备全文检索索引（SQLite FTS5 / PostgreSQL tsvector）
+from app.crud.search_index import ensure_search_index
+if ensure_search_index(engine):
+    app_logger.info("设备全文检索索引已就绪")
+
+# 校验设备统计汇总表（首次启用或数据不一致时全量重建）
+from app.crud.equipment_stats import ensure_equipment_stats
+if ensure_equipment_stats(engine):
+    app_logger.info("设备统计汇总表已重建")
+
+# 校准内部编号序列表（首次启用时按现有内部编号回填）
+from app.utils.auto_id import ensure_internal_id_sequences
+if ensure_internal_id_sequences(engine):
+    app_logger.info("内部编号序列已校准")
+
+# 建立器具类型编号索引（生成内部编号时按类别代码和器具名称直接查表）
+from app.crud.type_code_index import ensure_type_code_index
+if ensure_type_code_index(engine):
+    app_logger.info("器具类型编号索引已建立")
+
 app = FastAPI(
     title="设备台账管理系统",
     version="1.0.0",
@@ -55,6 +76,43 @@ app = FastAPI(
     openapi_url="/openapi.json"
 )
 
+# 应用关闭时释放异步缓存连接池
+from app.core.async_cache import async_cache_service
+
+@app.on_event("shutdown")
+async def close_async_cache():
+    await async_cache_service.close()
+
+# 应用关闭时停止后台导入任务
+from app.core.import_worker import import_worker
+
+@app.on_event("shutdown")
+def stop_import_worker():
+    import_worker.shutdown()
+
+# 应用关闭时停止后台导出任务
+from app.core.export_worker import export_worker
+
+@app.on_event("shutdown")
+def stop_export_worker():
+    export_worker.shutdown()
+
+# 启动操作日志写入线程（回放上次运行遗留的 spool 文件），应用关闭时写入剩余日志
+from app.core.audit_writer import audit_writer
+audit_writer.start()
+
+@app.on_event("shutdown")
+def stop_audit_writer():
+    audit_writer.shutdown()
+
+# 启动操作日志归档线程（启动时及之后每天把超过保留月数的日志按月移入归档库）
+from app.crud.audit_archive import start_audit_archiver, stop_audit_archiver
+start_audit_archiver()
+
+@app.on_event("shutdown")
+def stop_audit_archive():
+    stop_audit_archiver()
+
 # 添加中间件（注意顺序很重要）
 from app.core.middleware import LoggingMiddleware
 app.add_middleware(LoggingMiddleware)
@@ -77,6 +135,7 @@ app.include_router(dashboard_router, prefix="/api/dashboard", tags=["仪表盘"]
 app.include_router(audit_logs_router, prefix="/api/audit", tags=["操作日志"])
 app.include_router(import_export_router, prefix="/api/import", tags=["数据导入导出"])
 app.include_router(import_sessions_router, prefix="/api/import-sessions", tags=["导入会话管理"])
+app.include_router(export_jobs_router, prefix="/api/export-jobs", tags=["导出任务"])
 app.include_router(attachments_router, prefix="/api/attachments", tags=["附件管理"])
 app.include_router(settings_router, prefix="/api/settings", tags=["系统设置"])
 app.include_router(reports_router, prefix="/api/reports", tags=["统计报表"])
@@ -0,0 +1,57 @@
+"""Add equipment full-text search index
+
+Revision ID: 020
+Revises: 019
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '020'
+down_revision = '019'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """创建设备全文检索索引并回填现有设备"""
+    bind = op.get_bind()
+
+    if bind.dialect.name == 'sqlite':
+        # SQLite：FTS5 虚拟表，rowid 即设备ID
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS equipment_fts "
+            "USING fts5(document, tokenize='unicode61')"
+        )
+    elif bind.dialect.name == 'postgresql':
+        # PostgreSQL：tsvector 生成列 + GIN 索引
+        op.execute(
+            "CREATE TABLE IF NOT EXISTS equipment_search_index ("
+            "equipment_id INTEGER PRIMARY KEY REFERENCES equipments(id) ON DELETE CASCADE, "
+            "document TEXT NOT NULL DEFAULT '', "
+            "search_vector TSVECTOR GENERATED ALWAYS AS (to_tsvector('simple', document)) STORED)"
+        )
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS idx_equipment_search_index_vector "
+            "ON equipment_search_index USING GIN (search_vector)"
+        )
+    else:
+        return
+
+    # 回填索引文档（n-gram 切分逻辑与应用保持一致）
+    from app.crud.search_index import ensure_search_index
+    from app.db.database import engine
+    ensure_search_index(engine)
+
+
+def downgrade() -> None:
+    """删除设备全文检索索引"""
+    bind = op.get_bind()
+
+    if bind.dialect.name == 'sqlite':
+        op.execute("DROP TABLE IF EXISTS equipment_fts")
+    elif bind.dialect.name == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS idx_equipment_search_index_vector")
+        op.execute("DROP TABLE IF EXISTS equipment_search_index")
@@ -0,0 +1,47 @@
+"""Add composite indexes for equipment keyset pagination
+
+Revision ID: 021
+Revises: 020
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '021'
+down_revision = '020'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """添加游标分页所需的 (排序列, id) 复合索引"""
+
+    # 1. 有效期+ID - 设备列表默认排序（有效期至，空值在后）
+    op.create_index(
+        'idx_equipment_valid_until_id',
+        'equipments',
+        ['valid_until', 'id']
+    )
+
+    # 2. 名称+ID - 按名称排序
+    op.create_index(
+        'idx_equipment_name_id',
+        'equipments',
+        ['name', 'id']
+    )
+
+    # 3. 部门+ID - 按部门排序时与 departments.name 唯一索引配合
+    op.create_index(
+        'idx_equipment_department_id_id',
+        'equipments',
+        ['department_id', 'id']
+    )
+
+
+def downgrade() -> None:
+    """移除游标分页复合索引"""
+    op.drop_index('idx_equipment_department_id_id', table_name='equipments')
+    op.drop_index('idx_equipment_name_id', table_name='equipments')
+    op.drop_index('idx_equipment_valid_until_id', table_name='equipments')
@@ -0,0 +1,63 @@
+"""Add equipment_stats rollup table
+
+Revision ID: 022
+Revises: 021
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '022'
+down_revision = '021'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """创建设备统计汇总表并按现有设备回填"""
+    op.create_table(
+        'equipment_stats',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('department_id', sa.Integer(), nullable=False),
+        sa.Column('category_id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('valid_month', sa.String(length=7), nullable=False, server_default=''),
+        sa.Column('equipment_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.ForeignKeyConstraint(['department_id'], ['departments.id']),
+        sa.ForeignKeyConstraint(['category_id'], ['equipment_categories.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('department_id', 'category_id', 'name', 'status', 'valid_month',
+                            name='uq_equipment_stats_key')
+    )
+    op.create_index('ix_equipment_stats_id', 'equipment_stats', ['id'])
+
+    # 权限过滤按 (类别, 器具名称) 连接
+    op.create_index(
+        'idx_equipment_stats_category_name',
+        'equipment_stats',
+        ['category_id', 'name']
+    )
+
+    # 待检、超期统计按 (状态, 月份) 范围求和
+    op.create_index(
+        'idx_equipment_stats_status_month',
+        'equipment_stats',
+        ['status', 'valid_month']
+    )
+
+    # 回填汇总数据（月份折算逻辑与应用保持一致）
+    from app.crud.equipment_stats import ensure_equipment_stats
+    from app.db.database import engine
+    ensure_equipment_stats(engine)
+
+
+def downgrade() -> None:
+    """删除设备统计汇总表"""
+    op.drop_index('idx_equipment_stats_status_month', table_name='equipment_stats')
+    op.drop_index('idx_equipment_stats_category_name', table_name='equipment_stats')
+    op.drop_index('ix_equipment_stats_id', table_name='equipment_stats')
+    op.drop_table('equipment_stats')
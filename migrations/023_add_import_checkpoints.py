@@ -0,0 +1,33 @@
+"""Add checkpoint columns to import_sessions
+
+Revision ID: 023
+Revises: 022
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '023'
+down_revision = '022'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """添加导入断点续传所需的列"""
+    # 暂存的导入文件（完成或取消后清空）
+    op.add_column('import_sessions', sa.Column('source_path', sa.String(length=500), nullable=True))
+    # 最后一次提交的批次位置及截至该位置的计数
+    op.add_column('import_sessions', sa.Column('checkpoint', sa.JSON(), nullable=True))
+    # 执行任务的进程定期刷新，超时未刷新的会话视为已中断
+    op.add_column('import_sessions', sa.Column('heartbeat_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """删除导入断点续传列"""
+    op.drop_column('import_sessions', 'heartbeat_at')
+    op.drop_column('import_sessions', 'checkpoint')
+    op.drop_column('import_sessions', 'source_path')
@@ -0,0 +1,92 @@
+"""Add import_row_results table
+
+Revision ID: 024
+Revises: 023
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '024'
+down_revision = '023'
+branch_labels = None
+depends_on = None
+
+# 迁移后会话中保留的失败行样本数（与 IMPORT_ERROR_SAMPLE_SIZE 默认值一致）
+ERROR_SAMPLE_SIZE = 100
+
+
+def upgrade() -> None:
+    """创建导入行结果表，并把会话中的 detailed_results 拆分到该表"""
+    op.create_table(
+        'import_row_results',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('session_id', sa.Integer(), nullable=False),
+        sa.Column('row', sa.Integer(), nullable=False),
+        sa.Column('internal_id', sa.String(length=50), nullable=True),
+        sa.Column('name', sa.Text(), nullable=True),
+        sa.Column('status', sa.String(length=10), nullable=False),
+        sa.Column('message', sa.Text(), nullable=True),
+        sa.ForeignKeyConstraint(['session_id'], ['import_sessions.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('session_id', 'row', name='uq_import_row_results_session_row')
+    )
+    op.create_index('ix_import_row_results_id', 'import_row_results', ['id'])
+    op.create_index(
+        'idx_import_row_results_session_status_row',
+        'import_row_results',
+        ['session_id', 'status', 'row']
+    )
+
+    # 已有会话：逐行结果写入新表，会话中只保留失败行样本
+    bind = op.get_bind()
+    sessions = sa.table(
+        'import_sessions',
+        sa.column('id', sa.Integer),
+        sa.column('detailed_results', sa.JSON)
+    )
+    row_results = sa.table(
+        'import_row_results',
+        sa.column('session_id', sa.Integer),
+        sa.column('row', sa.Integer),
+        sa.column('internal_id', sa.String),
+        sa.column('name', sa.Text),
+        sa.column('status', sa.String),
+        sa.column('message', sa.Text)
+    )
+    for session_id, results in bind.execute(
+        sa.select(sessions.c.id, sessions.c.detailed_results).where(sessions.c.detailed_results.isnot(None))
+    ).fetchall():
+        # 旧数据可能是嵌套列表
+        if results and isinstance(results[0], list):
+            results = results[0]
+        by_row = {}
+        for item in results or []:
+            if isinstance(item, dict) and item.get('row') is not None:
+                by_row[int(item['row'])] = item
+        if by_row:
+            bind.execute(row_results.insert(), [
+                {
+                    'session_id': session_id,
+                    'row': row,
+                    'internal_id': str(item.get('internal_id') or '')[:50],
+                    'name': str(item.get('name') or ''),
+                    'status': str(item.get('status') or '失败'),
+                    'message': str(item.get('message') or '')
+                }
+                for row, item in sorted(by_row.items())
+            ])
+        sample = [item for _, item in sorted(by_row.items()) if item.get('status') == '失败'][:ERROR_SAMPLE_SIZE]
+        bind.execute(
+            sessions.update().where(sessions.c.id == session_id).values(detailed_results=sample)
+        )
+
+
+def downgrade() -> None:
+    """删除导入行结果表（会话中的失败行样本保留）"""
+    op.drop_index('idx_import_row_results_session_status_row', table_name='import_row_results')
+    op.drop_index('ix_import_row_results_id', table_name='import_row_results')
+    op.drop_table('import_row_results')
@@ -0,0 +1,52 @@
+"""Add export_jobs table
+
+Revision ID: 025
+Revises: 024
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '025'
+down_revision = '024'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """创建导出任务表"""
+    op.create_table(
+        'export_jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('export_type', sa.String(length=30), nullable=False),
+        sa.Column('params', sa.JSON(), nullable=True),
+        sa.Column('filename', sa.String(length=255), nullable=False),
+        sa.Column('cache_key', sa.String(length=64), nullable=False),
+        sa.Column('data_version', sa.String(length=32), nullable=False, server_default=''),
+        sa.Column('cached', sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column('status', sa.Enum('PENDING', 'PROCESSING', 'COMPLETED', 'FAILED', name='exportstatus'),
+                  nullable=False),
+        sa.Column('row_count', sa.Integer(), nullable=True),
+        sa.Column('file_size', sa.Integer(), nullable=True),
+        sa.Column('error_message', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('CURRENT_TIMESTAMP'),
+                  nullable=True),
+        sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('completed_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_export_jobs_id', 'export_jobs', ['id'])
+    op.create_index('idx_export_jobs_cache_key_status', 'export_jobs', ['cache_key', 'status'])
+    op.create_index('idx_export_jobs_user_created', 'export_jobs', ['user_id', 'created_at'])
+
+
+def downgrade() -> None:
+    """删除导出任务表"""
+    op.drop_index('idx_export_jobs_user_created', table_name='export_jobs')
+    op.drop_index('idx_export_jobs_cache_key_status', table_name='export_jobs')
+    op.drop_index('ix_export_jobs_id', table_name='export_jobs')
+    op.drop_table('export_jobs')
@@ -0,0 +1,53 @@
+"""Add internal_id_sequences table
+
+Revision ID: 026
+Revises: 025
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '026'
+down_revision = '025'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """创建内部编号序列表，并按现有内部编号回填每个 类别代码-类型编号 前缀的最大序列号"""
+    op.create_table(
+        'internal_id_sequences',
+        sa.Column('category_code', sa.String(length=10), nullable=False),
+        sa.Column('type_code', sa.String(length=20), nullable=False),
+        sa.Column('last_value', sa.Integer(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('category_code', 'type_code')
+    )
+
+    bind = op.get_bind()
+    maxima = {}
+    for (internal_id,) in bind.execute(sa.text("SELECT internal_id FROM equipments")):
+        parts = (internal_id or '').split('-')
+        if len(parts) != 3 or not parts[2].isdigit():
+            continue
+        prefix = (parts[0], parts[1])
+        maxima[prefix] = max(maxima.get(prefix, 0), int(parts[2]))
+
+    if maxima:
+        sequences = sa.table(
+            'internal_id_sequences',
+            sa.column('category_code', sa.String),
+            sa.column('type_code', sa.String),
+            sa.column('last_value', sa.Integer)
+        )
+        op.bulk_insert(sequences, [
+            {'category_code': category_code, 'type_code': type_code, 'last_value': last_value}
+            for (category_code, type_code), last_value in sorted(maxima.items())
+        ])
+
+
+def downgrade() -> None:
+    """删除内部编号序列表"""
+    op.drop_table('internal_id_sequences')
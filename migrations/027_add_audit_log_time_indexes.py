@@ -0,0 +1,36 @@
+"""Add audit_logs time-range indexes
+
+Revision ID: 027
+Revises: 026
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '027'
+down_revision = '026'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = (
+    ('idx_audit_logs_created_at', ['created_at']),
+    ('idx_audit_logs_user_created', ['user_id', 'created_at']),
+    ('idx_audit_logs_equipment_id', ['equipment_id']),
+)
+
+
+def upgrade() -> None:
+    """为操作日志按时间范围查询、按用户查询最近日志建立索引（已存在的跳过）"""
+    existing = {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('audit_logs')}
+    for name, columns in INDEXES:
+        if name not in existing:
+            op.create_index(name, 'audit_logs', columns)
+
+
+def downgrade() -> None:
+    """删除按用户和时间的组合索引（其余索引由更早的迁移创建）"""
+    op.drop_index('idx_audit_logs_user_created', table_name='audit_logs')
@@ -8,6 +8,7 @@ import os
 import sys
 import requests
 import json
+import time
 from datetime import datetime, timedelta
 from pathlib import Path
 import logging
@@ -26,6 +27,8 @@ class AutoExcelExporter:
             'default_export_type': 'all',
             'notification_enabled': True,
             'retention_days': 30,
+            'poll_interval': 2,        # 查询导出任务状态的间隔（秒）
+            'export_timeout': 1800,    # 等待导出任务完成的最长时间（秒）
             'auth_credentials': {
                 'username': 'admin',
                 'password': 'admin123'
@@ -105,53 +108,75 @@ class AutoExcelExporter:
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             if export_type == 'all':
                 filename = f"设备台账_自动导出_全部_{timestamp}.xlsx"
-                export_url = f"{self.config['api_base_url']}/api/import/export/export/all"
             else:
                 filename = f"设备台账_自动导出_筛选_{timestamp}.xlsx"
-                export_url = f"{self.config['api_base_url']}/api/import/export/export/filtered"
                 
             export_path = self.export_dir / filename
             
             self.logger.info(f"开始导出设备数据: {filename}")
             
-            # 发送导出请求
+            # 登记后台导出任务（数据未变更时服务端直接复用已生成的文件）
+            jobs_url = f"{self.config['api_base_url']}/api/export-jobs/"
+            payload = {'export_type': export_type}
             if export_type == 'filtered' and filters:
-                response = self.session.post(export_url, json=filters)
-            else:
-                response = self.session.get(export_url)
-                
-            if response.status_code == 200:
-                # 保存Excel文件
-                with open(export_path, 'wb') as f:
-                    f.write(response.content)
-                
-                file_size = export_path.stat().st_size
-                self.logger.info(f"导出成功: {filename} ({file_size} bytes)")
-                
-                # 创建导出信息文件
-                info_file = export_path.with_suffix('.json')
-                export_info = {
-                    'timestamp': timestamp,
-                    'export_type': export_type,
-                    'filename': filename,
-                    'file_size': file_size,
-                    'filters': filters or {},
-                    'exported_at': datetime.now().isoformat(),
-                    'api_endpoint': export_url
-                }
-                
-                with open(info_file, 'w', encoding='utf-8') as f:
-                    json.dump(export_info, f, ensure_ascii=False, indent=2)
-                
-                return export_path
-                
-            else:
+                payload['filters'] = filters
+            response = self.session.post(jobs_url, json=payload)
+            if response.status_code != 200:
                 raise Exception(f"导出失败: {response.status_code} - {response.text}")
+            job = self.wait_for_export_job(response.json())
+            
+            # 下载导出文件
+            download_url = f"{self.config['api_base_url']}{job['download_url']}"
+            with self.session.get(download_url, stream=True) as response:
+                if response.status_code != 200:
+                    raise Exception(f"下载导出文件失败: {response.status_code} - {response.text}")
+                with open(export_path, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=1024 * 1024):
+                        f.write(chunk)
+            
+            file_size = export_path.stat().st_size
+            self.logger.info(f"导出成功: {filename} ({file_size} bytes{'，复用已有导出文件' if job.get('cached') else ''})")
+            
+            # 创建导出信息文件
+            info_file = export_path.with_suffix('.json')
+            export_info = {
+                'timestamp': timestamp,
+                'export_type': export_type,
+                'filename': filename,
+                'file_size': file_size,
+                'filters': filters or {},
+                'exported_at': datetime.now().isoformat(),
+                'api_endpoint': jobs_url,
+                'job_id': job['id'],
+                'row_count': job.get('row_count'),
+                'cached': job.get('cached', False)
+            }
+            
+            with open(info_file, 'w', encoding='utf-8') as f:
+                json.dump(export_info, f, ensure_ascii=False, indent=2)
+            
+            return export_path
                 
         except Exception as e:
             self.logger.error(f"导出数据时发生错误: {e}")
             raise
             
+    def wait_for_export_job(self, job):
+        """轮询导出任务直到完成，返回已完成的任务"""
+        job_url = f"{self.config['api_base_url']}/api/export-jobs/{job['id']}"
+        deadline = time.monotonic() + self.config['export_timeout']
+        while job['status'] not in ('completed', 'failed'):
+            if time.monotonic() > deadline:
+                raise Exception(f"导出任务 {job['id']} 等待超时")
+            time.sleep(self.config['poll_interval'])
+            response = self.session.get(job_url)
+            if response.status_code != 200:
+                raise Exception(f"查询导出任务失败: {response.status_code} - {response.text}")
+            job = response.json()
+        if job['status'] == 'failed':
+            raise Exception(f"导出任务失败: {job.get('error_message')}")
+        return job
+            
     def cleanup_old_exports(self):
         """清理旧的导出文件"""
         self.logger.info("开始清理旧导出文件")
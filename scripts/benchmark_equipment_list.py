@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+设备列表序列化性能基准
+
+对比两种列表接口实现的吞吐量（行/秒）：
+- ORM路径：实例化 Equipment/Department/EquipmentCategory 对象，逐字段复制为字典，
+  经 Pydantic 校验后序列化（列投影改造前 /api/equipment/with-attachment-count 的做法）
+- 投影路径：只查询列表需要的列，元组组装为字典后直接序列化（当前实现）
+
+在临时 SQLite 数据库中生成测试数据，不影响业务数据库。
+
+用法:
+    python scripts/benchmark_equipment_list.py [--rows 50000] [--page-size 5000] [--repeat 3]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="设备列表序列化性能基准")
+    parser.add_argument("--rows", type=int, default=50000, help="测试设备数量")
+    parser.add_argument("--page-size", type=int, default=5000, help="每页条数")
+    parser.add_argument("--repeat", type=int, default=3, help="重复次数（取最好成绩）")
+    return parser.parse_args()
+
+
+def seed(engine, rows: int):
+    """批量生成部门、类别和设备测试数据"""
+    from sqlalchemy import text
+    from app.db.database import Base
+    from app.models.models import Department, EquipmentCategory, Equipment
+
+    Base.metadata.create_all(bind=engine)
+    now = datetime.now()
+    departments = [{"id": i, "name": f"部门{i}", "code": f"D{i}", "created_at": now} for i in range(1, 10)]
+    categories = [
+        {"id": i, "name": f"类别{i}", "code": f"C{i:02d}", "predefined_names": ["温度计", "压力表"], "created_at": now}
+        for i in range(1, 10)
+    ]
+
+    equipments = []
+    for i in range(rows):
+        calibration_date = date(2025, 1, 1) + timedelta(days=i % 365)
+        equipments.append({
+            "department_id": i % 9 + 1,
+            "category_id": (i // 9) % 9 + 1,
+            "name": "温度计" if i % 2 else "压力表",
+            "model": f"M-{i}",
+            "accuracy_level": "0.5级",
+            "measurement_range": "0-100",
+            "calibration_cycle": "12个月",
+            "calibration_date": calibration_date,
+            "valid_until": calibration_date + timedelta(days=364),
+            "calibration_method": "内检",
+            "current_calibration_result": "合格",
+            "internal_id": f"C{(i // 9) % 9 + 1:02d}-{i:06d}",
+            "manufacturer_id": f"SN{i}",
+            "installation_location": f"车间{i % 20}",
+            "manufacturer": "测试厂家",
+            "original_value": float(i % 5000),
+            "status": "在用",
+            "notes": f"基准测试设备{i}",
+            "created_at": now,
+        })
+
+    with engine.begin() as conn:
+        conn.execute(Department.__table__.insert(), departments)
+        conn.execute(EquipmentCategory.__table__.insert(), categories)
+        for start in range(0, len(equipments), 5000):
+            conn.execute(Equipment.__table__.insert(), equipments[start:start + 5000])
+
+        # 与生产库一致的排序、附件索引（见 migrations 019、021）
+        conn.execute(text("CREATE INDEX idx_equipment_valid_until_id ON equipments (valid_until, id)"))
+        conn.execute(text(
+            "CREATE INDEX idx_equipment_attachments_equipment_id ON equipment_attachments (equipment_id)"
+        ))
+
+
+def orm_page(db, skip: int, limit: int) -> bytes:
+    """列投影改造前的实现：ORM实例化 + 逐字段复制 + Pydantic 校验"""
+    from sqlalchemy import func
+    from sqlalchemy.orm import joinedload
+    from app.models.models import Equipment, EquipmentAttachment
+    from app.schemas.schemas import PaginatedEquipmentWithAttachmentCount
+
+    attachment_count_subquery = db.query(
+        EquipmentAttachment.equipment_id,
+        func.count(EquipmentAttachment.id).label('attachment_count')
+    ).group_by(EquipmentAttachment.equipment_id).subquery()
+
+    query = db.query(Equipment, attachment_count_subquery.c.attachment_count).options(
+        joinedload(Equipment.department),
+        joinedload(Equipment.category)
+    ).outerjoin(
+        attachment_count_subquery,
+        Equipment.id == attachment_count_subquery.c.equipment_id
+    ).order_by(Equipment.valid_until.asc(), Equipment.id.asc())
+
+    total = query.count()
+    results = query.offset(skip).limit(limit).all()
+
+    fields = [
+        'id', 'department_id', 'category_id', 'name', 'model', 'accuracy_level', 'measurement_range',
+        'calibration_cycle', 'calibration_date', 'valid_until', 'calibration_method',
+        'current_calibration_result', 'internal_id', 'manufacturer_id', 'installation_location',
+        'manufacturer', 'manufacture_date', 'scale_value', 'management_level', 'original_value',
+        'status', 'status_change_date', 'certificate_number', 'verification_agency',
+        'certificate_form', 'notes', 'created_at', 'updated_at', 'department', 'category'
+    ]
+    items = []
+    for equipment, attachment_count in results:
+        item = {field: getattr(equipment, field) for field in fields}
+        item['attachment_count'] = attachment_count or 0
+        items.append(item)
+
+    page = PaginatedEquipmentWithAttachmentCount.model_validate(
+        {"total": total, "items": items, "skip": skip, "limit": limit}
+    )
+    return page.model_dump_json().encode("utf-8")
+
+
+def projection_page(db, skip: int, limit: int) -> bytes:
+    """当前实现：列投影 + 直接序列化"""
+    from app.crud.equipment import get_equipments_with_attachment_count
+    from app.utils.fast_json import dumps
+
+    return dumps(get_equipments_with_attachment_count(db, skip=skip, limit=limit, is_admin=True))
+
+
+def run(name: str, fetch_page, rows: int, page_size: int, repeat: int) -> float:
+    """逐页读取全部设备，返回最好成绩的行/秒"""
+    from app.db.database import SessionLocal
+
+    best = None
+    for _ in range(repeat):
+        db = SessionLocal()
+        try:
+            started = time.perf_counter()
+            for skip in range(0, rows, page_size):
+                fetch_page(db, skip, page_size)
+                db.expunge_all()
+            elapsed = time.perf_counter() - started
+        finally:
+            db.close()
+        best = elapsed if best is None else min(best, elapsed)
+
+    rate = rows / best
+    print(f"{name:<12} {best:8.2f} 秒  {rate:12,.0f} 行/秒")
+    return rate
+
+
+def main():
+    args = parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="equipment_bench_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+
+    from app.db.database import engine
+    from app.utils import fast_json
+    # 预先导入（缓存服务初始化时会尝试连接Redis），避免计入第一页耗时
+    import app.crud.equipment  # noqa: F401
+    import app.schemas.schemas  # noqa: F401
+
+    print(f"生成 {args.rows:,} 台测试设备...")
+    seed(engine, args.rows)
+
+    print(f"每页 {args.page_size} 条，重复 {args.repeat} 次取最好成绩，"
+          f"JSON序列化: {'orjson' if fast_json.orjson else 'json'}")
+    print("-" * 50)
+    orm_rate = run("ORM路径", orm_page, args.rows, args.page_size, args.repeat)
+    projection_rate = run("投影路径", projection_page, args.rows, args.page_size, args.repeat)
+    print("-" * 50)
+    print(f"提升: {projection_rate / orm_rate:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+测试公共配置
+
+使用临时 SQLite 数据库；环境变量须在导入 app 之前设置。
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+_TMP_DIR = tempfile.mkdtemp(prefix="inventory-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_TMP_DIR}/test.db"
+os.environ["AUDIT_ASYNC_WRITES"] = "false"
+os.environ["AUDIT_SPOOL_DIR"] = os.path.join(_TMP_DIR, "audit_spool")
+os.environ["AUDIT_ARCHIVE_DIR"] = os.path.join(_TMP_DIR, "audit_archive")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import text  # noqa: E402
+
+from app.db.database import Base, SessionLocal, engine  # noqa: E402
+from app.models import models  # noqa: E402
+# 注册汇总表维护和缓存失效的会话钩子
+import app.crud.equipment  # noqa: E402,F401
+
+
+@pytest.fixture
+def tmp_dir() -> str:
+    return _TMP_DIR
+
+
+@pytest.fixture
+def db_session():
+    """重建全部表并写入基础数据（管理员、两个部门、两个带预定义名称的类别）"""
+    Base.metadata.drop_all(bind=engine)
+    with engine.begin() as connection:
+        connection.execute(text("DROP TABLE IF EXISTS equipment_fts"))
+    Base.metadata.create_all(bind=engine)
+
+    db = SessionLocal()
+    db.add(models.User(id=1, username="admin", hashed_password="x", is_admin=True))
+    db.add_all([
+        models.Department(id=1, name="生产部", code="SC"),
+        models.Department(id=2, name="质检部", code="ZJ"),
+    ])
+    db.add_all([
+        models.EquipmentCategory(id=1, name="温度仪表", code="TEM", predefined_names=["温度计", "热电偶"]),
+        models.EquipmentCategory(id=2, name="压力仪表", code="PRE", predefined_names=["压力表"]),
+    ])
+    db.commit()
+    try:
+        yield db
+    finally:
+        db.close()
@@ -0,0 +1,188 @@
+"""
+设备批量导入测试：断点续传、批量写入失败时的逐行重试、列式校验
+"""
+
+import csv
+import os
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from app.api.import_export import _run_equipment_import
+from app.core.import_worker import ImportCancelled, ImportJob
+from app.crud import import_session as import_crud
+from app.crud import equipment_import
+from app.crud.equipment_import import import_equipment_records
+from app.crud.equipment_stats import rebuild_equipment_stats
+from app.models.models import Equipment, EquipmentStats
+from app.schemas.schemas import ImportSessionCreate
+from app.utils.auto_id import InternalIdAllocator
+from app.utils.import_validation import load_lookup_frames, validate_import_frame
+
+COLUMNS = [
+    '使用部门', '设备类别', '计量器具名称', '型号/规格', '准确度等级', '检定周期', '检定(校准)日期',
+    '检定方式', '检定结果', '出厂编号', '设备状态', '状态变更时间', '出厂日期',
+    '证书编号', '检定机构', '证书形式'
+]
+
+
+def make_row(**overrides) -> dict:
+    """一行可以通过校验的导入数据"""
+    row = {
+        '使用部门': '生产部', '设备类别': '温度仪表', '计量器具名称': '温度计', '型号/规格': 'WSS-411',
+        '准确度等级': '1.5级', '检定周期': '12个月', '检定(校准)日期': '2024-01-15',
+        '检定方式': '内检', '检定结果': '合格', '出厂编号': 'SN-001', '设备状态': '在用',
+        '状态变更时间': '', '出厂日期': '', '证书编号': '', '检定机构': '', '证书形式': ''
+    }
+    row.update(overrides)
+    return row
+
+
+def make_record(manufacturer_id: str) -> dict:
+    """一条已校验的设备记录（import_equipment_records 的输入）"""
+    return {
+        'department_id': 1, 'category_id': 1, 'name': '温度计', 'model': 'WSS-411',
+        'accuracy_level': '1.5级', 'measurement_range': '', 'calibration_cycle': '12个月',
+        'calibration_date': date(2024, 1, 15), 'calibration_method': '内检',
+        'current_calibration_result': '合格', 'manufacturer_id': manufacturer_id,
+        'installation_location': '', 'manufacturer': '', 'manufacture_date': None, 'scale_value': '',
+        'management_level': '', 'original_value': None, 'status': '在用', 'status_change_date': None,
+        'certificate_number': '', 'verification_agency': '', 'certificate_form': '', 'notes': ''
+    }
+
+
+def stats_snapshot(db) -> list:
+    return sorted(
+        (row.department_id, row.category_id, row.name, row.status, row.valid_month, row.equipment_count)
+        for row in db.query(EquipmentStats).filter(EquipmentStats.equipment_count != 0)
+    )
+
+
+class InterruptedJob(ImportJob):
+    """在第一批提交后中断的导入任务（模拟服务关闭）"""
+
+    def checkpoint(self) -> None:
+        raise ImportCancelled()
+
+
+def test_resume_from_checkpoint_does_not_repeat_committed_rows(db_session, tmp_dir):
+    """从断点继续时不重复写入已提交的行，校验失败的行只计数一次"""
+    rows = [make_row(出厂编号=f'SN-{i:03d}') for i in range(10)]
+    rows[2]['检定方式'] = '自检'      # Excel 第4行：第一批之前的校验失败行
+    rows[6]['检定周期'] = '18个月'    # Excel 第8行：已读取但中断时尚未写入结果表
+    source_path = os.path.join(tmp_dir, 'resume.csv')
+    with open(source_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+    session = import_crud.create_import_session(db_session, ImportSessionCreate(
+        user_id=1, filename='resume.csv', batch_size=3, total_rows=len(rows)
+    ))
+
+    with pytest.raises(ImportCancelled):
+        _run_equipment_import(InterruptedJob(session.id), source_path, session.id,
+                              overwrite=False, batch_size=3, user_id=1)
+
+    db_session.expire_all()
+    checkpoint = import_crud.get_import_session(db_session, session.id).checkpoint
+    assert checkpoint['row'] == 4  # 第一批最后一行为 Excel 第5行
+    assert checkpoint['success_count'] == 3
+    assert checkpoint['error_count'] == 1
+    assert db_session.query(Equipment).count() == 3
+
+    result = _run_equipment_import(ImportJob(session.id), source_path, session.id,
+                                   overwrite=False, batch_size=3, user_id=1)
+
+    assert result['success_count'] == 8
+    assert result['error_count'] == 2
+    assert result['summary']['total_rows'] == 10
+
+    db_session.expire_all()
+    manufacturer_ids = [mid for (mid,) in db_session.query(Equipment.manufacturer_id)]
+    assert sorted(manufacturer_ids) == sorted(row['出厂编号'] for i, row in enumerate(rows) if i not in (2, 6))
+
+    row_results, total = import_crud.get_row_results(db_session, session.id, limit=None)
+    assert total == 10
+    assert [item['row'] for item in row_results] == list(range(2, 12))
+    assert [item['row'] for item in row_results if item['status'] == '失败'] == [4, 8]
+
+
+def test_failing_row_in_batch_is_isolated(db_session, monkeypatch):
+    """批量写入失败时逐行重试：只有出错的行记为失败，其余行正常写入"""
+    db_session.add(Equipment(
+        department_id=1, category_id=1, name='温度计', model='X', accuracy_level='1级',
+        calibration_cycle='12个月', calibration_date=date(2024, 1, 1), calibration_method='内检',
+        internal_id='TEM-1-900', manufacturer_id='EXISTING', status='在用'
+    ))
+    db_session.commit()
+
+    allocate = InternalIdAllocator.allocate
+    calls = []
+
+    def allocate_with_conflict(self, category_id, equipment_name):
+        calls.append(equipment_name)
+        internal_id = allocate(self, category_id, equipment_name)
+        # 第3台设备分配到已被占用的内部编号，批量插入违反唯一约束
+        return 'TEM-1-900' if len(calls) == 3 else internal_id
+
+    monkeypatch.setattr(equipment_import.InternalIdAllocator, 'allocate', allocate_with_conflict)
+
+    records = [(row, make_record(f'SN-{row}')) for row in range(2, 7)]
+    outcome = import_equipment_records(db_session, records, overwrite=False, batch_size=10)
+
+    statuses = [result['status'] for result in outcome['results']]
+    assert statuses == ['成功', '成功', '失败', '成功', '成功']
+    assert outcome['success_count'] == 4
+    assert outcome['error_count'] == 1
+    assert '处理数据时发生错误' in outcome['results'][2]['message']
+
+    assert db_session.query(Equipment).count() == 5
+    assert db_session.query(Equipment).filter(Equipment.manufacturer_id == 'SN-4').first() is None
+
+    # 汇总表只计入写入成功的行
+    incremental = stats_snapshot(db_session)
+    rebuild_equipment_stats(db_session)
+    db_session.commit()
+    assert incremental == stats_snapshot(db_session)
+
+
+# 每行的第一个错误，与原逐行校验（按部门、类别、器具名称、检定周期、检定方式、检定结果、
+# 外检字段、检定日期、出厂日期、设备状态、状态变更时间、出厂编号的顺序检查）的提示一致
+FIRST_ERROR_CASES = [
+    (make_row(), None),
+    (make_row(使用部门='销售部', 检定周期='18个月'), "部门'销售部'不存在"),
+    (make_row(设备类别='流量仪表', 检定方式='自检'), "设备类别'流量仪表'不存在"),
+    (make_row(计量器具名称='压力表', 检定结果='待定'),
+     "计量器具名称'压力表'不在设备类别'温度仪表'的预定义器具名称列表中。可用名称包括：温度计, 热电偶"),
+    (make_row(检定周期='18个月', 检定方式='自检'),
+     "检定周期必须是'6个月'、'12个月'、'24个月'、'36个月'或'随坏随换'"),
+    (make_row(检定方式='自检', 检定结果='待定'), "检定方式必须是'内检'或'外检'"),
+    (make_row(检定结果='待定', 出厂日期='不是日期'), "检定结果必须是'合格'或'不合格'"),
+    (make_row(检定方式='外检', 检定机构='计量院', 证书形式='检定证书'), "外检时'证书编号'为必填项"),
+    (make_row(检定方式='外检', 证书编号='C-1', 检定机构='计量院', 证书形式='合格证'),
+     "证书形式必须是'校准证书'或'检定证书'"),
+    (make_row(**{'检定(校准)日期': '', '设备状态': '封存'}), "检定(校准)日期为必填项"),
+    (make_row(**{'检定(校准)日期': '不是日期'}), "检定日期格式错误，请使用YYYY-MM-DD格式"),
+    (make_row(**{'检定周期': '随坏随换', '检定(校准)日期': '不是日期'}), None),
+    (make_row(出厂日期='不是日期', 出厂编号=''), "出厂日期格式错误，请使用YYYY-MM-DD格式"),
+    (make_row(设备状态='封存', 出厂编号=''), "设备状态'封存'不合法，只能是'在用'、'停用'或'报废'"),
+    (make_row(设备状态='停用', 状态变更时间='不是日期', 出厂编号=''), "状态变更时间格式错误，请使用YYYY-MM-DD格式"),
+    (make_row(设备状态='在用', 状态变更时间='不是日期'), None),
+    (make_row(出厂编号=' '), "出厂编号为必填项，不能为空"),
+]
+
+
+def test_validate_import_frame_reports_first_error_per_row(db_session):
+    """列式校验对每行报告的第一个错误与原逐行校验一致"""
+    df = pd.DataFrame([row for row, _ in FIRST_ERROR_CASES], columns=COLUMNS).fillna('')
+    validation = validate_import_frame(df, load_lookup_frames(db_session))
+
+    messages = dict(zip(validation.errors['row'], validation.errors['message']))
+    for index, (_, expected) in enumerate(FIRST_ERROR_CASES):
+        assert messages.get(index + 2) == expected, f"第{index + 2}行"
+
+    passed = [index + 2 for index, (_, expected) in enumerate(FIRST_ERROR_CASES) if expected is None]
+    assert list(validation.rows['row']) == passed
+    assert set(validation.errors['status']) == {'失败'}